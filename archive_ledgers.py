@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Ledger Archival for ExoWin Bot
+Moves games and transactions older than ARCHIVE_AFTER_DAYS into monthly
+archive collections so only recent history stays in the working set.
+Safe to run from cron; an interrupted run is finished by the next one.
+
+Usage:
+    python archive_ledgers.py
+    python archive_ledgers.py --days 90
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.database.db import archive_old_ledgers
+
+async def main(days):
+    print("📦 Archiving old games and transactions...")
+    moved = await archive_old_ledgers(days, progress=lambda count: print(f"   {count:,} rows moved"))
+    for name, count in moved.items():
+        print(f"✅ {name}: {count:,} rows archived")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old ledger rows into monthly archive collections")
+    parser.add_argument("--days", type=int, default=None, help="archive rows older than this many days (default ARCHIVE_AFTER_DAYS)")
+    args = parser.parse_args()
+    asyncio.run(main(args.days))
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Index Advisor for ExoWin Bot
+Reports unused and prefix-redundant indexes and applies the declarative index plan.
+
+Usage:
+    python index_advisor.py            # report only
+    python index_advisor.py --apply    # create missing and drop unplanned indexes
+    python index_advisor.py --apply --dry-run
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.database.db import db
+from src.database.indexes import analyze_indexes, apply_index_plan, build_index_plan, find_unserved_indexes
+
+async def main(apply: bool, dry_run: bool):
+    plan = build_index_plan()
+    report = await analyze_indexes(db, plan)
+
+    print("🔎 ExoWin Index Advisor")
+    print("=" * 50)
+    for collection, details in report.items():
+        print(f"\n📋 {collection}")
+        for name in details["indexes"]:
+            ops = details["usage"].get(name)
+            print(f"   • {name}: {ops if ops is not None else '?'} ops")
+        for name in details["unused"]:
+            print(f"   ⚠️ unused since server start: {name}")
+        for entry in details["redundant"]:
+            print(f"   ⚠️ redundant: {entry['name']} is a prefix of {entry['covered_by']}")
+        for name in details["to_drop"]:
+            print(f"   ➖ not in plan: {name}")
+        for name in details["to_create"]:
+            print(f"   ➕ missing from database: {name}")
+
+    for name in find_unserved_indexes(plan):
+        print(f"\n⚠️ Planned index {name} serves no recorded query shape")
+
+    if apply:
+        print("\nApplying index plan...")
+        actions = await apply_index_plan(db, plan, drop=True, dry_run=dry_run)
+        for action in actions:
+            print(f"   {'would ' if dry_run else ''}{action}")
+        if not actions:
+            print("   Indexes already match the plan")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report and prune MongoDB indexes")
+    parser.add_argument("--apply", action="store_true", help="create missing and drop unplanned indexes")
+    parser.add_argument("--dry-run", action="store_true", help="with --apply, only print the actions")
+    args = parser.parse_args()
+    asyncio.run(main(args.apply, args.dry_run))
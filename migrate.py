@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Schema Migration Runner for ExoWin Bot
+Applies versioned document migrations online, in throttled batches that
+resume from their last checkpoint.
+
+Usage:
+    python migrate.py --status
+    python migrate.py --dry-run
+    python migrate.py                          # apply every pending migration
+    python migrate.py --to 1 --rate 500 --batch-size 200
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.database.db import db
+from src.database.migrations import MigrationRunner, MIGRATION_BATCH_SIZE, MIGRATION_MAX_DOCS_PER_SECOND
+
+def report(migration, scanned, modified):
+    print(f"   v{migration.version}: {scanned:,} scanned, {modified:,} modified")
+
+async def main(args):
+    runner = MigrationRunner(db, batch_size=args.batch_size, max_docs_per_second=args.rate)
+
+    if args.status:
+        print("🧬 ExoWin Migrations")
+        print("=" * 50)
+        for entry in await runner.status():
+            print(f"v{entry['version']} {entry['name']}: {entry['status']} ({entry.get('scanned', 0):,} scanned, {entry.get('modified', 0):,} modified)")
+        return
+
+    print(f"🔄 Running migrations{' (dry run)' if args.dry_run else ''}...")
+    results = await runner.run(dry_run=args.dry_run, target=args.to, progress=report)
+    for version, result in results.items():
+        print(f"✅ v{version}: {result['scanned']:,} scanned, {result['modified']:,} {'would be modified' if args.dry_run else 'modified'}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply versioned MongoDB document migrations")
+    parser.add_argument("--status", action="store_true", help="show each migration's checkpoint and exit")
+    parser.add_argument("--dry-run", action="store_true", help="count the documents that would change without writing")
+    parser.add_argument("--to", type=int, default=None, help="stop after this migration version")
+    parser.add_argument("--batch-size", type=int, default=MIGRATION_BATCH_SIZE, help="documents per bulk_write")
+    parser.add_argument("--rate", type=float, default=MIGRATION_MAX_DOCS_PER_SECOND, help="max documents per second (0 for no limit)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Games Time-Series Migration for ExoWin Bot
+Moves the games ledger into a MongoDB time-series collection.
+
+Stop the bot and webapp first: the regular collection is renamed to
+games_legacy, a time-series games collection is created and every round is
+copied across. games_legacy is kept until you drop it with --drop-legacy.
+An interrupted run resumes from its checkpoint when started again.
+
+Usage:
+    python migrate_games_timeseries.py
+    python migrate_games_timeseries.py --batch-size 5000
+    python migrate_games_timeseries.py --drop-legacy
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.database.db import db, setup_database
+from src.database.timeseries import migrate_games_to_timeseries, get_collection_type, GAMES_LEGACY_COLLECTION
+
+async def main(batch_size: int, drop_legacy: bool):
+    if drop_legacy:
+        if await get_collection_type(db, "games") != "timeseries":
+            print("❌ games is not a time-series collection yet; refusing to drop the legacy copy")
+            return
+        await db[GAMES_LEGACY_COLLECTION].drop()
+        print(f"🗑️ Dropped {GAMES_LEGACY_COLLECTION}")
+        return
+
+    print("🔄 Migrating games into a time-series collection...")
+    copied = await migrate_games_to_timeseries(
+        db, batch_size=batch_size, progress=lambda count: print(f"   {count:,} rounds copied")
+    )
+    legacy = await db[GAMES_LEGACY_COLLECTION].estimated_document_count()
+    current = await db["games"].count_documents({})
+    print(f"✅ Copied {copied:,} rounds ({current:,} in games, {legacy:,} in {GAMES_LEGACY_COLLECTION})")
+
+    # Recreate the planned indexes on the new collection
+    await setup_database()
+    print("Set GAMES_TIMESERIES=true and restart; drop the legacy copy once verified.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move the games ledger into a time-series collection")
+    parser.add_argument("--batch-size", type=int, default=10000, help="rounds copied per insert")
+    parser.add_argument("--drop-legacy", action="store_true", help=f"drop {GAMES_LEGACY_COLLECTION} after verifying the copy")
+    args = parser.parse_args()
+    asyncio.run(main(args.batch_size, args.drop_legacy))
@@ -0,0 +1,15 @@
+import asyncio
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.database.db import setup_database, rebuild_rollups
+
+async def main():
+    print("Rebuilding analytics rollups from games and transactions...")
+    await setup_database()
+    await rebuild_rollups()
+    print("Rollups rebuilt!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
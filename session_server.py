@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Game Session Server for ExoWin Bot
+Holds active webapp game sessions in one process so several Flask workers
+can serve the same player. Start it before the workers and set
+GAME_SESSION_BACKEND=socket.
+
+Usage:
+    python session_server.py
+"""
+
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.games.sessions import build_session_server, GAME_SESSION_ADDRESS
+
+if __name__ == "__main__":
+    try:
+        server = build_session_server()
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"🗂️ Game session server listening on {GAME_SESSION_ADDRESS}")
+    server.serve_forever()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+RTP Simulator for ExoWin Bot
+Plays millions of rounds of every game and reports return to player,
+variance, maximum exposure and 95% confidence intervals.
+
+Usage:
+    python simulate_rtp.py                          # every game, default rounds
+    python simulate_rtp.py --game crash --crash-target 1.5 --rounds 5000000
+    python simulate_rtp.py --check                  # compare fast paths with the game classes first
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.games.simulation import SIMULATED_GAMES, SIMULATION_PROCESSES, SIMULATION_ROUNDS, build_models, check_model, simulate, vectorized_available
+
+def main(args):
+    models = build_models(
+        args.game,
+        target=args.crash_target,
+        risk=args.plinko_risk,
+        mines=args.mines,
+        picks=args.mines_picks,
+        levels=args.tower_levels,
+        bet=args.roulette_bet,
+        ticket=args.lottery_ticket,
+        stand_on=args.blackjack_stand
+    )
+
+    print("🎲 ExoWin RTP Simulator")
+    print("=" * 50)
+    print(f"Rounds per game: {args.rounds:,}  Seed: {args.seed}  NumPy: {'yes' if vectorized_available() else 'no (plain Python batches)'}")
+
+    if args.check:
+        print("\n🔬 Checking fast paths against the game classes")
+        failed = False
+        for model in models:
+            result = check_model(model, args.check_rounds, args.seed)
+            detail = f"{result.get('mismatches', 0)} mismatches" if result["method"] == "replay" else f"z={result['z_score']:.2f}" if result["method"] == "statistical" else "played through the class"
+            print(f"   {'✅' if result['passed'] else '❌'} {model.name}: {result['method']}, {detail}")
+            failed = failed or not result["passed"]
+        if failed:
+            print("\n❌ Fast paths disagree with the game classes, not simulating")
+            return 1
+
+    for model in models:
+        started = time.monotonic()
+        result = simulate(model, args.rounds, args.seed, args.processes)
+        elapsed = time.monotonic() - started
+        print(f"\n📊 {result['strategy']} [{result['mode']}, {elapsed:.1f}s]")
+        print(f"   RTP: {result['rtp']:.4%}  (95% CI {result['ci_low']:.4%} - {result['ci_high']:.4%})")
+        print(f"   House edge: {result['house_edge']:.4%}")
+        print(f"   Variance: {result['variance']:.4f}  Std dev: {result['std']:.4f}")
+        print(f"   Max exposure: {result['max_exposure']:g}x bet (largest seen {result['max_payout']:g}x)")
+        if result["ci_low"] > 1.0:
+            print("   ⚠️ Pays out more than it takes in")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monte Carlo RTP simulation of every game")
+    parser.add_argument("--game", action="append", choices=list(SIMULATED_GAMES), help="game to simulate; repeat for several (default: all)")
+    parser.add_argument("--rounds", type=int, default=SIMULATION_ROUNDS, help="rounds per game")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the simulated streams")
+    parser.add_argument("--processes", type=int, default=SIMULATION_PROCESSES, help="worker processes for games played round by round (0 = one per CPU)")
+    parser.add_argument("--check", action="store_true", help="check the fast paths against the game classes before simulating")
+    parser.add_argument("--check-rounds", type=int, default=10000, help="rounds per game for --check")
+    parser.add_argument("--crash-target", type=float, help="crash auto cash-out multiplier (default 2.0)")
+    parser.add_argument("--plinko-risk", choices=["low", "medium", "high"], help="plinko risk level (default medium)")
+    parser.add_argument("--mines", type=int, help="mines on the grid (default 5)")
+    parser.add_argument("--mines-picks", type=int, help="tiles revealed before cashing out (default 3)")
+    parser.add_argument("--tower-levels", type=int, help="tower levels climbed before cashing out (default 3)")
+    parser.add_argument("--roulette-bet", help="roulette bet type, e.g. red or number_17 (default red)")
+    parser.add_argument("--lottery-ticket", type=int, nargs=6, help="six lottery numbers (default 1-6)")
+    parser.add_argument("--blackjack-stand", type=int, help="blackjack player total to stand on (default 17)")
+    args = parser.parse_args()
+    sys.exit(main(args))
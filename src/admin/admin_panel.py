@@ -174,19 +174,27 @@ async def admin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         elif data[2] == "list":
             # Show all users with pagination
             from src.database import get_all_users
-            users, total_count = await get_all_users(limit=10)
             
-            message = f"📋 **All Users** (Showing 1-{len(users)} of {total_count:,})\n\n"
+            # Cursors are URL-safe base64 and may contain underscores
+            parts = query.data.split("_", 3)
+            page_cursor = parts[3] if len(parts) > 3 else None
+            try:
+                users, next_cursor, total_count = await get_all_users(limit=10, cursor=page_cursor)
+            except ValueError:
+                users, next_cursor, total_count = await get_all_users(limit=10)
+            
+            message = f"📋 **All Users** (Showing {len(users)} of ~{total_count:,})\n\n"
             
             for i, user in enumerate(users, 1):
                 status = "🚫" if user.get('is_banned') else "✅"
                 message += f"{i}. {status} ID: `{user['user_id']}` | Balance: ${user['balance']:.2f}\n"
             
+            navigation = [InlineKeyboardButton("Refresh", callback_data="admin_users_list")]
+            if next_cursor:
+                navigation.insert(0, InlineKeyboardButton("Next Page", callback_data=f"admin_users_list_{next_cursor}"))
+            
             keyboard = [
-                [
-                    InlineKeyboardButton("Next Page", callback_data="admin_users_list_1"),
-                    InlineKeyboardButton("Refresh", callback_data="admin_users_list")
-                ],
+                navigation,
                 [
                     InlineKeyboardButton("🔙 Back to User Management", callback_data="admin_users")
                 ]
@@ -487,9 +495,26 @@ async def admin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     elif section == "system":
         # System information and controls
-        from src.database.db import get_user_activity_stats
+        from src.database.db import get_user_activity_stats, ledger_writer, user_reads
+        from src.database.cache import user_cache
+        from src.database.monitoring import command_stats
+        from src.database.client import pool_stats
         
         activity_stats = await get_user_activity_stats()
+        cache_stats = user_cache.get_stats()
+        coalescing_stats = user_reads.get_stats()
+        ledger_stats = ledger_writer.get_stats()
+        pool = pool_stats.get_stats()
+        
+        # Operations with the most total time spent in Mongo
+        db_hot_spots = ""
+        for op in command_stats.get_stats(limit=5):
+            db_hot_spots += (
+                f"• `{op['collection']}.{op['command']}`: {op['count']:,} calls, "
+                f"avg {op['avg_ms']:.1f}ms, p95 ≤{op['p95_ms']:.0f}ms, max {op['max_ms']:.0f}ms\n"
+            )
+        if not db_hot_spots:
+            db_hot_spots = "• No queries recorded yet\n"
         
         message = (
             "🔧 **System Status** 🔧\n\n"
@@ -501,7 +526,24 @@ async def admin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"📊 **Engagement:**\n"
             f"• Avg Games/User: {activity_stats['engagement'].get('avg_games_per_user', 0):.1f}\n"
             f"• Users with Deposits: {activity_stats['engagement'].get('total_users_with_deposits', 0):,}\n"
-            f"• Users with Withdrawals: {activity_stats['engagement'].get('total_users_with_withdrawals', 0):,}\n"
+            f"• Users with Withdrawals: {activity_stats['engagement'].get('total_users_with_withdrawals', 0):,}\n\n"
+            f"🗄️ **User Cache:**\n"
+            f"• Hit Rate: {cache_stats['hit_rate']:.1f}% ({cache_stats['hits']:,} hits / {cache_stats['misses']:,} misses)\n"
+            f"• Cached Users: {cache_stats['size']:,} / {cache_stats['max_size']:,}\n"
+            f"• Evictions: {cache_stats['evictions']:,}\n"
+            f"• Coalesced Reads: {coalescing_stats['coalesced']:,} of {coalescing_stats['calls']:,} misses ({coalescing_stats['coalesced_rate']:.1f}%)\n\n"
+            f"📒 **Ledger Writer:**\n"
+            f"• Pending Rows: {ledger_stats['pending']:,}\n"
+            f"• Rows Written: {ledger_stats['rows_written']:,} in {ledger_stats['batches_written']:,} batches\n"
+            f"• Backpressure Waits: {ledger_stats['backpressure_waits']:,}\n"
+            f"• Dead-Lettered Rows: {ledger_stats['dead_letters']:,}\n\n"
+            f"🔌 **Connection Pool:**\n"
+            f"• In Use: {pool['checked_out']:,} / {pool['max_pool_size']:,} per server (peak {pool['peak_checked_out']:,})\n"
+            f"• Open Connections: {pool['open_connections']:,} ({pool['connections_created']:,} created)\n"
+            f"• Checkout Failures: {pool['checkout_failures']:,}, Pool Clears: {pool['pool_clears']:,}\n\n"
+            f"⏱️ **DB Hot Spots:**\n"
+            f"{db_hot_spots}"
+            f"• Slow queries (≥{command_stats.slow_ms:.0f}ms): {len(command_stats.slow_queries):,} recent\n"
         )
         
         keyboard = [
@@ -812,7 +854,7 @@ async def admin_message_handler(update: Update, context: ContextTypes.DEFAULT_TY
     
     elif action == "broadcast_message":
         # Broadcast message to all users
-        from src.database import get_all_users
+        from src.database import iter_user_batches
         
         broadcast_message = update.message.text.strip()
         
@@ -820,24 +862,24 @@ async def admin_message_handler(update: Update, context: ContextTypes.DEFAULT_TY
             await update.message.reply_text("❌ Message too short. Please enter a meaningful message.")
             return True
         
-        # Get all users
-        all_users, total_count = await get_all_users(limit=10000)  # Get first 10k users
-        
         success_count = 0
         failed_count = 0
         
-        # Send broadcast message
-        for user in all_users:
-            try:
-                await context.bot.send_message(
-                    chat_id=user['user_id'],
-                    text=f"📢 **ExoWin 👑 Announcement** 📢\n\n{broadcast_message}",
-                    parse_mode='Markdown'
-                )
-                success_count += 1
-            except Exception as e:
-                failed_count += 1
-                bot_logger.warning(f"Failed to send broadcast to user {user['user_id']}: {e}")
+        # Send broadcast message to every user, one page at a time
+        async for users in iter_user_batches(batch_size=1000, projection={"user_id": 1}):
+            for user in users:
+                try:
+                    await context.bot.send_message(
+                        chat_id=user['user_id'],
+                        text=f"📢 **ExoWin 👑 Announcement** 📢\n\n{broadcast_message}",
+                        parse_mode='Markdown'
+                    )
+                    success_count += 1
+                except Exception as e:
+                    failed_count += 1
+                    bot_logger.warning(f"Failed to send broadcast to user {user['user_id']}: {e}")
+        
+        total_count = success_count + failed_count
         
         result_message = (
             f"📢 **Broadcast Complete** 📢\n\n"
@@ -862,14 +904,14 @@ async def admin_message_handler(update: Update, context: ContextTypes.DEFAULT_TY
 
 async def execute_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE, broadcast_message: str):
     """Execute the broadcast to all users"""
-    from src.database import get_all_users
+    from src.database import count_users, iter_user_batches
     
-    # Get all users in batches to avoid memory issues
+    # Walk users by keyset pagination so every batch costs the same
     batch_size = 1000
-    skip = 0
+    batch_number = 0
+    processed = 0
     total_success = 0
     total_failed = 0
-    total_users = 0
     
     # Send initial status message
     status_message = await update.callback_query.edit_message_text(
@@ -879,16 +921,11 @@ async def execute_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE,
         parse_mode='Markdown'
     )
     
-    while True:
-        # Get batch of users
-        users, total_count = await get_all_users(limit=batch_size, skip=skip)
-        
-        if not users:
-            break
-        
-        total_users = total_count
-        batch_success = 0
-        batch_failed = 0
+    # Progress is shown against the estimated collection size
+    estimated_total = await count_users()
+    
+    async for users in iter_user_batches(batch_size=batch_size, projection={"user_id": 1}):
+        batch_number += 1
         
         # Send to each user in the batch
         for user in users:
@@ -898,33 +935,32 @@ async def execute_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE,
                     text=f"📢 **ExoWin 👑 Announcement** 📢\n\n{broadcast_message}",
                     parse_mode='Markdown'
                 )
-                batch_success += 1
                 total_success += 1
             except Exception as e:
-                batch_failed += 1
                 total_failed += 1
                 bot_logger.warning(f"Failed to send broadcast to user {user['user_id']}: {e}")
         
         # Update progress
-        progress = ((skip + len(users)) / total_count) * 100
+        processed += len(users)
+        progress = min(processed / max(estimated_total, 1) * 100, 100.0)
         try:
             await status_message.edit_text(
                 f"📢 **Broadcasting...** 📢\n\n"
                 f"📊 Progress: {progress:.1f}%\n"
                 f"✅ Sent: {total_success:,}\n"
                 f"❌ Failed: {total_failed:,}\n"
-                f"📈 Processing batch {skip//batch_size + 1}...",
+                f"📈 Processing batch {batch_number}...",
                 parse_mode='Markdown'
             )
         except:
             pass  # Ignore edit errors
         
-        skip += batch_size
-        
         # Small delay to avoid rate limiting
         import asyncio
         await asyncio.sleep(0.1)
     
+    total_users = processed
+    
     # Final result message
     result_message = (
         f"📢 **Broadcast Complete!** 📢\n\n"
@@ -161,12 +161,12 @@ async def help_command(update: Update, context):
 @handle_errors
 async def balance_command(update: Update, context):
     """Show user balance when the command /balance is issued."""
-    from src.database import get_user
+    from src.database import get_user_balance
     from src.utils.formatting import format_money
     
     user_id = update.effective_user.id
     bot_logger.info(f"User {user_id} checked balance")
-    user = await get_user(user_id)
+    user = await get_user_balance(user_id)
     
     balance_message = (
         "💰 Your Balance 💰\n\n"
@@ -179,12 +179,12 @@ async def balance_command(update: Update, context):
 @handle_errors
 async def stats_command(update: Update, context):
     """Show user statistics when the command /stats is issued."""
-    from src.database import get_user
+    from src.database import get_user_stats
     from src.utils.formatting import format_money, format_user_stats
     
     user_id = update.effective_user.id
     bot_logger.info(f"User {user_id} requested stats")
-    user = await get_user(user_id)
+    user = await get_user_stats(user_id)
     
     stats_message = (
         "📊 Your Gambling Statistics 📊\n\n"
@@ -295,9 +295,16 @@ async def post_init(application):
     await application.bot.set_my_commands(commands)
     logger.info("Bot commands have been set up")
 
+async def post_shutdown(application):
+    """Flush buffered database writes before exiting."""
+    from src.database import shutdown_database
+    
+    await shutdown_database()
+    logger.info("Database writes flushed")
+
 async def setup_bot():
     """Setup bot database and configurations"""
-    from src.database import setup_database
+    from src.database import setup_database, start_background_tasks
     
     # Setup database indexes
     bot_logger.info("Setting up database...")
@@ -306,6 +313,7 @@ async def setup_bot():
         bot_logger.error("Failed to setup database!")
         return False
     
+    start_background_tasks()
     bot_logger.info("Database setup completed successfully")
     return True
 
@@ -323,7 +331,7 @@ def main():
     bot_logger.info(config_validator.get_config_status())
     
     # Create the Application
-    application = Application.builder().token(BOT_TOKEN).post_init(post_init).build()
+    application = Application.builder().token(BOT_TOKEN).post_init(post_init).post_shutdown(post_shutdown).build()
     
     # Basic commands
     application.add_handler(CommandHandler("start", start))
@@ -1,6 +1,9 @@
 from src.database.db import (
     get_user,
+    get_user_balance,
+    get_user_stats,
     update_user_balance,
+    settle_balance,
     record_transaction,
     record_game,
     can_withdraw,
@@ -9,22 +12,31 @@ from src.database.db import (
     update_user_settings,
     # Admin functions
     get_all_users,
+    iter_user_batches,
+    count_users,
     search_users,
     get_user_transactions,
     get_user_games,
     ban_user,
     get_top_users_by_balance,
     get_top_users_by_bets,
+    get_user_rank,
     get_system_stats,
     get_game_statistics,
     get_financial_stats,
     get_daily_stats,
+    rebuild_rollups,
+    archive_old_ledgers,
     get_user_activity_stats,
     # User display functions
     format_user_display,
     extract_user_data_from_update,
     # Database setup
     setup_database,
+    flush_last_active,
+    flush_ledger,
+    start_background_tasks,
+    shutdown_database,
     users_collection,
     transactions_collection,
     games_collection
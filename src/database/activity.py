@@ -0,0 +1,110 @@
+import os
+import time
+import asyncio
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+from pymongo import UpdateOne
+from src.utils.logger import db_logger
+
+class LastActiveTracker:
+    """Buffer last_active timestamps in memory and flush them in bulk"""
+
+    def __init__(self, interval: float = 30.0):
+        self.interval = interval
+        # user_id -> most recent activity time not yet written
+        self._pending: Dict[int, datetime] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.touches = 0
+        self.writes = 0
+
+    def touch(self, user_id: int, when: Optional[datetime] = None):
+        """Record activity for a user without touching the database"""
+        when = when or datetime.now()
+        with self._lock:
+            current = self._pending.get(user_id)
+            if current is None or when > current:
+                self._pending[user_id] = when
+            self.touches += 1
+
+    def _drain(self) -> Dict[int, datetime]:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def _restore(self, pending: Dict[int, datetime]):
+        """Put back timestamps from a failed flush so they are retried"""
+        for user_id, when in pending.items():
+            with self._lock:
+                current = self._pending.get(user_id)
+                if current is None or when > current:
+                    self._pending[user_id] = when
+
+    @staticmethod
+    def _build_operations(pending: Dict[int, datetime]) -> List[UpdateOne]:
+        # $max keeps a late flush from moving last_active backwards
+        return [
+            UpdateOne({"user_id": user_id}, {"$max": {"last_active": when}})
+            for user_id, when in pending.items()
+        ]
+
+    async def flush(self, collection) -> int:
+        """Write buffered timestamps with one bulk_write on a motor collection"""
+        pending = self._drain()
+        if not pending:
+            return 0
+        try:
+            await collection.bulk_write(self._build_operations(pending), ordered=False)
+        except Exception as e:
+            db_logger.error(f"Failed to flush last_active for {len(pending)} users: {e}")
+            self._restore(pending)
+            return 0
+        self.writes += 1
+        return len(pending)
+
+    def flush_sync(self, collection) -> int:
+        """Write buffered timestamps with one bulk_write on a pymongo collection"""
+        pending = self._drain()
+        if not pending:
+            return 0
+        try:
+            collection.bulk_write(self._build_operations(pending), ordered=False)
+        except Exception as e:
+            db_logger.error(f"Failed to flush last_active for {len(pending)} users: {e}")
+            self._restore(pending)
+            return 0
+        self.writes += 1
+        return len(pending)
+
+    async def _run(self, collection):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush(collection)
+
+    def start(self, collection):
+        """Start the periodic flush on the running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(collection))
+
+    async def stop(self, collection):
+        """Stop the periodic flush and write whatever is still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush(collection)
+
+    def start_thread(self, collection):
+        """Start a daemon thread that flushes a pymongo collection periodically"""
+        def run():
+            while True:
+                time.sleep(self.interval)
+                self.flush_sync(collection)
+
+        threading.Thread(target=run, name="last-active-flusher", daemon=True).start()
+
+LAST_ACTIVE_FLUSH_INTERVAL = float(os.getenv("LAST_ACTIVE_FLUSH_INTERVAL", "30"))
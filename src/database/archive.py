@@ -0,0 +1,181 @@
+import os
+import re
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional, Tuple
+from pymongo.errors import BulkWriteError
+from src.utils.logger import db_logger
+from src.database.timeseries import get_collection_type
+
+# Games and transactions older than this many days move to monthly archives
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "5000"))
+
+# Ledger collections that are archived
+ARCHIVED_COLLECTIONS = ("games", "transactions")
+
+# Archives are rarely read, so trade CPU for disk with zstd block compression
+ARCHIVE_STORAGE_ENGINE = {"wiredTiger": {"configString": "block_compressor=zstd"}}
+
+# How long the list of archive collections is trusted before re-listing
+ARCHIVE_CATALOG_TTL = 300
+
+# Before 7.0 a time-series collection only accepts deletes filtered on its
+# metaField (user_id), so a time-series games ledger is archived on 7.0+ only
+TIMESERIES_DELETE_MIN_VERSION = (7, 0)
+
+_ARCHIVE_NAME = re.compile(r"^(games|transactions)_archive_(\d{4})_(\d{2})$")
+
+def month_start(timestamp: datetime) -> datetime:
+    """First instant of the month a timestamp falls in"""
+    return timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def archive_collection_name(name: str, timestamp: datetime) -> str:
+    """Monthly archive for a ledger row, e.g. games_archive_2024_01"""
+    return f"{name}_archive_{timestamp.year:04d}_{timestamp.month:02d}"
+
+def parse_archive_name(collection_name: str) -> Optional[Tuple[str, datetime]]:
+    """(ledger name, month start) for an archive collection name, else None"""
+    match = _ARCHIVE_NAME.match(collection_name)
+    if not match:
+        return None
+    return match.group(1), datetime(int(match.group(2)), int(match.group(3)), 1)
+
+class ArchiveCatalog:
+    """Cached list of the monthly archive collections per ledger"""
+
+    def __init__(self, ttl: float = ARCHIVE_CATALOG_TTL):
+        self.ttl = ttl
+        self._months: Dict[str, List[datetime]] = {}
+        self._loaded_at = 0.0
+
+    def invalidate(self):
+        self._loaded_at = 0.0
+
+    async def months(self, database, name: str) -> List[datetime]:
+        """Archived months for one ledger, newest first"""
+        if time.monotonic() - self._loaded_at > self.ttl:
+            months: Dict[str, List[datetime]] = {ledger: [] for ledger in ARCHIVED_COLLECTIONS}
+            for collection_name in await database.list_collection_names():
+                parsed = parse_archive_name(collection_name)
+                if parsed:
+                    months[parsed[0]].append(parsed[1])
+            for ledger_months in months.values():
+                ledger_months.sort(reverse=True)
+            self._months = months
+            self._loaded_at = time.monotonic()
+        return self._months.get(name, [])
+
+    async def collection_names(self, database, name: str) -> List[str]:
+        """Every archive collection for one ledger, newest first"""
+        return [archive_collection_name(name, month) for month in await self.months(database, name)]
+
+# Global archive catalog
+archive_catalog = ArchiveCatalog()
+
+async def _ensure_archive(database, collection_name: str, known: set):
+    """Create a compressed archive collection with its history index"""
+    if collection_name in known:
+        return
+    try:
+        await database.create_collection(collection_name, storageEngine=ARCHIVE_STORAGE_ENGINE)
+    except Exception as e:
+        # Already exists from an earlier run
+        db_logger.debug(f"Archive collection {collection_name} not created: {e}")
+    await database[collection_name].create_index([("user_id", 1), ("timestamp", -1)])
+    known.add(collection_name)
+
+async def _insert_archived(collection, rows: List[Dict[str, Any]]):
+    """Insert archived rows, ignoring ones a crashed earlier run already copied"""
+    try:
+        await collection.insert_many(rows, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != 11000 for error in errors):
+            raise
+
+async def _server_version(database) -> Tuple[int, ...]:
+    info = await database.command("buildInfo")
+    return tuple(info.get("versionArray", [0, 0])[:2])
+
+async def archive_collection(database, name: str, cutoff: datetime, batch_size: int = ARCHIVE_BATCH_SIZE, progress=None) -> int:
+    """Move rows older than cutoff from a ledger into its monthly archives.
+
+    Each batch is copied before it is deleted, so a crash leaves rows in both
+    places and the next run finishes the move. Returns the rows moved.
+    A time-series ledger is deleted by timestamp range, which needs MongoDB
+    7.0+; on older servers it is left in place and a warning is logged.
+    """
+    source = database[name]
+    timeseries = await get_collection_type(database, name) == "timeseries"
+    if timeseries:
+        version = await _server_version(database)
+        if version < TIMESERIES_DELETE_MIN_VERSION:
+            db_logger.warning(
+                f"Not archiving {name}: it is a time-series collection and MongoDB "
+                f"{'.'.join(map(str, version))} only deletes from those by user_id; archiving it needs 7.0+"
+            )
+            return 0
+
+    known = set(await archive_catalog.collection_names(database, name))
+    moved = 0
+    while True:
+        batch = await source.find({"timestamp": {"$lt": cutoff}}).sort("timestamp", 1).limit(batch_size).to_list(length=batch_size)
+        if not batch:
+            break
+        if timeseries:
+            # The delete is a timestamp range, so take every row sharing the last timestamp
+            upper = batch[-1]["timestamp"]
+            batch = [row for row in batch if row["timestamp"] < upper]
+            batch.extend(await source.find({"timestamp": upper}).to_list(length=None))
+
+        by_month: Dict[str, List[Dict[str, Any]]] = {}
+        for row in batch:
+            by_month.setdefault(archive_collection_name(name, row["timestamp"]), []).append(row)
+        for collection_name, rows in by_month.items():
+            await _ensure_archive(database, collection_name, known)
+            await _insert_archived(database[collection_name], rows)
+
+        if timeseries:
+            await source.delete_many({"timestamp": {"$lte": upper}})
+        else:
+            await source.delete_many({"_id": {"$in": [row["_id"] for row in batch]}})
+        moved += len(batch)
+        if progress:
+            progress(moved)
+
+    archive_catalog.invalidate()
+    if moved:
+        db_logger.info(f"Archived {moved} {name} rows older than {cutoff:%Y-%m-%d}")
+    return moved
+
+async def archive_ledgers(database, after_days: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE, progress=None) -> Dict[str, int]:
+    """Archive every ledger collection past the horizon"""
+    cutoff = month_start(datetime.now() - timedelta(days=after_days))
+    return {
+        name: await archive_collection(database, name, cutoff, batch_size, progress)
+        for name in ARCHIVED_COLLECTIONS
+    }
+
+async def find_archived(database, name: str, user_id: int, limit: int, before: Optional[datetime] = None, since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """A user's archived rows, newest first.
+
+    Only months between since (the user's creation) and before are queried,
+    so users newer than the archive horizon never touch it.
+    """
+    query: Dict[str, Any] = {"user_id": user_id}
+    if before is not None:
+        query["timestamp"] = {"$lt": before}
+
+    rows: List[Dict[str, Any]] = []
+    for month in await archive_catalog.months(database, name):
+        if before is not None and month > before:
+            continue
+        if since is not None and month < month_start(since):
+            break
+        remaining = limit - len(rows)
+        cursor = database[archive_collection_name(name, month)].find(query).sort("timestamp", -1).limit(remaining)
+        rows.extend(await cursor.to_list(length=remaining))
+        if len(rows) >= limit:
+            break
+    return rows
@@ -0,0 +1,126 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Callable, List
+
+class UserCache:
+    """Bounded in-process user document cache with TTL and LRU eviction"""
+
+    def __init__(self, max_size: int = 10000, ttl: float = 30.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        # user_id -> (expires_at, user document)
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        # The webapp thread writes through sync_db while the bot runs on asyncio
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Called with a user_id after every set or invalidate
+        self._write_listeners: List[Callable[[int], None]] = []
+        # Write clock: user_id -> tick of the user's last cache write, so a
+        # read that started earlier cannot store what it read over it
+        self._clock = 0
+        self._writes: "OrderedDict[int, int]" = OrderedDict()
+        # Newest tick forgotten from _writes; older reads of any user lose to it
+        self._writes_floor = 0
+        self.stale_sets = 0
+
+    def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached user, or None on a miss or expiry"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, user = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return dict(user)
+
+    def add_write_listener(self, listener: Callable[[int], None]):
+        """Register a callback run whenever a user is stored or dropped"""
+        self._write_listeners.append(listener)
+
+    def _notify(self, user_id: int):
+        for listener in self._write_listeners:
+            listener(user_id)
+
+    def generation(self) -> int:
+        """Write clock to pass to set() for a document read from now on"""
+        with self._lock:
+            return self._clock
+
+    def _record_write_locked(self, user_id: int):
+        self._clock += 1
+        self._writes[user_id] = self._clock
+        self._writes.move_to_end(user_id)
+        while len(self._writes) > max(self.max_size, 1):
+            _, tick = self._writes.popitem(last=False)
+            self._writes_floor = max(self._writes_floor, tick)
+
+    def set(self, user: Optional[Dict[str, Any]], generation: Optional[int] = None):
+        """Store a fresh copy of a user document.
+
+        generation is the write clock taken before the document was read; if
+        the user was stored or invalidated since, the document may be older
+        than that write, so the entry is dropped instead.
+        """
+        if not user:
+            return
+        self._notify(user["user_id"])
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            user_id = user["user_id"]
+            if generation is not None and self._writes.get(user_id, self._writes_floor) > generation:
+                self._entries.pop(user_id, None)
+                self.stale_sets += 1
+                return
+            self._record_write_locked(user_id)
+            self._entries[user_id] = (time.monotonic() + self.ttl, dict(user))
+            self._entries.move_to_end(user_id)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id: int):
+        """Drop a user after a write this process made outside settlement"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._record_write_locked(user_id)
+        self._notify(user_id)
+
+    def clear(self):
+        """Drop every cached user"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache counters for the admin panel"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "stale_sets": self.stale_sets,
+                "hit_rate": (self.hits / lookups * 100) if lookups else 0.0
+            }
+
+# Global user cache instance
+user_cache = UserCache(
+    max_size=int(os.getenv("USER_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "30"))
+)
@@ -0,0 +1,201 @@
+import os
+import atexit
+import threading
+import importlib.util
+from typing import Dict, List, Any
+import pymongo
+import motor.motor_asyncio
+from pymongo import monitoring
+from pymongo.read_preferences import SecondaryPreferred
+from dotenv import load_dotenv
+from src.utils.logger import db_logger
+from src.database.monitoring import command_stats
+
+load_dotenv()
+
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+DATABASE_NAME = os.getenv("DATABASE_NAME", "exowin_bot")
+
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "zstd,snappy,zlib")
+
+# Analytics may read a secondary at most this far behind; MongoDB requires >= 90
+ANALYTICS_MAX_STALENESS_SECONDS = max(90, int(os.getenv("ANALYTICS_MAX_STALENESS_SECONDS", "120")))
+
+# Wire compressors and the package each one needs; zlib ships with Python
+COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+
+def available_compressors(requested: str) -> List[str]:
+    """Keep the requested compressors whose library is installed, in order"""
+    compressors = []
+    for name in (part.strip() for part in requested.split(",")):
+        module = COMPRESSOR_MODULES.get(name)
+        if module and importlib.util.find_spec(module) is not None:
+            compressors.append(name)
+    return compressors
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Connection pool listener counting connections and checkouts"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open_connections = 0
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.connections_created = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.pool_clears = 0
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+            self.connections_created += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections -= 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+        db_logger.warning(f"Connection checkout from {event.address} failed: {event.reason}")
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get pool counters for the admin panel"""
+        with self._lock:
+            return {
+                "open_connections": self.open_connections,
+                "checked_out": self.checked_out,
+                "peak_checked_out": self.peak_checked_out,
+                "connections_created": self.connections_created,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "pool_clears": self.pool_clears,
+                "max_pool_size": MONGO_MAX_POOL_SIZE
+            }
+
+# Global pool listener shared by every client in the process
+pool_stats = PoolStats()
+
+def client_options() -> Dict[str, Any]:
+    """Pool, compression and monitoring options shared by motor and pymongo"""
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "event_listeners": [command_stats, pool_stats],
+        "appname": "exowin",
+        # Sockets are opened on first use, not at import
+        "connect": False
+    }
+    compressors = available_compressors(MONGO_COMPRESSORS)
+    if compressors:
+        options["compressors"] = compressors
+    return options
+
+def analytics_read_preference() -> SecondaryPreferred:
+    """Read preference for dashboards: a fresh-enough secondary, else the primary"""
+    return SecondaryPreferred(max_staleness=ANALYTICS_MAX_STALENESS_SECONDS)
+
+# (kind, pid) -> client; a forked worker gets its own pool instead of sharing sockets
+_clients: Dict[tuple, Any] = {}
+_clients_lock = threading.Lock()
+
+def _get_client(kind: str, factory):
+    key = (kind, os.getpid())
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = factory(MONGODB_URI, **client_options())
+            _clients[key] = client
+            db_logger.info(f"Created {kind} MongoDB client (maxPoolSize={MONGO_MAX_POOL_SIZE}, minPoolSize={MONGO_MIN_POOL_SIZE})")
+        return client
+
+def get_async_client() -> motor.motor_asyncio.AsyncIOMotorClient:
+    """The process-wide motor client, created on first call"""
+    return _get_client("motor", motor.motor_asyncio.AsyncIOMotorClient)
+
+def get_sync_client() -> pymongo.MongoClient:
+    """The process-wide pymongo client, created on first call"""
+    return _get_client("pymongo", pymongo.MongoClient)
+
+class LazyHandle:
+    """A client, database or collection resolved through a client factory on use.
+
+    Module-level handles built from this follow the factory, so a forked
+    worker or a client rebuilt after close_clients is picked up instead of
+    the one that existed at import.
+    """
+
+    def __init__(self, factory, path: tuple = (), options: Dict[str, Any] = None):
+        self._factory = factory
+        self._path = path
+        self._options = options or {}
+        self._resolved = (None, None)
+
+    def _resolve(self):
+        client = self._factory()
+        owner, handle = self._resolved
+        if owner is not client:
+            handle = client
+            for depth, name in enumerate(self._path):
+                handle = handle[name]
+                # Options are set on the database so every collection inherits them
+                if depth == 0 and self._options:
+                    handle = handle.with_options(**self._options)
+            self._resolved = (client, handle)
+        return handle
+
+    def __getitem__(self, name: str) -> "LazyHandle":
+        return LazyHandle(self._factory, self._path + (name,), self._options)
+
+    def __getattr__(self, name: str):
+        return getattr(self._resolve(), name)
+
+    def with_options(self, **options) -> "LazyHandle":
+        return LazyHandle(self._factory, self._path, {**self._options, **options})
+
+def close_clients(kind: str = None):
+    """Close this process's clients, or only the "motor" or "pymongo" one.
+
+    A later get_*_client call builds a fresh client.
+    """
+    with _clients_lock:
+        pid = os.getpid()
+        for key in [key for key in _clients if key[1] == pid and kind in (None, key[0])]:
+            _clients.pop(key).close()
+
+# Registered before any flush hook, so atexit runs it after them
+atexit.register(close_clients)
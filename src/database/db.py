@@ -1,122 +1,178 @@
 import os
-import motor.motor_asyncio
-from dotenv import load_dotenv
+from pymongo import ReturnDocument, UpdateOne
+from bson import ObjectId
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from src.utils.logger import db_logger
-from src.utils.error_handler import DatabaseError
-
-load_dotenv()
-
-MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
-DATABASE_NAME = os.getenv("DATABASE_NAME", "exowin_bot")
+from src.utils.error_handler import DatabaseError, InsufficientFundsError
+from src.database.schema import build_settlement_filter, build_settlement_update, build_user_upsert, resolve_user_upsert, build_daily_bonus_claim, build_referral_claim, build_referrer_credit, daily_bonus_amount, REFERRER_BONUS, REFERRED_BONUS
+from src.database.cache import user_cache
+from src.database.singleflight import SingleFlight
+from src.database.leaderboard import leaderboards
+from src.database.views import BalanceView, StatsView
+from src.database.pagination import build_keyset_query, encode_cursor
+from src.database.rollups import GRANULARITIES, bucket_start, build_backfill_pipeline
+from src.database.search import normalize_search_term, build_search_keys, build_prefix_query, rank_search_results, USER_SEARCH_TEXT_INDEX, SEARCH_CANDIDATE_FACTOR
+from src.database.indexes import apply_index_plan
+from src.database.timeseries import ensure_games_collection
+from src.database.archive import archive_catalog, archive_ledgers, find_archived
+from src.database.client import LazyHandle, get_async_client, close_clients, analytics_read_preference, MONGODB_URI, DATABASE_NAME
+from src.database.activity import LastActiveTracker, LAST_ACTIVE_FLUSH_INTERVAL
+from src.database.ledger import LedgerWriter, DURABLE_TRANSACTION_TYPES, LEDGER_BATCH_SIZE, LEDGER_FLUSH_INTERVAL, LEDGER_MAX_BUFFER
 
 if not MONGODB_URI or not DATABASE_NAME:
     raise ValueError("MONGODB_URI and DATABASE_NAME must be set in environment variables")
 
-client = motor.motor_asyncio.AsyncIOMotorClient(MONGODB_URI)
+# Resolved through get_async_client on use, so forked workers get their own pool
+client = LazyHandle(get_async_client)
 db = client[DATABASE_NAME]
 users_collection = db["users"]
 transactions_collection = db["transactions"]
 games_collection = db["games"]
+game_rollups_collection = db["game_rollups"]
+transaction_rollups_collection = db["transaction_rollups"]
+
+# Admin analytics read from secondaries so dashboards never queue behind
+# settlements on the primary; money-path reads keep using the handles above
+analytics_db = db.with_options(read_preference=analytics_read_preference())
+analytics_users_collection = analytics_db["users"]
+analytics_game_rollups_collection = analytics_db["game_rollups"]
+analytics_transaction_rollups_collection = analytics_db["transaction_rollups"]
+
+user_reads = SingleFlight()
+# Any write through the user cache detaches reads that started before it
+user_cache.add_write_listener(user_reads.forget_group)
+last_active_tracker = LastActiveTracker(interval=LAST_ACTIVE_FLUSH_INTERVAL)
+ledger_writer = LedgerWriter(
+    {"games": games_collection, "transactions": transactions_collection},
+    batch_size=LEDGER_BATCH_SIZE,
+    interval=LEDGER_FLUSH_INTERVAL,
+    max_buffer=LEDGER_MAX_BUFFER,
+    rollups={"games": game_rollups_collection, "transactions": transaction_rollups_collection}
+)
 
 # User operations
 async def get_user(user_id: int, user_data: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
     """Get user from database or create if not exists"""
+    # Plain reads are served from the cache; profile refreshes always go to Mongo
+    if not user_data:
+        cached_user = user_cache.get(user_id)
+        if cached_user:
+            last_active_tracker.touch(user_id)
+            return cached_user
+        
+        # Concurrent plain reads of one user share a single query; each
+        # caller still gets its own copy of the document
+        user = await user_reads.do((user_id, "user"), lambda: _load_user(user_id))
+        return dict(user) if user else user
+    
+    return await _load_user(user_id, user_data)
+
+async def _load_user(user_id: int, user_data: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Return a user, creating it or applying a profile refresh when needed"""
+    # Taken before the read, so a write landing meanwhile keeps this copy out of the cache
+    generation = user_cache.generation()
     try:
         db_logger.debug(f"Getting user {user_id}")
-        user = await users_collection.find_one({"user_id": user_id})
-        if not user:
-            user = {
-                "user_id": user_id,
-                "balance": 1.0,  # Starting balance of $1
-                "created_at": datetime.now(),
-                "last_active": datetime.now(),
-                "total_bets": 0,
-                "total_wins": 0,
-                "total_losses": 0,
-                "total_deposits": 0,
-                "total_withdrawals": 0,
-                "is_banned": False,
-                # New fields for bonuses and settings
-                "daily_bonus_streak": 0,
-                "last_daily_bonus": None,
-                "total_daily_bonuses": 0.0,
-                "total_referrals": 0,
-                "total_referral_bonuses": 0.0,
-                "total_event_bonuses": 0.0,
-                "referred_by": None,
-                # Settings
-                "notifications_enabled": True,
-                "sound_effects": True,
-                "theme": "dark",
-                "language": "en",
-                "auto_bet_enabled": False,
-                "quick_bet_enabled": False,
-                # User info fields
-                "username": None,
-                "first_name": None,
-                "last_name": None
-            }
-            
-            # Add user data if provided
-            if user_data:
-                user.update({
-                    "username": user_data.get('username'),
-                    "first_name": user_data.get('first_name'),
-                    "last_name": user_data.get('last_name')
-                })
-            
-            await users_collection.insert_one(user)
+        if not user_data:
+            # Plain reads of existing users stay reads; only a miss upserts
+            user = await users_collection.find_one({"user_id": user_id})
+            if user is not None:
+                last_active_tracker.touch(user_id)
+                user_cache.set(user, generation)
+                return user
+        
+        update = build_user_upsert(user_data)
+        before = await users_collection.find_one_and_update(
+            {"user_id": user_id},
+            update,
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+        user = resolve_user_upsert(user_id, before, update)
+        
+        if before is None:
             db_logger.info(f"Created new user {user_id}")
-        else:
-            # Update last active and user info if provided
-            update_data = {"last_active": datetime.now()}
-            if user_data:
-                update_data.update({
-                    "username": user_data.get('username'),
-                    "first_name": user_data.get('first_name'),
-                    "last_name": user_data.get('last_name')
-                })
-            
-            await users_collection.update_one(
-                {"user_id": user_id},
-                {"$set": update_data}
-            )
+            leaderboards.observe(user)
+        elif not user_data:
+            # Plain reads only record activity; it is written in bulk later
+            last_active_tracker.touch(user_id)
+        
+        user_cache.set(user, generation)
         return user
     except Exception as e:
         db_logger.error(f"Database error in get_user: {e}")
         raise DatabaseError(f"Failed to get user {user_id}: {e}")
 
-async def update_user_balance(user_id: int, amount: float):
-    """Update user balance"""
-    await users_collection.update_one(
-        {"user_id": user_id},
-        {"$inc": {"balance": amount}, "$set": {"last_active": datetime.now()}}
-    )
+async def _get_user_view(user_id: int, view_class, fresh: bool = False):
+    """Read only the fields of a view, preferring the user cache unless fresh"""
+    cached_user = None if fresh else user_cache.get(user_id)
+    if cached_user:
+        last_active_tracker.touch(user_id)
+        return view_class.from_document(cached_user)
     
-    # Update stats based on transaction type
-    if amount > 0:
-        await users_collection.update_one(
-            {"user_id": user_id},
-            {"$inc": {"total_wins": 1}}
-        )
-    elif amount < 0:
-        await users_collection.update_one(
-            {"user_id": user_id},
-            {"$inc": {"total_losses": 1}}
+    try:
+        document = await user_reads.do(
+            (user_id, view_class.__name__),
+            lambda: users_collection.find_one({"user_id": user_id}, view_class.projection())
         )
+    except Exception as e:
+        db_logger.error(f"Database error in get_user view: {e}")
+        raise DatabaseError(f"Failed to get user {user_id}: {e}")
     
-    await users_collection.update_one(
-        {"user_id": user_id},
-        {"$inc": {"total_bets": 1}}
-    )
+    if document is None:
+        # First contact still creates the user with defaults
+        return view_class.from_document(await get_user(user_id))
     
-    return await get_user(user_id)
+    last_active_tracker.touch(user_id)
+    return view_class.from_document(document)
+
+async def get_user_balance(user_id: int, fresh: bool = False) -> BalanceView:
+    """Get a user's balance and ban flag without decoding the full document.
+
+    The cached balance may lag other processes by USER_CACHE_TTL; it is fine
+    for display and bet pre-checks because settle_balance refuses overdrafts.
+    Pass fresh=True to read the primary for decisions that move money out.
+    """
+    return await _get_user_view(user_id, BalanceView, fresh)
 
-async def record_transaction(user_id: int, amount: float, transaction_type: str, game_id: str = None, description: str = None):
-    """Record a transaction"""
-    transaction = {
+async def get_user_stats(user_id: int) -> StatsView:
+    """Get a user's balance and game/payment counters"""
+    return await _get_user_view(user_id, StatsView)
+
+async def settle_balance(user_id: int, amount: float, inc: Optional[Dict[str, Any]] = None, set_fields: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Apply a balance delta and every counter change in one round trip.
+
+    Returns the user document after the update, or None if a credit found no
+    user. A debit the balance cannot cover changes nothing and raises
+    InsufficientFundsError, so concurrent bets can never overdraw.
+    """
+    generation = user_cache.generation()
+    try:
+        user = await users_collection.find_one_and_update(
+            build_settlement_filter(user_id, amount),
+            build_settlement_update(amount, inc, set_fields),
+            return_document=ReturnDocument.AFTER
+        )
+    except Exception as e:
+        db_logger.error(f"Database error in settle_balance: {e}")
+        raise DatabaseError(f"Failed to settle balance for user {user_id}: {e}")
+    if user is None:
+        if amount < 0:
+            user_cache.invalidate(user_id)
+            raise InsufficientFundsError(f"Insufficient balance for user {user_id}")
+        return None
+    user_cache.set(user, generation)
+    leaderboards.observe(user)
+    return user
+
+async def update_user_balance(user_id: int, amount: float):
+    """Update user balance"""
+    return await settle_balance(user_id, amount)
+
+def _transaction_row(user_id: int, amount: float, transaction_type: str, game_id: str = None, description: str = None) -> Dict[str, Any]:
+    return {
+        "_id": ObjectId(),
         "user_id": user_id,
         "amount": amount,
         "type": transaction_type,  # deposit, withdrawal, bet, win
@@ -124,7 +180,13 @@ async def record_transaction(user_id: int, amount: float, transaction_type: str,
         "description": description,
         "timestamp": datetime.now()
     }
-    await transactions_collection.insert_one(transaction)
+
+async def record_transaction(user_id: int, amount: float, transaction_type: str, game_id: str = None, description: str = None, durable: Optional[bool] = None):
+    """Record a transaction; money-moving types are written before returning"""
+    if durable is None:
+        durable = transaction_type in DURABLE_TRANSACTION_TYPES
+    transaction = _transaction_row(user_id, amount, transaction_type, game_id, description)
+    await ledger_writer.add("transactions", transaction, durable=durable)
     
     # Update user stats for deposits and withdrawals
     if transaction_type == "deposit":
@@ -138,11 +200,15 @@ async def record_transaction(user_id: int, amount: float, transaction_type: str,
             {"$inc": {"total_withdrawals": amount}}
         )
     
+    if transaction_type in ("deposit", "withdrawal"):
+        user_cache.invalidate(user_id)
+    
     return transaction
 
-async def record_game(user_id: int, game_type: str, bet_amount: float, outcome: str, winnings: float):
+async def record_game(user_id: int, game_type: str, bet_amount: float, outcome: str, winnings: float, durable: bool = False):
     """Record a game result"""
     game = {
+        "_id": ObjectId(),
         "user_id": user_id,
         "game_type": game_type,
         "bet_amount": bet_amount,
@@ -150,90 +216,97 @@ async def record_game(user_id: int, game_type: str, bet_amount: float, outcome:
         "winnings": winnings,
         "timestamp": datetime.now()
     }
-    result = await games_collection.insert_one(game)
-    return str(result.inserted_id)
+    await ledger_writer.add("games", game, durable=durable)
+    return str(game["_id"])
 
 async def can_withdraw(user_id: int):
     """Check if user can withdraw (balance >= $50)"""
-    user = await get_user(user_id)
+    # Withdrawals are gated on the primary, never on a cached balance
+    user = await get_user_balance(user_id, fresh=True)
     return user["balance"] >= 50.0
 
 async def claim_daily_bonus(user_id: int):
     """Claim daily bonus for user"""
+    # Same local clock as every other timestamp, including the bonuses menu
+    now = datetime.now()
+    query, pipeline = build_daily_bonus_claim(user_id, now)
+    try:
+        # The cooldown is part of the filter, so a double tap pays out once
+        user = await users_collection.find_one_and_update(query, pipeline, return_document=ReturnDocument.BEFORE)
+        if user is None:
+            if await users_collection.count_documents({"user_id": user_id}, limit=1):
+                return False, "Daily bonus already claimed today"
+            # First contact: create the user with defaults, then claim
+            await get_user(user_id)
+            return await claim_daily_bonus(user_id)
+    except Exception as e:
+        db_logger.error(f"Database error in claim_daily_bonus: {e}")
+        raise DatabaseError(f"Failed to claim daily bonus for user {user_id}: {e}")
+    user_cache.invalidate(user_id)
     
-    user = await get_user(user_id)
-    now = datetime.utcnow()
-    
-    # Check if user can claim daily bonus
-    last_bonus = user.get('last_daily_bonus')
-    if last_bonus and isinstance(last_bonus, datetime):
-        time_since_last = now - last_bonus
-        if time_since_last < timedelta(hours=24):
-            return False, "Daily bonus already claimed today"
-    
-    # Calculate bonus amount based on streak
-    streak = user.get('daily_bonus_streak', 0)
-    base_bonus = 0.50
-    streak_bonus = min(streak * 0.10, 2.0)  # Max $2 streak bonus
-    total_bonus = base_bonus + streak_bonus
-    
-    # Update user
-    new_streak = streak + 1 if last_bonus and (now - last_bonus) < timedelta(hours=48) else 1
-    
-    await users_collection.update_one(
-        {"user_id": user_id},
-        {
-            "$inc": {
-                "balance": total_bonus,
-                "total_daily_bonuses": total_bonus
-            },
-            "$set": {
-                "last_daily_bonus": now,
-                "daily_bonus_streak": new_streak
-            }
-        }
-    )
-    
-    # Record transaction
-    await record_transaction(user_id, total_bonus, "bonus", description="Daily bonus")
+    total_bonus = daily_bonus_amount(user.get("daily_bonus_streak"))
+    await ledger_writer.add("transactions", _transaction_row(user_id, total_bonus, "bonus", description="Daily bonus"))
     
     return True, total_bonus
 
 async def add_referral(referrer_id: int, referred_id: int):
     """Add referral relationship and give bonuses"""
-    # Check if referred user already has a referrer
-    referred_user = await get_user(referred_id)
-    if referred_user.get('referred_by'):
-        return False, "User already has a referrer"
+    if referrer_id == referred_id:
+        return False, "Users cannot refer themselves"
     
-    # Give bonus to referrer
-    referrer_bonus = 2.0
-    await users_collection.update_one(
-        {"user_id": referrer_id},
-        {
-            "$inc": {
-                "balance": referrer_bonus,
-                "total_referrals": 1,
-                "total_referral_bonuses": referrer_bonus
-            }
-        }
-    )
+    query, update = build_referral_claim(referrer_id, referred_id)
+    generation = user_cache.generation()
+    try:
+        # Setting referred_by only where it is still unset makes the bonus one-time;
+        # the same update leaves the referrer's credit pending until it is paid
+        referred_user = await users_collection.find_one_and_update(query, update, return_document=ReturnDocument.AFTER)
+        if referred_user is None:
+            if await users_collection.count_documents({"user_id": referred_id}, limit=1):
+                return False, "User already has a referrer"
+            await get_user(referred_id)
+            return await add_referral(referrer_id, referred_id)
+    except Exception as e:
+        db_logger.error(f"Database error in add_referral: {e}")
+        raise DatabaseError(f"Failed to add referral {referrer_id} -> {referred_id}: {e}")
     
-    # Give bonus to referred user
-    referred_bonus = 1.0
-    await users_collection.update_one(
-        {"user_id": referred_id},
-        {
-            "$inc": {"balance": referred_bonus},
-            "$set": {"referred_by": referrer_id}
-        }
-    )
+    user_cache.set(referred_user, generation)
+    leaderboards.observe(referred_user)
+    await ledger_writer.add("transactions", _transaction_row(referred_id, REFERRED_BONUS, "bonus", description="Welcome referral bonus"))
     
-    # Record transactions
-    await record_transaction(referrer_id, referrer_bonus, "bonus", description="Referral bonus")
-    await record_transaction(referred_id, referred_bonus, "bonus", description="Welcome referral bonus")
+    try:
+        await _credit_referrer(referrer_id, referred_id)
+    except Exception as e:
+        # The pending flag stays set, so retry_referrer_credits pays it later
+        db_logger.error(f"Referrer credit {referrer_id} -> {referred_id} left pending: {e}")
     
-    return True, (referrer_bonus, referred_bonus)
+    return True, (REFERRER_BONUS, REFERRED_BONUS)
+
+async def _credit_referrer(referrer_id: int, referred_id: int) -> bool:
+    """Pay a pending referrer credit once and clear it; safe to run again"""
+    query, update = build_referrer_credit(referrer_id, referred_id)
+    generation = user_cache.generation()
+    referrer = await users_collection.find_one_and_update(query, update, return_document=ReturnDocument.AFTER)
+    if referrer is not None:
+        user_cache.set(referrer, generation)
+        leaderboards.observe(referrer)
+        await ledger_writer.add("transactions", _transaction_row(referrer_id, REFERRER_BONUS, "bonus", description="Referral bonus"))
+    else:
+        # Already credited, or the referrer does not exist
+        user_cache.invalidate(referrer_id)
+    await users_collection.update_one({"user_id": referred_id}, {"$unset": {"referrer_credit_pending": ""}})
+    user_cache.invalidate(referred_id)
+    return referrer is not None
+
+async def retry_referrer_credits(limit: int = 1000) -> int:
+    """Pay referrer credits a failed add_referral left pending; returns how many were paid"""
+    pending = await users_collection.find(
+        {"referrer_credit_pending": True}, {"user_id": True, "referred_by": True}
+    ).to_list(length=limit)
+    credited = 0
+    for user in pending:
+        if await _credit_referrer(user["referred_by"], user["user_id"]):
+            credited += 1
+    return credited
 
 async def update_user_settings(user_id: int, settings: dict):
     """Update user settings"""
@@ -241,43 +314,106 @@ async def update_user_settings(user_id: int, settings: dict):
         {"user_id": user_id},
         {"$set": settings}
     )
+    user_cache.invalidate(user_id)
 
 # Admin functions
-async def get_all_users(limit: int = 50, skip: int = 0, sort_by: str = "created_at", sort_order: int = -1):
-    """Get all users with pagination and sorting"""
-    cursor = users_collection.find().sort(sort_by, sort_order).skip(skip).limit(limit)
-    users = await cursor.to_list(length=limit)
-    total_count = await users_collection.count_documents({})
-    return users, total_count
+async def get_all_users(limit: int = 50, cursor: Optional[str] = None, sort_by: str = "created_at", sort_order: int = -1, with_count: bool = True, projection: Optional[Dict[str, Any]] = None):
+    """Get a page of users after an optional cursor.
+
+    Returns (users, next_cursor, total_count). next_cursor is None on the last
+    page; total_count is the collection's estimated size, or None when
+    with_count is False.
+    """
+    query, sort = build_keyset_query(sort_by, sort_order, cursor)
+    if projection is not None:
+        # The cursor is built from the sort key of the last user on the page
+        projection = dict(projection, **{sort_by: 1})
+    users = await users_collection.find(query, projection).sort(sort).limit(limit).to_list(length=limit)
+    next_cursor = encode_cursor(users[-1], sort_by) if len(users) == limit else None
+    total_count = await count_users() if with_count else None
+    return users, next_cursor, total_count
+
+async def count_users(estimated: bool = True) -> int:
+    """Count users from collection metadata, or exactly with a full count"""
+    if estimated:
+        return await users_collection.estimated_document_count()
+    return await users_collection.count_documents({})
+
+async def iter_user_batches(batch_size: int = 1000, projection: Optional[Dict[str, Any]] = None):
+    """Walk every user in created_at order, one page at a time"""
+    cursor = None
+    while True:
+        users, cursor, _ = await get_all_users(limit=batch_size, cursor=cursor, with_count=False, projection=projection)
+        if users:
+            yield users
+        if cursor is None:
+            break
 
 async def search_users(search_term: str, limit: int = 20):
-    """Search users by user_id or username"""
+    """Search users by user_id, username or name prefix, best matches first"""
     try:
         # Try to search by user_id first
         user_id = int(search_term)
         user = await users_collection.find_one({"user_id": user_id})
         return [user] if user else []
     except ValueError:
-        # Search by username or other text fields
-        regex_pattern = {"$regex": search_term, "$options": "i"}
-        cursor = users_collection.find({
-            "$or": [
-                {"username": regex_pattern},
-                {"first_name": regex_pattern},
-                {"last_name": regex_pattern}
-            ]
-        }).limit(limit)
-        return await cursor.to_list(length=limit)
-
-async def get_user_transactions(user_id: int, limit: int = 20):
-    """Get user transaction history"""
-    cursor = transactions_collection.find({"user_id": user_id}).sort("timestamp", -1).limit(limit)
-    return await cursor.to_list(length=limit)
+        term = normalize_search_term(search_term)
+        if not term:
+            return []
 
-async def get_user_games(user_id: int, limit: int = 20):
-    """Get user game history"""
-    cursor = games_collection.find({"user_id": user_id}).sort("timestamp", -1).limit(limit)
-    return await cursor.to_list(length=limit)
+        candidates = await users_collection.find(build_prefix_query(term)).limit(limit * SEARCH_CANDIDATE_FACTOR).to_list(length=None)
+
+        # Word matches inside names the prefix keys cannot reach
+        if USER_SEARCH_TEXT_INDEX and len(candidates) < limit:
+            cursor = users_collection.find(
+                {"$text": {"$search": search_term}},
+                {"score": {"$meta": "textScore"}}
+            ).sort([("score", {"$meta": "textScore"})]).limit(limit)
+            candidates.extend(await cursor.to_list(length=limit))
+
+        return rank_search_results(term, candidates, limit)
+
+async def backfill_search_keys(batch_size: int = 1000) -> int:
+    """Add search_keys to users created before indexed search"""
+    updated = 0
+    while True:
+        users = await users_collection.find(
+            {"search_keys": {"$exists": False}},
+            {"user_id": 1, "username": 1, "first_name": 1, "last_name": 1}
+        ).limit(batch_size).to_list(length=batch_size)
+        if not users:
+            return updated
+
+        await users_collection.bulk_write([
+            UpdateOne({"_id": user["_id"]}, {"$set": {"search_keys": build_search_keys(user)}})
+            for user in users
+        ], ordered=False)
+        updated += len(users)
+
+async def _get_user_history(name: str, collection, user_id: int, limit: int, before: Optional[datetime]):
+    """Newest-first ledger rows for a user, continuing into the archives when the hot collection runs out"""
+    await flush_ledger()
+    query = {"user_id": user_id}
+    if before is not None:
+        query["timestamp"] = {"$lt": before}
+    rows = await collection.find(query).sort("timestamp", -1).limit(limit).to_list(length=limit)
+    if len(rows) >= limit:
+        return rows
+    
+    # Archives only hold months the user existed in
+    user = user_cache.get(user_id) or await users_collection.find_one({"user_id": user_id}, {"_id": 0, "created_at": 1})
+    since = user.get("created_at") if user else None
+    older_than = rows[-1]["timestamp"] if rows else before
+    rows.extend(await find_archived(db, name, user_id, limit - len(rows), before=older_than, since=since))
+    return rows
+
+async def get_user_transactions(user_id: int, limit: int = 20, before: Optional[datetime] = None):
+    """Get user transaction history, older than before when paging"""
+    return await _get_user_history("transactions", transactions_collection, user_id, limit, before)
+
+async def get_user_games(user_id: int, limit: int = 20, before: Optional[datetime] = None):
+    """Get user game history, older than before when paging"""
+    return await _get_user_history("games", games_collection, user_id, limit, before)
 
 async def ban_user(user_id: int, banned: bool = True):
     """Ban or unban a user"""
@@ -285,26 +421,37 @@ async def ban_user(user_id: int, banned: bool = True):
         {"user_id": user_id},
         {"$set": {"is_banned": banned}}
     )
+    user_cache.invalidate(user_id)
     return await get_user(user_id)
 
 async def get_top_users_by_balance(limit: int = 10):
     """Get top users by balance"""
+    if leaderboards.loaded and limit <= leaderboards.size:
+        return leaderboards.top("balance", limit)
     cursor = users_collection.find().sort("balance", -1).limit(limit)
     return await cursor.to_list(length=limit)
 
 async def get_top_users_by_bets(limit: int = 10):
     """Get top users by total bets"""
+    if leaderboards.loaded and limit <= leaderboards.size:
+        return leaderboards.top("total_bets", limit)
     cursor = users_collection.find().sort("total_bets", -1).limit(limit)
     return await cursor.to_list(length=limit)
 
+def get_user_rank(user_id: int) -> Dict[str, Optional[int]]:
+    """Get a user's leaderboard ranks from memory; None means outside the top"""
+    return leaderboards.get_rank(user_id)
+
 async def get_system_stats():
     """Get system statistics"""
-    total_users = await users_collection.count_documents({})
-    active_users = await users_collection.count_documents({"last_active": {"$gte": datetime.now() - timedelta(days=7)}})
-    banned_users = await users_collection.count_documents({"is_banned": True})
+    # Analytics read a secondary up to ANALYTICS_MAX_STALENESS_SECONDS behind,
+    # so flushing the write buffers first would not make them any fresher
+    total_users = await analytics_users_collection.count_documents({})
+    active_users = await analytics_users_collection.count_documents({"last_active": {"$gte": datetime.now() - timedelta(days=7)}})
+    banned_users = await analytics_users_collection.count_documents({"is_banned": True})
     
     # Aggregate balance statistics
-    balance_stats = await users_collection.aggregate([
+    balance_stats = await analytics_users_collection.aggregate([
         {
             "$group": {
                 "_id": None,
@@ -316,9 +463,11 @@ async def get_system_stats():
         }
     ]).to_list(length=1)
     
-    # Game statistics
-    total_games = await games_collection.count_documents({})
-    total_transactions = await transactions_collection.count_documents({})
+    # Ledger totals come from the all-time rollups, which still count archived rows
+    game_totals = await analytics_game_rollups_collection.find({"granularity": "all"}, {"total_games": 1}).to_list(length=None)
+    transaction_totals = await analytics_transaction_rollups_collection.find({"granularity": "all"}, {"count": 1}).to_list(length=None)
+    total_games = sum(rollup.get("total_games", 0) for rollup in game_totals)
+    total_transactions = sum(rollup.get("count", 0) for rollup in transaction_totals)
     
     return {
         "total_users": total_users,
@@ -330,108 +479,160 @@ async def get_system_stats():
     }
 
 async def get_game_statistics():
-    """Get game statistics"""
-    game_stats = await games_collection.aggregate([
+    """Get game statistics from the all-time game rollups"""
+    rollups = await analytics_game_rollups_collection.find({"granularity": "all"}).to_list(length=None)
+    
+    game_stats = [
         {
-            "$group": {
-                "_id": "$game_type",
-                "total_games": {"$sum": 1},
-                "total_bet_amount": {"$sum": "$bet_amount"},
-                "total_winnings": {"$sum": "$winnings"},
-                "avg_bet": {"$avg": "$bet_amount"},
-                "max_bet": {"$max": "$bet_amount"}
-            }
-        },
-        {"$sort": {"total_games": -1}}
-    ]).to_list(length=None)
+            "_id": rollup["game_type"],
+            "total_games": rollup["total_games"],
+            "total_bet_amount": rollup["total_bet_amount"],
+            "total_winnings": rollup["total_winnings"],
+            "avg_bet": rollup["total_bet_amount"] / rollup["total_games"] if rollup["total_games"] else 0,
+            "max_bet": rollup.get("max_bet", 0)
+        }
+        for rollup in rollups
+    ]
+    game_stats.sort(key=lambda stat: stat["total_games"], reverse=True)
     
     return game_stats
 
+def _rollup_sources():
+    return (
+        ("games", games_collection, game_rollups_collection),
+        ("transactions", transactions_collection, transaction_rollups_collection)
+    )
+
+async def _rebuild_ledger_rollups(name: str, source, rollups):
+    archives = await archive_catalog.collection_names(db, name)
+    for granularity in GRANULARITIES:
+        await source.aggregate(build_backfill_pipeline(name, granularity, rollups.name, union=archives)).to_list(length=None)
+    db_logger.info(f"Rebuilt {name} rollups")
+
+async def rebuild_rollups():
+    """Rebuild every rollup bucket from raw games and transactions.
+    
+    Archived months are read back with $unionWith so all-time totals do not
+    shrink. Buckets are replaced in place with $merge; run it while traffic is
+    quiet, since a settlement landing mid-rebuild can be overwritten until the
+    next run.
+    """
+    await flush_ledger()
+    archive_catalog.invalidate()
+    for name, source, rollups in _rollup_sources():
+        await _rebuild_ledger_rollups(name, source, rollups)
+
+async def rebuild_missing_rollups() -> List[str]:
+    """Rebuild the rollups of any ledger that has rows but no rollup buckets yet.
+
+    Stats read only the rollups, so a database upgraded from before they
+    existed would otherwise report zero totals. Returns the ledgers rebuilt.
+    """
+    rebuilt = []
+    for name, source, rollups in _rollup_sources():
+        if await rollups.find_one({}, {"_id": True}) is not None:
+            continue
+        if await source.find_one({}, {"_id": True}) is None and not await archive_catalog.collection_names(db, name):
+            continue
+        await flush_ledger()
+        await _rebuild_ledger_rollups(name, source, rollups)
+        rebuilt.append(name)
+    return rebuilt
+
+async def archive_old_ledgers(after_days: Optional[int] = None, progress=None):
+    """Move games and transactions past the archive horizon into monthly archives"""
+    await flush_ledger()
+    if after_days is None:
+        return await archive_ledgers(db, progress=progress)
+    return await archive_ledgers(db, after_days=after_days, progress=progress)
+
+async def flush_last_active():
+    """Write buffered last_active timestamps in one bulk_write"""
+    return await last_active_tracker.flush(users_collection)
+
+async def flush_ledger():
+    """Write buffered games and transactions"""
+    return await ledger_writer.flush()
+
+def start_background_tasks():
+    """Start periodic database maintenance on the running event loop"""
+    last_active_tracker.start(users_collection)
+    ledger_writer.start()
+    leaderboards.start(users_collection)
+
+async def shutdown_database():
+    """Flush buffered writes before the process exits"""
+    await leaderboards.stop()
+    await ledger_writer.stop()
+    await last_active_tracker.stop(users_collection)
+    close_clients("motor")
+
 async def setup_database():
     """Setup database indexes and initial configuration"""
     try:
-        # Create indexes for users collection
-        await users_collection.create_index("user_id", unique=True)
-        await users_collection.create_index("last_active")
-        await users_collection.create_index("is_banned")
-        await users_collection.create_index("balance")
-        await users_collection.create_index("total_bets")
-        await users_collection.create_index("created_at")
-        
-        # Create indexes for transactions collection
-        await transactions_collection.create_index("user_id")
-        await transactions_collection.create_index("timestamp")
-        await transactions_collection.create_index("type")
-        await transactions_collection.create_index([("user_id", 1), ("timestamp", -1)])
+        # Time-series collections must be created explicitly, before any insert
+        if await ensure_games_collection(db):
+            db_logger.info("Games are stored in a time-series collection")
         
-        # Create indexes for games collection
-        await games_collection.create_index("user_id")
-        await games_collection.create_index("game_type")
-        await games_collection.create_index("timestamp")
-        await games_collection.create_index([("user_id", 1), ("timestamp", -1)])
-        await games_collection.create_index([("game_type", 1), ("timestamp", -1)])
+        # Create any missing indexes from the declarative plan; pruning is
+        # left to index_advisor.py so startup never drops an index
+        await apply_index_plan(db)
         
         db_logger.info("Database indexes created successfully")
+        
+        backfilled = await backfill_search_keys()
+        if backfilled:
+            db_logger.info(f"Added search keys to {backfilled} existing users")
+        
+        credited = await retry_referrer_credits()
+        if credited:
+            db_logger.info(f"Paid {credited} pending referrer credits")
+        
+        rebuilt = await rebuild_missing_rollups()
+        if rebuilt:
+            db_logger.info(f"Built missing rollups for {', '.join(rebuilt)}")
         return True
     except Exception as e:
         db_logger.error(f"Failed to setup database: {e}")
         return False
 
 async def get_financial_stats():
-    """Get detailed financial statistics"""
+    """Get detailed financial statistics from the all-time transaction rollups"""
     try:
-        # Deposit statistics
-        deposit_pipeline = [
-            {"$match": {"type": "deposit"}},
-            {
-                "$group": {
-                    "_id": None,
-                    "total_deposits": {"$sum": "$amount"},
-                    "count_deposits": {"$sum": 1},
-                    "avg_deposit": {"$avg": "$amount"},
-                    "max_deposit": {"$max": "$amount"},
-                    "min_deposit": {"$min": "$amount"}
-                }
-            }
-        ]
+        # The rollups still count transactions that were moved into the archives
+        rollups = await analytics_transaction_rollups_collection.find(
+            {"granularity": "all", "type": {"$in": ["deposit", "withdrawal", "bonus"]}}
+        ).to_list(length=None)
+        totals = {rollup["type"]: rollup for rollup in rollups if rollup.get("count")}
         
-        # Withdrawal statistics
-        withdrawal_pipeline = [
-            {"$match": {"type": "withdrawal"}},
-            {
-                "$group": {
-                    "_id": None,
-                    "total_withdrawals": {"$sum": {"$abs": "$amount"}},
-                    "count_withdrawals": {"$sum": 1},
-                    "avg_withdrawal": {"$avg": {"$abs": "$amount"}},
-                    "max_withdrawal": {"$max": {"$abs": "$amount"}},
-                    "min_withdrawal": {"$min": {"$abs": "$amount"}}
-                }
+        stats = {"deposits": {}, "withdrawals": {}, "bonuses": {}}
+        if "deposit" in totals:
+            deposits = totals["deposit"]
+            stats["deposits"] = {
+                "total_deposits": deposits["total_amount"],
+                "count_deposits": deposits["count"],
+                "avg_deposit": deposits["total_amount"] / deposits["count"],
+                "max_deposit": deposits.get("max_amount", 0),
+                "min_deposit": deposits.get("min_amount", 0)
             }
-        ]
-        
-        # Bonus statistics
-        bonus_pipeline = [
-            {"$match": {"type": "bonus"}},
-            {
-                "$group": {
-                    "_id": None,
-                    "total_bonuses": {"$sum": "$amount"},
-                    "count_bonuses": {"$sum": 1},
-                    "avg_bonus": {"$avg": "$amount"}
-                }
+        if "withdrawal" in totals:
+            withdrawals = totals["withdrawal"]
+            total = abs(withdrawals["total_amount"])
+            stats["withdrawals"] = {
+                "total_withdrawals": total,
+                "count_withdrawals": withdrawals["count"],
+                "avg_withdrawal": total / withdrawals["count"],
+                "max_withdrawal": withdrawals.get("max_amount", 0),
+                "min_withdrawal": withdrawals.get("min_amount", 0)
             }
-        ]
-        
-        deposit_stats = await transactions_collection.aggregate(deposit_pipeline).to_list(length=1)
-        withdrawal_stats = await transactions_collection.aggregate(withdrawal_pipeline).to_list(length=1)
-        bonus_stats = await transactions_collection.aggregate(bonus_pipeline).to_list(length=1)
-        
-        return {
-            "deposits": deposit_stats[0] if deposit_stats else {},
-            "withdrawals": withdrawal_stats[0] if withdrawal_stats else {},
-            "bonuses": bonus_stats[0] if bonus_stats else {}
-        }
+        if "bonus" in totals:
+            bonuses = totals["bonus"]
+            stats["bonuses"] = {
+                "total_bonuses": bonuses["total_amount"],
+                "count_bonuses": bonuses["count"],
+                "avg_bonus": bonuses["total_amount"] / bonuses["count"]
+            }
+        return stats
     except Exception as e:
         db_logger.error(f"Error getting financial stats: {e}")
         return {"deposits": {}, "withdrawals": {}, "bonuses": {}}
@@ -457,45 +658,45 @@ async def get_daily_stats(days: int = 7):
             {"$sort": {"_id": 1}}
         ]
         
-        # Daily game activity
+        # Daily game activity, summed across game types from the day rollups
         game_pipeline = [
-            {"$match": {"timestamp": {"$gte": start_date}}},
+            {"$match": {"granularity": "day", "bucket": {"$gte": bucket_start(start_date, "day")}}},
             {
                 "$group": {
                     "_id": {
-                        "year": {"$year": "$timestamp"},
-                        "month": {"$month": "$timestamp"},
-                        "day": {"$dayOfMonth": "$timestamp"}
+                        "year": {"$year": "$bucket"},
+                        "month": {"$month": "$bucket"},
+                        "day": {"$dayOfMonth": "$bucket"}
                     },
-                    "games_played": {"$sum": 1},
-                    "total_bets": {"$sum": "$bet_amount"},
-                    "total_winnings": {"$sum": "$winnings"}
+                    "games_played": {"$sum": "$total_games"},
+                    "total_bets": {"$sum": "$total_bet_amount"},
+                    "total_winnings": {"$sum": "$total_winnings"}
                 }
             },
             {"$sort": {"_id": 1}}
         ]
         
-        # Daily transactions
+        # Daily transactions per type from the day rollups
         transaction_pipeline = [
-            {"$match": {"timestamp": {"$gte": start_date}}},
+            {"$match": {"granularity": "day", "bucket": {"$gte": bucket_start(start_date, "day")}}},
             {
-                "$group": {
+                "$project": {
                     "_id": {
-                        "year": {"$year": "$timestamp"},
-                        "month": {"$month": "$timestamp"},
-                        "day": {"$dayOfMonth": "$timestamp"},
+                        "year": {"$year": "$bucket"},
+                        "month": {"$month": "$bucket"},
+                        "day": {"$dayOfMonth": "$bucket"},
                         "type": "$type"
                     },
-                    "count": {"$sum": 1},
-                    "total_amount": {"$sum": "$amount"}
+                    "count": 1,
+                    "total_amount": 1
                 }
             },
             {"$sort": {"_id": 1}}
         ]
         
-        user_stats = await users_collection.aggregate(user_pipeline).to_list(length=None)
-        game_stats = await games_collection.aggregate(game_pipeline).to_list(length=None)
-        transaction_stats = await transactions_collection.aggregate(transaction_pipeline).to_list(length=None)
+        user_stats = await analytics_users_collection.aggregate(user_pipeline).to_list(length=None)
+        game_stats = await analytics_game_rollups_collection.aggregate(game_pipeline).to_list(length=None)
+        transaction_stats = await analytics_transaction_rollups_collection.aggregate(transaction_pipeline).to_list(length=None)
         
         return {
             "user_registrations": user_stats,
@@ -511,34 +712,29 @@ async def get_user_activity_stats():
     try:
         now = datetime.now()
         
-        # Active users in different time periods
-        active_1h = await users_collection.count_documents({"last_active": {"$gte": now - timedelta(hours=1)}})
-        active_24h = await users_collection.count_documents({"last_active": {"$gte": now - timedelta(hours=24)}})
-        active_7d = await users_collection.count_documents({"last_active": {"$gte": now - timedelta(days=7)}})
-        active_30d = await users_collection.count_documents({"last_active": {"$gte": now - timedelta(days=30)}})
-        
-        # User engagement statistics
-        engagement_pipeline = [
-            {
-                "$group": {
-                    "_id": None,
-                    "avg_games_per_user": {"$avg": "$total_bets"},
-                    "avg_balance": {"$avg": "$balance"},
-                    "total_users_with_deposits": {"$sum": {"$cond": [{"$gt": ["$total_deposits", 0]}, 1, 0]}},
-                    "total_users_with_withdrawals": {"$sum": {"$cond": [{"$gt": ["$total_withdrawals", 0]}, 1, 0]}}
-                }
-            }
-        ]
+        # Activity windows and engagement in a single pass over users
+        windows = {
+            "active_1h": now - timedelta(hours=1),
+            "active_24h": now - timedelta(hours=24),
+            "active_7d": now - timedelta(days=7),
+            "active_30d": now - timedelta(days=30)
+        }
+        group = {
+            "_id": None,
+            "avg_games_per_user": {"$avg": "$total_bets"},
+            "avg_balance": {"$avg": "$balance"},
+            "total_users_with_deposits": {"$sum": {"$cond": [{"$gt": ["$total_deposits", 0]}, 1, 0]}},
+            "total_users_with_withdrawals": {"$sum": {"$cond": [{"$gt": ["$total_withdrawals", 0]}, 1, 0]}}
+        }
+        for window, since in windows.items():
+            group[window] = {"$sum": {"$cond": [{"$gte": ["$last_active", since]}, 1, 0]}}
         
-        engagement_stats = await users_collection.aggregate(engagement_pipeline).to_list(length=1)
+        result = await analytics_users_collection.aggregate([{"$group": group}]).to_list(length=1)
+        engagement = result[0] if result else {}
         
-        return {
-            "active_1h": active_1h,
-            "active_24h": active_24h,
-            "active_7d": active_7d,
-            "active_30d": active_30d,
-            "engagement": engagement_stats[0] if engagement_stats else {}
-        }
+        stats = {window: engagement.pop(window, 0) for window in windows}
+        stats["engagement"] = engagement
+        return stats
     except Exception as e:
         db_logger.error(f"Error getting user activity stats: {e}")
         return {"active_1h": 0, "active_24h": 0, "active_7d": 0, "active_30d": 0, "engagement": {}}
@@ -0,0 +1,205 @@
+from typing import Dict, List, Any, Optional
+from src.utils.logger import db_logger
+from src.database.search import USER_SEARCH_TEXT_INDEX
+
+# Filter and sort shapes issued by src/database/db.py. Every planned index
+# must serve at least one of these; the advisor flags the rest.
+QUERY_SHAPES = [
+    {"collection": "users", "query": "get_user / settle_balance", "equality": ["user_id"]},
+    {"collection": "users", "query": "get_all_users", "sort": [("created_at", -1), ("_id", -1)]},
+    {"collection": "users", "query": "get_daily_stats registrations", "range": "created_at"},
+    {"collection": "users", "query": "search_users", "range": "search_keys"},
+    {"collection": "users", "query": "get_system_stats active users", "range": "last_active"},
+    {"collection": "users", "query": "get_system_stats banned users", "equality": ["is_banned"]},
+    {"collection": "users", "query": "retry_referrer_credits", "equality": ["referrer_credit_pending"]},
+    {"collection": "users", "query": "leaderboard reconcile (balance)", "sort": [("balance", -1)]},
+    {"collection": "users", "query": "leaderboard reconcile (total_bets)", "sort": [("total_bets", -1)]},
+    {"collection": "transactions", "query": "get_user_transactions", "equality": ["user_id"], "sort": [("timestamp", -1)]},
+    {"collection": "transactions", "query": "rollup backfill by time", "range": "timestamp"},
+    {"collection": "games", "query": "get_user_games", "equality": ["user_id"], "sort": [("timestamp", -1)]},
+    {"collection": "games", "query": "per-game history", "equality": ["game_type"], "sort": [("timestamp", -1)]},
+    {"collection": "games", "query": "rollup backfill by time", "range": "timestamp"},
+    {"collection": "game_rollups", "query": "rollup upsert", "equality": ["granularity", "bucket", "game_type"]},
+    {"collection": "transaction_rollups", "query": "rollup upsert", "equality": ["granularity", "bucket", "type"]}
+]
+
+def index_name(keys: List[tuple]) -> str:
+    """Default Mongo name for a key pattern, e.g. user_id_1_timestamp_-1"""
+    return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+def _index(keys: List[tuple], **options) -> Dict[str, Any]:
+    options.setdefault("name", index_name(keys))
+    return {"keys": keys, "options": options}
+
+def build_index_plan() -> Dict[str, List[Dict[str, Any]]]:
+    """The indexes each collection should have, and nothing else.
+
+    Single-field user_id and game_type indexes on the ledger collections are
+    left out because the (field, timestamp) compounds serve them as a prefix,
+    and is_banned and referrer_credit_pending only index the users they flag.
+    """
+    users = [
+        _index([("user_id", 1)], unique=True),
+        _index([("last_active", 1)]),
+        _index([("is_banned", 1)], name="banned_users", partialFilterExpression={"is_banned": True}),
+        _index([("referrer_credit_pending", 1)], name="pending_referrer_credits", partialFilterExpression={"referrer_credit_pending": True}),
+        _index([("balance", 1)]),
+        _index([("total_bets", 1)]),
+        _index([("created_at", -1), ("_id", -1)]),
+        _index([("search_keys", 1)])
+    ]
+    if USER_SEARCH_TEXT_INDEX:
+        users.append(_index(
+            [("username", "text"), ("first_name", "text"), ("last_name", "text")],
+            name="user_text_search",
+            weights={"username": 3, "first_name": 1, "last_name": 1},
+            default_language="none"
+        ))
+
+    return {
+        "users": users,
+        "transactions": [
+            _index([("user_id", 1), ("timestamp", -1)]),
+            _index([("timestamp", 1)])
+        ],
+        "games": [
+            _index([("user_id", 1), ("timestamp", -1)]),
+            _index([("game_type", 1), ("timestamp", -1)]),
+            _index([("timestamp", 1)])
+        ],
+        # Rollup buckets are upserted and $merge'd on these keys
+        "game_rollups": [
+            _index([("granularity", 1), ("bucket", 1), ("game_type", 1)], unique=True)
+        ],
+        "transaction_rollups": [
+            _index([("granularity", 1), ("bucket", 1), ("type", 1)], unique=True)
+        ]
+    }
+
+def _key_list(index: Dict[str, Any]) -> List[tuple]:
+    return list(index["key"].items())
+
+def _is_plain(index: Dict[str, Any]) -> bool:
+    """Whether an index only orders keys, so a longer one can stand in for it"""
+    special = ("unique", "partialFilterExpression", "sparse", "expireAfterSeconds", "weights")
+    return index["name"] != "_id_" and not any(index.get(option) for option in special)
+
+def find_redundant_indexes(indexes: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """Indexes whose key pattern is a strict prefix of another index"""
+    redundant = []
+    for index in indexes:
+        if not _is_plain(index):
+            continue
+        keys = _key_list(index)
+        for other in indexes:
+            other_keys = _key_list(other)
+            if len(other_keys) > len(keys) and other_keys[:len(keys)] == keys:
+                redundant.append({"name": index["name"], "covered_by": other["name"]})
+                break
+    return redundant
+
+def find_unused_indexes(index_stats: List[Dict[str, Any]]) -> List[str]:
+    """Indexes $indexStats has not seen used since the server started"""
+    return [
+        stat["name"] for stat in index_stats
+        if stat["name"] != "_id_" and stat.get("accesses", {}).get("ops", 0) == 0
+    ]
+
+def index_serves_shape(keys: List[tuple], shape: Dict[str, Any]) -> bool:
+    """Whether an index key pattern can answer a query shape without a scan"""
+    fields = [field for field, _ in keys]
+    equality = shape.get("equality", [])
+    if sorted(fields[:len(equality)]) != sorted(equality):
+        return False
+
+    rest = keys[len(equality):]
+    if "range" in shape:
+        return bool(rest) and rest[0][0] == shape["range"]
+    if "sort" in shape:
+        sort = shape["sort"]
+        if len(rest) < len(sort):
+            return False
+        same = all(rest[i] == sort[i] for i in range(len(sort)))
+        # An index can be walked backwards, so a fully reversed order also works
+        reversed_order = all(rest[i][0] == sort[i][0] and rest[i][1] == -sort[i][1] for i in range(len(sort)))
+        return same or reversed_order
+    return True
+
+def find_unserved_indexes(plan: Dict[str, List[Dict[str, Any]]], shapes: List[Dict[str, Any]] = None) -> List[str]:
+    """Planned indexes that no recorded query shape needs"""
+    shapes = shapes if shapes is not None else QUERY_SHAPES
+    unserved = []
+    for collection, indexes in plan.items():
+        collection_shapes = [shape for shape in shapes if shape["collection"] == collection]
+        for index in indexes:
+            if any(direction == "text" for _, direction in index["keys"]):
+                continue
+            if not any(index_serves_shape(index["keys"], shape) for shape in collection_shapes):
+                unserved.append(f"{collection}.{index['options']['name']}")
+    return unserved
+
+async def analyze_indexes(database, plan: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> Dict[str, Any]:
+    """Compare live indexes with usage stats and the index plan"""
+    plan = plan or build_index_plan()
+    report = {}
+    for collection_name, planned in plan.items():
+        collection = database[collection_name]
+        indexes = await collection.list_indexes().to_list(length=None)
+        try:
+            index_stats = await collection.aggregate([{"$indexStats": {}}]).to_list(length=None)
+        except Exception as e:
+            db_logger.warning(f"$indexStats unavailable for {collection_name}: {e}")
+            index_stats = []
+
+        planned_names = {index["options"]["name"] for index in planned}
+        existing_names = {index["name"] for index in indexes}
+        report[collection_name] = {
+            "indexes": sorted(existing_names),
+            "usage": {stat["name"]: stat.get("accesses", {}).get("ops", 0) for stat in index_stats},
+            "unused": find_unused_indexes(index_stats),
+            "redundant": find_redundant_indexes(indexes),
+            "to_drop": sorted(existing_names - planned_names - {"_id_"}),
+            "to_create": sorted(planned_names - existing_names)
+        }
+    return report
+
+async def apply_index_plan(database, plan: Optional[Dict[str, List[Dict[str, Any]]]] = None, drop: bool = False, dry_run: bool = False) -> List[str]:
+    """Create missing planned indexes and, with drop, remove unplanned ones.
+
+    Drops run first so a replacement with the same key pattern but different
+    options can be built. Without drop, an unplanned index is still dropped
+    when a planned one with its exact key pattern replaces it, since servers
+    before MongoDB 5.0 refuse a second index on the same keys. Returns the
+    actions taken, or that would be taken on a dry run.
+    """
+    plan = plan or build_index_plan()
+    actions = []
+    for collection_name, planned in plan.items():
+        collection = database[collection_name]
+        live = {index["name"]: _key_list(index) for index in await collection.list_indexes().to_list(length=None)}
+        existing = set(live)
+        planned_names = {index["options"]["name"] for index in planned}
+
+        if drop:
+            for name in sorted(existing - planned_names - {"_id_"}):
+                actions.append(f"drop {collection_name}.{name}")
+                if not dry_run:
+                    await collection.drop_index(name)
+            existing &= planned_names | {"_id_"}
+
+        for index in planned:
+            if index["options"]["name"] in existing:
+                continue
+            for name in sorted(existing - planned_names - {"_id_"}):
+                if live[name] == list(index["keys"]):
+                    actions.append(f"drop {collection_name}.{name} (replaced by {index['options']['name']})")
+                    existing.discard(name)
+                    if not dry_run:
+                        await collection.drop_index(name)
+            actions.append(f"create {collection_name}.{index['options']['name']}")
+            if not dry_run:
+                await collection.create_index(index["keys"], **index["options"])
+
+    for action in actions:
+        db_logger.info(f"Index plan: {action}{' (dry run)' if dry_run else ''}")
+    return actions
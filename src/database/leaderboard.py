@@ -0,0 +1,146 @@
+import os
+import asyncio
+import threading
+from bisect import bisect_left, insort
+from typing import Dict, List, Any, Optional, Tuple
+from src.utils.logger import db_logger
+
+# Metrics with a leaderboard, keyed by the user field they rank on
+LEADERBOARD_METRICS = ("balance", "total_bets")
+
+class Leaderboard:
+    """Bounded top-K ranking for one user field.
+
+    Keeps the invariant that every tracked user's value is at least floor and
+    every untracked user's value is at most floor, so ranks inside the board
+    are exact without knowing anything about the users outside it.
+    """
+
+    def __init__(self, metric: str, size: int = 1000):
+        self.metric = metric
+        self.size = size
+        # Sorted (-value, user_id) so rank 1 is first and ties break by user_id
+        self._entries: List[Tuple[float, int]] = []
+        self._values: Dict[int, float] = {}
+        # Upper bound on the value of any user not on the board
+        self.floor = float("-inf")
+        self.loaded = False
+
+    def _remove(self, user_id: int):
+        value = self._values.pop(user_id)
+        index = bisect_left(self._entries, (-value, user_id))
+        del self._entries[index]
+
+    def update(self, user_id: int, value: float):
+        """Apply a user's new value"""
+        if user_id in self._values:
+            self._remove(user_id)
+        # Someone off the board may now be ahead of this user
+        if value < self.floor:
+            return
+
+        self._values[user_id] = value
+        insort(self._entries, (-value, user_id))
+        while len(self._entries) > self.size:
+            evicted_value, evicted_id = self._entries.pop()
+            del self._values[evicted_id]
+            self.floor = max(self.floor, -evicted_value)
+
+    def load(self, users: List[Dict[str, Any]]):
+        """Replace the board with the top users as read from Mongo"""
+        self._entries = []
+        self._values = {}
+        self.floor = float("-inf")
+        for user in users:
+            value = user.get(self.metric) or 0
+            self._values[user["user_id"]] = value
+            self._entries.append((-value, user["user_id"]))
+        self._entries.sort()
+        # A full page means more users may sit at or below the last one
+        if len(self._entries) >= self.size:
+            self._entries = self._entries[:self.size]
+            self._values = {user_id: -value for value, user_id in self._entries}
+            self.floor = -self._entries[-1][0]
+        self.loaded = True
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """1-based rank of a user, or None if they are outside the top"""
+        value = self._values.get(user_id)
+        if value is None:
+            return None
+        return bisect_left(self._entries, (-value, user_id)) + 1
+
+    def top(self, limit: int) -> List[Dict[str, Any]]:
+        """Top users as {"user_id", metric} dicts"""
+        return [{"user_id": user_id, self.metric: -value} for value, user_id in self._entries[:limit]]
+
+class LeaderboardService:
+    """In-memory leaderboards fed by settlements and reconciled from Mongo"""
+
+    def __init__(self, size: int = 1000, interval: float = 300.0):
+        self.size = size
+        self.interval = interval
+        self.boards = {metric: Leaderboard(metric, size) for metric in LEADERBOARD_METRICS}
+        # Settlements arrive from the bot loop and the webapp thread
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def loaded(self) -> bool:
+        """Whether every board has been reconciled at least once"""
+        return all(board.loaded for board in self.boards.values())
+
+    def observe(self, user: Optional[Dict[str, Any]]):
+        """Feed a freshly written user document into every board"""
+        if not user or "user_id" not in user:
+            return
+        with self._lock:
+            for metric, board in self.boards.items():
+                if metric in user:
+                    board.update(user["user_id"], user[metric] or 0)
+
+    def get_rank(self, user_id: int) -> Dict[str, Optional[int]]:
+        """Rank of a user on every board, without touching Mongo"""
+        with self._lock:
+            return {metric: board.rank(user_id) for metric, board in self.boards.items()}
+
+    def top(self, metric: str, limit: int) -> List[Dict[str, Any]]:
+        """Top users on one board"""
+        with self._lock:
+            return self.boards[metric].top(limit)
+
+    async def reconcile(self, collection):
+        """Reload every board from Mongo to fix drift from writes we never saw"""
+        for metric, board in self.boards.items():
+            users = await collection.find({}, {"_id": 0, "user_id": 1, metric: 1}).sort(metric, -1).limit(self.size).to_list(length=self.size)
+            with self._lock:
+                board.load(users)
+
+    async def _run(self, collection):
+        while True:
+            try:
+                await self.reconcile(collection)
+            except Exception as e:
+                db_logger.error(f"Failed to reconcile leaderboards: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self, collection):
+        """Load the boards now and reconcile them periodically on the running loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(collection))
+
+    async def stop(self):
+        """Stop periodic reconciliation"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+# Global leaderboard instance
+leaderboards = LeaderboardService(
+    size=int(os.getenv("LEADERBOARD_SIZE", "1000")),
+    interval=float(os.getenv("LEADERBOARD_RECONCILE_INTERVAL", "300"))
+)
@@ -0,0 +1,338 @@
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from typing import Dict, List, Any, Optional
+from bson import encode
+from pymongo.errors import BulkWriteError
+from src.utils.logger import db_logger
+from src.utils.error_handler import DatabaseError
+from src.database.rollups import build_rollup_operations
+
+# Money-moving transaction types that are written before the caller continues
+DURABLE_TRANSACTION_TYPES = {"deposit", "withdrawal", "crypto_deposit", "admin_add"}
+
+DUPLICATE_KEY_ERROR = 11000
+MAX_DOCUMENT_SIZE = 16 * 1024 * 1024
+
+class LedgerWriter:
+    """Write-behind buffer for games and transactions ledger rows.
+
+    Rows are appended in memory and written with ordered insert_many once a
+    buffer reaches batch_size or every interval seconds. Callers that need the
+    row persisted before they continue pass durable=True; if it cannot be
+    written they get DatabaseError and the row is dropped, never retried
+    behind their back. When max_buffer rows are pending, writers wait for a
+    flush instead of growing the buffer, and get DatabaseError if that flush
+    could not make room. Rows no retry can ever store (unencodable, rejected
+    by validation) are moved to dead_letters and logged instead of blocking
+    the rows behind them. Time-series collections do not enforce a unique
+    _id, so rows going back in after a failed insert are looked up before
+    they are inserted again. Every written batch is also folded into the
+    matching rollup collection.
+    """
+
+    def __init__(self, collections: Dict[str, Any], batch_size: int = 100, interval: float = 1.0, max_buffer: int = 5000, rollups: Optional[Dict[str, Any]] = None, dead_letters_kept: int = 1000):
+        self.collections = collections
+        self.rollups = rollups or {}
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_buffer = max_buffer
+        self._buffers: Dict[str, List[Dict[str, Any]]] = {name: [] for name in collections}
+        self.dead_letters: deque = deque(maxlen=dead_letters_kept)
+        # _ids of restored rows a failed insert may have stored anyway
+        self._retrying: Dict[str, set] = {name: set() for name in collections}
+        self._lock = threading.Lock()
+        # Serialises flushes so a durable write never returns before its row is stored
+        self._sync_flush_lock = threading.Lock()
+        self._async_flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self.rows_written = 0
+        self.batches_written = 0
+        self.backpressure_waits = 0
+
+    def pending(self) -> int:
+        """Number of rows not yet written"""
+        with self._lock:
+            return sum(len(rows) for rows in self._buffers.values())
+
+    def _append(self, name: str, row: Dict[str, Any]) -> bool:
+        """Buffer a row and report whether its batch is full"""
+        with self._lock:
+            self._buffers[name].append(row)
+            return len(self._buffers[name]) >= self.batch_size
+
+    def _drain(self) -> Dict[str, List[Dict[str, Any]]]:
+        with self._lock:
+            batches = {name: rows for name, rows in self._buffers.items() if rows}
+            self._buffers = {name: [] for name in self.collections}
+        return batches
+
+    def _restore(self, name: str, rows: List[Dict[str, Any]]):
+        """Put unwritten rows back at the front of their buffer"""
+        with self._lock:
+            self._buffers[name] = rows + self._buffers[name]
+            self._retrying[name].update(row["_id"] for row in rows if "_id" in row)
+
+    def _take_retrying(self, name: str, rows: List[Dict[str, Any]]) -> List[Any]:
+        """_ids in a batch that an earlier failed insert may have stored"""
+        with self._lock:
+            retrying = self._retrying[name]
+            ids = [row["_id"] for row in rows if row.get("_id") in retrying]
+            retrying.difference_update(ids)
+        return ids
+
+    @staticmethod
+    def _split_stored(rows: List[Dict[str, Any]], existing: set):
+        """Split a batch into (rows already in the collection, rows to insert)"""
+        return [row for row in rows if row.get("_id") in existing], [row for row in rows if row.get("_id") not in existing]
+
+    def _take_back(self, name: str, rows: List[Dict[str, Any]]) -> bool:
+        """Remove rows that are still buffered or dead-lettered; True if any were"""
+        ids = {id(row) for row in rows}
+        with self._lock:
+            kept = [row for row in self._buffers[name] if id(row) not in ids]
+            found = len(kept) != len(self._buffers[name])
+            self._buffers[name] = kept
+            self._retrying[name].difference_update(row["_id"] for row in rows if "_id" in row)
+            dead = [entry for entry in self.dead_letters if id(entry["row"]) not in ids]
+            if len(dead) != len(self.dead_letters):
+                found = True
+                self.dead_letters.clear()
+                self.dead_letters.extend(dead)
+        return found
+
+    @staticmethod
+    def _is_writable(row: Dict[str, Any]) -> bool:
+        """Whether pymongo can encode the row into an insert at all"""
+        try:
+            return len(encode(row)) <= MAX_DOCUMENT_SIZE
+        except Exception:
+            return False
+
+    @classmethod
+    def _split_failed_insert(cls, rows: List[Dict[str, Any]], error: Exception):
+        """Split a failed ordered insert into (rows it stored, rows still to write, rows never writable)"""
+        if not isinstance(error, BulkWriteError):
+            # The error names no row; only rows that fail to encode are beyond retrying
+            remaining = [row for row in rows if cls._is_writable(row)]
+            if len(remaining) == len(rows):
+                return [], rows, []
+            writable = {id(row) for row in remaining}
+            return [], remaining, [row for row in rows if id(row) not in writable]
+
+        inserted = error.details.get("nInserted", 0)
+        write_errors = error.details.get("writeErrors", [])
+        if not write_errors:
+            return rows[:inserted], rows[inserted:], []
+        # An ordered insert stops at its first error
+        first = write_errors[0]
+        stop = first.get("index", inserted)
+        if first.get("code") == DUPLICATE_KEY_ERROR:
+            # An earlier, partly failed flush already stored (and rolled up) this row
+            return rows[:stop], rows[stop + 1:], []
+        # Any other write error (e.g. validation) rejects this row on every retry
+        return rows[:stop], rows[stop + 1:], rows[stop:stop + 1]
+
+    async def _write_rollups(self, name: str, rows: List[Dict[str, Any]]):
+        if name not in self.rollups or not rows:
+            return
+        try:
+            await self.rollups[name].bulk_write(build_rollup_operations(name, rows), ordered=False)
+        except Exception as e:
+            # Rollups can be rebuilt from the ledger, so never fail the write for them
+            db_logger.error(f"Failed to update {name} rollups for {len(rows)} rows: {e}")
+
+    def _write_rollups_sync(self, name: str, rows: List[Dict[str, Any]]):
+        if name not in self.rollups or not rows:
+            return
+        try:
+            self.rollups[name].bulk_write(build_rollup_operations(name, rows), ordered=False)
+        except Exception as e:
+            db_logger.error(f"Failed to update {name} rollups for {len(rows)} rows: {e}")
+
+    def _settle_batch(self, name: str, rows: List[Dict[str, Any]], error: Optional[Exception], failures: List[str]) -> List[Dict[str, Any]]:
+        """Account for one insert attempt; returns the rows it stored.
+
+        Rows it did not store go back into the buffer and the failure is
+        noted, so every drained batch is still attempted in the same flush.
+        Rows that can never be stored go to dead_letters instead.
+        """
+        if error is None:
+            self.rows_written += len(rows)
+            if rows:
+                self.batches_written += 1
+            return rows
+        stored, remaining, dead = self._split_failed_insert(rows, error)
+        self.rows_written += len(stored)
+        if dead:
+            with self._lock:
+                self.dead_letters.extend({"collection": name, "row": row, "error": str(error)} for row in dead)
+            for row in dead:
+                db_logger.error(f"Dead-lettered unwritable {name} ledger row {row!r}: {error}")
+            failures.append(f"{name}: {error}")
+        if remaining:
+            self._restore(name, remaining)
+            db_logger.error(f"Failed to flush {len(remaining)} {name} ledger rows: {error}")
+            failures.append(f"{name}: {error}")
+        return stored
+
+    @staticmethod
+    def _raise_failures(failures: List[str], raise_errors: bool):
+        if failures and raise_errors:
+            raise DatabaseError(f"Failed to write ledger: {'; '.join(failures)}")
+
+    async def _flush_locked(self, raise_errors: bool) -> int:
+        written = 0
+        failures: List[str] = []
+        for name, rows in self._drain().items():
+            error = None
+            already: List[Dict[str, Any]] = []
+            try:
+                retrying = self._take_retrying(name, rows)
+                if retrying:
+                    found = await self.collections[name].find({"_id": {"$in": retrying}}, {"_id": True}).to_list(length=None)
+                    already, rows = self._split_stored(rows, {doc["_id"] for doc in found})
+                    self.rows_written += len(already)
+                if rows:
+                    await self.collections[name].insert_many(rows, ordered=True)
+            except Exception as e:
+                error = e
+            stored = already + self._settle_batch(name, rows, error, failures)
+            await self._write_rollups(name, stored)
+            written += len(stored)
+        self._raise_failures(failures, raise_errors)
+        return written
+
+    def _flush_sync_locked(self, raise_errors: bool) -> int:
+        written = 0
+        failures: List[str] = []
+        for name, rows in self._drain().items():
+            error = None
+            already: List[Dict[str, Any]] = []
+            try:
+                retrying = self._take_retrying(name, rows)
+                if retrying:
+                    found = self.collections[name].find({"_id": {"$in": retrying}}, {"_id": True})
+                    already, rows = self._split_stored(rows, {doc["_id"] for doc in found})
+                    self.rows_written += len(already)
+                if rows:
+                    self.collections[name].insert_many(rows, ordered=True)
+            except Exception as e:
+                error = e
+            stored = already + self._settle_batch(name, rows, error, failures)
+            self._write_rollups_sync(name, stored)
+            written += len(stored)
+        self._raise_failures(failures, raise_errors)
+        return written
+
+    async def flush(self, raise_errors: bool = False) -> int:
+        """Write every buffered row on motor collections"""
+        if self._async_flush_lock is None:
+            self._async_flush_lock = asyncio.Lock()
+        async with self._async_flush_lock:
+            return await self._flush_locked(raise_errors)
+
+    def flush_sync(self, raise_errors: bool = False) -> int:
+        """Write every buffered row on pymongo collections"""
+        with self._sync_flush_lock:
+            return self._flush_sync_locked(raise_errors)
+
+    def _check_durable(self, name: str, rows: List[Dict[str, Any]]):
+        """Fail a durable add whose rows are still buffered after its flush.
+
+        The rows are dropped, so an error always means "not recorded" and the
+        caller can skip or retry its follow-up writes consistently.
+        """
+        if self._take_back(name, rows):
+            raise DatabaseError(f"Failed to write {name} ledger rows")
+
+    def _check_room(self):
+        """Refuse new rows while a backpressure flush could not drain the buffer"""
+        if self.pending() >= self.max_buffer:
+            raise DatabaseError(f"Ledger buffer full: {self.max_buffer} rows are waiting for the database")
+
+    async def add(self, name: str, row: Dict[str, Any], durable: bool = False):
+        """Buffer a ledger row from async code"""
+        await self.add_many(name, [row], durable)
+
+    async def add_many(self, name: str, rows: List[Dict[str, Any]], durable: bool = False):
+        """Buffer related ledger rows so they land in the same batched insert"""
+        if self.pending() >= self.max_buffer:
+            self.backpressure_waits += 1
+            await self.flush()
+            self._check_room()
+
+        batch_full = False
+        for row in rows:
+            batch_full = self._append(name, row) or batch_full
+        if durable:
+            await self.flush()
+            self._check_durable(name, rows)
+        elif batch_full:
+            await self.flush()
+
+    def add_sync(self, name: str, row: Dict[str, Any], durable: bool = False):
+        """Buffer a ledger row from sync code"""
+        self.add_many_sync(name, [row], durable)
+
+    def add_many_sync(self, name: str, rows: List[Dict[str, Any]], durable: bool = False):
+        """Buffer related ledger rows from sync code"""
+        if self.pending() >= self.max_buffer:
+            self.backpressure_waits += 1
+            self.flush_sync()
+            self._check_room()
+
+        batch_full = False
+        for row in rows:
+            batch_full = self._append(name, row) or batch_full
+        if durable:
+            self.flush_sync()
+            self._check_durable(name, rows)
+        elif batch_full:
+            self.flush_sync()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def start(self):
+        """Start the periodic flush on the running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the periodic flush and write whatever is still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def start_thread(self):
+        """Start a daemon thread that flushes pymongo collections periodically"""
+        def run():
+            while True:
+                time.sleep(self.interval)
+                self.flush_sync()
+
+        threading.Thread(target=run, name="ledger-flusher", daemon=True).start()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get ledger counters for the admin panel"""
+        return {
+            "pending": self.pending(),
+            "rows_written": self.rows_written,
+            "batches_written": self.batches_written,
+            "backpressure_waits": self.backpressure_waits,
+            "dead_letters": len(self.dead_letters)
+        }
+
+LEDGER_BATCH_SIZE = int(os.getenv("LEDGER_BATCH_SIZE", "100"))
+LEDGER_FLUSH_INTERVAL = float(os.getenv("LEDGER_FLUSH_INTERVAL", "1"))
+LEDGER_MAX_BUFFER = int(os.getenv("LEDGER_MAX_BUFFER", "5000"))
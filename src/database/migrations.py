@@ -0,0 +1,145 @@
+import os
+import time
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Any, Callable, Optional
+from pymongo import UpdateOne
+from src.utils.logger import db_logger
+from src.database.schema import USER_DEFAULTS
+from src.database.search import build_search_keys
+
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "500"))
+# Upper bound on documents rewritten per second, to leave headroom for live traffic
+MIGRATION_MAX_DOCS_PER_SECOND = float(os.getenv("MIGRATION_MAX_DOCS_PER_SECOND", "2000"))
+
+# Checkpoints, one document per migration version
+MIGRATIONS_COLLECTION = "migrations"
+
+class Migration:
+    """One versioned, idempotent rewrite of the documents matching query.
+
+    transform receives each matching document (limited to projection) and
+    returns an update document, or None to leave it alone. Re-running over
+    already migrated documents must be harmless.
+    """
+
+    def __init__(self, version: int, name: str, collection: str, query: Dict[str, Any], transform: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]], projection: Optional[Dict[str, Any]] = None):
+        self.version = version
+        self.name = name
+        self.collection = collection
+        self.query = query
+        self.transform = transform
+        self.projection = projection
+
+def _missing_user_defaults(user: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    missing = {field: value for field, value in USER_DEFAULTS.items() if field not in user}
+    if "search_keys" in missing:
+        missing["search_keys"] = build_search_keys(user)
+    if not missing:
+        return None
+    # Decided on the server, so a field a live request set after the batch
+    # was read (a claimed bonus, a referrer) is never reset to its default
+    return [{"$set": {
+        field: {"$cond": [{"$eq": [{"$type": f"${field}"}, "missing"]}, {"$literal": value}, f"${field}"]}
+        for field, value in missing.items()
+    }}]
+
+# Registered migrations, applied in version order
+MIGRATIONS = [
+    Migration(
+        1,
+        "backfill user defaults",
+        "users",
+        {"$or": [{field: {"$exists": False}} for field in USER_DEFAULTS]},
+        _missing_user_defaults,
+        projection={field: 1 for field in list(USER_DEFAULTS) + ["user_id"]}
+    )
+]
+
+class MigrationRunner:
+    """Apply migrations online in throttled, checkpointed bulk_write batches.
+
+    Documents are walked in _id order and the last _id of every batch is
+    saved, so an interrupted run resumes where it stopped.
+    """
+
+    def __init__(self, database, migrations: Optional[List[Migration]] = None, batch_size: int = MIGRATION_BATCH_SIZE, max_docs_per_second: float = MIGRATION_MAX_DOCS_PER_SECOND):
+        self.database = database
+        self.migrations = sorted(migrations if migrations is not None else MIGRATIONS, key=lambda migration: migration.version)
+        self.batch_size = batch_size
+        self.max_docs_per_second = max_docs_per_second
+        self.checkpoints = database[MIGRATIONS_COLLECTION]
+
+    async def status(self) -> List[Dict[str, Any]]:
+        """Every registered migration with its checkpoint, if any"""
+        saved = {doc["_id"]: doc for doc in await self.checkpoints.find().to_list(length=None)}
+        return [
+            {"version": migration.version, "name": migration.name, **saved.get(migration.version, {"status": "pending"})}
+            for migration in self.migrations
+        ]
+
+    async def _save_checkpoint(self, migration: Migration, fields: Dict[str, Any]):
+        await self.checkpoints.update_one(
+            {"_id": migration.version},
+            {"$set": fields, "$setOnInsert": {"name": migration.name, "started_at": datetime.now()}},
+            upsert=True
+        )
+
+    async def apply(self, migration: Migration, dry_run: bool = False, progress: Optional[Callable[[Migration, int, int], None]] = None) -> Dict[str, int]:
+        """Run one migration from its checkpoint; returns scanned and modified counts"""
+        checkpoint = await self.checkpoints.find_one({"_id": migration.version}) or {}
+        if checkpoint.get("status") == "done":
+            return {"scanned": 0, "modified": 0}
+
+        # A dry run reports from the checkpoint without moving it
+        last_id = checkpoint.get("last_id")
+        scanned = checkpoint.get("scanned", 0)
+        modified = checkpoint.get("modified", 0)
+        collection = self.database[migration.collection]
+
+        while True:
+            started = time.monotonic()
+            query = dict(migration.query)
+            if last_id is not None:
+                query = {"$and": [migration.query, {"_id": {"$gt": last_id}}]}
+            batch = await collection.find(query, migration.projection).sort("_id", 1).limit(self.batch_size).to_list(length=self.batch_size)
+            if not batch:
+                break
+
+            operations = []
+            for document in batch:
+                update = migration.transform(document)
+                if update:
+                    operations.append(UpdateOne({"_id": document["_id"]}, update))
+            if operations and not dry_run:
+                result = await collection.bulk_write(operations, ordered=False)
+                modified += result.modified_count
+            elif dry_run:
+                modified += len(operations)
+
+            scanned += len(batch)
+            last_id = batch[-1]["_id"]
+            if not dry_run:
+                await self._save_checkpoint(migration, {"status": "running", "last_id": last_id, "scanned": scanned, "modified": modified})
+            if progress:
+                progress(migration, scanned, modified)
+
+            # Spread batches out so the rewrite rate stays under the limit
+            if self.max_docs_per_second > 0:
+                remaining = len(batch) / self.max_docs_per_second - (time.monotonic() - started)
+                if remaining > 0:
+                    await asyncio.sleep(remaining)
+
+        if not dry_run:
+            await self._save_checkpoint(migration, {"status": "done", "scanned": scanned, "modified": modified, "finished_at": datetime.now()})
+        db_logger.info(f"Migration {migration.version} ({migration.name}){' dry run' if dry_run else ''}: {scanned} scanned, {modified} {'to modify' if dry_run else 'modified'}")
+        return {"scanned": scanned, "modified": modified}
+
+    async def run(self, dry_run: bool = False, target: Optional[int] = None, progress: Optional[Callable[[Migration, int, int], None]] = None) -> Dict[int, Dict[str, int]]:
+        """Apply every pending migration up to target, in version order"""
+        results = {}
+        for migration in self.migrations:
+            if target is not None and migration.version > target:
+                break
+            results[migration.version] = await self.apply(migration, dry_run, progress)
+        return results
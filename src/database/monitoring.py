@@ -0,0 +1,152 @@
+import os
+import threading
+from bisect import bisect_left
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+from pymongo import monitoring
+from src.utils.logger import db_logger
+
+# Upper bounds in milliseconds of the latency histogram buckets
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, float("inf"))
+
+# Driver handshakes and heartbeats that say nothing about our queries
+IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "saslStart", "saslContinue", "endSessions", "getMore", "killCursors", "buildInfo"}
+
+def filter_shape(value: Any) -> Any:
+    """Replace every literal in a filter with its type, keeping operators and fields"""
+    if isinstance(value, dict):
+        return {key: filter_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        shapes = []
+        for item in value:
+            shape = filter_shape(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    return type(value).__name__
+
+def extract_filter(command_name: str, command: Dict[str, Any]) -> Any:
+    """Pull the query part out of a raw command document"""
+    if command_name in ("find", "count", "distinct"):
+        return command.get("filter", command.get("query"))
+    if command_name == "findAndModify":
+        return command.get("query")
+    if command_name in ("update", "delete"):
+        statements = command.get(f"{command_name}s") or [{}]
+        return statements[0].get("q")
+    if command_name == "aggregate":
+        for stage in command.get("pipeline", []):
+            if "$match" in stage:
+                return stage["$match"]
+        return None
+    return None
+
+class OperationStats:
+    """Latency histogram for one (collection, command) pair"""
+
+    __slots__ = ("count", "failures", "total_ms", "max_ms", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.failures = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS_MS)
+
+    def record(self, duration_ms: float, failed: bool):
+        self.count += 1
+        self.failures += failed
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        self.buckets[bisect_left(LATENCY_BUCKETS_MS, duration_ms)] += 1
+
+    def percentile(self, fraction: float) -> float:
+        """Upper bound of the bucket holding the given fraction of calls"""
+        target = fraction * self.count
+        seen = 0
+        for bound, hits in zip(LATENCY_BUCKETS_MS, self.buckets):
+            seen += hits
+            if seen >= target and hits:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+class CommandStats(monitoring.CommandListener):
+    """pymongo command listener that keeps latency histograms and a slow-query log"""
+
+    def __init__(self, slow_ms: float = 100.0, slow_log_size: int = 50):
+        self.slow_ms = slow_ms
+        self.slow_queries: deque = deque(maxlen=slow_log_size)
+        self.operations: Dict[Tuple[str, str], OperationStats] = {}
+        # (connection_id, request_id) -> (collection, command name, filter)
+        self._inflight: Dict[tuple, tuple] = {}
+        # Events arrive from the motor executor threads and the webapp threads
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = event.database_name
+        query = extract_filter(event.command_name, event.command)
+        with self._lock:
+            self._inflight[(event.connection_id, event.request_id)] = (collection, event.command_name, query)
+
+    def _finish(self, event, failed: bool):
+        with self._lock:
+            inflight = self._inflight.pop((event.connection_id, event.request_id), None)
+            if inflight is None:
+                return
+            collection, command_name, query = inflight
+            duration_ms = event.duration_micros / 1000
+            stats = self.operations.get((collection, command_name))
+            if stats is None:
+                stats = self.operations[(collection, command_name)] = OperationStats()
+            stats.record(duration_ms, failed)
+
+        if duration_ms >= self.slow_ms:
+            shape = filter_shape(query) if query is not None else None
+            self.slow_queries.append({
+                "time": datetime.now(),
+                "collection": collection,
+                "command": command_name,
+                "duration_ms": duration_ms,
+                "shape": shape
+            })
+            db_logger.warning(f"Slow query {collection}.{command_name} took {duration_ms:.1f}ms filter={shape}")
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+    def get_stats(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Per-operation summaries, most total time first"""
+        with self._lock:
+            summaries = [
+                {
+                    "collection": collection,
+                    "command": command_name,
+                    "count": stats.count,
+                    "failures": stats.failures,
+                    "total_ms": stats.total_ms,
+                    "avg_ms": stats.total_ms / stats.count if stats.count else 0.0,
+                    "p50_ms": stats.percentile(0.5),
+                    "p95_ms": stats.percentile(0.95),
+                    "max_ms": stats.max_ms
+                }
+                for (collection, command_name), stats in self.operations.items()
+            ]
+        summaries.sort(key=lambda summary: summary["total_ms"], reverse=True)
+        return summaries[:limit] if limit else summaries
+
+    def reset(self):
+        """Clear histograms and the slow-query log"""
+        with self._lock:
+            self.operations.clear()
+            self.slow_queries.clear()
+
+# Global command listener shared by the motor and pymongo clients
+command_stats = CommandStats(slow_ms=float(os.getenv("SLOW_QUERY_MS", "100")))
@@ -0,0 +1,43 @@
+import base64
+import bson
+from typing import Optional, Dict, List, Any, Tuple
+
+def encode_cursor(document: Dict[str, Any], sort_by: str) -> str:
+    """Encode the position after a document as an opaque, URL-safe token"""
+    raw = bson.encode({"v": document.get(sort_by), "i": document["_id"]})
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[Any, Any]:
+    """Decode a token from encode_cursor into (sort value, _id)"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        position = bson.decode(raw)
+        return position["v"], position["i"]
+    except Exception as e:
+        raise ValueError(f"Invalid pagination cursor: {e}")
+
+def build_keyset_query(sort_by: str, sort_order: int, cursor: Optional[str] = None) -> Tuple[Dict[str, Any], List[Tuple[str, int]]]:
+    """Build the filter and sort for the page after a cursor.
+
+    Pages are ordered by (sort_by, _id) so ties on the sort key still have a
+    stable position, and the filter seeks past the last document through the
+    index instead of skipping over every earlier one.
+    """
+    sort = [(sort_by, sort_order)]
+    if sort_by != "_id":
+        sort.append(("_id", sort_order))
+
+    if cursor is None:
+        return {}, sort
+
+    value, last_id = decode_cursor(cursor)
+    op = "$lt" if sort_order < 0 else "$gt"
+    if sort_by == "_id":
+        return {"_id": {op: last_id}}, sort
+
+    return {
+        "$or": [
+            {sort_by: {op: value}},
+            {sort_by: value, "_id": {op: last_id}}
+        ]
+    }, sort
@@ -0,0 +1,123 @@
+from datetime import datetime
+from typing import Dict, List, Any, Sequence, Tuple
+from pymongo import UpdateOne
+
+# Rollup resolutions; "all" keeps one running total per game_type or type
+GRANULARITIES = ("hour", "day", "all")
+
+# Fixed bucket for the "all" totals; $merge cannot match on a null key
+ALL_TIME_BUCKET = datetime(1970, 1, 1)
+
+# Ledger collection -> field its rollups are broken down by
+ROLLUP_DIMENSIONS = {
+    "games": "game_type",
+    "transactions": "type"
+}
+
+# Stands in for a missing dimension value; $merge cannot match on null either
+UNKNOWN_DIMENSION = "unknown"
+
+def bucket_start(timestamp: datetime, granularity: str):
+    """Truncate a timestamp to the start of its rollup bucket"""
+    if granularity == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    return ALL_TIME_BUCKET
+
+def _amount(value) -> float:
+    """Numeric ledger value, with anything else counted as 0 like $sum does"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return 0
+
+def _row_counters(name: str, row: Dict[str, Any]) -> Tuple[Dict[str, float], Dict[str, float], Dict[str, float]]:
+    """Split a ledger row into ($inc counters, $max fields, $min fields)"""
+    if name == "games":
+        bet_amount = _amount(row.get("bet_amount"))
+        return {
+            "total_games": 1,
+            "total_bet_amount": bet_amount,
+            "total_winnings": _amount(row.get("winnings"))
+        }, {"max_bet": bet_amount}, {}
+    amount = _amount(row.get("amount"))
+    # Extremes by size, so withdrawals (stored negative) compare like deposits
+    return {"count": 1, "total_amount": amount}, {"max_amount": abs(amount)}, {"min_amount": abs(amount)}
+
+def build_rollup_operations(name: str, rows: List[Dict[str, Any]]) -> List[UpdateOne]:
+    """Fold a batch of ledger rows into one $inc upsert per rollup bucket"""
+    dimension = ROLLUP_DIMENSIONS[name]
+    buckets: Dict[tuple, Tuple[Dict[str, float], Dict[str, float], Dict[str, float]]] = {}
+
+    for row in rows:
+        counters, maxima, minima = _row_counters(name, row)
+        for granularity in GRANULARITIES:
+            value = row.get(dimension)
+            key = (granularity, bucket_start(row["timestamp"], granularity), UNKNOWN_DIMENSION if value is None else value)
+            inc, peak, low = buckets.setdefault(key, ({}, {}, {}))
+            for field, value in counters.items():
+                inc[field] = inc.get(field, 0) + value
+            for field, value in maxima.items():
+                peak[field] = max(peak.get(field, value), value)
+            for field, value in minima.items():
+                low[field] = min(low.get(field, value), value)
+
+    operations = []
+    for (granularity, bucket, value), (inc, peak, low) in buckets.items():
+        update = {"$inc": inc}
+        if peak:
+            update["$max"] = peak
+        if low:
+            update["$min"] = low
+        operations.append(UpdateOne(
+            {"granularity": granularity, "bucket": bucket, dimension: value},
+            update,
+            upsert=True
+        ))
+    return operations
+
+def _bucket_expression(granularity: str) -> Dict[str, Any]:
+    parts = {
+        "year": {"$year": "$timestamp"},
+        "month": {"$month": "$timestamp"},
+        "day": {"$dayOfMonth": "$timestamp"}
+    }
+    if granularity == "hour":
+        parts["hour"] = {"$hour": "$timestamp"}
+    return {"$dateFromParts": parts}
+
+def build_backfill_pipeline(name: str, granularity: str, into: str, union: Sequence[str] = ()) -> List[Dict[str, Any]]:
+    """Aggregate raw ledger history, plus any union collections, into one rollup granularity with $merge"""
+    dimension = ROLLUP_DIMENSIONS[name]
+    bucket = _bucket_expression(granularity) if granularity != "all" else {"$literal": ALL_TIME_BUCKET}
+
+    if name == "games":
+        accumulators = {
+            "total_games": {"$sum": 1},
+            "total_bet_amount": {"$sum": "$bet_amount"},
+            "total_winnings": {"$sum": "$winnings"},
+            "max_bet": {"$max": "$bet_amount"}
+        }
+    else:
+        accumulators = {
+            "count": {"$sum": 1},
+            "total_amount": {"$sum": "$amount"},
+            "max_amount": {"$max": {"$abs": "$amount"}},
+            "min_amount": {"$min": {"$abs": "$amount"}}
+        }
+
+    group = {"_id": {"bucket": bucket, "value": {"$ifNull": [f"${dimension}", UNKNOWN_DIMENSION]}}}
+    group.update(accumulators)
+    projection = {"_id": 0, "granularity": {"$literal": granularity}, "bucket": "$_id.bucket", dimension: "$_id.value"}
+    projection.update({field: 1 for field in accumulators})
+
+    return [{"$unionWith": collection} for collection in union] + [
+        {"$group": group},
+        {"$project": projection},
+        {"$merge": {
+            "into": into,
+            "on": ["granularity", "bucket", dimension],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert"
+        }}
+    ]
@@ -0,0 +1,175 @@
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any
+from bson import ObjectId
+from src.database.search import build_search_keys
+
+# Telegram profile fields refreshed whenever the caller passes user data
+PROFILE_FIELDS = ("username", "first_name", "last_name")
+
+# Default profile for a new user, shared by the async bot and the sync webapp.
+# created_at and last_active are filled in at creation time.
+USER_DEFAULTS = {
+    "balance": 1.0,  # Starting balance of $1
+    "total_bets": 0,
+    "total_wins": 0,
+    "total_losses": 0,
+    "total_deposits": 0,
+    "total_withdrawals": 0,
+    "is_banned": False,
+    # New fields for bonuses and settings
+    "daily_bonus_streak": 0,
+    "last_daily_bonus": None,
+    "total_daily_bonuses": 0.0,
+    "total_referrals": 0,
+    "total_referral_bonuses": 0.0,
+    "total_event_bonuses": 0.0,
+    "referred_by": None,
+    # Settings
+    "notifications_enabled": True,
+    "sound_effects": True,
+    "theme": "dark",
+    "language": "en",
+    "auto_bet_enabled": False,
+    "quick_bet_enabled": False,
+    # User info fields
+    "username": None,
+    "first_name": None,
+    "last_name": None,
+    # Normalized prefixes of the fields above, see search.build_search_keys
+    "search_keys": []
+}
+
+def build_user_upsert(user_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Build the upsert that creates a user with defaults or refreshes its profile.
+
+    Defaults only apply on insert. Profile fields and activity go into $set when
+    user data is given; a plain read leaves an existing document untouched.
+    """
+    now = datetime.now()
+    profile = {}
+    if user_data:
+        profile = {"last_active": now}
+        profile.update({field: user_data.get(field) for field in PROFILE_FIELDS})
+        profile["search_keys"] = build_search_keys(profile)
+
+    # An explicit _id lets the caller rebuild the created document exactly
+    defaults = {"_id": ObjectId(), "created_at": now, "last_active": now}
+    defaults.update(USER_DEFAULTS)
+
+    # Mongo rejects a field that appears in both $set and $setOnInsert
+    update = {"$setOnInsert": {field: value for field, value in defaults.items() if field not in profile}}
+    if profile:
+        update["$set"] = profile
+    return update
+
+def resolve_user_upsert(user_id: int, before: Optional[Dict[str, Any]], update: Dict[str, Any]) -> Dict[str, Any]:
+    """Rebuild the post-upsert user from the document returned before the update"""
+    if before is None:
+        user = {"user_id": user_id}
+        user.update(update["$setOnInsert"])
+    else:
+        user = before
+    user.update(update.get("$set", {}))
+    return user
+
+def build_settlement_filter(user_id: int, amount: float) -> Dict[str, Any]:
+    """Filter for a balance settlement; debits only match users who can cover them"""
+    query = {"user_id": user_id}
+    if amount < 0:
+        query["balance"] = {"$gte": -amount}
+    return query
+
+def build_settlement_update(amount: float, inc: Optional[Dict[str, Any]] = None, set_fields: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Build the single update document for a balance settlement.
+
+    Mirrors the counters the old update_user_balance applied one call at a time:
+    every settlement counts as a bet, credits count as wins and debits as losses.
+    """
+    counters = {"balance": amount, "total_bets": 1}
+    if amount > 0:
+        counters["total_wins"] = 1
+    elif amount < 0:
+        counters["total_losses"] = 1
+
+    if inc:
+        for field, value in inc.items():
+            counters[field] = counters.get(field, 0) + value
+
+    fields = {"last_active": datetime.now()}
+    if set_fields:
+        fields.update(set_fields)
+
+    return {"$inc": counters, "$set": fields}
+
+# Shared rounds remembered per user, so a retried round settlement pays each bet once
+SETTLED_ROUNDS_KEPT = 20
+
+def build_round_settlement(user_id: int, round_key: str, amount: float):
+    """Build the (filter, update) crediting one shared-round payout at most once"""
+    update = build_settlement_update(amount)
+    update["$push"] = {"settled_rounds": {"$each": [round_key], "$slice": -SETTLED_ROUNDS_KEPT}}
+    return {"user_id": user_id, "settled_rounds": {"$ne": round_key}}, update
+
+# Daily bonus: base amount plus a capped per-day streak bonus
+DAILY_BONUS_BASE = 0.50
+DAILY_BONUS_STREAK_STEP = 0.10
+DAILY_BONUS_STREAK_MAX = 2.0
+DAILY_BONUS_COOLDOWN = timedelta(hours=24)
+# A claim within this long of the previous one continues the streak
+DAILY_BONUS_STREAK_WINDOW = timedelta(hours=48)
+
+REFERRER_BONUS = 2.0
+REFERRED_BONUS = 1.0
+# Referrals remembered per referrer. A marker only matters until the referred
+# user's referrer_credit_pending flag is cleared, so this bounds how many of
+# one referrer's credits can be waiting on that flag at once
+CREDITED_REFERRALS_KEPT = 100
+
+def build_referral_claim(referrer_id: int, referred_id: int):
+    """Build the (filter, update) that pays the referred user and records the
+    referrer's credit as pending; a user can only be referred once"""
+    return (
+        {"user_id": referred_id, "referred_by": None},
+        {"$inc": {"balance": REFERRED_BONUS}, "$set": {"referred_by": referrer_id, "referrer_credit_pending": True}}
+    )
+
+def build_referrer_credit(referrer_id: int, referred_id: int):
+    """Build the (filter, update) crediting a referrer for one referral at most once"""
+    update = {
+        "$inc": {"balance": REFERRER_BONUS, "total_referrals": 1, "total_referral_bonuses": REFERRER_BONUS},
+        "$push": {"credited_referrals": {"$each": [referred_id], "$slice": -CREDITED_REFERRALS_KEPT}}
+    }
+    return {"user_id": referrer_id, "credited_referrals": {"$ne": referred_id}}, update
+
+def daily_bonus_amount(streak) -> float:
+    """Bonus paid for a claim made with the given streak before it"""
+    return DAILY_BONUS_BASE + min((streak or 0) * DAILY_BONUS_STREAK_STEP, DAILY_BONUS_STREAK_MAX)
+
+def build_daily_bonus_claim(user_id: int, now: datetime):
+    """Build the (filter, pipeline update) that claims a daily bonus in one statement.
+
+    The filter only matches once the cooldown has passed, so concurrent claims
+    cannot both succeed. The pipeline computes the bonus and the new streak
+    from the stored values with the same formula as daily_bonus_amount.
+    """
+    query = {
+        "user_id": user_id,
+        "$or": [
+            {"last_daily_bonus": {"$not": {"$type": "date"}}},
+            {"last_daily_bonus": {"$lte": now - DAILY_BONUS_COOLDOWN}}
+        ]
+    }
+    streak = {"$ifNull": ["$daily_bonus_streak", 0]}
+    bonus = {"$add": [DAILY_BONUS_BASE, {"$min": [{"$multiply": [streak, DAILY_BONUS_STREAK_STEP]}, DAILY_BONUS_STREAK_MAX]}]}
+    continues_streak = {"$and": [
+        {"$eq": [{"$type": "$last_daily_bonus"}, "date"]},
+        {"$gt": ["$last_daily_bonus", now - DAILY_BONUS_STREAK_WINDOW]}
+    ]}
+    # Every expression in one $set stage reads the document as it was before it
+    pipeline = [{"$set": {
+        "balance": {"$add": [{"$ifNull": ["$balance", 0]}, bonus]},
+        "total_daily_bonuses": {"$add": [{"$ifNull": ["$total_daily_bonuses", 0]}, bonus]},
+        "daily_bonus_streak": {"$cond": [continues_streak, {"$add": [streak, 1]}, 1]},
+        "last_daily_bonus": {"$literal": now}
+    }}]
+    return query, pipeline
@@ -0,0 +1,72 @@
+import os
+import re
+import unicodedata
+from typing import Optional, Dict, List, Any
+
+# Enables the text index fallback for word matches inside names
+USER_SEARCH_TEXT_INDEX = os.getenv("USER_SEARCH_TEXT_INDEX", "false").lower() == "true"
+
+# Candidates fetched per requested result before ranking
+SEARCH_CANDIDATE_FACTOR = 5
+
+def normalize_search_term(value: Optional[str]) -> str:
+    """Fold a name or query to the form stored in search_keys"""
+    if not value:
+        return ""
+    value = unicodedata.normalize("NFKC", value).casefold().strip().lstrip("@")
+    return " ".join(value.split())
+
+def build_search_keys(profile: Dict[str, Any]) -> List[str]:
+    """Build the lowercase keys a user can be found by through a prefix.
+
+    Covers the username, each name and the full name, so "ali", "smi" and
+    "alice sm" all hit the multikey index on search_keys.
+    """
+    first_name = normalize_search_term(profile.get("first_name"))
+    last_name = normalize_search_term(profile.get("last_name"))
+    keys = [
+        normalize_search_term(profile.get("username")),
+        first_name,
+        last_name,
+        f"{first_name} {last_name}".strip()
+    ]
+    keys.extend(first_name.split())
+    keys.extend(last_name.split())
+
+    unique = []
+    for key in keys:
+        if key and key not in unique:
+            unique.append(key)
+    return unique
+
+def build_prefix_query(term: str) -> Dict[str, Any]:
+    """Anchored, case-sensitive regex so Mongo scans only the matching index range"""
+    return {"search_keys": {"$regex": f"^{re.escape(term)}"}}
+
+def _rank(term: str, user: Dict[str, Any]) -> int:
+    username = normalize_search_term(user.get("username"))
+    names = [key for key in user.get("search_keys", []) if key != username]
+    if username == term:
+        return 0
+    if username.startswith(term):
+        return 1
+    if term in names:
+        return 2
+    if any(name.startswith(term) for name in names):
+        return 3
+    return 4
+
+def rank_search_results(term: str, users: List[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+    """Order matches: exact username, username prefix, exact name, name prefix, then text hits.
+
+    Python's sort is stable, so text hits keep their relevance order.
+    """
+    seen = set()
+    unique = []
+    for user in users:
+        if user["user_id"] not in seen:
+            seen.add(user["user_id"])
+            unique.append(user)
+
+    unique.sort(key=lambda user: _rank(term, user))
+    return unique[:limit]
@@ -0,0 +1,60 @@
+import asyncio
+import threading
+from typing import Dict, Any, Awaitable, Callable, Hashable
+
+class SingleFlight:
+    """Coalesce concurrent identical async reads into one pending query.
+
+    Keys are tuples whose first element groups them (a user_id), so every
+    in-flight read for a user can be dropped at once when that user is
+    written. Callers arriving after a write then start a fresh read instead
+    of joining one that began before it.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        # forget_group is called from the webapp thread through the user cache
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: tuple, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Await factory(), or the identical call already in flight for key"""
+        with self._lock:
+            self.calls += 1
+            task = self._calls.get(key)
+            if task is None:
+                self.executions += 1
+            else:
+                self.coalesced += 1
+
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            with self._lock:
+                self._calls[key] = task
+            task.add_done_callback(lambda done: self._release(key, done))
+        # A cancelled caller must not cancel the query the others are waiting on
+        return await asyncio.shield(task)
+
+    def _release(self, key: tuple, task: asyncio.Future):
+        with self._lock:
+            if self._calls.get(key) is task:
+                del self._calls[key]
+
+    def forget_group(self, group: Hashable):
+        """Stop handing out in-flight reads for one group after it was written"""
+        with self._lock:
+            for key in [key for key in self._calls if key[0] == group]:
+                del self._calls[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get coalescing counters for the admin panel"""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls),
+                "coalesced_rate": (self.coalesced / self.calls * 100) if self.calls else 0.0
+            }
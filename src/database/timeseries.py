@@ -0,0 +1,117 @@
+import os
+from typing import Dict, Any, Optional
+from src.utils.logger import db_logger
+from src.database.migrations import MIGRATIONS_COLLECTION
+
+# Store game rounds in a MongoDB time-series collection (MongoDB 6.0+)
+GAMES_TIMESERIES = os.getenv("GAMES_TIMESERIES", "false").lower() == "true"
+GAMES_TIMESERIES_GRANULARITY = os.getenv("GAMES_TIMESERIES_GRANULARITY", "seconds")
+
+# Where migrate_games_to_timeseries parks the original regular collection
+GAMES_LEGACY_COLLECTION = "games_legacy"
+# Its checkpoint document in the migrations collection
+GAMES_TIMESERIES_CHECKPOINT = "games_timeseries"
+
+def timeseries_options(granularity: str = GAMES_TIMESERIES_GRANULARITY) -> Dict[str, Any]:
+    """Time-series settings for the games collection.
+
+    user_id is the metaField so rounds are bucketed per player and every
+    existing user_id filter keeps working; game_type stays a measurement.
+    """
+    return {"timeField": "timestamp", "metaField": "user_id", "granularity": granularity}
+
+async def get_collection_type(database, name: str) -> Optional[str]:
+    """"collection", "timeseries" or "view" for an existing collection, else None"""
+    infos = await database.list_collections(filter={"name": name}).to_list(length=1)
+    return infos[0].get("type", "collection") if infos else None
+
+async def ensure_games_collection(database, name: str = "games") -> bool:
+    """Create the games collection as time-series when the mode is on.
+
+    Returns whether the collection is time-series. An existing regular
+    collection is left alone; migrate_games_to_timeseries converts it.
+    """
+    collection_type = await get_collection_type(database, name)
+    if collection_type == "timeseries":
+        return True
+    if not GAMES_TIMESERIES:
+        return False
+    if collection_type is None:
+        await database.create_collection(name, timeseries=timeseries_options())
+        db_logger.info(f"Created time-series collection {name}")
+        return True
+
+    db_logger.warning(f"GAMES_TIMESERIES is set but {name} is a regular collection; run migrate_games_timeseries.py")
+    return False
+
+async def _save_checkpoint(checkpoints, fields: Dict[str, Any]):
+    await checkpoints.update_one({"_id": GAMES_TIMESERIES_CHECKPOINT}, {"$set": fields}, upsert=True)
+
+async def migrate_games_to_timeseries(database, batch_size: int = 10000, name: str = "games", progress=None) -> int:
+    """Copy a regular games collection into a new time-series one.
+
+    The original is renamed to games_legacy first, so the bot and webapp
+    must be stopped while this runs. Rounds are copied in _id order and the
+    last copied _id is checkpointed after every batch, so an interrupted run
+    resumes there. Time-series collections do not enforce a unique _id, so
+    rows of the batch in flight when a run stopped are looked up before
+    they are copied again. The legacy collection is kept for the caller to
+    verify and drop. Returns the number of rounds copied by this run.
+    """
+    checkpoints = database[MIGRATIONS_COLLECTION]
+    checkpoint = await checkpoints.find_one({"_id": GAMES_TIMESERIES_CHECKPOINT}) or {}
+    collection_type = await get_collection_type(database, name)
+    if collection_type == "timeseries":
+        if checkpoint.get("status") == "done" or await get_collection_type(database, GAMES_LEGACY_COLLECTION) is None:
+            db_logger.info(f"{name} is already a time-series collection")
+            return 0
+        if not checkpoint:
+            # Stopped before the first checkpoint; nothing says what was copied
+            await database[name].drop()
+            await database.create_collection(name, timeseries=timeseries_options())
+    elif collection_type == "collection":
+        if await get_collection_type(database, GAMES_LEGACY_COLLECTION) is not None:
+            raise ValueError(f"{GAMES_LEGACY_COLLECTION} already exists; drop it before migrating")
+        await database[name].rename(GAMES_LEGACY_COLLECTION)
+        await _save_checkpoint(checkpoints, {"status": "running", "last_id": None, "copied": 0})
+        checkpoint = {}
+        await database.create_collection(name, timeseries=timeseries_options())
+    elif await get_collection_type(database, GAMES_LEGACY_COLLECTION) is None:
+        await ensure_games_collection(database, name)
+        return 0
+    else:
+        # Renamed but the new collection was never created; copy everything
+        await _save_checkpoint(checkpoints, {"status": "running", "last_id": None, "copied": 0})
+        checkpoint = {}
+        await database.create_collection(name, timeseries=timeseries_options())
+
+    legacy = database[GAMES_LEGACY_COLLECTION]
+    target = database[name]
+
+    last_id = checkpoint.get("last_id")
+    total = checkpoint.get("copied", 0)
+    copied = 0
+    # Only the batch in flight when a run stopped can be past the checkpoint
+    query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+    in_flight = {row["_id"] for row in await target.find(query, {"_id": True}).to_list(length=None)} if checkpoint else set()
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        batch = await legacy.find(query).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        # Time-series documents must have a time value
+        rows = [row for row in batch if row.get("timestamp") is not None and row["_id"] not in in_flight]
+        if rows:
+            await target.insert_many(rows, ordered=False)
+            copied += len(rows)
+        if not batch:
+            break
+        in_flight = set()
+        last_id = batch[-1]["_id"]
+        await _save_checkpoint(checkpoints, {"status": "running", "last_id": last_id, "copied": total + copied})
+        if progress:
+            progress(total + copied)
+        if len(batch) < batch_size:
+            break
+
+    await _save_checkpoint(checkpoints, {"status": "done", "last_id": last_id, "copied": total + copied})
+    db_logger.info(f"Copied {copied} rounds from {GAMES_LEGACY_COLLECTION} into time-series {name}")
+    return copied
@@ -0,0 +1,61 @@
+from typing import Dict, Any
+from src.database.schema import USER_DEFAULTS
+
+class UserView:
+    """Compact read-only projection of a user document.
+
+    Subclasses list their fields in __slots__; only those are fetched from
+    Mongo. Item access is kept so views drop into code written for dicts.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def projection(cls) -> Dict[str, Any]:
+        """Mongo projection for exactly the fields of this view"""
+        fields = {"_id": 0}
+        fields.update({field: 1 for field in cls.__slots__})
+        return fields
+
+    @classmethod
+    def from_document(cls, document: Dict[str, Any]) -> "UserView":
+        """Build a view from a full or projected user document"""
+        view = cls.__new__(cls)
+        for field in cls.__slots__:
+            object.__setattr__(view, field, document.get(field, USER_DEFAULTS.get(field)))
+        return view
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __getitem__(self, field: str):
+        try:
+            return getattr(self, field)
+        except AttributeError:
+            raise KeyError(field)
+
+    def get(self, field: str, default=None):
+        return getattr(self, field, default)
+
+    def __repr__(self):
+        fields = ", ".join(f"{field}={getattr(self, field)!r}" for field in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+class BalanceView(UserView):
+    """Balance checks before a bet or a menu render"""
+
+    __slots__ = ("user_id", "balance", "is_banned")
+
+class StatsView(UserView):
+    """Profile and achievement counters"""
+
+    __slots__ = (
+        "user_id",
+        "balance",
+        "total_bets",
+        "total_wins",
+        "total_losses",
+        "total_deposits",
+        "total_withdrawals",
+        "created_at"
+    )
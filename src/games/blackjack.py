@@ -1,13 +1,34 @@
 import random
+import struct
+from src.games.state import register_game_class, encode_choice, decode_choice
+from src.games.fair import fair_rng, register_fair_game
+from src.games.sessions import get_session_store
 
 # Card suits and values
 SUITS = ["♠️", "♥️", "♦️", "♣️"]
 RANKS = ["A", "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K"]
 
 class Card:
+    """A card stored as one small int: suit index * 13 + rank index"""
+    
+    __slots__ = ("code",)
+    
     def __init__(self, suit, rank):
-        self.suit = suit
-        self.rank = rank
+        self.code = SUITS.index(suit) * 13 + RANKS.index(rank)
+    
+    @classmethod
+    def from_code(cls, code):
+        card = cls.__new__(cls)
+        card.code = code
+        return card
+    
+    @property
+    def suit(self):
+        return SUITS[self.code // 13]
+    
+    @property
+    def rank(self):
+        return RANKS[self.code % 13]
     
     def __str__(self):
         return f"{self.rank}{self.suit}"
@@ -28,34 +49,56 @@ class Card:
         }
 
 class Deck:
-    def __init__(self):
-        self.cards = []
+    __slots__ = ("cards", "rng")
+    
+    def __init__(self, rng=random):
+        self.rng = rng
+        self.cards = bytearray()
         self.build()
     
     def build(self):
-        self.cards = [Card(suit, rank) for suit in SUITS for rank in RANKS]
-        random.shuffle(self.cards)
+        # Card codes, see Card
+        self.cards = bytearray(range(52))
+        self.rng.shuffle(self.cards)
     
     def draw(self):
         if not self.cards:
             self.build()
-        return self.cards.pop()
+        return Card.from_code(self.cards.pop())
 
+@register_fair_game("blackjack")
+def blackjack_outcome(rng):
+    """The shuffled deck in dealing order: player, dealer, player, dealer, then hits"""
+    deck = Deck(rng)
+    return [Card.from_code(code).to_dict() for code in reversed(deck.cards)]
+
+@register_game_class
 class BlackjackGame:
-    def __init__(self, user_id, bet_amount):
+    SESSION_TAG = 6
+    RESULTS = ("push", "blackjack", "bust", "dealer_bust", "player_win", "dealer_win")
+    # user_id, bet_amount, game_over, result, player and dealer card counts,
+    # nonce (-1 = None), followed by both hands and the remaining deck as card codes
+    _STRUCT = struct.Struct("<qd?BBBq")
+    
+    __slots__ = ("user_id", "bet_amount", "deck", "_player_hand", "_dealer_hand", "game_over", "result", "nonce")
+    
+    def __init__(self, user_id, bet_amount, rng=None):
         self.user_id = user_id
         self.bet_amount = bet_amount
-        self.deck = Deck()
-        self.player_hand = []
-        self.dealer_hand = []
+        if rng is None:
+            rng = fair_rng.draw(user_id)
+        self.nonce = getattr(rng, "nonce", None)
+        self.deck = Deck(rng)
+        self._player_hand = bytearray()
+        self._dealer_hand = bytearray()
         self.game_over = False
         self.result = None
         
         # Deal initial cards
-        self.player_hand.append(self.deck.draw())
-        self.dealer_hand.append(self.deck.draw())
-        self.player_hand.append(self.deck.draw())
-        self.dealer_hand.append(self.deck.draw())
+        self._player_hand.append(self.deck.draw().code)
+        self._dealer_hand.append(self.deck.draw().code)
+        self._player_hand.append(self.deck.draw().code)
+        self._dealer_hand.append(self.deck.draw().code)
         
         # Check for blackjack
         if self.get_hand_value(self.player_hand) == 21:
@@ -65,6 +108,22 @@ class BlackjackGame:
                 self.result = "blackjack"
             self.game_over = True
     
+    @property
+    def player_hand(self):
+        return [Card.from_code(code) for code in self._player_hand]
+    
+    @player_hand.setter
+    def player_hand(self, cards):
+        self._player_hand = bytearray(card.code for card in cards)
+    
+    @property
+    def dealer_hand(self):
+        return [Card.from_code(code) for code in self._dealer_hand]
+    
+    @dealer_hand.setter
+    def dealer_hand(self, cards):
+        self._dealer_hand = bytearray(card.code for card in cards)
+    
     def get_hand_value(self, hand):
         value = 0
         aces = 0
@@ -87,7 +146,7 @@ class BlackjackGame:
         if self.game_over:
             return False
         
-        self.player_hand.append(self.deck.draw())
+        self._player_hand.append(self.deck.draw().code)
         
         if self.get_hand_value(self.player_hand) > 21:
             self.result = "bust"
@@ -101,7 +160,7 @@ class BlackjackGame:
         
         # Dealer plays
         while self.get_hand_value(self.dealer_hand) < 17:
-            self.dealer_hand.append(self.deck.draw())
+            self._dealer_hand.append(self.deck.draw().code)
         
         player_value = self.get_hand_value(self.player_hand)
         dealer_value = self.get_hand_value(self.dealer_hand)
@@ -136,8 +195,33 @@ class BlackjackGame:
             'game_over': self.game_over,
             'result': self.result,
             'bet_amount': self.bet_amount,
-            'winnings': self.get_winnings() if self.game_over else 0
+            'winnings': self.get_winnings() if self.game_over else 0,
+            'nonce': self.nonce
         }
+    
+    def to_bytes(self):
+        """Pack the game into a fixed header, both hands and the remaining deck"""
+        return self._STRUCT.pack(
+            int(self.user_id), self.bet_amount, self.game_over, encode_choice(self.result, self.RESULTS),
+            len(self._player_hand), len(self._dealer_hand), -1 if self.nonce is None else self.nonce
+        ) + self._player_hand + self._dealer_hand + self.deck.cards
+    
+    @classmethod
+    def from_bytes(cls, data):
+        """Rebuild a game packed by to_bytes"""
+        game = cls.__new__(cls)
+        game.user_id, game.bet_amount, game.game_over, result, player_count, dealer_count, nonce = cls._STRUCT.unpack_from(data)
+        game.nonce = None if nonce < 0 else nonce
+        game.result = decode_choice(result, cls.RESULTS)
+        offset = cls._STRUCT.size
+        game._player_hand = bytearray(data[offset:offset + player_count])
+        offset += player_count
+        game._dealer_hand = bytearray(data[offset:offset + dealer_count])
+        game.deck = Deck.__new__(Deck)
+        game.deck.cards = bytearray(data[offset + dealer_count:])
+        # A hand never gets through a whole deck, so this only matters in theory
+        game.deck.rng = random
+        return game
 
 # Game logic functions for webapp API
 def create_blackjack_game(user_id, bet_amount):
@@ -154,18 +238,21 @@ def stand_blackjack(game):
     game.stand()
     return game.to_dict()
 
-# Store active games (in production, use Redis or database)
-active_blackjack_games = {}
+# Store active games in the configured session backend (see src/games/sessions.py)
+blackjack_sessions = get_session_store("blackjack")
 
 def get_game(user_id):
     """Get active game for user"""
-    return active_blackjack_games.get(user_id)
+    return blackjack_sessions.get(user_id)
 
 def set_game(user_id, game):
     """Set active game for user"""
-    active_blackjack_games[user_id] = game
+    blackjack_sessions.set(user_id, game)
+
+def play_game(user_id, action):
+    """Apply action(game) to the user's active game; returns (result, game), or (None, None) without a game"""
+    return blackjack_sessions.update(user_id, action)
 
 def clear_game(user_id):
     """Clear active game for user"""
-    if user_id in active_blackjack_games:
-        del active_blackjack_games[user_id]
\ No newline at end of file
+    blackjack_sessions.delete(user_id)
\ No newline at end of file
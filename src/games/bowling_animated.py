@@ -2,7 +2,7 @@ import random
 import asyncio
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from src.database import get_user, update_user_balance, record_transaction, record_game
+from src.database import get_user_balance, settle_balance, record_transaction, record_game
 from src.utils.formatting import format_money
 
 # Active bowling competitions
@@ -117,7 +117,7 @@ async def bowling_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def execute_solo_bowling_game(query, bet_amount: float):
     """Execute a solo bowling game with animation"""
-    user = await get_user(query.from_user.id)
+    user = await get_user_balance(query.from_user.id)
     
     if user["balance"] < bet_amount:
         await query.edit_message_text(
@@ -128,7 +128,7 @@ async def execute_solo_bowling_game(query, bet_amount: float):
         return
     
     # Deduct bet amount
-    await update_user_balance(user["user_id"], -bet_amount)
+    user = await settle_balance(user["user_id"], -bet_amount)
     await record_transaction(user["user_id"], -bet_amount, "bowling bet", "Solo bowling game")
     
     # Show bowling animation
@@ -160,12 +160,9 @@ async def execute_solo_bowling_game(query, bet_amount: float):
     )
     
     if winnings > 0:
-        await update_user_balance(user["user_id"], winnings)
+        user = await settle_balance(user["user_id"], winnings)
         await record_transaction(user["user_id"], winnings, "bowling win", f"Game ID: {game_id}")
     
-    # Get updated balance
-    user = await get_user(user["user_id"])
-    
     # Show result
     if winnings > 0:
         result_text = (
@@ -2,7 +2,7 @@ import random
 import asyncio
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from src.database import get_user, update_user_balance, record_transaction, record_game
+from src.database import get_user_balance, settle_balance, record_transaction, record_game
 from src.utils.formatting import format_money
 
 # Active coinflip games for multiplayer
@@ -66,7 +66,7 @@ async def coinflip_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def show_solo_coinflip_menu(query):
     """Show solo coinflip betting menu"""
-    user = await get_user(query.from_user.id)
+    user = await get_user_balance(query.from_user.id)
     
     message = (
         f"🪙 **SOLO COINFLIP** 🪙\n\n"
@@ -104,7 +104,7 @@ async def show_solo_coinflip_menu(query):
 
 async def handle_coinflip_bet(query, choice, bet_amount):
     """Handle a coinflip bet"""
-    user = await get_user(query.from_user.id)
+    user = await get_user_balance(query.from_user.id)
     
     if user["balance"] < bet_amount:
         await query.edit_message_text(
@@ -117,7 +117,7 @@ async def handle_coinflip_bet(query, choice, bet_amount):
         return
     
     # Deduct bet amount
-    await update_user_balance(user["user_id"], -bet_amount)
+    user = await settle_balance(user["user_id"], -bet_amount)
     await record_transaction(user["user_id"], -bet_amount, "bet")
     
     # Show betting message
@@ -155,12 +155,9 @@ async def handle_coinflip_bet(query, choice, bet_amount):
     
     # Update balance if won
     if won:
-        await update_user_balance(user["user_id"], winnings)
+        user = await settle_balance(user["user_id"], winnings)
         await record_transaction(user["user_id"], winnings, "win", game_id)
     
-    # Get updated user data
-    user = await get_user(user["user_id"])
-    
     # Create result message
     if won:
         result_message = (
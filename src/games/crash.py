@@ -1,18 +1,55 @@
-import random
 import time
 import math
-from src.database import get_user, update_user_balance, record_transaction, record_game
+import struct
+from src.database import get_user, settle_balance, record_transaction, record_game
+from src.games.sessions import get_session_store
+from src.games.state import register_game_class, encode_choice, decode_choice
+from src.games.fair import fair_rng, register_fair_game
 
 # Store active crash games for webapp
-active_crash_games = {}
+crash_sessions = get_session_store("crash")
 
+@register_fair_game("crash")
+def crash_outcome(rng):
+    """Generate a crash point with house edge from a provably-fair stream"""
+    # House edge of approximately 5%
+    r = rng.random()
+    if r < 0.01:  # 1% chance for a very early crash (below 1.1x)
+        return rng.uniform(1.0, 1.1)
+    elif r < 0.05:  # 4% chance for an early crash (1.1x to 1.5x)
+        return rng.uniform(1.1, 1.5)
+    else:  # 95% chance for a normal distribution
+        return 0.9 / (rng.random() ** 0.7)
+
+def multiplier_at(elapsed):
+    """Multiplier after elapsed seconds; grows exponentially over time"""
+    return 1.0 + (max(elapsed, 0.0) * 0.1) ** 1.5
+
+def crash_elapsed(crash_point):
+    """Seconds after the start at which the multiplier reaches crash_point"""
+    return max(crash_point - 1.0, 0.0) ** (1 / 1.5) / 0.1
+
+@register_game_class
 class CrashGame:
-    def __init__(self, user_id):
+    SESSION_TAG = 3
+    RESULTS = ("win", "crash")
+    # user_id, bet_amount, current_multiplier, crash_point, start_time,
+    # cash_out_multiplier, winnings, flags, result, nonce; NaN stands for None
+    # (-1 for the nonce)
+    _STRUCT = struct.Struct("<qddddddBBq")
+
+    __slots__ = (
+        "user_id", "bet_amount", "is_running", "current_multiplier", "crash_point", "start_time",
+        "cashed_out", "cash_out_multiplier", "game_over", "result", "winnings", "nonce"
+    )
+
+    def __init__(self, user_id, rng=None):
         self.user_id = user_id
         self.bet_amount = 0
         self.is_running = False
         self.current_multiplier = 1.0
-        self.crash_point = self.generate_crash_point()
+        self.nonce = None
+        self.crash_point = self.generate_crash_point(rng)
         self.start_time = None
         self.cashed_out = False
         self.cash_out_multiplier = None
@@ -20,16 +57,12 @@ class CrashGame:
         self.result = None
         self.winnings = 0
     
-    def generate_crash_point(self):
-        """Generate a random crash point with house edge"""
-        # House edge of approximately 5%
-        r = random.random()
-        if r < 0.01:  # 1% chance for a very early crash (below 1.1x)
-            return random.uniform(1.0, 1.1)
-        elif r < 0.05:  # 4% chance for an early crash (1.1x to 1.5x)
-            return random.uniform(1.1, 1.5)
-        else:  # 95% chance for a normal distribution
-            return 0.9 / (random.random() ** 0.7)
+    def generate_crash_point(self, rng=None):
+        """Generate the crash point from the user's next provably-fair nonce"""
+        if rng is None:
+            rng = fair_rng.draw(self.user_id)
+        self.nonce = getattr(rng, "nonce", None)
+        return crash_outcome(rng)
     
     def start_game(self, bet_amount):
         """Start a new crash game"""
@@ -49,9 +82,7 @@ class CrashGame:
         if not self.is_running or self.game_over:
             return self.current_multiplier
         
-        elapsed = time.time() - self.start_time
-        # Multiplier grows exponentially over time
-        self.current_multiplier = 1.0 + (elapsed * 0.1) ** 1.5
+        self.current_multiplier = multiplier_at(time.time() - self.start_time)
         
         # Check if we've reached the crash point
         if self.current_multiplier >= self.crash_point:
@@ -81,33 +112,52 @@ class CrashGame:
             self.winnings = 0
         
         return True
+    
+    def to_bytes(self):
+        """Pack the game into a fixed-size record"""
+        flags = self.is_running | self.cashed_out << 1 | self.game_over << 2
+        return self._STRUCT.pack(
+            int(self.user_id), self.bet_amount, self.current_multiplier, self.crash_point,
+            math.nan if self.start_time is None else self.start_time,
+            math.nan if self.cash_out_multiplier is None else self.cash_out_multiplier,
+            self.winnings, flags, encode_choice(self.result, self.RESULTS),
+            -1 if self.nonce is None else self.nonce
+        )
+    
+    @classmethod
+    def from_bytes(cls, data):
+        """Rebuild a game packed by to_bytes"""
+        game = cls.__new__(cls)
+        (game.user_id, game.bet_amount, game.current_multiplier, game.crash_point, start_time,
+         cash_out_multiplier, game.winnings, flags, result, nonce) = cls._STRUCT.unpack(data)
+        game.nonce = None if nonce < 0 else nonce
+        game.start_time = None if math.isnan(start_time) else start_time
+        game.cash_out_multiplier = None if math.isnan(cash_out_multiplier) else cash_out_multiplier
+        game.is_running = bool(flags & 1)
+        game.cashed_out = bool(flags & 2)
+        game.game_over = bool(flags & 4)
+        game.result = decode_choice(result, cls.RESULTS)
+        return game
 
 def create_crash_game(user_id, bet_amount):
     """Create a new crash game"""
     game = CrashGame(user_id)
     game.start_game(bet_amount)
-    active_crash_games[user_id] = game
+    crash_sessions.set(user_id, game)
     return game
 
 def get_crash_game(user_id):
     """Get active crash game for user"""
-    return active_crash_games.get(user_id)
+    return crash_sessions.get(user_id)
 
 def update_crash_game(user_id):
     """Update crash game state"""
-    game = active_crash_games.get(user_id)
-    if game:
-        game.update_multiplier()
-    return game
+    return crash_sessions.update(user_id, lambda game: game.update_multiplier())[1]
 
 def cash_out_crash(user_id):
-    """Cash out from crash game"""
-    game = active_crash_games.get(user_id)
-    if game:
-        return game.cash_out()
-    return False
+    """Cash out from crash game; returns (result, game), or (None, None) without a game"""
+    return crash_sessions.update(user_id, lambda game: game.cash_out())
 
 def clear_crash_game(user_id):
     """Clear crash game for user"""
-    if user_id in active_crash_games:
-        del active_crash_games[user_id]
\ No newline at end of file
+    crash_sessions.delete(user_id)
\ No newline at end of file
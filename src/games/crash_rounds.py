@@ -0,0 +1,486 @@
+import os
+import json
+import time
+import secrets
+import itertools
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, Any, Callable, List, Optional
+from pymongo.errors import DuplicateKeyError
+from src.utils.logger import webapp_logger
+from src.utils.error_handler import GameError
+from src.games.crash import multiplier_at, crash_elapsed
+from src.games.fair import CrashHashChain, crash_chain, crash_point_from_hash
+
+# Seconds bets are open before each round takes off
+CRASH_BETTING_SECONDS = float(os.getenv("CRASH_BETTING_SECONDS", "5"))
+# How often the multiplier is pushed to connected clients while a round runs
+CRASH_TICK_INTERVAL = float(os.getenv("CRASH_TICK_INTERVAL", "0.1"))
+# Pause between a crash and the next betting phase
+CRASH_PAUSE_SECONDS = float(os.getenv("CRASH_PAUSE_SECONDS", "3"))
+# Seconds between comment lines keeping idle event streams open through proxies
+CRASH_STREAM_KEEPALIVE = 15.0
+# Recent events kept for streams that fell behind
+CRASH_EVENT_HISTORY = 32
+# Finished rounds listed for verification
+CRASH_ROUND_HISTORY = 50
+# Seconds the round owner's claim lasts without renewal; another worker may take over once it lapses
+CRASH_OWNER_TTL = float(os.getenv("CRASH_OWNER_TTL", "30"))
+# Settlement attempts right after a crash; a round that still fails is retried from the journal every round
+CRASH_SETTLE_ATTEMPTS = 3
+
+class RoundBet:
+    """One player's stake in a crash round"""
+
+    __slots__ = ("user_id", "amount", "auto_cashout", "cash_out_multiplier", "confirmed")
+
+    def __init__(self, user_id: int, amount: float, auto_cashout: Optional[float] = None):
+        self.user_id = user_id
+        self.amount = amount
+        self.auto_cashout = auto_cashout
+        self.cash_out_multiplier: Optional[float] = None
+        # Set once the stake has been debited
+        self.confirmed = False
+
+    @property
+    def winnings(self) -> float:
+        return self.amount * self.cash_out_multiplier if self.cash_out_multiplier else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "user_id": self.user_id,
+            "amount": self.amount,
+            "auto_cashout": self.auto_cashout,
+            "cash_out_multiplier": self.cash_out_multiplier,
+            "winnings": self.winnings
+        }
+
+class CrashRound:
+    """One round on the shared clock: every bet rides the same curve and crash point"""
+
+    __slots__ = ("round_id", "round_key", "crash_point", "game_hash", "phase", "betting_ends_at", "start_time", "crash_time", "bets")
+
+    def __init__(self, round_id: int, crash_point: float, betting_ends_at: float, game_hash: Optional[str] = None, round_key: Optional[str] = None):
+        self.round_id = round_id
+        # Unique across workers and restarts; settlement credits each bet once per key
+        self.round_key = round_key or secrets.token_hex(12)
+        self.crash_point = crash_point
+        # Hash chain entry the crash point was derived from
+        self.game_hash = game_hash
+        self.phase = "betting"
+        self.betting_ends_at = betting_ends_at
+        self.start_time: Optional[float] = None
+        self.crash_time: Optional[float] = None
+        self.bets: Dict[int, RoundBet] = {}
+
+    def multiplier(self, now: float) -> float:
+        if self.phase == "betting" or self.start_time is None:
+            return 1.0
+        if self.phase == "crashed":
+            return self.crash_point
+        return min(multiplier_at(now - self.start_time), self.crash_point)
+
+    def snapshot(self, now: float) -> Dict[str, Any]:
+        """Public round state; the crash point and hash are only revealed after the crash"""
+        crashed = self.phase == "crashed"
+        return {
+            "round_id": self.round_id,
+            "phase": self.phase,
+            "server_time": now,
+            "betting_ends_at": self.betting_ends_at,
+            "start_time": self.start_time,
+            "multiplier": self.multiplier(now),
+            "crash_point": self.crash_point if crashed else None,
+            "hash": self.game_hash if crashed else None,
+            "players": len(self.bets)
+        }
+
+def journal_bets(bets: List[RoundBet]) -> List[Dict[str, Any]]:
+    return [{"user_id": bet.user_id, "amount": bet.amount, "auto_cashout": bet.auto_cashout, "cash_out_multiplier": bet.cash_out_multiplier} for bet in bets]
+
+def restore_round(document: Dict[str, Any]):
+    """(round, bets) of a journaled round; a round that never finished is refunded"""
+    crash_round = CrashRound(document["round_id"], document["crash_point"], 0.0, document.get("hash"), document["_id"])
+    bets = []
+    for saved in document["bets"]:
+        bet = RoundBet(saved["user_id"], saved["amount"], saved.get("auto_cashout"))
+        bet.cash_out_multiplier = saved.get("cash_out_multiplier")
+        bet.confirmed = True
+        bets.append(bet)
+    if document["status"] == "running":
+        crash_round.phase = "interrupted"
+        for bet in bets:
+            bet.cash_out_multiplier = 1.0
+    else:
+        crash_round.phase = "crashed"
+    return crash_round, bets
+
+class MemoryRoundJournal:
+    """Round journal for one process: settlement retries, but nothing survives a restart"""
+
+    def __init__(self):
+        self._rounds: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def claim(self, owner: str, ttl: float) -> bool:
+        return True
+
+    def open(self, crash_round: CrashRound, bets: List[RoundBet]):
+        with self._lock:
+            self._rounds[crash_round.round_key] = {
+                "_id": crash_round.round_key, "round_id": crash_round.round_id, "hash": crash_round.game_hash,
+                "crash_point": crash_round.crash_point, "status": "running", "bets": journal_bets(bets)
+            }
+
+    def close(self, crash_round: CrashRound, bets: List[RoundBet]):
+        with self._lock:
+            self._rounds[crash_round.round_key].update(status="crashed", bets=journal_bets(bets))
+
+    def settled(self, crash_round: CrashRound):
+        with self._lock:
+            self._rounds.pop(crash_round.round_key, None)
+
+    def unsettled(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(document) for document in self._rounds.values()]
+
+class MongoRoundJournal:
+    """Crash rounds in a Mongo collection: the bets of every unsettled round and
+    which worker process owns the rounds"""
+
+    OWNER_ID = "owner"
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def claim(self, owner: str, ttl: float) -> bool:
+        """Take or renew ownership of the rounds; False while another worker holds it"""
+        now = datetime.utcnow()
+        try:
+            self.collection.update_one(
+                {"_id": self.OWNER_ID, "$or": [{"owner": owner}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=ttl)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+    def open(self, crash_round: CrashRound, bets: List[RoundBet]):
+        self.collection.insert_one({
+            "_id": crash_round.round_key,
+            "round_id": crash_round.round_id,
+            "hash": crash_round.game_hash,
+            "crash_point": crash_round.crash_point,
+            "status": "running",
+            "bets": journal_bets(bets),
+            "started_at": datetime.utcnow()
+        })
+
+    def close(self, crash_round: CrashRound, bets: List[RoundBet]):
+        self.collection.update_one({"_id": crash_round.round_key}, {"$set": {"status": "crashed", "bets": journal_bets(bets)}})
+
+    def settled(self, crash_round: CrashRound):
+        self.collection.update_one({"_id": crash_round.round_key}, {"$set": {"status": "settled", "settled_at": datetime.utcnow()}})
+
+    def unsettled(self) -> List[Dict[str, Any]]:
+        return list(self.collection.find({"status": {"$in": ["running", "crashed"]}}))
+
+class CrashRoundEngine:
+    """Process-wide crash rounds with bulk settlement and pushed multiplier ticks.
+
+    One thread drives the rounds; clients follow them through subscribe()
+    instead of polling, so the work per tick is one serialized event shared by
+    every stream. The callbacks passed to start() move the money:
+
+    - debit(user_id, amount) takes a stake and returns the new balance
+    - refund(user_id, amount) returns a stake that missed the round
+    - settle(round, bets) pays and records every bet of a finished round at
+      once; it must credit each bet at most once per round.round_key, since a
+      failed round is settled again
+
+    Every round's bets go into the journal before takeoff. A settlement that
+    keeps failing, or a round cut short by a restart, is settled (or refunded,
+    phase "interrupted") from the journal at the start of a later round.
+    Rounds live in the process that owns them: start() refuses to run them
+    while the journal says another worker owns them.
+    """
+
+    def __init__(self, betting_seconds: float = CRASH_BETTING_SECONDS, tick_interval: float = CRASH_TICK_INTERVAL, pause_seconds: float = CRASH_PAUSE_SECONDS, chain: CrashHashChain = crash_chain, crash_point_factory: Optional[Callable[[], float]] = None, owner_ttl: float = CRASH_OWNER_TTL, settle_attempts: int = CRASH_SETTLE_ATTEMPTS):
+        self.betting_seconds = betting_seconds
+        self.tick_interval = tick_interval
+        self.pause_seconds = pause_seconds
+        self.chain = chain
+        # Fixed crash points without a hash, for tests
+        self.crash_point_factory = crash_point_factory
+        # (round_id, hash, crash_point) of finished rounds, newest first
+        self.history: deque = deque(maxlen=CRASH_ROUND_HISTORY)
+        self.round: Optional[CrashRound] = None
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        # Recent (sequence, name, serialized event); streams remember the last sequence they sent
+        self._events: deque = deque(maxlen=CRASH_EVENT_HISTORY)
+        self._sequence = 0
+        # Auto cash-outs of the running round, sorted by target multiplier
+        self._autos: List[RoundBet] = []
+        self._next_auto = 0
+        self._round_ids = itertools.count(1)
+        self._thread: Optional[threading.Thread] = None
+        self._debit: Optional[Callable[[int, float], float]] = None
+        self._refund: Optional[Callable[[int, float], None]] = None
+        self._settle: Optional[Callable[[CrashRound, List[RoundBet]], None]] = None
+        self.journal = MemoryRoundJournal()
+        self.owner = secrets.token_hex(8)
+        self.owner_ttl = owner_ttl
+        self.settle_attempts = settle_attempts
+        self.rounds_played = 0
+        self.bets_settled = 0
+        self.settle_failures = 0
+        self.rounds_recovered = 0
+        self.subscribers = 0
+
+    def start(self, debit: Callable[[int, float], float], refund: Callable[[int, float], None], settle: Callable[[CrashRound, List[RoundBet]], None], journal=None):
+        """Start the round loop once per process; raises GameError if another worker owns the rounds"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if journal is not None:
+                self.journal = journal
+            if not self.journal.claim(self.owner, self.owner_ttl):
+                raise GameError("Crash rounds are run by another worker process")
+            self._debit, self._refund, self._settle = debit, refund, settle
+            self._thread = threading.Thread(target=self._run, name="crash-rounds", daemon=True)
+            self._thread.start()
+
+    def _publish_locked(self, event: str, data: Dict[str, Any]):
+        # Serialized once here and shared by every stream
+        self._sequence += 1
+        self._events.append((self._sequence, event, f"event: {event}\ndata: {json.dumps(data)}\n\n"))
+        self._changed.notify_all()
+
+    def _run(self):
+        while True:
+            try:
+                if not self.journal.claim(self.owner, self.owner_ttl):
+                    webapp_logger.error("Another worker took over the crash rounds, stopping here")
+                    return
+                self.play_round()
+            except Exception as e:
+                webapp_logger.error(f"Crash round failed: {e}")
+                time.sleep(self.pause_seconds or 1.0)
+
+    def _settle_round(self, crash_round: CrashRound, bets: List[RoundBet], attempts: int = 1) -> bool:
+        """Pay a round and mark it settled in the journal; False leaves it for a later retry"""
+        for attempt in range(attempts):
+            try:
+                if bets:
+                    self._settle(crash_round, bets)
+                self.journal.settled(crash_round)
+                return True
+            except Exception as e:
+                webapp_logger.error(f"Crash round {crash_round.round_key} settlement failed (attempt {attempt + 1}): {e}")
+                if attempt + 1 < attempts:
+                    time.sleep(2 ** attempt)
+        self.settle_failures += 1
+        return False
+
+    def recover(self):
+        """Settle every journaled round a failure or restart left unpaid"""
+        for document in self.journal.unsettled():
+            crash_round, bets = restore_round(document)
+            if self._settle_round(crash_round, bets):
+                self.rounds_recovered += 1
+                webapp_logger.info(f"Recovered crash round {crash_round.round_key} ({crash_round.phase}, {len(bets)} bets)")
+
+    def play_round(self):
+        """Run one betting phase, flight and settlement on the calling thread"""
+        self.recover()
+        if self.crash_point_factory:
+            crash_point, game_hash = self.crash_point_factory(), None
+        else:
+            game_hash = self.chain.next()
+            crash_point = crash_point_from_hash(game_hash, self.chain.salt)
+        now = time.time()
+        crash_round = CrashRound(next(self._round_ids), crash_point, now + self.betting_seconds, game_hash)
+        with self._lock:
+            self.round = crash_round
+            self._publish_locked("betting", crash_round.snapshot(now))
+        time.sleep(self.betting_seconds)
+
+        with self._lock:
+            # Stakes still being debited missed the round and are refunded by place_bet
+            for user_id in [user_id for user_id, bet in crash_round.bets.items() if not bet.confirmed]:
+                del crash_round.bets[user_id]
+            crash_round.phase = "starting"
+            bets = list(crash_round.bets.values())
+
+        # The stakes are on record before anyone can cash out
+        try:
+            self.journal.open(crash_round, bets)
+        except Exception as e:
+            webapp_logger.error(f"Could not journal crash round {crash_round.round_key}, refunding it: {e}")
+            for bet in bets:
+                self._refund(bet.user_id, bet.amount)
+            with self._lock:
+                crash_round.phase = "cancelled"
+                self._publish_locked("cancelled", {"round_id": crash_round.round_id})
+            time.sleep(self.pause_seconds)
+            return
+
+        with self._lock:
+            crash_round.phase = "running"
+            crash_round.start_time = time.time()
+            crash_round.crash_time = crash_round.start_time + crash_elapsed(crash_round.crash_point)
+            self._autos = sorted((bet for bet in crash_round.bets.values() if bet.auto_cashout), key=lambda bet: bet.auto_cashout)
+            self._next_auto = 0
+            self._publish_locked("start", crash_round.snapshot(crash_round.start_time))
+
+        renewed = time.time()
+        while True:
+            now = time.time()
+            if now >= crash_round.crash_time:
+                break
+            if now - renewed >= self.owner_ttl / 3:
+                # Long flights keep the rounds from being taken over midway
+                try:
+                    self.journal.claim(self.owner, self.owner_ttl)
+                except Exception as e:
+                    webapp_logger.warning(f"Could not renew crash round ownership: {e}")
+                renewed = now
+            with self._lock:
+                multiplier = crash_round.multiplier(now)
+                self._cash_out_autos_locked(multiplier)
+                self._publish_locked("tick", {"round_id": crash_round.round_id, "multiplier": multiplier, "server_time": now})
+            time.sleep(min(self.tick_interval, crash_round.crash_time - now))
+
+        with self._lock:
+            # Targets passed between the last tick and the crash still pay
+            self._cash_out_autos_locked(crash_round.crash_point, inclusive=False)
+            crash_round.phase = "crashed"
+            self.history.appendleft({"round_id": crash_round.round_id, "hash": crash_round.game_hash, "crash_point": crash_round.crash_point})
+            self._publish_locked("crash", crash_round.snapshot(time.time()))
+            bets = list(crash_round.bets.values())
+
+        try:
+            self.journal.close(crash_round, bets)
+        except Exception as e:
+            webapp_logger.error(f"Could not record cash outs of crash round {crash_round.round_key}: {e}")
+        self._settle_round(crash_round, bets, self.settle_attempts)
+        with self._lock:
+            self.rounds_played += 1
+            self.bets_settled += len(bets)
+            self._publish_locked("settled", {"round_id": crash_round.round_id, "crash_point": crash_round.crash_point})
+        time.sleep(self.pause_seconds)
+
+    def _cash_out_autos_locked(self, multiplier: float, inclusive: bool = True):
+        # Only the targets crossed since the last tick are visited
+        while self._next_auto < len(self._autos):
+            bet = self._autos[self._next_auto]
+            if bet.auto_cashout > multiplier or (not inclusive and bet.auto_cashout == multiplier):
+                break
+            if bet.cash_out_multiplier is None:
+                bet.cash_out_multiplier = bet.auto_cashout
+            self._next_auto += 1
+
+    def place_bet(self, user_id: int, amount: float, auto_cashout: Optional[float] = None) -> Dict[str, Any]:
+        """Join the round that is taking bets; returns the round id and new balance"""
+        if amount <= 0:
+            raise GameError("Bet amount must be positive")
+        if auto_cashout is not None and auto_cashout <= 1.0:
+            raise GameError("Auto cashout must be above 1.00x")
+
+        with self._lock:
+            crash_round = self.round
+            if crash_round is None or crash_round.phase != "betting":
+                raise GameError("Betting is closed for this round")
+            if user_id in crash_round.bets:
+                raise GameError("You already have a bet in this round")
+            bet = RoundBet(user_id, amount, auto_cashout)
+            crash_round.bets[user_id] = bet
+
+        # The debit runs outside the lock so one slow write never stalls the round
+        try:
+            balance = self._debit(user_id, amount)
+        except Exception:
+            with self._lock:
+                if crash_round.bets.get(user_id) is bet:
+                    del crash_round.bets[user_id]
+            raise
+
+        with self._lock:
+            joined = crash_round.phase == "betting" and crash_round.bets.get(user_id) is bet
+            if joined:
+                bet.confirmed = True
+        if not joined:
+            self._refund(user_id, amount)
+            raise GameError("Betting closed before your bet was placed")
+        return {"round_id": crash_round.round_id, "balance": balance}
+
+    def cash_out(self, user_id: int) -> RoundBet:
+        """Lock in the current multiplier; the payout is made when the round settles"""
+        with self._lock:
+            crash_round = self.round
+            bet = crash_round.bets.get(user_id) if crash_round else None
+            now = time.time()
+            if bet is None or crash_round.phase != "running" or now >= crash_round.crash_time:
+                raise GameError("No active bet to cash out")
+            if bet.cash_out_multiplier is not None:
+                raise GameError("Already cashed out")
+            bet.cash_out_multiplier = crash_round.multiplier(now)
+            return bet
+
+    def subscribe(self, keepalive: float = CRASH_STREAM_KEEPALIVE):
+        """Server-Sent Events for the rounds, starting with the current state"""
+        with self._lock:
+            self.subscribers += 1
+            sequence = self._sequence
+            current = self.round.snapshot(time.time()) if self.round else None
+        try:
+            if current:
+                yield f"event: round\ndata: {json.dumps(current)}\n\n"
+            while True:
+                with self._changed:
+                    if self._changed.wait_for(lambda: self._sequence != sequence, timeout=keepalive):
+                        pending = [(name, event) for number, name, event in self._events if number > sequence]
+                        sequence = self._sequence
+                    else:
+                        pending = [(None, ": keepalive\n\n")]
+                # Slow clients skip stale ticks but never a phase change
+                for index, (name, event) in enumerate(pending):
+                    if name != "tick" or index == len(pending) - 1:
+                        yield event
+        finally:
+            with self._lock:
+                self.subscribers -= 1
+
+    def get_state(self, user_id: Optional[int] = None) -> Dict[str, Any]:
+        """Current round, plus the caller's bet when user_id is given"""
+        with self._lock:
+            if self.round is None:
+                return {"phase": "idle", "server_time": time.time()}
+            state = self.round.snapshot(time.time())
+            bet = self.round.bets.get(user_id) if user_id is not None else None
+            state["bet"] = bet.to_dict() if bet else None
+            return state
+
+    def get_fairness(self) -> Dict[str, Any]:
+        """Hash chain commitment and the revealed hashes of recent rounds"""
+        with self._lock:
+            rounds = list(self.history)
+        return {"commitment": self.chain.commitment, "salt": self.chain.salt, "rounds": rounds}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get round counters for monitoring"""
+        with self._lock:
+            return {
+                "rounds_played": self.rounds_played,
+                "bets_settled": self.bets_settled,
+                "settle_failures": self.settle_failures,
+                "rounds_recovered": self.rounds_recovered,
+                "subscribers": self.subscribers,
+                "current_players": len(self.round.bets) if self.round else 0
+            }
+
+# Global crash round engine, started by the webapp
+crash_rounds = CrashRoundEngine()
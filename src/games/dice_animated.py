@@ -2,7 +2,7 @@ import random
 import asyncio
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from src.database import get_user, update_user_balance, record_transaction, record_game
+from src.database import get_user_balance, settle_balance, record_transaction, record_game
 from src.utils.formatting import format_money
 
 # Active dice games for multiplayer
@@ -193,7 +193,7 @@ async def dice_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def execute_solo_dice_game(query, choice: int, bet_amount: float):
     """Execute a solo dice game with Telegram animation"""
-    user = await get_user(query.from_user.id)
+    user = await get_user_balance(query.from_user.id)
 
     if user["balance"] < bet_amount:
         await query.edit_message_text(
@@ -204,7 +204,7 @@ async def execute_solo_dice_game(query, choice: int, bet_amount: float):
         return
 
     # Deduct bet amount
-    await update_user_balance(user["user_id"], -bet_amount)
+    user = await settle_balance(user["user_id"], -bet_amount)
     await record_transaction(user["user_id"], -bet_amount, "dice bet", "Solo dice game")
 
     # Show rolling animation
@@ -240,12 +240,9 @@ async def execute_solo_dice_game(query, choice: int, bet_amount: float):
 
     # Update user balance if won
     if won:
-        await update_user_balance(user["user_id"], winnings)
+        user = await settle_balance(user["user_id"], winnings)
         await record_transaction(user["user_id"], winnings, "dice win", f"Game ID: {game_id}")
 
-    # Get updated user data
-    user = await get_user(user["user_id"])
-
     # Create animated result message
     dice_emojis = ["", "⚀", "⚁", "⚂", "⚃", "⚄", "⚅"]
 
@@ -286,7 +283,7 @@ async def execute_solo_dice_game(query, choice: int, bet_amount: float):
 async def handle_dice_bet(query, number: int, bet_amount: float):
     """Handle dice betting from the games menu"""
     user_id = query.from_user.id
-    user = await get_user(user_id)
+    user = await get_user_balance(user_id)
 
     if user["balance"] < bet_amount:
         await query.edit_message_text(
@@ -299,7 +296,7 @@ async def handle_dice_bet(query, number: int, bet_amount: float):
         return
 
     # Deduct bet amount
-    await update_user_balance(user_id, -bet_amount)
+    updated_user = await settle_balance(user_id, -bet_amount)
     await record_transaction(user_id, -bet_amount, "bet")
 
     # Send dice animation
@@ -316,7 +313,7 @@ async def handle_dice_bet(query, number: int, bet_amount: float):
     winnings = bet_amount * 6 if won else 0
 
     if won:
-        await update_user_balance(user_id, winnings)
+        updated_user = await settle_balance(user_id, winnings)
         await record_transaction(user_id, winnings, "win")
 
     # Record game
@@ -329,9 +326,6 @@ async def handle_dice_bet(query, number: int, bet_amount: float):
         game_data={"guess": number, "result": dice_result}
     )
 
-    # Update user balance
-    updated_user = await get_user(user_id)
-
     # Create result message
     if won:
         result_text = (
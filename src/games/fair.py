@@ -0,0 +1,483 @@
+import os
+import hmac
+import random
+import hashlib
+import secrets
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Dict, Any, Callable, Iterable, List, Optional
+from src.utils.logger import webapp_logger
+
+# Where seed pairs live: "mongo" keeps them, "memory" (tests only) forgets unrevealed seeds on restart
+FAIR_SEED_BACKEND = os.getenv("FAIR_SEED_BACKEND", "mongo").lower()
+# Nonces reserved per store write; unused ones are skipped after a restart
+FAIR_NONCE_BLOCK = int(os.getenv("FAIR_NONCE_BLOCK", "64"))
+# Seconds a reserved block may be dealt from; a rotated seed stays hidden until
+# every other process's block has expired
+FAIR_NONCE_LEASE = float(os.getenv("FAIR_NONCE_LEASE", "60"))
+# Revealed seed pairs kept per user for verification
+FAIR_SEED_HISTORY = int(os.getenv("FAIR_SEED_HISTORY", "20"))
+# Seed pairs kept in memory
+FAIR_CACHE_SIZE = 10000
+# Rounds per crash hash chain, and the public salt mixed into every round
+FAIR_CRASH_CHAIN_LENGTH = int(os.getenv("FAIR_CRASH_CHAIN_LENGTH", "100000"))
+FAIR_CRASH_SALT = os.getenv("FAIR_CRASH_SALT", "exowin-crash")
+
+def hash_server_seed(server_seed: str) -> str:
+    """Public commitment to a server seed"""
+    return hashlib.sha256(server_seed.encode()).hexdigest()
+
+def keyed_hmac(server_seed: str):
+    """HMAC keyed with a server seed; copy() it instead of re-deriving the key pads"""
+    return hmac.new(server_seed.encode(), digestmod=hashlib.sha256)
+
+class FairRandom(random.Random):
+    """random.Random drawing from one (server seed, client seed, nonce) stream.
+
+    The stream is HMAC-SHA256(key=server_seed, msg=f"{client_seed}:{nonce}:{cursor}")
+    for cursor = 0, 1, 2, ... Floats take 8 bytes (the top 53 bits over 2**53)
+    and getrandbits(k) takes ceil(k / 8) bytes, so any engine written against
+    the random module can use it and players can replay it once the server
+    seed is revealed.
+    """
+
+    def __init__(self, server_seed: str, client_seed: str, nonce: int, keyed=None):
+        self._keyed = keyed or keyed_hmac(server_seed)
+        self.client_seed = client_seed
+        self.nonce = nonce
+        self._cursor = 0
+        self._buffer = b""
+        super().__init__()
+
+    def seed(self, *args, **kwargs):
+        # The stream is fixed by the seeds; reseeding would break verification
+        pass
+
+    def getstate(self):
+        raise NotImplementedError("FairRandom streams cannot be saved")
+
+    def setstate(self, state):
+        raise NotImplementedError("FairRandom streams cannot be restored")
+
+    def _take(self, count: int) -> bytes:
+        while len(self._buffer) < count:
+            digest = self._keyed.copy()
+            digest.update(f"{self.client_seed}:{self.nonce}:{self._cursor}".encode())
+            self._buffer += digest.digest()
+            self._cursor += 1
+        taken, self._buffer = self._buffer[:count], self._buffer[count:]
+        return taken
+
+    def random(self) -> float:
+        return (int.from_bytes(self._take(8), "big") >> 11) * (1.0 / (1 << 53))
+
+    def getrandbits(self, k: int) -> int:
+        if k <= 0:
+            return 0
+        return int.from_bytes(self._take((k + 7) // 8), "big") >> (-k % 8)
+
+def outcome_batch(server_seed: str, client_seed: str, first_nonce: int, count: int) -> List[FairRandom]:
+    """Streams for count consecutive nonces sharing one keyed HMAC"""
+    keyed = keyed_hmac(server_seed)
+    return [FairRandom(server_seed, client_seed, nonce, keyed) for nonce in range(first_nonce, first_nonce + count)]
+
+# Game name -> function(rng, **params) returning its outcome, for verification
+FAIR_GAMES: Dict[str, Callable[..., Any]] = {}
+# Game name -> param name -> check(name, value) returning the value to replay with
+FAIR_PARAMS: Dict[str, Dict[str, Callable[[str, Any], Any]]] = {}
+
+def register_fair_game(name: str, params: Optional[Dict[str, Callable[[str, Any], Any]]] = None):
+    """Decorator registering a game's outcome function and the params players may pass"""
+    def register(outcome):
+        FAIR_GAMES[name] = outcome
+        FAIR_PARAMS[name] = params or {}
+        return outcome
+    return register
+
+def int_param(low: int, high: int):
+    """Param check for a whole number within [low, high]"""
+    def check(name, value):
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError(f"{name} must be a whole number")
+        if not low <= value <= high:
+            raise ValueError(f"{name} must be between {low} and {high}")
+        return value
+    return check
+
+def float_param(low: float, high: float):
+    """Param check for a number within [low, high]"""
+    def check(name, value):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"{name} must be a number")
+        if not low <= value <= high:
+            raise ValueError(f"{name} must be between {low} and {high}")
+        return value
+    return check
+
+def choice_param(*choices):
+    """Param check for one of a fixed set of values"""
+    def check(name, value):
+        if value not in choices:
+            raise ValueError(f"{name} must be one of {', '.join(map(str, choices))}")
+        return value
+    return check
+
+def check_params(game: str, params: Any) -> Dict[str, Any]:
+    """Params of a verification request, limited to what the game accepts"""
+    if params is None:
+        return {}
+    if not isinstance(params, dict):
+        raise ValueError("params must be an object")
+    accepted = FAIR_PARAMS.get(game, {})
+    unknown = sorted(set(params) - set(accepted))
+    if unknown:
+        raise ValueError(f"Unknown {game} params: {', '.join(map(str, unknown))}")
+    return {name: accepted[name](name, value) for name, value in params.items()}
+
+def verify_outcome(game: str, server_seed: str, client_seed: str, nonce: int, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Replay one game from revealed seeds"""
+    if game not in FAIR_GAMES:
+        raise ValueError(f"Unknown game {game!r}")
+    outcome = FAIR_GAMES[game](FairRandom(server_seed, client_seed, nonce), **check_params(game, params))
+    return {"game": game, "server_seed_hash": hash_server_seed(server_seed), "client_seed": client_seed, "nonce": nonce, "outcome": outcome}
+
+def new_seed_pair(next_nonce: int = 0, client_seed: Optional[str] = None) -> Dict[str, Any]:
+    server_seed = secrets.token_hex(32)
+    return {
+        "server_seed": server_seed,
+        "server_seed_hash": hash_server_seed(server_seed),
+        "client_seed": client_seed or secrets.token_hex(8),
+        "first_nonce": next_nonce,
+        "next_nonce": next_nonce,
+        "leases": {},
+        "created_at": datetime.utcnow()
+    }
+
+class SeedPairInUse(RuntimeError):
+    """The current seed pair still has unfinished games dealt from it"""
+
+def public_seed_pair(pair: Dict[str, Any], now: datetime, live_nonces: Iterable[int] = ()) -> Dict[str, Any]:
+    """A rotated pair, without its server seed while it is still retiring.
+
+    A pair stays retiring while a block leased from it is live, or while an
+    unfinished game dealt from one of its nonces is.
+    """
+    dealt = any(pair.get("first_nonce", 0) <= nonce <= pair.get("last_nonce", -1) for nonce in live_nonces)
+    if dealt or (pair.get("reveal_at") and pair["reveal_at"] > now):
+        pair = {key: value for key, value in pair.items() if key != "server_seed"}
+        pair["retiring"] = True
+    return pair
+
+class MemorySeedStore:
+    """Seed pairs in this process only; unrevealed seeds die with it"""
+
+    def __init__(self):
+        self._pairs: Dict[int, Dict[str, Any]] = {}
+        self._history: Dict[int, deque] = {}
+        self._lock = threading.Lock()
+
+    def load(self, user_id: int) -> Dict[str, Any]:
+        """The user's current seed pair, created on first use"""
+        with self._lock:
+            if user_id not in self._pairs:
+                self._pairs[user_id] = new_seed_pair()
+            return dict(self._pairs[user_id])
+
+    def reserve(self, user_id: int, server_seed_hash: str, count: int, holder: str, lease_until: datetime) -> Optional[int]:
+        """First of count fresh nonces leased to holder, or None if the seed was rotated meanwhile"""
+        with self._lock:
+            pair = self._pairs.get(user_id)
+            if pair is None or pair["server_seed_hash"] != server_seed_hash:
+                return None
+            first = pair["next_nonce"]
+            pair["next_nonce"] += count
+            pair["leases"][holder] = lease_until
+            return first
+
+    def rotate(self, user_id: int, server_seed_hash: str, client_seed: Optional[str], holder: str) -> Optional[Dict[str, Any]]:
+        """Retire the current pair and start a new one; None if it already changed.
+
+        The retired pair is revealed once the blocks other holders leased
+        from it have expired.
+        """
+        with self._lock:
+            pair = self._pairs.get(user_id)
+            if pair is None or pair["server_seed_hash"] != server_seed_hash:
+                return None
+            now = datetime.utcnow()
+            others = [until for key, until in pair["leases"].items() if key != holder]
+            revealed = {key: value for key, value in pair.items() if key != "leases"}
+            revealed.update(last_nonce=pair["next_nonce"] - 1, revealed_at=now, reveal_at=max(others + [now]))
+            self._history.setdefault(user_id, deque(maxlen=FAIR_SEED_HISTORY)).appendleft(revealed)
+            self._pairs[user_id] = new_seed_pair(pair["next_nonce"], client_seed)
+            return revealed
+
+    def history(self, user_id: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._history.get(user_id, ()))
+
+class MongoSeedStore:
+    """Seed pairs in a Mongo collection, one document per user with its revealed history"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def load(self, user_id: int) -> Dict[str, Any]:
+        pair = new_seed_pair()
+        # Concurrent first uses agree on whichever pair was inserted first
+        self.collection.update_one({"_id": user_id}, {"$setOnInsert": dict(pair, history=[])}, upsert=True)
+        return self.collection.find_one({"_id": user_id}, {"history": 0})
+
+    def reserve(self, user_id: int, server_seed_hash: str, count: int, holder: str, lease_until: datetime) -> Optional[int]:
+        before = self.collection.find_one_and_update(
+            {"_id": user_id, "server_seed_hash": server_seed_hash},
+            {"$inc": {"next_nonce": count}, "$set": {f"leases.{holder}": lease_until}},
+            projection={"next_nonce": 1}
+        )
+        return before["next_nonce"] if before else None
+
+    def rotate(self, user_id: int, server_seed_hash: str, client_seed: Optional[str], holder: str) -> Optional[Dict[str, Any]]:
+        pair = new_seed_pair(0, client_seed)
+        now = datetime.utcnow()
+        # Latest block another holder may still deal from; $max skips the null of an empty list
+        other_leases = {"$map": {
+            "input": {"$filter": {
+                "input": {"$objectToArray": {"$ifNull": ["$leases", {}]}},
+                "cond": {"$ne": ["$$this.k", holder]}
+            }},
+            "in": "$$this.v"
+        }}
+        # One pipeline update moves the current pair into history and starts
+        # the new one at the stored nonce counter
+        before = self.collection.find_one_and_update(
+            {"_id": user_id, "server_seed_hash": server_seed_hash},
+            [{"$set": {
+                "history": {"$slice": [{"$concatArrays": [[{
+                    "server_seed": "$server_seed",
+                    "server_seed_hash": "$server_seed_hash",
+                    "client_seed": "$client_seed",
+                    "first_nonce": "$first_nonce",
+                    "last_nonce": {"$subtract": ["$next_nonce", 1]},
+                    "created_at": "$created_at",
+                    "revealed_at": now,
+                    "reveal_at": {"$max": [now, {"$max": other_leases}]}
+                }], "$history"]}, FAIR_SEED_HISTORY]},
+                "server_seed": pair["server_seed"],
+                "server_seed_hash": pair["server_seed_hash"],
+                "client_seed": {"$literal": pair["client_seed"]},
+                "first_nonce": "$next_nonce",
+                "leases": {"$literal": {}},
+                "created_at": now
+            }}],
+            projection={"history": 0}
+        )
+        if before is None:
+            return None
+        leases = before.pop("leases", None) or {}
+        before.pop("_id", None)
+        others = [until for key, until in leases.items() if key != holder]
+        return dict(before, last_nonce=before["next_nonce"] - 1, revealed_at=now, reveal_at=max(others + [now]))
+
+    def history(self, user_id: int) -> List[Dict[str, Any]]:
+        document = self.collection.find_one({"_id": user_id}, {"history": 1})
+        return document.get("history", []) if document else []
+
+class SeedPair:
+    """Cached current seed pair of one user with its reserved nonce block"""
+
+    __slots__ = ("server_seed", "server_seed_hash", "client_seed", "keyed", "next_nonce", "limit", "expires")
+
+    def __init__(self, state: Dict[str, Any]):
+        self.server_seed = state["server_seed"]
+        self.server_seed_hash = state["server_seed_hash"]
+        self.client_seed = state["client_seed"]
+        self.keyed = keyed_hmac(self.server_seed)
+        # Nothing reserved yet
+        self.next_nonce = 0
+        self.limit = 0
+        self.expires = datetime.min
+
+class FairRNG:
+    """Per-user provably-fair streams.
+
+    Nonces are reserved from the store in blocks, so a store write happens
+    once per block instead of once per game, and each user's HMAC key is
+    derived once and reused. Each block is leased to this process; a seed
+    rotated elsewhere stays hidden until the lease runs out, and the block
+    is not dealt from past half its lease.
+    """
+
+    def __init__(self, store=None, block_size: int = FAIR_NONCE_BLOCK, cache_size: int = FAIR_CACHE_SIZE, lease: float = FAIR_NONCE_LEASE):
+        self._store = store
+        self.block_size = block_size
+        self.cache_size = cache_size
+        self.lease = lease
+        self._holder = None
+        self._holder_pid = None
+        self._pairs: "OrderedDict[int, SeedPair]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.draws = 0
+        self.reservations = 0
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = create_seed_store()
+        return self._store
+
+    @property
+    def holder(self) -> str:
+        """Lease holder id of this process, renewed in forked children"""
+        if self._holder_pid != os.getpid():
+            self._holder, self._holder_pid = secrets.token_hex(8), os.getpid()
+            self._pairs.clear()
+        return self._holder
+
+    def _pair_locked(self, user_id: int) -> SeedPair:
+        pair = self._pairs.get(user_id)
+        if pair is None:
+            pair = self._pairs[user_id] = SeedPair(self.store.load(user_id))
+            while len(self._pairs) > self.cache_size:
+                self._pairs.popitem(last=False)
+        self._pairs.move_to_end(user_id)
+        return pair
+
+    def _reserve_locked(self, user_id: int, count: int) -> SeedPair:
+        holder = self.holder
+        pair = self._pair_locked(user_id)
+        now = datetime.utcnow()
+        if pair.limit - pair.next_nonce >= count and now < pair.expires:
+            return pair
+        size = max(count, self.block_size)
+        lease_until = now + timedelta(seconds=self.lease)
+        first = self.store.reserve(user_id, pair.server_seed_hash, size, holder, lease_until)
+        if first is None:
+            # Rotated by another process; pick up the new seed
+            self._pairs.pop(user_id, None)
+            pair = self._pair_locked(user_id)
+            first = self.store.reserve(user_id, pair.server_seed_hash, size, holder, lease_until)
+            if first is None:
+                raise RuntimeError(f"Seed pair for user {user_id} keeps changing")
+        self.reservations += 1
+        # Half the lease leaves room for clock skew between workers
+        pair.next_nonce, pair.limit = first, first + size
+        pair.expires = now + timedelta(seconds=self.lease / 2)
+        return pair
+
+    def draw(self, user_id: int) -> FairRandom:
+        """Stream for the user's next game"""
+        return self.batch(user_id, 1)[0]
+
+    def batch(self, user_id: int, count: int) -> List[FairRandom]:
+        """Streams for the user's next count games, reserved in one go"""
+        with self._lock:
+            pair = self._reserve_locked(user_id, count)
+            first = pair.next_nonce
+            pair.next_nonce += count
+            self.draws += count
+        return [FairRandom(pair.server_seed, pair.client_seed, nonce, pair.keyed) for nonce in range(first, first + count)]
+
+    def get_seeds(self, user_id: int, live_nonces: Iterable[int] = ()) -> Dict[str, Any]:
+        """Public side of the current pair plus the revealed history.
+
+        live_nonces are the nonces of the user's unfinished games; pairs they
+        were dealt from keep their server seed hidden.
+        """
+        with self._lock:
+            pair = self._pair_locked(user_id)
+            current = {"server_seed_hash": pair.server_seed_hash, "client_seed": pair.client_seed}
+        now = datetime.utcnow()
+        live_nonces = list(live_nonces)
+        return {"current": current, "revealed": [public_seed_pair(revealed, now, live_nonces) for revealed in self.store.history(user_id)]}
+
+    def rotate(self, user_id: int, client_seed: Optional[str] = None, live_nonces: Iterable[int] = ()) -> Dict[str, Any]:
+        """Retire the current server seed and start a new pair.
+
+        Refused with SeedPairInUse while the user has unfinished games
+        (live_nonces). The old seed is revealed right away unless another
+        process still holds a block of it, in which case it shows up in the
+        history once that block's lease has run out.
+        """
+        if client_seed is not None and not 0 < len(client_seed) <= 64:
+            raise ValueError("Client seed must be 1-64 characters")
+        live_nonces = list(live_nonces)
+        if live_nonces:
+            raise SeedPairInUse("Finish your active games before rotating seeds")
+        with self._lock:
+            holder = self.holder
+            pair = self._pair_locked(user_id)
+            revealed = self.store.rotate(user_id, pair.server_seed_hash, client_seed, holder)
+            # Reload even when another process rotated first
+            self._pairs.pop(user_id, None)
+            current = self._pair_locked(user_id)
+        if revealed is None:
+            raise RuntimeError("Seed pair changed while rotating, try again")
+        webapp_logger.info(f"Rotated provably-fair seed for user {user_id}")
+        return {"revealed": public_seed_pair(revealed, datetime.utcnow()), "current": {"server_seed_hash": current.server_seed_hash, "client_seed": current.client_seed}}
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"cached_pairs": len(self._pairs), "draws": self.draws, "reservations": self.reservations}
+
+def create_seed_store(kind: str = FAIR_SEED_BACKEND):
+    """Build the configured seed store"""
+    if kind == "mongo":
+        from src.database.client import get_sync_client, DATABASE_NAME
+        return MongoSeedStore(get_sync_client()[DATABASE_NAME]["fair_seeds"])
+    if kind != "memory":
+        raise ValueError(f"Unknown FAIR_SEED_BACKEND {kind!r}")
+    webapp_logger.warning("Provably-fair seeds are kept in memory; unrevealed seeds are lost on restart")
+    return MemorySeedStore()
+
+class CrashHashChain:
+    """Crash round hashes: sha256 applied length times to a secret seed, used backwards.
+
+    The hash after the first round's is published up front; each revealed
+    round hash must sha256 to the one revealed before it.
+    """
+
+    def __init__(self, length: int = FAIR_CRASH_CHAIN_LENGTH, salt: str = FAIR_CRASH_SALT):
+        self.length = length
+        self.salt = salt
+        self._hashes: List[str] = []
+        self.commitment: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def _build_locked(self):
+        current = secrets.token_hex(32)
+        hashes = []
+        for _ in range(self.length):
+            current = hashlib.sha256(current.encode()).hexdigest()
+            hashes.append(current)
+        # Rounds pop from the end, so the first round gets the last hash
+        self.commitment = hashlib.sha256(hashes[-1].encode()).hexdigest()
+        self._hashes = hashes
+        webapp_logger.info(f"Built crash hash chain of {self.length} rounds, commitment {self.commitment}")
+
+    def next(self) -> str:
+        """Hash for the next round"""
+        with self._lock:
+            if not self._hashes:
+                self._build_locked()
+            return self._hashes.pop()
+
+    def remaining(self) -> int:
+        with self._lock:
+            return len(self._hashes)
+
+def crash_point_from_hash(game_hash: str, salt: str = FAIR_CRASH_SALT) -> float:
+    """Crash point of a round: the round hash stands in for the server seed"""
+    return FAIR_GAMES["crash"](FairRandom(game_hash, salt, 0))
+
+def verify_crash_round(game_hash: str, salt: str = FAIR_CRASH_SALT) -> Dict[str, Any]:
+    """Crash point of a revealed round and the hash of the round before it"""
+    return {
+        "hash": game_hash,
+        "crash_point": crash_point_from_hash(game_hash, salt),
+        "previous_hash": hashlib.sha256(game_hash.encode()).hexdigest()
+    }
+
+# Global provably-fair services
+fair_rng = FairRNG()
+crash_chain = CrashHashChain()
@@ -2,7 +2,7 @@ import random
 import asyncio
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from src.database import get_user, update_user_balance, record_transaction, record_game
+from src.database import get_user_balance, settle_balance, record_transaction, record_game
 from src.utils.formatting import format_money
 
 # Active football competitions
@@ -15,11 +15,6 @@ FOOTBALL_SCORING = {
     3: {"name": "Close", "multiplier": 2, "emoji": "🟡"},
     4: {"name": "Good Goal", "multiplier": 4, "emoji": "🟢"},
     5: {"name": "Perfect Goal", "multiplier": 8, "emoji": "⚽"}
-    # Handle both direct commands and callback queries
-    if update.message:
-        pass
-    elif update.callback_query:
-        update.message = update.callback_query.message
 }
 
 async def football_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -114,7 +109,7 @@ async def football_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def execute_solo_football_game(query, bet_amount: float):
     """Execute a solo football game with animation"""
-    user = await get_user(query.from_user.id)
+    user = await get_user_balance(query.from_user.id)
     
     if user["balance"] < bet_amount:
         await query.edit_message_text(
@@ -125,7 +120,7 @@ async def execute_solo_football_game(query, bet_amount: float):
         return
     
     # Deduct bet amount
-    await update_user_balance(user["user_id"], -bet_amount)
+    user = await settle_balance(user["user_id"], -bet_amount)
     await record_transaction(user["user_id"], -bet_amount, "football bet", "Solo football game")
     
     # Show kicking animation
@@ -157,12 +152,9 @@ async def execute_solo_football_game(query, bet_amount: float):
     )
     
     if winnings > 0:
-        await update_user_balance(user["user_id"], winnings)
+        user = await settle_balance(user["user_id"], winnings)
         await record_transaction(user["user_id"], winnings, "football win", f"Game ID: {game_id}")
     
-    # Get updated balance
-    user = await get_user(user["user_id"])
-    
     # Show result
     if winnings > 0:
         result_text = (
@@ -1,8 +1,20 @@
-import random
-from src.database import get_user, update_user_balance, record_transaction, record_game
+from src.database import get_user, settle_balance, record_transaction, record_game
+from src.games.sessions import get_session_store
+from src.games.fair import fair_rng, register_fair_game
 
 # Store active lottery games for webapp
-active_lottery_games = {}
+lottery_sessions = get_session_store("lottery")
+
+@register_fair_game("lottery")
+def lottery_outcome(rng):
+    """Six winning numbers from 1-49 and a bonus number from the rest"""
+    # Draw 6 winning numbers from 1-49
+    all_numbers = list(range(1, 50))
+    winning_numbers = sorted(rng.sample(all_numbers, 6))
+    
+    # Draw bonus number from remaining numbers
+    remaining_numbers = [n for n in all_numbers if n not in winning_numbers]
+    return {'winning_numbers': winning_numbers, 'bonus_number': rng.choice(remaining_numbers)}
 
 class LotteryGame:
     def __init__(self, user_id):
@@ -15,6 +27,7 @@ class LotteryGame:
         self.game_over = False
         self.result = None
         self.winnings = 0
+        self.nonce = None
         self.payout_multipliers = {
             6: 1000,  # Jackpot
             5: 100,   # 5 matches
@@ -44,18 +57,17 @@ class LotteryGame:
         self.selected_numbers = sorted(numbers)
         return True
     
-    def draw_numbers(self):
+    def draw_numbers(self, rng=None):
         """Draw winning lottery numbers"""
         if self.game_over or not self.selected_numbers:
             return False
         
-        # Draw 6 winning numbers from 1-49
-        all_numbers = list(range(1, 50))
-        self.winning_numbers = sorted(random.sample(all_numbers, 6))
-        
-        # Draw bonus number from remaining numbers
-        remaining_numbers = [n for n in all_numbers if n not in self.winning_numbers]
-        self.bonus_number = random.choice(remaining_numbers)
+        if rng is None:
+            rng = fair_rng.draw(self.user_id)
+        self.nonce = getattr(rng, "nonce", None)
+        drawn = lottery_outcome(rng)
+        self.winning_numbers = drawn['winning_numbers']
+        self.bonus_number = drawn['bonus_number']
         
         # Count matches
         self.matches = len(set(self.selected_numbers) & set(self.winning_numbers))
@@ -84,35 +96,29 @@ class LotteryGame:
             'result': self.result,
             'winnings': self.winnings,
             'bet_amount': self.bet_amount,
-            'payout_multipliers': self.payout_multipliers
+            'payout_multipliers': self.payout_multipliers,
+            'nonce': self.nonce
         }
 
 def create_lottery_game(user_id, bet_amount):
     """Create a new lottery game"""
     game = LotteryGame(user_id)
     game.start_game(bet_amount)
-    active_lottery_games[user_id] = game
+    lottery_sessions.set(user_id, game)
     return game
 
 def get_lottery_game(user_id):
     """Get active lottery game for user"""
-    return active_lottery_games.get(user_id)
+    return lottery_sessions.get(user_id)
 
 def select_lottery_numbers(user_id, numbers):
-    """Select numbers for lottery game"""
-    game = active_lottery_games.get(user_id)
-    if game:
-        return game.select_numbers(numbers)
-    return False
+    """Select numbers for lottery game; returns (result, game), or (None, None) without a game"""
+    return lottery_sessions.update(user_id, lambda game: game.select_numbers(numbers))
 
 def draw_lottery_numbers(user_id):
-    """Draw winning lottery numbers"""
-    game = active_lottery_games.get(user_id)
-    if game:
-        return game.draw_numbers()
-    return False
+    """Draw winning lottery numbers; returns (result, game), or (None, None) without a game"""
+    return lottery_sessions.update(user_id, lambda game: game.draw_numbers())
 
 def clear_lottery_game(user_id):
     """Clear lottery game for user"""
-    if user_id in active_lottery_games:
-        del active_lottery_games[user_id]
\ No newline at end of file
+    lottery_sessions.delete(user_id)
\ No newline at end of file
@@ -1,33 +1,69 @@
-import random
-from src.database import get_user, update_user_balance, record_transaction, record_game
+import struct
+from src.database import get_user, settle_balance, record_transaction, record_game
+from src.games.sessions import get_session_store
+from src.games.state import register_game_class, unpack_bits, encode_choice, decode_choice
+from src.games.fair import fair_rng, register_fair_game, int_param
 
 # Store active mines games for webapp
-active_mines_games = {}
+mines_sessions = get_session_store("mines")
 
+@register_fair_game("mines", {"mines_count": int_param(1, 24), "grid_size": int_param(25, 25)})
+def mines_outcome(rng, mines_count=5, grid_size=25):
+    """Mine positions of one game"""
+    return sorted(rng.sample(range(grid_size), mines_count))
+
+@register_game_class
 class MinesGame:
-    def __init__(self, user_id, mines_count=5, grid_size=25):
+    SESSION_TAG = 1
+    RESULTS = ("mine", "cashout")
+    # user_id, mines_count, grid_size, bet_amount, mine_mask, revealed_mask,
+    # gems_found, current_multiplier, flags, result, winnings, nonce (-1 = None)
+    _STRUCT = struct.Struct("<qBBdQQBdBBdq")
+
+    __slots__ = (
+        "user_id", "mines_count", "grid_size", "bet_amount", "mine_mask", "revealed_mask",
+        "gems_found", "current_multiplier", "game_over", "result", "winnings", "cashed_out", "nonce"
+    )
+
+    def __init__(self, user_id, mines_count=5, grid_size=25, rng=None):
         self.user_id = user_id
         self.mines_count = mines_count
         self.grid_size = grid_size
         self.bet_amount = 0
-        self.grid = [False] * grid_size  # False = safe, True = mine
-        self.revealed = [False] * grid_size
-        self.mines_positions = []
+        self.mine_mask = 0  # bit i set = mine on tile i
+        self.revealed_mask = 0
         self.gems_found = 0
         self.current_multiplier = 1.0
         self.game_over = False
         self.result = None
         self.winnings = 0
         self.cashed_out = False
+        self.nonce = None
         
-        # Place mines randomly
-        self.place_mines()
+        # Place mines from the user's provably-fair stream
+        self.place_mines(rng)
+    
+    @property
+    def grid(self):
+        """Tiles as booleans, True = mine"""
+        return unpack_bits(self.mine_mask, self.grid_size)
+    
+    @property
+    def revealed(self):
+        return unpack_bits(self.revealed_mask, self.grid_size)
     
-    def place_mines(self):
-        """Randomly place mines on the grid"""
-        self.mines_positions = random.sample(range(self.grid_size), self.mines_count)
-        for pos in self.mines_positions:
-            self.grid[pos] = True
+    @property
+    def mines_positions(self):
+        return [pos for pos in range(self.grid_size) if self.mine_mask >> pos & 1]
+    
+    def place_mines(self, rng=None):
+        """Place mines on the grid from the user's next provably-fair nonce"""
+        if rng is None:
+            rng = fair_rng.draw(self.user_id)
+        self.nonce = getattr(rng, "nonce", None)
+        self.mine_mask = 0
+        for pos in mines_outcome(rng, self.mines_count, self.grid_size):
+            self.mine_mask |= 1 << pos
     
     def start_game(self, bet_amount):
         """Start a new mines game"""
@@ -36,12 +72,15 @@ class MinesGame:
     
     def reveal_tile(self, position):
         """Reveal a tile on the grid"""
-        if self.game_over or self.revealed[position]:
+        if not 0 <= position < self.grid_size:
+            return False
+        tile = 1 << position
+        if self.game_over or self.revealed_mask & tile:
             return False
         
-        self.revealed[position] = True
+        self.revealed_mask |= tile
         
-        if self.grid[position]:  # Hit a mine
+        if self.mine_mask & tile:  # Hit a mine
             self.game_over = True
             self.result = 'mine'
             self.winnings = 0
@@ -86,35 +125,51 @@ class MinesGame:
             'result': self.result,
             'winnings': self.winnings,
             'bet_amount': self.bet_amount,
-            'cashed_out': self.cashed_out
+            'cashed_out': self.cashed_out,
+            'nonce': self.nonce
         }
+    
+    def to_bytes(self):
+        """Pack the game into a fixed-size record"""
+        flags = self.game_over | self.cashed_out << 1
+        return self._STRUCT.pack(
+            int(self.user_id), self.mines_count, self.grid_size, self.bet_amount, self.mine_mask,
+            self.revealed_mask, self.gems_found, self.current_multiplier, flags,
+            encode_choice(self.result, self.RESULTS), self.winnings, -1 if self.nonce is None else self.nonce
+        )
+    
+    @classmethod
+    def from_bytes(cls, data):
+        """Rebuild a game packed by to_bytes"""
+        game = cls.__new__(cls)
+        (game.user_id, game.mines_count, game.grid_size, game.bet_amount, game.mine_mask,
+         game.revealed_mask, game.gems_found, game.current_multiplier, flags, result,
+         game.winnings, nonce) = cls._STRUCT.unpack(data)
+        game.nonce = None if nonce < 0 else nonce
+        game.game_over = bool(flags & 1)
+        game.cashed_out = bool(flags & 2)
+        game.result = decode_choice(result, cls.RESULTS)
+        return game
 
 def create_mines_game(user_id, bet_amount, mines_count=5):
     """Create a new mines game"""
     game = MinesGame(user_id, mines_count)
     game.start_game(bet_amount)
-    active_mines_games[user_id] = game
+    mines_sessions.set(user_id, game)
     return game
 
 def get_mines_game(user_id):
     """Get active mines game for user"""
-    return active_mines_games.get(user_id)
+    return mines_sessions.get(user_id)
 
 def reveal_mines_tile(user_id, position):
-    """Reveal a tile in mines game"""
-    game = active_mines_games.get(user_id)
-    if game:
-        return game.reveal_tile(position)
-    return None
+    """Reveal a tile in mines game; returns (result, game), or (None, None) without a game"""
+    return mines_sessions.update(user_id, lambda game: game.reveal_tile(position))
 
 def cash_out_mines(user_id):
-    """Cash out from mines game"""
-    game = active_mines_games.get(user_id)
-    if game:
-        return game.cash_out()
-    return False
+    """Cash out from mines game; returns (result, game), or (None, None) without a game"""
+    return mines_sessions.update(user_id, lambda game: game.cash_out())
 
 def clear_mines_game(user_id):
     """Clear mines game for user"""
-    if user_id in active_mines_games:
-        del active_mines_games[user_id]
\ No newline at end of file
+    mines_sessions.delete(user_id)
\ No newline at end of file
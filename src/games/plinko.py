@@ -1,70 +1,106 @@
-import random
-from src.database import get_user, update_user_balance, record_transaction, record_game
+import struct
+from src.database import get_user, settle_balance, record_transaction, record_game
+from src.games.sessions import get_session_store
+from src.games.state import register_game_class, encode_choice, decode_choice
+from src.games.fair import fair_rng, register_fair_game, int_param
 
 # Store active plinko games for webapp
-active_plinko_games = {}
+plinko_sessions = get_session_store("plinko")
 
+# Slot multipliers per risk level, shared by every game
+RISK_MULTIPLIERS = {
+    # Lower risk, more consistent payouts
+    'low': (0.5, 1.0, 1.2, 1.5, 2.0, 3.0, 5.0, 10.0, 5.0, 3.0, 2.0, 1.5, 1.2, 1.0, 0.5),
+    # Medium risk
+    'medium': (0.3, 0.5, 1.0, 1.5, 2.0, 5.0, 10.0, 50.0, 10.0, 5.0, 2.0, 1.5, 1.0, 0.5, 0.3),
+    # High risk, high reward
+    'high': (0.2, 0.3, 0.5, 1.0, 2.0, 10.0, 50.0, 1000.0, 50.0, 10.0, 2.0, 1.0, 0.5, 0.3, 0.2)
+}
+
+@register_fair_game("plinko", {"rows": int_param(8, 16), "slots": int_param(2, 17)})
+def plinko_outcome(rng, rows=16, slots=15):
+    """Ball position after every row, starting in the middle"""
+    position = rows // 2
+    ball_path = [position]
+    
+    # Ball bounces left or right at each peg
+    for row in range(rows):
+        # 50% chance to go left or right
+        if rng.random() < 0.5:
+            position = max(0, position - 1)  # Go left
+        else:
+            position = min(slots - 1, position + 1)  # Go right
+        
+        ball_path.append(position)
+    return ball_path
+
+@register_game_class
 class PlinkoGame:
+    SESSION_TAG = 4
+    RESULTS = ("win", "lose")
+    RISK_LEVELS = ("low", "medium", "high")
+    # user_id, rows, bet_amount, risk_level, final_slot (255 = None), flags,
+    # result, winnings, nonce (-1 = not dropped yet), followed by the ball
+    # path one byte per position
+    _STRUCT = struct.Struct("<qBdBBBBdq")
+
+    __slots__ = ("user_id", "rows", "bet_amount", "risk_level", "_ball_path", "final_slot", "game_over", "result", "winnings", "nonce")
+
     def __init__(self, user_id, rows=16):
         self.user_id = user_id
         self.rows = rows
         self.bet_amount = 0
         self.risk_level = 'medium'  # low, medium, high
-        self.multipliers = self.get_multipliers()
-        self.ball_path = []
+        self._ball_path = b""
         self.final_slot = None
         self.game_over = False
         self.result = None
         self.winnings = 0
+        self.nonce = None
+    
+    @property
+    def multipliers(self):
+        return self.get_multipliers()
+    
+    @property
+    def ball_path(self):
+        return list(self._ball_path)
     
     def get_multipliers(self):
         """Get multipliers based on risk level"""
-        if self.risk_level == 'low':
-            # Lower risk, more consistent payouts
-            return [0.5, 1.0, 1.2, 1.5, 2.0, 3.0, 5.0, 10.0, 5.0, 3.0, 2.0, 1.5, 1.2, 1.0, 0.5]
-        elif self.risk_level == 'medium':
-            # Medium risk
-            return [0.3, 0.5, 1.0, 1.5, 2.0, 5.0, 10.0, 50.0, 10.0, 5.0, 2.0, 1.5, 1.0, 0.5, 0.3]
-        else:  # high
-            # High risk, high reward
-            return [0.2, 0.3, 0.5, 1.0, 2.0, 10.0, 50.0, 1000.0, 50.0, 10.0, 2.0, 1.0, 0.5, 0.3, 0.2]
+        return list(RISK_MULTIPLIERS[self.risk_level])
     
     def start_game(self, bet_amount, risk_level='medium'):
         """Start a new plinko game"""
         self.bet_amount = bet_amount
-        self.risk_level = risk_level
-        self.multipliers = self.get_multipliers()
+        # Unknown levels have always paid out on the high table
+        self.risk_level = risk_level if risk_level in RISK_MULTIPLIERS else 'high'
         return True
     
-    def drop_ball(self):
+    def drop_ball(self, rng=None):
         """Simulate dropping a ball through the plinko board"""
         if self.game_over:
             return False
         
-        # Simulate ball path
-        position = self.rows // 2  # Start in the middle
-        self.ball_path = [position]
+        multipliers = self.get_multipliers()
         
-        # Ball bounces left or right at each peg
-        for row in range(self.rows):
-            # 50% chance to go left or right
-            if random.random() < 0.5:
-                position = max(0, position - 1)  # Go left
-            else:
-                position = min(len(self.multipliers) - 1, position + 1)  # Go right
-            
-            self.ball_path.append(position)
+        # Simulate ball path from the user's provably-fair stream
+        if rng is None:
+            rng = fair_rng.draw(self.user_id)
+        self.nonce = getattr(rng, "nonce", None)
+        ball_path = plinko_outcome(rng, self.rows, len(multipliers))
+        self._ball_path = bytes(ball_path)
         
         # Final position determines the multiplier
-        self.final_slot = position
-        multiplier = self.multipliers[self.final_slot]
+        self.final_slot = ball_path[-1]
+        multiplier = multipliers[self.final_slot]
         
         self.winnings = self.bet_amount * multiplier
         self.game_over = True
         self.result = 'win' if multiplier > 1.0 else 'lose'
         
         return {
-            'ball_path': self.ball_path,
+            'ball_path': ball_path,
             'final_slot': self.final_slot,
             'multiplier': multiplier,
             'winnings': self.winnings
@@ -81,28 +117,47 @@ class PlinkoGame:
             'game_over': self.game_over,
             'result': self.result,
             'winnings': self.winnings,
-            'bet_amount': self.bet_amount
+            'bet_amount': self.bet_amount,
+            'nonce': self.nonce
         }
+    
+    def to_bytes(self):
+        """Pack the game into a fixed header plus the ball path"""
+        return self._STRUCT.pack(
+            int(self.user_id), self.rows, self.bet_amount, encode_choice(self.risk_level, self.RISK_LEVELS),
+            255 if self.final_slot is None else self.final_slot, self.game_over,
+            encode_choice(self.result, self.RESULTS), self.winnings, -1 if self.nonce is None else self.nonce
+        ) + self._ball_path
+    
+    @classmethod
+    def from_bytes(cls, data):
+        """Rebuild a game packed by to_bytes"""
+        game = cls.__new__(cls)
+        (game.user_id, game.rows, game.bet_amount, risk_level, final_slot, game_over,
+         result, game.winnings, nonce) = cls._STRUCT.unpack_from(data)
+        game.nonce = None if nonce < 0 else nonce
+        game.risk_level = decode_choice(risk_level, cls.RISK_LEVELS)
+        game.final_slot = None if final_slot == 255 else final_slot
+        game.game_over = bool(game_over)
+        game.result = decode_choice(result, cls.RESULTS)
+        game._ball_path = bytes(data[cls._STRUCT.size:])
+        return game
 
 def create_plinko_game(user_id, bet_amount, risk_level='medium'):
     """Create a new plinko game"""
     game = PlinkoGame(user_id)
     game.start_game(bet_amount, risk_level)
-    active_plinko_games[user_id] = game
+    plinko_sessions.set(user_id, game)
     return game
 
 def get_plinko_game(user_id):
     """Get active plinko game for user"""
-    return active_plinko_games.get(user_id)
+    return plinko_sessions.get(user_id)
 
 def drop_plinko_ball(user_id):
-    """Drop a ball in plinko game"""
-    game = active_plinko_games.get(user_id)
-    if game:
-        return game.drop_ball()
-    return None
+    """Drop a ball in plinko game; returns (result, game), or (None, None) without a game"""
+    return plinko_sessions.update(user_id, lambda game: game.drop_ball())
 
 def clear_plinko_game(user_id):
     """Clear plinko game for user"""
-    if user_id in active_plinko_games:
-        del active_plinko_games[user_id]
\ No newline at end of file
+    plinko_sessions.delete(user_id)
\ No newline at end of file
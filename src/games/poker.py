@@ -1,41 +1,99 @@
-import random
-from src.database import get_user, update_user_balance, record_transaction, record_game
+import struct
+from src.database import get_user, settle_balance, record_transaction, record_game
+from src.games.sessions import get_session_store
+from src.games.state import register_game_class, encode_choice, decode_choice
+from src.games.fair import fair_rng, register_fair_game
 
 # Store active poker games for webapp
-active_poker_games = {}
+poker_sessions = get_session_store("poker")
 
+SUITS = ['♠️', '♥️', '♦️', '♣️']
+RANKS = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
+
+# Hand rank value -> name, as returned by get_hand_rank
+HAND_NAMES = {
+    10: 'Royal Flush', 9: 'Straight Flush', 8: 'Four of a Kind', 7: 'Full House', 6: 'Flush',
+    5: 'Straight', 4: 'Three of a Kind', 3: 'Two Pair', 2: 'One Pair', 1: 'High Card'
+}
+
+def card_from_code(code):
+    """Card dict for a 0-51 card code (suit * 13 + rank)"""
+    return {'rank': RANKS[code % 13], 'suit': SUITS[code // 13]}
+
+def shuffled_deck(rng):
+    """The 52 card codes shuffled by a provably-fair stream; cards are dealt from the end"""
+    deck = bytearray(range(52))
+    rng.shuffle(deck)
+    return deck
+
+@register_fair_game("poker")
+def poker_outcome(rng):
+    """Both five-card hands of one game"""
+    deck = shuffled_deck(rng)
+    player_hand = [deck.pop() for _ in range(5)]
+    dealer_hand = [deck.pop() for _ in range(5)]
+    return {
+        'player_hand': [card_from_code(code) for code in player_hand],
+        'dealer_hand': [card_from_code(code) for code in dealer_hand]
+    }
+
+@register_game_class
 class PokerGame:
+    SESSION_TAG = 5
+    RESULTS = ("win", "lose", "tie")
+    # user_id, bet_amount, winnings, game_over, result, player rank value,
+    # dealer rank value (0 = not ranked yet), nonce (-1 = not dealt yet), then
+    # 5 + 5 hand codes and the deck
+    _STRUCT = struct.Struct("<qdd?BBBq")
+
+    __slots__ = ("user_id", "bet_amount", "deck", "_player_hand", "_dealer_hand", "game_over", "result", "winnings", "_player_rank", "_dealer_rank", "nonce")
+
     def __init__(self, user_id):
         self.user_id = user_id
         self.bet_amount = 0
-        self.deck = self.create_deck()
-        self.player_hand = []
-        self.dealer_hand = []
+        # Shuffled when the game starts
+        self.deck = bytearray(range(52))
+        # Hands and deck hold card codes, see card_from_code
+        self._player_hand = bytearray()
+        self._dealer_hand = bytearray()
         self.game_over = False
         self.result = None
         self.winnings = 0
-        self.player_hand_rank = None
-        self.dealer_hand_rank = None
+        self._player_rank = 0
+        self._dealer_rank = 0
+        self.nonce = None
     
-    def create_deck(self):
-        """Create a standard 52-card deck"""
-        suits = ['♠️', '♥️', '♦️', '♣️']
-        ranks = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
-        deck = []
-        for suit in suits:
-            for rank in ranks:
-                deck.append({'rank': rank, 'suit': suit})
-        random.shuffle(deck)
-        return deck
+    @property
+    def player_hand(self):
+        return [card_from_code(code) for code in self._player_hand]
     
-    def start_game(self, bet_amount):
+    @property
+    def dealer_hand(self):
+        return [card_from_code(code) for code in self._dealer_hand]
+    
+    @property
+    def player_hand_rank(self):
+        return (self._player_rank, HAND_NAMES[self._player_rank]) if self._player_rank else None
+    
+    @property
+    def dealer_hand_rank(self):
+        return (self._dealer_rank, HAND_NAMES[self._dealer_rank]) if self._dealer_rank else None
+    
+    def create_deck(self, rng):
+        """Create a shuffled standard 52-card deck of card codes"""
+        return shuffled_deck(rng)
+    
+    def start_game(self, bet_amount, rng=None):
         """Start a new poker game"""
         self.bet_amount = bet_amount
-        self.deck = self.create_deck()
+        if rng is None:
+            rng = fair_rng.draw(self.user_id)
+        self.nonce = getattr(rng, "nonce", None)
+        self.deck = self.create_deck(rng)
         
         # Deal 5 cards to player and dealer
-        self.player_hand = [self.deck.pop() for _ in range(5)]
-        self.dealer_hand = [self.deck.pop() for _ in range(5)]
+        self._player_hand = bytearray(self.deck.pop() for _ in range(5))
+        self._dealer_hand = bytearray(self.deck.pop() for _ in range(5))
         
         return True
     
@@ -90,11 +148,11 @@ class PokerGame:
         if self.game_over:
             return False
         
-        self.player_hand_rank = self.get_hand_rank(self.player_hand)
-        self.dealer_hand_rank = self.get_hand_rank(self.dealer_hand)
+        self._player_rank = self.get_hand_rank(self.player_hand)[0]
+        self._dealer_rank = self.get_hand_rank(self.dealer_hand)[0]
         
-        player_rank_value = self.player_hand_rank[0]
-        dealer_rank_value = self.dealer_hand_rank[0]
+        player_rank_value = self._player_rank
+        dealer_rank_value = self._dealer_rank
         
         if player_rank_value > dealer_rank_value:
             self.result = 'win'
@@ -119,28 +177,50 @@ class PokerGame:
             'game_over': self.game_over,
             'result': self.result,
             'winnings': self.winnings,
-            'bet_amount': self.bet_amount
+            'bet_amount': self.bet_amount,
+            'nonce': self.nonce
         }
+    
+    def to_bytes(self):
+        """Pack the game into a fixed header, both hands and the remaining deck"""
+        return self._STRUCT.pack(
+            int(self.user_id), self.bet_amount, self.winnings, self.game_over,
+            encode_choice(self.result, self.RESULTS), self._player_rank, self._dealer_rank,
+            -1 if self.nonce is None else self.nonce
+        ) + bytes((len(self._player_hand), len(self._dealer_hand))) + self._player_hand + self._dealer_hand + self.deck
+    
+    @classmethod
+    def from_bytes(cls, data):
+        """Rebuild a game packed by to_bytes"""
+        game = cls.__new__(cls)
+        (game.user_id, game.bet_amount, game.winnings, game.game_over, result,
+         game._player_rank, game._dealer_rank, nonce) = cls._STRUCT.unpack_from(data)
+        game.nonce = None if nonce < 0 else nonce
+        game.result = decode_choice(result, cls.RESULTS)
+        offset = cls._STRUCT.size
+        player_count, dealer_count = data[offset], data[offset + 1]
+        offset += 2
+        game._player_hand = bytearray(data[offset:offset + player_count])
+        offset += player_count
+        game._dealer_hand = bytearray(data[offset:offset + dealer_count])
+        game.deck = bytearray(data[offset + dealer_count:])
+        return game
 
 def create_poker_game(user_id, bet_amount):
     """Create a new poker game"""
     game = PokerGame(user_id)
     game.start_game(bet_amount)
-    active_poker_games[user_id] = game
+    poker_sessions.set(user_id, game)
     return game
 
 def get_poker_game(user_id):
     """Get active poker game for user"""
-    return active_poker_games.get(user_id)
+    return poker_sessions.get(user_id)
 
 def finish_poker_game(user_id):
-    """Finish poker game and determine winner"""
-    game = active_poker_games.get(user_id)
-    if game:
-        return game.finish_game()
-    return False
+    """Finish poker game and determine winner; returns (result, game), or (None, None) without a game"""
+    return poker_sessions.update(user_id, lambda game: game.finish_game())
 
 def clear_poker_game(user_id):
     """Clear poker game for user"""
-    if user_id in active_poker_games:
-        del active_poker_games[user_id]
\ No newline at end of file
+    poker_sessions.delete(user_id)
\ No newline at end of file
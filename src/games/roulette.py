@@ -1,8 +1,14 @@
-import random
-from src.database import get_user, update_user_balance, record_transaction, record_game
+from src.database import get_user, settle_balance, record_transaction, record_game
+from src.games.sessions import get_session_store
+from src.games.fair import fair_rng, register_fair_game
 
 # Store active roulette games for webapp
-active_roulette_games = {}
+roulette_sessions = get_session_store("roulette")
+
+@register_fair_game("roulette")
+def roulette_outcome(rng):
+    """Winning pocket, 0-36"""
+    return rng.randint(0, 36)
 
 class RouletteGame:
     def __init__(self, user_id):
@@ -15,6 +21,8 @@ class RouletteGame:
         self.result = None
         self.winnings = 0
         self.payout_details = []
+        self.payouts = {}  # {bet_type: payout} of winning bets
+        self.nonce = None
     
     def place_bet(self, bet_type, amount):
         """Place a bet on the roulette table"""
@@ -25,9 +33,12 @@ class RouletteGame:
         self.total_bet += amount
         return True
     
-    def spin(self):
+    def spin(self, rng=None):
         """Spin the roulette wheel"""
-        self.winning_number = random.randint(0, 36)
+        if rng is None:
+            rng = fair_rng.draw(self.user_id)
+        self.nonce = getattr(rng, "nonce", None)
+        self.winning_number = roulette_outcome(rng)
         
         # Determine color (0 is green, 1-10 and 19-28 red/black alternate, 11-18 and 29-36 black/red alternate)
         if self.winning_number == 0:
@@ -80,28 +91,21 @@ class RouletteGame:
 def create_roulette_game(user_id):
     """Create a new roulette game"""
     game = RouletteGame(user_id)
-    active_roulette_games[user_id] = game
+    roulette_sessions.set(user_id, game)
     return game
 
 def get_roulette_game(user_id):
     """Get active roulette game for user"""
-    return active_roulette_games.get(user_id)
+    return roulette_sessions.get(user_id)
 
 def place_roulette_bet(user_id, bet_type, amount):
-    """Place a bet in roulette game"""
-    game = active_roulette_games.get(user_id)
-    if game:
-        return game.place_bet(bet_type, amount)
-    return False
+    """Place a bet in roulette game; returns (result, game), or (None, None) without a game"""
+    return roulette_sessions.update(user_id, lambda game: game.place_bet(bet_type, amount))
 
 def spin_roulette(user_id):
-    """Spin the roulette wheel"""
-    game = active_roulette_games.get(user_id)
-    if game:
-        return game.spin()
-    return None
+    """Spin the roulette wheel; returns (result, game), or (None, None) without a game"""
+    return roulette_sessions.update(user_id, lambda game: game.spin())
 
 def clear_roulette_game(user_id):
     """Clear roulette game for user"""
-    if user_id in active_roulette_games:
-        del active_roulette_games[user_id]
\ No newline at end of file
+    roulette_sessions.delete(user_id)
\ No newline at end of file
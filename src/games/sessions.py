@@ -0,0 +1,379 @@
+import os
+import time
+import pickle
+import ipaddress
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from multiprocessing.managers import BaseManager
+from typing import Optional, Dict, Any, List
+from bson import Binary
+from src.utils.logger import webapp_logger
+from src.utils.error_handler import GameError
+from src.games.state import dump_game, is_game_dump, load_game
+
+# Where active webapp game sessions live: "memory" (one process), "mongo" or
+# "socket" (a session server shared by every worker on the host)
+GAME_SESSION_BACKEND = os.getenv("GAME_SESSION_BACKEND", "memory").lower()
+# Sessions untouched for this many seconds are abandoned and evicted
+GAME_SESSION_TTL = float(os.getenv("GAME_SESSION_TTL", "1800"))
+GAME_SESSION_MAX = int(os.getenv("GAME_SESSION_MAX", "10000"))
+GAME_SESSION_ADDRESS = os.getenv("GAME_SESSION_ADDRESS", "127.0.0.1:50055")
+# Required by the socket backend: the session server unpickles what it is sent
+GAME_SESSION_AUTHKEY = os.getenv("GAME_SESSION_AUTHKEY", "")
+# Let the session server listen on, and workers connect to, a non-loopback address
+GAME_SESSION_ALLOW_REMOTE = os.getenv("GAME_SESSION_ALLOW_REMOTE", "false").lower() == "true"
+# Authkeys shipped in examples, treated as unset
+PLACEHOLDER_AUTHKEYS = {"change-me", "exowin-sessions"}
+
+class SessionConflict(GameError):
+    """Another request changed or ended the session while this one was acting on it"""
+
+def encode_game(game) -> bytes:
+    """Serialize a game object for an out-of-process backend"""
+    # Registered games pack into a few dozen bytes; anything else is pickled
+    data = dump_game(game)
+    if data is not None:
+        return data
+    return pickle.dumps(game, protocol=pickle.HIGHEST_PROTOCOL)
+
+def decode_game(data: bytes):
+    """Rebuild a game object written by encode_game"""
+    data = bytes(data)
+    if is_game_dump(data):
+        return load_game(data)
+    return pickle.loads(data)
+
+class MemorySessionStore:
+    """In-process sessions with TTL and LRU eviction.
+
+    Values are kept as-is, so this is also what the socket server holds its
+    encoded sessions in. Every write bumps the session's version, which
+    replace() and remove() compare against.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 1800.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        # key -> (expires_at, value, version)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        # Flask serves requests from several threads
+        self._lock = threading.Lock()
+        self._next_version = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def _live_locked(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            self.expired += 1
+            return None
+        return entry
+
+    def _write_locked(self, key: str, value):
+        self._next_version += 1
+        self._entries[key] = (time.monotonic() + self.ttl, value, self._next_version)
+        self._entries.move_to_end(key)
+        self._evict_locked()
+
+    def get_versioned(self, key: str):
+        """(value, version) of a live session, or (None, None)"""
+        with self._lock:
+            entry = self._live_locked(key)
+            if entry is None:
+                return None, None
+            _, value, version = entry
+            # Reading a session keeps it alive
+            self._entries[key] = (time.monotonic() + self.ttl, value, version)
+            self._entries.move_to_end(key)
+            return value, version
+
+    def get(self, key: str):
+        return self.get_versioned(key)[0]
+
+    def set(self, key: str, value):
+        with self._lock:
+            self._write_locked(key, value)
+
+    def replace(self, key: str, value, version) -> bool:
+        """Write value only if the session is still at version"""
+        with self._lock:
+            entry = self._live_locked(key)
+            if entry is None or entry[2] != version:
+                return False
+            self._write_locked(key, value)
+            return True
+
+    def remove(self, key: str, version) -> bool:
+        """Delete the session only if it is still at version"""
+        with self._lock:
+            entry = self._live_locked(key)
+            if entry is None or entry[2] != version:
+                return False
+            del self._entries[key]
+            return True
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _evict_locked(self):
+        # Oldest entries sit at the front, so expired ones are found first
+        now = time.monotonic()
+        while self._entries:
+            key, (expires_at, _, _) = next(iter(self._entries.items()))
+            if expires_at >= now and len(self._entries) <= self.max_size:
+                break
+            del self._entries[key]
+            if expires_at < now:
+                self.expired += 1
+            else:
+                self.evictions += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get session counters for monitoring"""
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._entries),
+                "max_size": self.max_size,
+                "expired": self.expired,
+                "evictions": self.evictions
+            }
+
+class MongoSessionStore:
+    """Sessions in a Mongo collection with a TTL index, shared by every worker.
+
+    Each document carries a version that every write increments.
+    """
+
+    def __init__(self, collection, ttl: float = 1800.0):
+        self.collection = collection
+        self.ttl = ttl
+        self._indexed = False
+
+    def _ensure_index(self):
+        if not self._indexed:
+            self.collection.create_index("expires_at", expireAfterSeconds=0)
+            self._indexed = True
+
+    def _write(self, value) -> Dict[str, Any]:
+        return {
+            "$set": {"data": Binary(encode_game(value)), "expires_at": datetime.utcnow() + timedelta(seconds=self.ttl)},
+            "$inc": {"version": 1}
+        }
+
+    @staticmethod
+    def _at_version(key: str, version) -> Dict[str, Any]:
+        # Sessions written before versioning have no version field
+        return {"_id": key, "version": version or None, "expires_at": {"$gt": datetime.utcnow()}}
+
+    def get_versioned(self, key: str):
+        # The TTL monitor only runs once a minute, so check expiry here too
+        document = self.collection.find_one_and_update(
+            {"_id": key, "expires_at": {"$gt": datetime.utcnow()}},
+            {"$set": {"expires_at": datetime.utcnow() + timedelta(seconds=self.ttl)}},
+            projection={"data": 1, "version": 1}
+        )
+        if document is None:
+            return None, None
+        return decode_game(document["data"]), document.get("version", 0)
+
+    def get(self, key: str):
+        return self.get_versioned(key)[0]
+
+    def set(self, key: str, value):
+        self._ensure_index()
+        self.collection.update_one({"_id": key}, self._write(value), upsert=True)
+
+    def replace(self, key: str, value, version) -> bool:
+        return self.collection.update_one(self._at_version(key, version), self._write(value)).modified_count == 1
+
+    def remove(self, key: str, version) -> bool:
+        return self.collection.delete_one(self._at_version(key, version)).deleted_count == 1
+
+    def delete(self, key: str):
+        self.collection.delete_one({"_id": key})
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"backend": "mongo", "sessions": self.collection.estimated_document_count()}
+
+class SessionServerManager(BaseManager):
+    """multiprocessing manager serving one MemorySessionStore over a local socket"""
+
+class SessionClientManager(BaseManager):
+    """Client side of SessionServerManager"""
+
+SessionClientManager.register("get_store")
+
+def parse_address(address: str):
+    """host:port for TCP, anything else is a Unix socket path"""
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        return host, int(port)
+    return address
+
+def check_session_socket(address, authkey: str, allow_remote: bool = GAME_SESSION_ALLOW_REMOTE):
+    """Refuse a session socket without a real authkey, or off loopback unless allowed"""
+    if not authkey or authkey in PLACEHOLDER_AUTHKEYS:
+        raise ValueError("Set GAME_SESSION_AUTHKEY to a secret to use the socket session backend")
+    if isinstance(address, str):
+        address = parse_address(address)
+    if isinstance(address, tuple) and not allow_remote:
+        host = address[0]
+        try:
+            loopback = ipaddress.ip_address(host).is_loopback
+        except ValueError:
+            loopback = host == "localhost"
+        if not loopback:
+            raise ValueError(f"Session socket {host} is not a loopback address; set GAME_SESSION_ALLOW_REMOTE=true to allow it")
+    return address
+
+def build_session_server(address=GAME_SESSION_ADDRESS, authkey: str = GAME_SESSION_AUTHKEY, store: Optional[MemorySessionStore] = None, allow_remote: bool = GAME_SESSION_ALLOW_REMOTE):
+    """Session server holding encoded sessions; call serve_forever() on it"""
+    address = check_session_socket(address, authkey, allow_remote)
+    store = store or MemorySessionStore(GAME_SESSION_MAX, GAME_SESSION_TTL)
+    SessionServerManager.register("get_store", callable=lambda: store)
+    manager = SessionServerManager(address=address, authkey=authkey.encode())
+    return manager.get_server()
+
+class SocketSessionStore:
+    """Client of the session server started by session_server.py"""
+
+    def __init__(self, address: str = GAME_SESSION_ADDRESS, authkey: str = GAME_SESSION_AUTHKEY, allow_remote: bool = GAME_SESSION_ALLOW_REMOTE):
+        check_session_socket(address, authkey, allow_remote)
+        self.address = address
+        self.authkey = authkey
+        self._store = None
+        self._lock = threading.Lock()
+
+    def _proxy(self):
+        # Proxies are not thread-safe, so each request serializes on the lock
+        if self._store is None:
+            manager = SessionClientManager(address=parse_address(self.address), authkey=self.authkey.encode())
+            manager.connect()
+            self._store = manager.get_store()
+        return self._store
+
+    def get_versioned(self, key: str):
+        with self._lock:
+            data, version = self._proxy().get_versioned(key)
+        return (decode_game(data), version) if data is not None else (None, None)
+
+    def get(self, key: str):
+        return self.get_versioned(key)[0]
+
+    def set(self, key: str, value):
+        data = encode_game(value)
+        with self._lock:
+            self._proxy().set(key, data)
+
+    def replace(self, key: str, value, version) -> bool:
+        data = encode_game(value)
+        with self._lock:
+            return self._proxy().replace(key, data, version)
+
+    def remove(self, key: str, version) -> bool:
+        with self._lock:
+            return self._proxy().remove(key, version)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._proxy().delete(key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = self._proxy().get_stats()
+        stats["backend"] = "socket"
+        return stats
+
+# Requests of this process acting on the same session take turns; the
+# version check catches requests from other workers
+_session_locks = [threading.Lock() for _ in range(64)]
+
+class GameSessions:
+    """One game's view of the shared session backend, keyed by user or game id"""
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+
+    def _key(self, key) -> str:
+        return f"{self.namespace}:{key}"
+
+    def get(self, key):
+        """The active session, or None if there is none or it expired"""
+        return get_session_backend().get(self._key(key))
+
+    def update(self, key, action):
+        """Apply action(game) to the active session and save the outcome.
+
+        Returns (action's result, game), or (None, None) without a session.
+        A game that is over is removed in the same step, so only one of
+        several concurrent finishing requests gets it back to settle; the
+        others raise SessionConflict, as does any request whose session
+        another worker changed meanwhile.
+        """
+        backend = get_session_backend()
+        full_key = self._key(key)
+        with _session_locks[hash(full_key) % len(_session_locks)]:
+            game, version = backend.get_versioned(full_key)
+            if game is None:
+                return None, None
+            result = action(game)
+            if getattr(game, "game_over", False):
+                saved = backend.remove(full_key, version)
+            else:
+                saved = backend.replace(full_key, game, version)
+        if not saved:
+            raise SessionConflict("Game was changed by another request, try again")
+        return result, game
+
+    def set(self, key, game):
+        """Store a session; call again after every change to the game"""
+        get_session_backend().set(self._key(key), game)
+
+    def delete(self, key):
+        """End a session"""
+        get_session_backend().delete(self._key(key))
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def create_session_backend(kind: str = GAME_SESSION_BACKEND):
+    """Build the configured backend"""
+    if kind == "mongo":
+        from src.database.client import get_sync_client, DATABASE_NAME
+        return MongoSessionStore(get_sync_client()[DATABASE_NAME]["game_sessions"], GAME_SESSION_TTL)
+    if kind == "socket":
+        return SocketSessionStore(GAME_SESSION_ADDRESS, GAME_SESSION_AUTHKEY)
+    if kind != "memory":
+        webapp_logger.warning(f"Unknown GAME_SESSION_BACKEND {kind!r}, using memory")
+    return MemorySessionStore(GAME_SESSION_MAX, GAME_SESSION_TTL)
+
+def get_session_backend():
+    """The process-wide session backend, created on first use"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_session_backend()
+    return _backend
+
+# Every game's session store, by namespace
+_stores: Dict[str, GameSessions] = {}
+
+def get_session_store(namespace: str) -> GameSessions:
+    """Session store for one game type"""
+    return _stores.setdefault(namespace, GameSessions(namespace))
+
+def live_nonces(user_id) -> List[int]:
+    """Provably-fair nonces of the user's unfinished games, across every game type"""
+    nonces = []
+    for store in _stores.values():
+        game = store.get(user_id)
+        if game is not None and not getattr(game, "game_over", False) and getattr(game, "nonce", None) is not None:
+            nonces.append(game.nonce)
+    return nonces
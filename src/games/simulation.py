@@ -0,0 +1,513 @@
+import os
+import math
+import inspect
+import random
+from multiprocessing import Pool
+from typing import Dict, List, Any, Iterable, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # Rounds are then played from the same uniforms in plain Python
+    np = None
+
+from src.games.blackjack import BlackjackGame
+from src.games.crash import CrashGame
+from src.games.lottery import LotteryGame
+from src.games.mines import MinesGame
+from src.games.plinko import PlinkoGame, RISK_MULTIPLIERS
+from src.games.poker import PokerGame
+from src.games.roulette import RouletteGame
+from src.games.tower import TowerGame
+
+SIMULATION_ROUNDS = int(os.getenv("SIMULATION_ROUNDS", "1000000"))
+# Rounds per vectorized batch or worker task; bounds memory per batch
+SIMULATION_CHUNK = int(os.getenv("SIMULATION_CHUNK", "100000"))
+# Worker processes for games played through their classes; 0 = one per CPU
+SIMULATION_PROCESSES = int(os.getenv("SIMULATION_PROCESSES", "0"))
+
+# Two-sided 95% normal quantile for the reported confidence interval
+Z_95 = 1.959963984540054
+# random.Random without getrandbits turns a uniform into randrange(n) as
+# floor(u * 2**53) % n, so vectorized draws index the same way
+RANDBELOW_SCALE = 2.0 ** 53
+
+class ScriptedRandom(random.Random):
+    """random.Random replaying a fixed list of uniforms.
+
+    Only random() is overridden, so randrange, sample, choice and uniform all
+    consume these values the way the vectorized models do.
+    """
+
+    def __init__(self, values: Iterable[float]):
+        self._values = iter(values)
+        super().__init__(0)
+
+    def random(self):
+        return next(self._values)
+
+def _randbelow(u: float, n: int) -> int:
+    return int(u * RANDBELOW_SCALE) % n
+
+class RTPStats:
+    """Running mean and variance of payouts per unit bet, mergeable across workers"""
+
+    __slots__ = ("rounds", "mean", "m2", "max_payout")
+
+    def __init__(self, rounds: int = 0, mean: float = 0.0, m2: float = 0.0, max_payout: float = 0.0):
+        self.rounds = rounds
+        self.mean = mean
+        self.m2 = m2  # sum of squared deviations from the mean
+        self.max_payout = max_payout
+
+    def add(self, payouts):
+        """Fold in one batch of payouts (list or NumPy array)"""
+        rounds = len(payouts)
+        if not rounds:
+            return
+        if np is not None and isinstance(payouts, np.ndarray):
+            mean = float(payouts.mean())
+            m2 = float(((payouts - mean) ** 2).sum())
+            peak = float(payouts.max())
+        else:
+            mean = math.fsum(payouts) / rounds
+            m2 = math.fsum((payout - mean) ** 2 for payout in payouts)
+            peak = float(max(payouts))
+        self.merge(RTPStats(rounds, mean, m2, peak))
+
+    def merge(self, other: "RTPStats"):
+        """Combine with another batch (Chan et al. parallel variance)"""
+        if not other.rounds:
+            return
+        total = self.rounds + other.rounds
+        delta = other.mean - self.mean
+        self.mean += delta * other.rounds / total
+        self.m2 += other.m2 + delta * delta * self.rounds * other.rounds / total
+        self.rounds = total
+        self.max_payout = max(self.max_payout, other.max_payout)
+
+    def summary(self) -> Dict[str, float]:
+        variance = self.m2 / (self.rounds - 1) if self.rounds > 1 else 0.0
+        margin = Z_95 * math.sqrt(variance / self.rounds) if self.rounds else 0.0
+        return {
+            "rounds": self.rounds,
+            "rtp": self.mean,
+            "house_edge": 1.0 - self.mean,
+            "variance": variance,
+            "std": math.sqrt(variance),
+            "ci_low": self.mean - margin,
+            "ci_high": self.mean + margin,
+            "max_payout": self.max_payout
+        }
+
+class GameModel:
+    """One game played with a fixed strategy, paid per unit bet.
+
+    Games with a fixed number of uniforms per round set draws and implement
+    payout (one round in plain Python) and vectorized (a NumPy batch). Games
+    whose draws depend on play, like blackjack and poker, set draws to 0 and
+    only implement scalar, which plays the real game class. exact means the
+    uniforms are consumed the way the scalar class consumes them, so both
+    must agree round for round.
+    """
+
+    name = ""
+    draws = 0
+    exact = False
+
+    def describe(self) -> str:
+        return self.name
+
+    def max_exposure(self) -> float:
+        """Largest possible payout per unit bet"""
+        raise NotImplementedError
+
+    def payout(self, row: Sequence[float]) -> float:
+        raise NotImplementedError
+
+    def vectorized(self, uniforms):
+        raise NotImplementedError
+
+    def scalar(self, rng: random.Random) -> float:
+        """Play one round through the game class"""
+        raise NotImplementedError
+
+class CrashModel(GameModel):
+    """Auto cash-out at target, paid like a shared crash round"""
+
+    name = "crash"
+    draws = 2
+    exact = True
+
+    def __init__(self, target: float = 2.0):
+        self.target = target
+
+    def describe(self):
+        return f"crash (auto cash-out {self.target}x)"
+
+    def max_exposure(self):
+        return self.target
+
+    def payout(self, row):
+        r, v = row
+        if r < 0.01:
+            crash_point = 1.0 + 0.1 * v
+        elif r < 0.05:
+            crash_point = 1.1 + 0.4 * v
+        else:
+            crash_point = 0.9 / v ** 0.7 if v else math.inf
+        # Rounds pay an auto cash-out only below the crash point
+        return self.target if self.target < crash_point else 0.0
+
+    def vectorized(self, uniforms):
+        r, v = uniforms[:, 0], uniforms[:, 1]
+        with np.errstate(divide="ignore"):
+            tail = 0.9 / v ** 0.7
+        crash_point = np.where(r < 0.01, 1.0 + 0.1 * v, np.where(r < 0.05, 1.1 + 0.4 * v, tail))
+        return np.where(self.target < crash_point, self.target, 0.0)
+
+    def scalar(self, rng):
+        game = CrashGame(0, rng=rng)
+        return self.target if self.target < game.crash_point else 0.0
+
+class PlinkoModel(GameModel):
+    name = "plinko"
+    exact = True
+
+    def __init__(self, risk: str = "medium", rows: int = 16):
+        self.risk = risk
+        self.rows = rows
+        self.draws = rows
+        self.multipliers = RISK_MULTIPLIERS[risk]
+
+    def describe(self):
+        return f"plinko ({self.risk} risk)"
+
+    def max_exposure(self):
+        return max(self.multipliers)
+
+    def payout(self, row):
+        last = len(self.multipliers) - 1
+        position = self.rows // 2
+        for u in row:
+            position = max(0, position - 1) if u < 0.5 else min(last, position + 1)
+        return self.multipliers[position]
+
+    def vectorized(self, uniforms):
+        last = len(self.multipliers) - 1
+        position = np.full(len(uniforms), self.rows // 2)
+        for row in range(self.rows):
+            position = np.where(uniforms[:, row] < 0.5, np.maximum(position - 1, 0), np.minimum(position + 1, last))
+        return np.asarray(self.multipliers)[position]
+
+    def scalar(self, rng):
+        game = PlinkoGame(0, self.rows)
+        game.start_game(1, self.risk)
+        game.drop_ball(rng)
+        return game.winnings
+
+class MinesModel(GameModel):
+    """Reveal picks tiles, then cash out.
+
+    MinesGame places mines with random.sample, which redraws on collisions,
+    so this model picks the mines as the smallest of one uniform per tile and
+    is only checked against the class statistically.
+    """
+
+    name = "mines"
+    exact = False
+
+    def __init__(self, mines: int = 5, picks: int = 3, grid_size: int = 25):
+        if not 1 <= picks <= grid_size - mines:
+            raise ValueError("picks must be between 1 and the number of safe tiles")
+        self.mines = mines
+        self.picks = picks
+        self.grid_size = grid_size
+        self.draws = grid_size
+        self.multiplier = self._multiplier()
+
+    def _multiplier(self):
+        game = MinesGame(0, self.mines, self.grid_size, rng=random.Random(0))
+        game.gems_found = self.picks
+        game.calculate_multiplier()
+        return game.current_multiplier
+
+    def describe(self):
+        return f"mines ({self.mines} mines, cash out after {self.picks})"
+
+    def max_exposure(self):
+        return self.multiplier
+
+    def payout(self, row):
+        threshold = sorted(row)[self.mines - 1]
+        return 0.0 if min(row[:self.picks]) <= threshold else self.multiplier
+
+    def vectorized(self, uniforms):
+        threshold = np.partition(uniforms, self.mines - 1, axis=1)[:, self.mines - 1]
+        hit = uniforms[:, :self.picks].min(axis=1) <= threshold
+        return np.where(hit, 0.0, self.multiplier)
+
+    def scalar(self, rng):
+        game = MinesGame(0, self.mines, self.grid_size, rng=rng)
+        game.start_game(1)
+        for position in range(self.picks):
+            game.reveal_tile(position)
+        game.cash_out()
+        return game.winnings
+
+class TowerModel(GameModel):
+    """Climb levels by always taking the first tile, then cash out"""
+
+    name = "tower"
+    exact = True
+
+    def __init__(self, levels: int = 3, tower_levels: int = 8, tiles_per_level: int = 4):
+        if not 1 <= levels <= tower_levels:
+            raise ValueError("levels must be between 1 and the tower height")
+        self.levels = levels
+        self.tower_levels = tower_levels
+        self.tiles_per_level = tiles_per_level
+        self.draws = tower_levels
+        self.multiplier = self._multiplier()
+
+    def _multiplier(self):
+        game = TowerGame(0, self.tower_levels, self.tiles_per_level, rng=random.Random(0))
+        game.current_level = self.levels
+        game.calculate_multiplier()
+        return game.current_multiplier
+
+    def describe(self):
+        return f"tower (cash out after {self.levels} levels)"
+
+    def max_exposure(self):
+        return self.multiplier
+
+    def payout(self, row):
+        safe = all(_randbelow(u, self.tiles_per_level) == 0 for u in row[:self.levels])
+        return self.multiplier if safe else 0.0
+
+    def vectorized(self, uniforms):
+        tiles = (uniforms[:, :self.levels] * RANDBELOW_SCALE).astype(np.int64) % self.tiles_per_level
+        return np.where((tiles == 0).all(axis=1), self.multiplier, 0.0)
+
+    def scalar(self, rng):
+        game = TowerGame(0, self.tower_levels, self.tiles_per_level, rng=rng)
+        game.start_game(1)
+        for _ in range(self.levels):
+            game.choose_tile(0)
+        game.cash_out()
+        return game.winnings
+
+class RouletteModel(GameModel):
+    name = "roulette"
+    draws = 1
+    exact = True
+
+    def __init__(self, bet: str = "red"):
+        self.bet = bet
+        # Payout of every pocket, taken from the game class itself
+        self.pockets = [self._spin(ScriptedRandom([number / RANDBELOW_SCALE])) for number in range(37)]
+
+    def _spin(self, rng):
+        game = RouletteGame(0)
+        game.place_bet(self.bet, 1)
+        game.spin(rng)
+        return game.winnings
+
+    def describe(self):
+        return f"roulette ({self.bet})"
+
+    def max_exposure(self):
+        return max(self.pockets)
+
+    def payout(self, row):
+        return self.pockets[_randbelow(row[0], 37)]
+
+    def vectorized(self, uniforms):
+        pockets = (uniforms[:, 0] * RANDBELOW_SCALE).astype(np.int64) % 37
+        return np.asarray(self.pockets, dtype=float)[pockets]
+
+    def scalar(self, rng):
+        return self._spin(rng)
+
+class LotteryModel(GameModel):
+    """One ticket per draw; six numbers drawn from 49, then the bonus"""
+
+    name = "lottery"
+    draws = 7
+    exact = True
+
+    def __init__(self, ticket: Sequence[int] = (1, 2, 3, 4, 5, 6)):
+        self.ticket = sorted(ticket)
+        self.table = LotteryGame(0).payout_multipliers
+
+    def describe(self):
+        return f"lottery (ticket {' '.join(map(str, self.ticket))})"
+
+    def max_exposure(self):
+        return max(self.table.values())
+
+    def payout(self, row):
+        # random.sample's pool draw: swap each pick out of a shrinking pool
+        pool = list(range(1, 50))
+        drawn = set()
+        for index, u in enumerate(row[:6]):
+            j = _randbelow(u, 49 - index)
+            drawn.add(pool[j])
+            pool[j] = pool[48 - index]
+        return self.table[len(drawn.intersection(self.ticket))]
+
+    def vectorized(self, uniforms):
+        count = len(uniforms)
+        rows = np.arange(count)
+        pool = np.tile(np.arange(1, 50), (count, 1))
+        drawn = np.empty((count, 6), dtype=np.int64)
+        for index in range(6):
+            j = (uniforms[:, index] * RANDBELOW_SCALE).astype(np.int64) % (49 - index)
+            drawn[:, index] = pool[rows, j]
+            pool[rows, j] = pool[:, 48 - index]
+        matches = np.isin(drawn, self.ticket).sum(axis=1)
+        table = np.array([self.table.get(hits, 0) for hits in range(7)], dtype=float)
+        return table[matches]
+
+    def scalar(self, rng):
+        game = LotteryGame(0)
+        game.start_game(1)
+        game.select_numbers(self.ticket)
+        game.draw_numbers(rng)
+        return game.winnings
+
+class BlackjackModel(GameModel):
+    """Hit below stand_on, like the dealer"""
+
+    name = "blackjack"
+
+    def __init__(self, stand_on: int = 17):
+        self.stand_on = stand_on
+
+    def describe(self):
+        return f"blackjack (stand on {self.stand_on})"
+
+    def max_exposure(self):
+        return 2.5
+
+    def scalar(self, rng):
+        game = BlackjackGame(0, 1, rng=rng)
+        while not game.game_over and game.get_hand_value(game.player_hand) < self.stand_on:
+            game.hit()
+        game.stand()
+        return game.get_winnings()
+
+class PokerModel(GameModel):
+    """Five-card showdown against the dealer"""
+
+    name = "poker"
+
+    def max_exposure(self):
+        return 2.0
+
+    def scalar(self, rng):
+        game = PokerGame(0)
+        game.start_game(1, rng)
+        game.finish_game()
+        return game.winnings
+
+# Game name -> model class; keyword arguments pick the strategy
+SIMULATED_GAMES = {
+    model.name: model
+    for model in (CrashModel, PlinkoModel, MinesModel, TowerModel, RouletteModel, LotteryModel, BlackjackModel, PokerModel)
+}
+
+def vectorized_available() -> bool:
+    return np is not None
+
+def _chunk_rng(seed: int, chunk: int) -> random.Random:
+    return random.Random(f"{seed}:{chunk}")
+
+def _run_chunk(task) -> RTPStats:
+    """Play one chunk of rounds; runs in a worker process for the scalar games"""
+    model, rounds, seed, chunk = task
+    stats = RTPStats()
+    if model.draws and np is not None:
+        uniforms = np.random.default_rng([seed, chunk]).random((rounds, model.draws))
+        stats.add(model.vectorized(uniforms))
+    elif model.draws:
+        rng = _chunk_rng(seed, chunk)
+        draws = range(model.draws)
+        stats.add([model.payout([rng.random() for _ in draws]) for _ in range(rounds)])
+    else:
+        rng = _chunk_rng(seed, chunk)
+        stats.add([model.scalar(rng) for _ in range(rounds)])
+    return stats
+
+def simulate(model: GameModel, rounds: int = SIMULATION_ROUNDS, seed: int = 0, processes: int = SIMULATION_PROCESSES, chunk_size: int = SIMULATION_CHUNK) -> Dict[str, Any]:
+    """Play rounds of one game and report RTP, variance, exposure and a 95% CI.
+
+    Vectorized games run batch by batch in this process; everything played
+    round by round in Python is fanned out over a process pool.
+    """
+    tasks = [(model, min(chunk_size, rounds - start), seed, chunk) for chunk, start in enumerate(range(0, rounds, chunk_size))]
+    vectorized = bool(model.draws) and np is not None
+    stats = RTPStats()
+    if vectorized or processes == 1 or len(tasks) < 2:
+        for part in map(_run_chunk, tasks):
+            stats.merge(part)
+    else:
+        with Pool(processes or None) as pool:
+            for part in pool.imap_unordered(_run_chunk, tasks):
+                stats.merge(part)
+
+    summary = stats.summary()
+    summary.update({
+        "game": model.name,
+        "strategy": model.describe(),
+        "mode": "vectorized" if vectorized else "batch" if model.draws else "scalar",
+        "max_exposure": model.max_exposure()
+    })
+    return summary
+
+def check_model(model: GameModel, rounds: int = 2000, seed: int = 0) -> Dict[str, Any]:
+    """Check the fast paths of a model against its game class.
+
+    Exact models replay the same uniforms through payout, vectorized and the
+    class and must match round for round; the rest compare mean payouts and
+    pass within four standard errors.
+    """
+    result = {"game": model.name, "rounds": rounds}
+    if not model.draws:
+        result.update({"method": "scalar only", "passed": True})
+        return result
+
+    rng = _chunk_rng(seed, -1)
+    rows = [[rng.random() for _ in range(model.draws)] for _ in range(rounds)]
+    fast = [model.payout(row) for row in rows]
+    if np is not None:
+        vectorized = model.vectorized(np.array(rows)).tolist()
+        result["vectorized_mismatches"] = sum(1 for a, b in zip(fast, vectorized) if not math.isclose(a, b))
+
+    if model.exact:
+        scalar = [model.scalar(ScriptedRandom(row)) for row in rows]
+        result["method"] = "replay"
+        result["mismatches"] = sum(1 for a, b in zip(fast, scalar) if not math.isclose(a, b))
+        result["passed"] = result["mismatches"] == 0
+    else:
+        scalar = [model.scalar(rng) for _ in range(rounds)]
+        fast_stats, scalar_stats = RTPStats(), RTPStats()
+        fast_stats.add(fast)
+        scalar_stats.add(scalar)
+        fast_summary, scalar_summary = fast_stats.summary(), scalar_stats.summary()
+        error = math.sqrt((fast_summary["variance"] + scalar_summary["variance"]) / rounds)
+        result["method"] = "statistical"
+        result["z_score"] = abs(fast_summary["rtp"] - scalar_summary["rtp"]) / error if error else 0.0
+        result["passed"] = result["z_score"] < 4.0
+
+    result["passed"] = result["passed"] and not result.get("vectorized_mismatches")
+    return result
+
+def build_models(games: Optional[List[str]] = None, **options) -> List[GameModel]:
+    """Models for the named games (all by default); options go to the models that take them"""
+    models = []
+    for name in games or SIMULATED_GAMES:
+        model_class = SIMULATED_GAMES[name]
+        accepted = inspect.signature(model_class).parameters
+        models.append(model_class(**{key: value for key, value in options.items() if key in accepted and value is not None}))
+    return models
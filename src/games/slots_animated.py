@@ -2,7 +2,7 @@ import random
 import asyncio
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from src.database import get_user, update_user_balance, record_transaction, record_game
+from src.database import get_user_balance, settle_balance, record_transaction, record_game
 from src.utils.formatting import format_money
 
 # Active slots tournaments
@@ -23,11 +23,6 @@ SLOT_PAYOUTS = {
     (1, 2, 3): {"multiplier": 5, "name": "🍋🍊🍇 Fruit Mix"},
     (4, 5, 6): {"multiplier": 8, "name": "🍒🔔💎 Premium Mix"}
 }
-    # Handle both direct commands and callback queries
-    if update.message:
-        pass
-    elif update.callback_query:
-        update.message = update.callback_query.message
 
 async def slots_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Handle both direct commands and callback queries
@@ -148,7 +143,7 @@ async def slots_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def execute_solo_slots_game(query, bet_amount: float):
     """Execute a solo slots game with animation"""
-    user = await get_user(query.from_user.id)
+    user = await get_user_balance(query.from_user.id)
     
     if user["balance"] < bet_amount:
         await query.edit_message_text(
@@ -159,7 +154,7 @@ async def execute_solo_slots_game(query, bet_amount: float):
         return
     
     # Deduct bet amount
-    await update_user_balance(user["user_id"], -bet_amount)
+    user = await settle_balance(user["user_id"], -bet_amount)
     await record_transaction(user["user_id"], -bet_amount, "slots bet", "Solo slots game")
     
     # Show spinning animation
@@ -225,12 +220,9 @@ async def execute_solo_slots_game(query, bet_amount: float):
     )
     
     if winnings > 0:
-        await update_user_balance(user["user_id"], winnings)
+        user = await settle_balance(user["user_id"], winnings)
         await record_transaction(user["user_id"], winnings, "slots win", f"Game ID: {game_id}")
     
-    # Get updated balance
-    user = await get_user(user["user_id"])
-    
     # Show result
     if winnings > 0:
         result_text = (
@@ -0,0 +1,45 @@
+from typing import Dict, List, Optional, Sequence
+
+# First byte of a game written by dump_game; pickles start with 0x80
+BINARY_MARKER = 0xB1
+
+# SESSION_TAG -> game class with to_bytes / from_bytes
+GAME_CLASSES: Dict[int, type] = {}
+
+def register_game_class(cls):
+    """Class decorator making a game serializable by dump_game"""
+    GAME_CLASSES[cls.SESSION_TAG] = cls
+    return cls
+
+def dump_game(game) -> Optional[bytes]:
+    """Compact binary form of a registered game, or None for other objects"""
+    tag = getattr(type(game), "SESSION_TAG", None)
+    if GAME_CLASSES.get(tag) is not type(game):
+        return None
+    return bytes((BINARY_MARKER, tag)) + game.to_bytes()
+
+def is_game_dump(data: bytes) -> bool:
+    return len(data) >= 2 and data[0] == BINARY_MARKER
+
+def load_game(data: bytes):
+    """Rebuild a game written by dump_game"""
+    return GAME_CLASSES[data[1]].from_bytes(data[2:])
+
+def pack_bits(flags: Sequence[bool]) -> int:
+    """List of booleans -> bitmask with flags[i] at bit i"""
+    mask = 0
+    for index, flag in enumerate(flags):
+        if flag:
+            mask |= 1 << index
+    return mask
+
+def unpack_bits(mask: int, count: int) -> List[bool]:
+    """Bitmask -> list of count booleans"""
+    return [bool(mask >> index & 1) for index in range(count)]
+
+def encode_choice(value, choices: Sequence) -> int:
+    """Small int for one of a fixed set of values; 0 means None"""
+    return 0 if value is None else choices.index(value) + 1
+
+def decode_choice(code: int, choices: Sequence):
+    return None if code == 0 else choices[code - 1]
@@ -1,34 +1,62 @@
-import random
-from src.database import get_user, update_user_balance, record_transaction, record_game
+import struct
+from src.database import get_user, settle_balance, record_transaction, record_game
+from src.games.sessions import get_session_store
+from src.games.state import register_game_class, unpack_bits, encode_choice, decode_choice
+from src.games.fair import fair_rng, register_fair_game, int_param
 
 # Store active tower games for webapp
-active_tower_games = {}
+tower_sessions = get_session_store("tower")
 
+@register_fair_game("tower", {"levels": int_param(1, 8), "tiles_per_level": int_param(2, 4)})
+def tower_outcome(rng, levels=8, tiles_per_level=4):
+    """Safe tile index of every level, bottom first"""
+    return [rng.randrange(tiles_per_level) for _ in range(levels)]
+
+@register_game_class
 class TowerGame:
-    def __init__(self, user_id, levels=8, tiles_per_level=4):
+    SESSION_TAG = 2
+    RESULTS = ("trap", "completed", "cashout")
+    # user_id, levels, tiles_per_level, bet_amount, current_level, safe_mask,
+    # current_multiplier, flags, result, winnings, nonce (-1 = None)
+    _STRUCT = struct.Struct("<qBBdBQdBBdq")
+
+    __slots__ = (
+        "user_id", "levels", "tiles_per_level", "bet_amount", "current_level", "safe_mask",
+        "current_multiplier", "game_over", "result", "winnings", "cashed_out", "nonce"
+    )
+
+    def __init__(self, user_id, levels=8, tiles_per_level=4, rng=None):
         self.user_id = user_id
         self.levels = levels
         self.tiles_per_level = tiles_per_level
         self.bet_amount = 0
         self.current_level = 0
-        self.tower_layout = []  # [level][tile] = True/False (safe/trap)
+        self.safe_mask = 0  # bit level * tiles_per_level + tile set = safe tile
         self.current_multiplier = 1.0
         self.game_over = False
         self.result = None
         self.winnings = 0
         self.cashed_out = False
+        self.nonce = None
         
         # Generate tower layout
-        self.generate_tower()
+        self.generate_tower(rng)
     
-    def generate_tower(self):
+    @property
+    def tower_layout(self):
+        """[level][tile] = True/False (safe/trap)"""
+        tiles = unpack_bits(self.safe_mask, self.levels * self.tiles_per_level)
+        return [tiles[level * self.tiles_per_level:(level + 1) * self.tiles_per_level] for level in range(self.levels)]
+    
+    def generate_tower(self, rng=None):
         """Generate the tower layout with safe tiles and traps"""
-        self.tower_layout = []
-        for level in range(self.levels):
-            # Each level has 1 safe tile and 3 traps (for 4 tiles per level)
-            level_tiles = [True] + [False] * (self.tiles_per_level - 1)
-            random.shuffle(level_tiles)
-            self.tower_layout.append(level_tiles)
+        # Each level has 1 safe tile and the rest are traps
+        if rng is None:
+            rng = fair_rng.draw(self.user_id)
+        self.nonce = getattr(rng, "nonce", None)
+        self.safe_mask = 0
+        for level, tile in enumerate(tower_outcome(rng, self.levels, self.tiles_per_level)):
+            self.safe_mask |= 1 << (level * self.tiles_per_level + tile)
     
     def start_game(self, bet_amount):
         """Start a new tower game"""
@@ -42,10 +70,10 @@ class TowerGame:
         if self.game_over or self.current_level >= self.levels:
             return False
         
-        if tile_index >= self.tiles_per_level:
+        if not 0 <= tile_index < self.tiles_per_level:
             return False
         
-        is_safe = self.tower_layout[self.current_level][tile_index]
+        is_safe = self.safe_mask >> (self.current_level * self.tiles_per_level + tile_index) & 1
         
         if is_safe:
             # Advance to next level
@@ -94,35 +122,51 @@ class TowerGame:
             'result': self.result,
             'winnings': self.winnings,
             'bet_amount': self.bet_amount,
-            'cashed_out': self.cashed_out
+            'cashed_out': self.cashed_out,
+            'nonce': self.nonce
         }
+    
+    def to_bytes(self):
+        """Pack the game into a fixed-size record"""
+        flags = self.game_over | self.cashed_out << 1
+        return self._STRUCT.pack(
+            int(self.user_id), self.levels, self.tiles_per_level, self.bet_amount, self.current_level,
+            self.safe_mask, self.current_multiplier, flags, encode_choice(self.result, self.RESULTS), self.winnings,
+            -1 if self.nonce is None else self.nonce
+        )
+    
+    @classmethod
+    def from_bytes(cls, data):
+        """Rebuild a game packed by to_bytes"""
+        game = cls.__new__(cls)
+        (game.user_id, game.levels, game.tiles_per_level, game.bet_amount, game.current_level,
+         game.safe_mask, game.current_multiplier, flags, result, game.winnings,
+         nonce) = cls._STRUCT.unpack(data)
+        game.nonce = None if nonce < 0 else nonce
+        game.game_over = bool(flags & 1)
+        game.cashed_out = bool(flags & 2)
+        game.result = decode_choice(result, cls.RESULTS)
+        return game
 
 def create_tower_game(user_id, bet_amount):
     """Create a new tower game"""
     game = TowerGame(user_id)
     game.start_game(bet_amount)
-    active_tower_games[user_id] = game
+    tower_sessions.set(user_id, game)
     return game
 
 def get_tower_game(user_id):
     """Get active tower game for user"""
-    return active_tower_games.get(user_id)
+    return tower_sessions.get(user_id)
 
 def choose_tower_tile(user_id, tile_index):
-    """Choose a tile in tower game"""
-    game = active_tower_games.get(user_id)
-    if game:
-        return game.choose_tile(tile_index)
-    return None
+    """Choose a tile in tower game; returns (result, game), or (None, None) without a game"""
+    return tower_sessions.update(user_id, lambda game: game.choose_tile(tile_index))
 
 def cash_out_tower(user_id):
-    """Cash out from tower game"""
-    game = active_tower_games.get(user_id)
-    if game:
-        return game.cash_out()
-    return False
+    """Cash out from tower game; returns (result, game), or (None, None) without a game"""
+    return tower_sessions.update(user_id, lambda game: game.cash_out())
 
 def clear_tower_game(user_id):
     """Clear tower game for user"""
-    if user_id in active_tower_games:
-        del active_tower_games[user_id]
\ No newline at end of file
+    tower_sessions.delete(user_id)
\ No newline at end of file
@@ -2,8 +2,9 @@ import random
 import asyncio
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from src.database import get_user, update_user_balance, record_transaction, record_game
+from src.database import get_user, get_user_balance, settle_balance, record_transaction, record_game
 from src.utils.formatting import format_money
+from src.utils.error_handler import InsufficientFundsError
 
 # Active wheel games for multiplayer
 active_wheel_games = {}
@@ -156,7 +157,7 @@ async def wheel_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def execute_solo_wheel_game(query, segment_id: int, bet_amount: float):
     """Execute a solo wheel game with animation"""
-    user = await get_user(query.from_user.id)
+    user = await get_user_balance(query.from_user.id)
     segment = WHEEL_SEGMENTS[segment_id]
     
     if user["balance"] < bet_amount:
@@ -168,7 +169,7 @@ async def execute_solo_wheel_game(query, segment_id: int, bet_amount: float):
         return
     
     # Deduct bet amount
-    await update_user_balance(user["user_id"], -bet_amount)
+    user = await settle_balance(user["user_id"], -bet_amount)
     await record_transaction(user["user_id"], -bet_amount, "wheel bet", "Solo wheel game")
     
     # Show spinning animation
@@ -212,12 +213,9 @@ async def execute_solo_wheel_game(query, segment_id: int, bet_amount: float):
     game_id = await record_game(user["user_id"], "wheel", bet_amount, "win" if won else "loss", winnings)
     
     if won:
-        await update_user_balance(user["user_id"], winnings)
+        user = await settle_balance(user["user_id"], winnings)
         await record_transaction(user["user_id"], winnings, "wheel win", f"Game ID: {game_id}")
     
-    # Get updated balance
-    user = await get_user(user["user_id"])
-    
     # Show result with animation
     if won:
         result_text = (
@@ -253,7 +251,7 @@ async def execute_solo_wheel_game(query, segment_id: int, bet_amount: float):
 
 async def start_multiplayer_wheel(query, context: ContextTypes.DEFAULT_TYPE, bet_amount: float):
     """Start a multiplayer wheel game"""
-    user = await get_user(query.from_user.id)
+    user = await get_user_balance(query.from_user.id)
     
     if user["balance"] < bet_amount:
         await query.edit_message_text(
@@ -322,7 +320,7 @@ async def join_wheel_game(query, game_id: str):
         await query.answer("Game is full!")
         return
     
-    user = await get_user(user_id)
+    user = await get_user_balance(user_id)
     if user["balance"] < game['bet_amount']:
         await query.answer(f"Insufficient funds! Need {format_money(game['bet_amount'])}")
         return
@@ -378,10 +376,19 @@ async def start_wheel_game(query, game_id: str):
     # Collect entry fees from all players
     all_players = [game['creator']] + list(game['players'].keys())
     total_pot = 0
+    paid = []
     
     for player_id in all_players:
         user = await get_user(player_id)
-        if user["balance"] < game['bet_amount']:
+        try:
+            if user["balance"] < game['bet_amount']:
+                raise InsufficientFundsError(player_id)
+            await settle_balance(player_id, -game['bet_amount'])
+        except InsufficientFundsError:
+            # Players who already paid get their entry back
+            for paid_id in paid:
+                await settle_balance(paid_id, game['bet_amount'])
+                await record_transaction(paid_id, game['bet_amount'], "wheel refund", f"Multiplayer game {game_id} cancelled")
             await query.edit_message_text(
                 f"❌ Game cancelled!\n"
                 f"Player {user['username'] or 'Unknown'} has insufficient funds."
@@ -389,7 +396,7 @@ async def start_wheel_game(query, game_id: str):
             del active_wheel_games[game_id]
             return
         
-        await update_user_balance(player_id, -game['bet_amount'])
+        paid.append(player_id)
         await record_transaction(player_id, -game['bet_amount'], "wheel entry", f"Multiplayer game {game_id}")
         total_pot += game['bet_amount']
     
@@ -433,8 +440,9 @@ async def start_wheel_game(query, game_id: str):
     individual_winnings = game['bet_amount'] * result_segment['multiplier']
     
     # Award winnings to all players
+    settled_users = {}
     for player_id in all_players:
-        await update_user_balance(player_id, individual_winnings)
+        settled_users[player_id] = await settle_balance(player_id, individual_winnings)
         await record_transaction(player_id, individual_winnings, "wheel win", f"Multiplayer game {game_id}")
         await record_game(player_id, "wheel", game['bet_amount'], "win", individual_winnings)
     
@@ -449,7 +457,7 @@ async def start_wheel_game(query, game_id: str):
     )
     
     for player_id in all_players:
-        user = await get_user(player_id)
+        user = settled_users[player_id]
         result_text += f"• {user['username'] or 'Unknown'}: +{format_money(individual_winnings - game['bet_amount'])}\n"
     
     keyboard = [
@@ -1,6 +1,6 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from src.database import get_user, update_user_balance, record_transaction, claim_daily_bonus, add_referral
+from src.database import get_user, get_user_stats, update_user_balance, record_transaction, claim_daily_bonus, add_referral
 from src.utils.formatting import format_money
 from datetime import datetime, timedelta
 
@@ -162,7 +162,7 @@ async def show_referral_program(update: Update, context: ContextTypes.DEFAULT_TY
 async def show_vip_rewards(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show VIP rewards program"""
     user_id = update.callback_query.from_user.id
-    user = await get_user(user_id)
+    user = await get_user_stats(user_id)
     
     total_deposits = user.get('total_deposits', 0)
     total_games = user.get('total_bets', 0)
@@ -1,6 +1,6 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from src.database import get_user
+from src.database import get_user_balance
 from src.utils.formatting import format_money
 from src.wallet.nowpayments import create_deposit_payment, create_deposit_invoice
 
@@ -60,7 +60,7 @@ async def deposit_menu_command(update: Update, context: ContextTypes.DEFAULT_TYP
 async def show_deposit_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show the deposit amount selection menu"""
     user_id = update.effective_user.id if update.effective_user else update.callback_query.from_user.id
-    user = await get_user(user_id)
+    user = await get_user_balance(user_id)
     
     message = (
         f"💰 **Deposit Funds** 💰\n\n"
@@ -1,7 +1,7 @@
 import os
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
 from telegram.ext import ContextTypes
-from src.database import get_user
+from src.database import get_user_balance
 from src.utils.formatting import format_money
 from dotenv import load_dotenv
 
@@ -15,7 +15,7 @@ async def games_menu_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def show_games_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show the unified games selection menu"""
     user_id = update.effective_user.id if update.effective_user else update.callback_query.from_user.id
-    user = await get_user(user_id)
+    user = await get_user_balance(user_id)
     
     message = (
         f"🎮 **GAMES** 🎮\n\n"
@@ -72,7 +72,7 @@ async def show_games_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def show_animated_games_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show Telegram animated games menu"""
     user_id = update.callback_query.from_user.id
-    user = await get_user(user_id)
+    user = await get_user_balance(user_id)
     
     message = (
         f"🎲 **ANIMATED GAMES** 🎲\n\n"
@@ -107,7 +107,7 @@ async def show_animated_games_menu(update: Update, context: ContextTypes.DEFAULT
 async def show_webapp_games_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show web app games menu"""
     user_id = update.callback_query.from_user.id
-    user = await get_user(user_id)
+    user = await get_user_balance(user_id)
     
     message = (
         f"🎮 **WEB APP GAMES** 🎮\n\n"
@@ -286,7 +286,7 @@ async def show_challenges_menu(update: Update, context: ContextTypes.DEFAULT_TYP
 async def show_blackjack_webapp(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show Blackjack web app"""
     user_id = update.callback_query.from_user.id
-    user = await get_user(user_id)
+    user = await get_user_balance(user_id)
     
     message = (
         f"♠️ **BLACKJACK** ♠️\n\n"
@@ -316,7 +316,7 @@ async def show_blackjack_webapp(update: Update, context: ContextTypes.DEFAULT_TY
 async def show_roulette_webapp(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show Roulette web app"""
     user_id = update.callback_query.from_user.id
-    user = await get_user(user_id)
+    user = await get_user_balance(user_id)
     
     message = (
         f"🎰 **ROULETTE** 🎰\n\n"
@@ -346,7 +346,7 @@ async def show_roulette_webapp(update: Update, context: ContextTypes.DEFAULT_TYP
 async def show_mines_webapp(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show Mines web app"""
     user_id = update.callback_query.from_user.id
-    user = await get_user(user_id)
+    user = await get_user_balance(user_id)
     
     message = (
         f"💣 **MINES** 💣\n\n"
@@ -376,7 +376,7 @@ async def show_mines_webapp(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def show_tower_webapp(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show Tower web app"""
     user_id = update.callback_query.from_user.id
-    user = await get_user(user_id)
+    user = await get_user_balance(user_id)
     
     message = (
         f"🏗️ **TOWER** 🏗️\n\n"
@@ -408,7 +408,7 @@ async def show_tower_webapp(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def show_crash_webapp(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show Crash web app"""
     user_id = update.callback_query.from_user.id
-    user = await get_user(user_id)
+    user = await get_user_balance(user_id)
     
     message = (
         f"🚀 **CRASH** 🚀\n\n"
@@ -438,7 +438,7 @@ async def show_crash_webapp(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def show_plinko_webapp(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show Plinko web app"""
     user_id = update.callback_query.from_user.id
-    user = await get_user(user_id)
+    user = await get_user_balance(user_id)
     
     message = (
         f"🟡 **PLINKO** 🟡\n\n"
@@ -469,7 +469,7 @@ async def show_plinko_webapp(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def show_lottery_webapp(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show Lottery web app"""
     user_id = update.callback_query.from_user.id
-    user = await get_user(user_id)
+    user = await get_user_balance(user_id)
     
     message = (
         f"🎰 **LOTTERY** 🎰\n\n"
@@ -499,7 +499,7 @@ async def show_lottery_webapp(update: Update, context: ContextTypes.DEFAULT_TYPE
 async def show_poker_webapp(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show Poker web app"""
     user_id = update.callback_query.from_user.id
-    user = await get_user(user_id)
+    user = await get_user_balance(user_id)
     
     message = (
         f"🃏 **POKER** 🃏\n\n"
@@ -529,7 +529,7 @@ async def show_poker_webapp(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def show_coinflip_betting_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show coinflip betting interface"""
     user_id = update.callback_query.from_user.id
-    user = await get_user(user_id)
+    user = await get_user_balance(user_id)
     
     message = (
         f"🪙 **COINFLIP** 🪙\n\n"
@@ -569,7 +569,7 @@ async def show_coinflip_betting_menu(update: Update, context: ContextTypes.DEFAU
 async def show_dice_betting_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show dice betting interface"""
     user_id = update.callback_query.from_user.id
-    user = await get_user(user_id)
+    user = await get_user_balance(user_id)
     
     message = (
         f"🎲 **DICE GAME** 🎲\n\n"
@@ -614,7 +614,7 @@ async def show_dice_betting_menu(update: Update, context: ContextTypes.DEFAULT_T
 async def show_lottery_betting_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show lottery betting menu"""
     user_id = update.callback_query.from_user.id
-    user = await get_user(user_id)
+    user = await get_user_balance(user_id)
 
     message = (
         f"🎰 **LOTTERY** 🎰\n\n"
@@ -647,7 +647,7 @@ async def show_lottery_betting_menu(update: Update, context: ContextTypes.DEFAUL
 async def show_poker_betting_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show poker betting menu"""
     user_id = update.callback_query.from_user.id
-    user = await get_user(user_id)
+    user = await get_user_balance(user_id)
 
     message = (
         f"🃏 **POKER** 🃏\n\n"
@@ -1,12 +1,12 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
 from telegram.ext import ContextTypes
-from src.database import get_user
+from src.database import get_user_balance
 from src.utils.formatting import format_money
 
 async def main_menu_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Display the main menu"""
     user_id = update.effective_user.id
-    user = await get_user(user_id)
+    user = await get_user_balance(user_id)
     
     message = (
         f"🎰 **ExoWin 👑** 🎰\n\n"
@@ -85,7 +85,7 @@ async def show_withdraw_menu(update: Update, context: ContextTypes.DEFAULT_TYPE)
     from src.database import can_withdraw
     
     user_id = update.callback_query.from_user.id
-    user = await get_user(user_id)
+    user = await get_user_balance(user_id)
     can_withdraw_funds = await can_withdraw(user_id)
     
     if not can_withdraw_funds:
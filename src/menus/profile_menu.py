@@ -1,6 +1,6 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from src.database import get_user
+from src.database import get_user_stats, get_user_rank
 from src.utils.formatting import format_money, format_user_stats
 
 async def profile_menu_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -10,7 +10,7 @@ async def profile_menu_command(update: Update, context: ContextTypes.DEFAULT_TYP
 async def show_profile_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show the user profile menu"""
     user_id = update.effective_user.id if update.effective_user else update.callback_query.from_user.id
-    user = await get_user(user_id)
+    user = await get_user_stats(user_id)
     
     # Calculate win rate
     total_games = user.get('total_bets', 0)
@@ -23,6 +23,11 @@ async def show_profile_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     current_balance = user.get('balance', 0)
     net_profit = current_balance + total_withdrawals - total_deposits - 1  # Subtract initial $1
     
+    # Leaderboard ranks come from memory, not Mongo
+    ranks = get_user_rank(user_id)
+    balance_rank = f"#{ranks['balance']:,}" if ranks['balance'] else "Unranked"
+    bets_rank = f"#{ranks['total_bets']:,}" if ranks['total_bets'] else "Unranked"
+    
     message = (
         f"👤 **Your Profile** 👤\n\n"
         f"🆔 User ID: `{user_id}`\n"
@@ -33,6 +38,9 @@ async def show_profile_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"🏆 Total wins: {total_wins:,}\n"
         f"📉 Total losses: {user.get('total_losses', 0):,}\n"
         f"📈 Win rate: {win_rate:.1f}%\n\n"
+        f"🏅 **Leaderboards:**\n"
+        f"💰 Balance rank: {balance_rank}\n"
+        f"🎮 Bets rank: {bets_rank}\n\n"
         f"💸 **Financial:**\n"
         f"💰 Total deposited: {format_money(total_deposits)}\n"
         f"💸 Total withdrawn: {format_money(total_withdrawals)}\n"
@@ -96,7 +104,7 @@ async def profile_menu_callback(update: Update, context: ContextTypes.DEFAULT_TY
 async def show_detailed_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show detailed user statistics"""
     user_id = update.callback_query.from_user.id
-    user = await get_user(user_id)
+    user = await get_user_stats(user_id)
     
     message = (
         f"📊 **Detailed Statistics** 📊\n\n"
@@ -119,7 +127,7 @@ async def show_detailed_stats(update: Update, context: ContextTypes.DEFAULT_TYPE
 async def show_achievements(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show user achievements"""
     user_id = update.callback_query.from_user.id
-    user = await get_user(user_id)
+    user = await get_user_stats(user_id)
     
     total_games = user.get('total_bets', 0)
     total_wins = user.get('total_wins', 0)
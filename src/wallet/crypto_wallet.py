@@ -7,6 +7,7 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from src.database import get_user, update_user_balance, record_transaction
 from src.utils.formatting import format_money
+from src.utils.error_handler import InsufficientFundsError
 from src.wallet.nowpayments import (
     get_api_status, 
     get_crypto_price, 
@@ -861,12 +862,17 @@ async def crypto_message_handler(update: Update, context: ContextTypes.DEFAULT_T
                 )
                 return True
             
+            # Deduct from user balance first; the guarded debit refuses overdrafts
+            try:
+                await update_user_balance(user_id, -amount_usd)
+            except InsufficientFundsError:
+                await update.message.reply_text("Insufficient funds.")
+                return True
+            
             # Process withdrawal through NOWPayments API
             withdrawal = await process_withdrawal(user_id, address, crypto, net_amount_crypto)
             
             if withdrawal:
-                # Deduct from user balance
-                await update_user_balance(user_id, -amount_usd)
                 await record_transaction(
                     user_id, 
                     -amount_usd, 
@@ -896,6 +902,8 @@ async def crypto_message_handler(update: Update, context: ContextTypes.DEFAULT_T
                 
                 await update.message.reply_text(message)
             else:
+                # Give the stake back when the payout was not accepted
+                await update_user_balance(user_id, amount_usd)
                 await update.message.reply_text(
                     "❌ Failed to process withdrawal. Please try again later or contact support."
                 )
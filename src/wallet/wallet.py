@@ -2,6 +2,7 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, Labeled
 from telegram.ext import ContextTypes
 from src.database import get_user, update_user_balance, record_transaction, can_withdraw
 from src.utils.formatting import format_money
+from src.utils.error_handler import InsufficientFundsError
 import os
 from dotenv import load_dotenv
 
@@ -382,8 +383,16 @@ async def process_withdrawal(update: Update, context: ContextTypes.DEFAULT_TYPE,
             await update.message.reply_text(message)
         return
     
-    # Deduct amount from user balance
-    await update_user_balance(user_id, -amount)
+    # Deduct amount from user balance; the guarded debit refuses overdrafts
+    try:
+        await update_user_balance(user_id, -amount)
+    except InsufficientFundsError:
+        message = "❌ Insufficient balance for this withdrawal."
+        if hasattr(update, 'callback_query') and update.callback_query:
+            await update.callback_query.edit_message_text(message)
+        else:
+            await update.message.reply_text(message)
+        return
     await record_transaction(user_id, -amount, "withdrawal")
     
     # Get updated user data
@@ -12,6 +12,7 @@ from telegram.ext import ContextTypes
 from src.database import get_user, update_user_balance, record_transaction
 from src.utils.formatting import format_money
 from src.utils.logger import bot_logger
+from src.utils.error_handler import InsufficientFundsError
 
 load_dotenv()
 
@@ -365,7 +366,12 @@ class WithdrawalSystem:
         
         # Deduct balance
         total_deduction = withdrawal['usd_value'] + withdrawal['processing_fee']
-        await update_user_balance(user_id, -total_deduction)
+        try:
+            await update_user_balance(user_id, -total_deduction)
+        except InsufficientFundsError:
+            del self.pending_withdrawals[withdrawal_id]
+            await update.callback_query.edit_message_text("❌ Insufficient balance for this withdrawal.")
+            return
         
         # Record transaction
         await record_transaction(
@@ -47,7 +47,7 @@ async def test_admin_functions():
         print(f"✅ Admin check function works: {admin_check}")
         
         # Test user retrieval
-        users, count = await get_all_users(limit=10)
+        users, next_cursor, count = await get_all_users(limit=10)
         print(f"✅ User retrieval: {count} total users, {len(users)} retrieved")
         
         # Test user search
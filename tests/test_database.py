@@ -0,0 +1,1443 @@
+import unittest
+import sys
+import os
+import time
+import asyncio
+import threading
+from datetime import datetime, timedelta
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.database.schema import build_settlement_filter, build_settlement_update, build_round_settlement, build_user_upsert, resolve_user_upsert, build_daily_bonus_claim, daily_bonus_amount, USER_DEFAULTS, REFERRER_BONUS, REFERRED_BONUS, CREDITED_REFERRALS_KEPT, build_referrer_credit
+from src.database.cache import UserCache
+from src.database.activity import LastActiveTracker
+from src.database.ledger import LedgerWriter
+from src.database.pagination import build_keyset_query, encode_cursor, decode_cursor
+from src.database.search import normalize_search_term, build_search_keys, build_prefix_query, rank_search_results
+from src.database.rollups import build_rollup_operations, build_backfill_pipeline, ALL_TIME_BUCKET, UNKNOWN_DIMENSION
+from src.database.leaderboard import Leaderboard, LeaderboardService
+from src.database.views import BalanceView, StatsView
+from src.database.indexes import apply_index_plan, build_index_plan, find_redundant_indexes, find_unused_indexes, find_unserved_indexes, index_serves_shape
+from src.database.monitoring import CommandStats, filter_shape, extract_filter
+from src.database.client import LazyHandle, PoolStats, available_compressors, client_options, get_sync_client, close_clients, analytics_read_preference
+from src.database.timeseries import migrate_games_to_timeseries, timeseries_options, GAMES_LEGACY_COLLECTION
+from src.database.archive import ArchiveCatalog, archive_collection, archive_collection_name, parse_archive_name, find_archived
+import src.database.archive as archive_module
+from src.database.singleflight import SingleFlight
+from src.database.migrations import Migration, MigrationRunner, MIGRATIONS
+from types import SimpleNamespace
+import bson
+from bson import ObjectId
+from src.utils.error_handler import DatabaseError, InsufficientFundsError
+from unittest import mock
+import src.database.db as db_module
+from pymongo import UpdateOne
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+class TestSettlementUpdate(unittest.TestCase):
+    """Test the single-round-trip settlement update document"""
+
+    def test_debit_counts_loss_and_bet(self):
+        """Test a bet deduction counts as a bet and a loss"""
+        update = build_settlement_update(-5.0)
+        self.assertEqual(update["$inc"], {"balance": -5.0, "total_bets": 1, "total_losses": 1})
+        self.assertIn("last_active", update["$set"])
+
+    def test_credit_counts_win_and_bet(self):
+        """Test a payout counts as a bet and a win"""
+        update = build_settlement_update(10.0)
+        self.assertEqual(update["$inc"], {"balance": 10.0, "total_bets": 1, "total_wins": 1})
+
+    def test_extra_counters_are_merged(self):
+        """Test extra counters and fields ride along in the same update"""
+        update = build_settlement_update(2.0, inc={"balance": 1.0, "total_referrals": 1}, set_fields={"referred_by": 42})
+        self.assertEqual(update["$inc"]["balance"], 3.0)
+        self.assertEqual(update["$inc"]["total_referrals"], 1)
+        self.assertEqual(update["$set"]["referred_by"], 42)
+
+class FakeBalanceCollection:
+    """Applies settlement filters and $inc to users held in memory"""
+
+    def __init__(self, users):
+        self.users = {user["user_id"]: dict(user) for user in users}
+
+    async def find_one_and_update(self, query, update, return_document=None):
+        user = self.users.get(query["user_id"])
+        if user is None or user["balance"] < query.get("balance", {}).get("$gte", float("-inf")):
+            return None
+        for field, value in update["$inc"].items():
+            user[field] = user.get(field, 0) + value
+        return dict(user)
+
+    async def find_one(self, query, projection=None):
+        user = self.users.get(query["user_id"])
+        return dict(user) if user else None
+
+class TestRoundSettlement(unittest.TestCase):
+    """Test shared-round payouts can be retried without paying twice"""
+
+    def test_round_key_guards_the_credit(self):
+        """Test a credit only matches users not yet paid for the round and records the round"""
+        query, update = build_round_settlement(7, "round-1", 12.5)
+        self.assertEqual(query, {"user_id": 7, "settled_rounds": {"$ne": "round-1"}})
+        self.assertEqual(update["$inc"]["balance"], 12.5)
+        self.assertEqual(update["$push"]["settled_rounds"]["$each"], ["round-1"])
+        self.assertLess(update["$push"]["settled_rounds"]["$slice"], 0)
+
+class TestWebappFlushers(unittest.TestCase):
+    """Test the webapp's flusher threads start on demand, once per process"""
+
+    def test_import_starts_nothing(self):
+        """Test importing sync_db leaves thread start-up to the app"""
+        import webapp.sync_db as sync_db
+        names = {thread.name for thread in threading.enumerate()}
+        if sync_db._background_pid is None:
+            self.assertNotIn("ledger-flusher", names)
+
+        with mock.patch.object(sync_db, "_background_pid", None), \
+                mock.patch.object(sync_db.ledger_writer, "start_thread") as ledger_start, \
+                mock.patch.object(sync_db.last_active_tracker, "start_thread") as activity_start, \
+                mock.patch.object(sync_db.atexit, "register"):
+            sync_db.start_background_threads()
+            sync_db.start_background_threads()
+        self.assertEqual((ledger_start.call_count, activity_start.call_count), (1, 1))
+
+class TestGuardedSettlement(unittest.TestCase):
+    """Test debits can never take a balance below zero"""
+
+    def test_filter_only_guards_debits(self):
+        """Test debits require the balance to cover them and credits do not"""
+        self.assertEqual(build_settlement_filter(7, -5.0), {"user_id": 7, "balance": {"$gte": 5.0}})
+        self.assertEqual(build_settlement_filter(7, 5.0), {"user_id": 7})
+
+    def test_concurrent_debits_cannot_overdraw(self):
+        """Test two bets racing on the same balance only take it once"""
+        users = FakeBalanceCollection([{"user_id": 7, "balance": 10.0}])
+
+        async def run():
+            return await asyncio.gather(
+                db_module.settle_balance(7, -10.0),
+                db_module.settle_balance(7, -10.0),
+                return_exceptions=True
+            )
+
+        with mock.patch.object(db_module, "users_collection", users):
+            results = asyncio.run(run())
+            self.assertEqual(sum(isinstance(result, InsufficientFundsError) for result in results), 1)
+            self.assertEqual(users.users[7]["balance"], 0.0)
+            self.assertIsNone(asyncio.run(db_module.settle_balance(8, 5.0)))
+
+    def test_withdrawal_check_ignores_cached_balance(self):
+        """Test a balance cached by this process cannot unlock a withdrawal"""
+        users = FakeBalanceCollection([{"user_id": 9, "balance": 0.0}])
+        db_module.user_cache.set({"user_id": 9, "balance": 500.0})
+        try:
+            with mock.patch.object(db_module, "users_collection", users):
+                self.assertFalse(asyncio.run(db_module.can_withdraw(9)))
+                self.assertEqual(asyncio.run(db_module.get_user_balance(9))["balance"], 500.0)
+        finally:
+            db_module.user_cache.invalidate(9)
+
+class TestDailyBonusClaim(unittest.TestCase):
+    """Test the single-statement daily bonus claim"""
+
+    def test_cooldown_is_in_the_filter(self):
+        """Test only users past the 24h cooldown or without a date match"""
+        now = datetime(2024, 5, 2, 12)
+        query, pipeline = build_daily_bonus_claim(42, now)
+        self.assertEqual(query["user_id"], 42)
+        self.assertIn({"last_daily_bonus": {"$lte": now - timedelta(hours=24)}}, query["$or"])
+        self.assertIn({"last_daily_bonus": {"$not": {"$type": "date"}}}, query["$or"])
+        self.assertEqual(pipeline[0]["$set"]["last_daily_bonus"], {"$literal": now})
+
+    def test_bonus_amount_caps_streak(self):
+        """Test the streak bonus grows by 0.10 a day up to 2.00"""
+        self.assertAlmostEqual(daily_bonus_amount(0), 0.5)
+        self.assertAlmostEqual(daily_bonus_amount(None), 0.5)
+        self.assertAlmostEqual(daily_bonus_amount(3), 0.8)
+        self.assertAlmostEqual(daily_bonus_amount(100), 2.5)
+
+class FakeReferralCollection:
+    """Applies the referral claim and referrer credit updates in memory"""
+
+    def __init__(self, users, fail_credits=0):
+        self.users = {user["user_id"]: dict(user) for user in users}
+        self.fail_credits = fail_credits
+
+    def _matches(self, user, query):
+        if "referred_by" in query and user.get("referred_by") != query["referred_by"]:
+            return False
+        if "credited_referrals" in query and query["credited_referrals"]["$ne"] in user.get("credited_referrals", []):
+            return False
+        return True
+
+    async def find_one_and_update(self, query, update, return_document=None):
+        if "credited_referrals" in query and self.fail_credits:
+            self.fail_credits -= 1
+            raise ConnectionError("primary stepped down")
+        user = self.users.get(query["user_id"])
+        if user is None or not self._matches(user, query):
+            return None
+        for field, value in update["$inc"].items():
+            user[field] = user.get(field, 0) + value
+        user.update(update.get("$set", {}))
+        for field, push in update.get("$push", {}).items():
+            user[field] = (user.get(field, []) + push["$each"])[push["$slice"]:]
+        return dict(user)
+
+    async def update_one(self, query, update):
+        for field in update["$unset"]:
+            self.users[query["user_id"]].pop(field, None)
+
+    def find(self, query, projection=None):
+        found = [dict(user) for user in self.users.values() if user.get("referrer_credit_pending")]
+        return SimpleNamespace(to_list=lambda length: asyncio.sleep(0, found[:length]))
+
+class TestReferrals(unittest.TestCase):
+    """Test the referrer credit survives a failed second update"""
+
+    def test_failed_referrer_credit_is_retried_once(self):
+        """Test a pending referrer credit is paid by the retry exactly once"""
+        users = FakeReferralCollection([
+            {"user_id": 1, "balance": 0.0, "referred_by": None},
+            {"user_id": 2, "balance": 0.0, "referred_by": None}
+        ], fail_credits=1)
+        with mock.patch.object(db_module, "users_collection", users), \
+                mock.patch.object(db_module.ledger_writer, "add", mock.AsyncMock()) as add_row, \
+                mock.patch.object(db_module.leaderboards, "observe"):
+            try:
+                self.assertEqual(asyncio.run(db_module.add_referral(1, 2)), (True, (REFERRER_BONUS, REFERRED_BONUS)))
+                self.assertTrue(users.users[2]["referrer_credit_pending"])
+                self.assertEqual(users.users[1]["balance"], 0.0)
+
+                self.assertEqual(asyncio.run(db_module.retry_referrer_credits()), 1)
+                self.assertEqual(asyncio.run(db_module.retry_referrer_credits()), 0)
+                self.assertEqual(users.users[1]["balance"], REFERRER_BONUS)
+                self.assertEqual(users.users[1]["total_referrals"], 1)
+                self.assertNotIn("referrer_credit_pending", users.users[2])
+                self.assertEqual(add_row.await_count, 2)
+
+                # Crediting the same referral again is a no-op
+                self.assertFalse(asyncio.run(db_module._credit_referrer(1, 2)))
+                self.assertEqual(users.users[1]["balance"], REFERRER_BONUS)
+            finally:
+                db_module.user_cache.invalidate(1)
+                db_module.user_cache.invalidate(2)
+
+    def test_referral_markers_have_their_own_cap(self):
+        """Test credited referrals are not capped by the shared-round window"""
+        query, update = build_referrer_credit(1, 2)
+        self.assertEqual(query, {"user_id": 1, "credited_referrals": {"$ne": 2}})
+        self.assertEqual(update["$push"]["credited_referrals"]["$slice"], -CREDITED_REFERRALS_KEPT)
+
+class TestUserUpsert(unittest.TestCase):
+    """Test the single-round-trip user bootstrap"""
+
+    def test_plain_read_only_sets_on_insert(self):
+        """Test a plain read never modifies an existing user"""
+        update = build_user_upsert()
+        self.assertNotIn("$set", update)
+        self.assertEqual(update["$setOnInsert"]["balance"], USER_DEFAULTS["balance"])
+        self.assertIn("created_at", update["$setOnInsert"])
+
+    def test_profile_fields_are_not_duplicated(self):
+        """Test profile fields move from $setOnInsert to $set"""
+        update = build_user_upsert({"username": "alice", "first_name": "Alice"})
+        self.assertEqual(update["$set"]["username"], "alice")
+        self.assertIn("last_active", update["$set"])
+        self.assertFalse(set(update["$set"]) & set(update["$setOnInsert"]))
+
+    def test_resolve_new_and_existing_user(self):
+        """Test the returned user reflects the upsert in both cases"""
+        update = build_user_upsert({"username": "alice"})
+        created = resolve_user_upsert(7, None, update)
+        self.assertEqual(created["user_id"], 7)
+        self.assertEqual(created["username"], "alice")
+        self.assertEqual(created["total_bets"], 0)
+        self.assertIsInstance(created["_id"], ObjectId)
+
+        existing = resolve_user_upsert(7, {"user_id": 7, "balance": 9.0, "username": "old"}, update)
+        self.assertEqual(existing["balance"], 9.0)
+        self.assertEqual(existing["username"], "alice")
+
+class FakeUpsertCollection:
+    """Counts plain reads and upserts of users held in memory"""
+
+    def __init__(self, users):
+        self.users = {user["user_id"]: dict(user) for user in users}
+        self.upserts = 0
+
+    async def find_one(self, query, projection=None):
+        user = self.users.get(query["user_id"])
+        return dict(user) if user else None
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        self.upserts += 1
+        before = self.users.get(query["user_id"])
+        if before is None:
+            self.users[query["user_id"]] = dict(update["$setOnInsert"], user_id=query["user_id"])
+        return dict(before) if before else None
+
+class TestUserLoad(unittest.TestCase):
+    """Test plain reads only write when the user is missing"""
+
+    def test_existing_user_is_read_without_upsert(self):
+        """Test a cache miss on an existing user is a plain find_one"""
+        users = FakeUpsertCollection([{"_id": ObjectId(), "user_id": 11, "balance": 3.0}])
+        with mock.patch.object(db_module, "users_collection", users):
+            user = asyncio.run(db_module._load_user(11))
+            created = asyncio.run(db_module._load_user(12))
+        db_module.user_cache.invalidate(11)
+        db_module.user_cache.invalidate(12)
+        self.assertEqual(user["balance"], 3.0)
+        self.assertEqual(users.upserts, 1)
+        self.assertEqual(created["_id"], users.users[12]["_id"])
+
+class TestUserCache(unittest.TestCase):
+    """Test the in-process user cache"""
+
+    def test_hit_and_miss_counters(self):
+        """Test lookups are counted and hits return copies"""
+        cache = UserCache(max_size=10, ttl=60)
+        self.assertIsNone(cache.get(1))
+        cache.set({"user_id": 1, "balance": 5.0})
+
+        user = cache.get(1)
+        user["balance"] = 0
+        self.assertEqual(cache.get(1)["balance"], 5.0)
+
+        stats = cache.get_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 1))
+
+    def test_lru_eviction(self):
+        """Test the least recently used user is evicted first"""
+        cache = UserCache(max_size=2, ttl=60)
+        cache.set({"user_id": 1})
+        cache.set({"user_id": 2})
+        cache.get(1)
+        cache.set({"user_id": 3})
+
+        self.assertIsNotNone(cache.get(1))
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.get_stats()["evictions"], 1)
+
+    def test_ttl_expiry_and_invalidation(self):
+        """Test expired and invalidated users are not served"""
+        cache = UserCache(max_size=10, ttl=0.01)
+        cache.set({"user_id": 1})
+        time.sleep(0.02)
+        self.assertIsNone(cache.get(1))
+
+        cache.ttl = 60
+        cache.set({"user_id": 2})
+        cache.invalidate(2)
+        self.assertIsNone(cache.get(2))
+
+    def test_read_older_than_a_write_is_not_stored(self):
+        """Test a read started before a write cannot put its copy back"""
+        cache = UserCache(max_size=10, ttl=60)
+        generation = cache.generation()
+        cache.invalidate(1)
+        cache.set({"user_id": 1, "balance": 5.0}, generation)
+        self.assertIsNone(cache.get(1))
+        self.assertEqual(cache.get_stats()["stale_sets"], 1)
+
+        cache.set({"user_id": 1, "balance": 5.0}, cache.generation())
+        self.assertEqual(cache.get(1)["balance"], 5.0)
+
+    def test_slow_read_racing_a_settlement(self):
+        """Test a user read that finishes after a settlement leaves the settled balance visible"""
+        class SlowReadCollection(FakeBalanceCollection):
+            async def find_one(self, query, projection=None):
+                user = dict(self.users[query["user_id"]])
+                read_done.set()
+                await release.wait()
+                return user
+
+        async def run():
+            reader = asyncio.ensure_future(db_module.get_user(31))
+            await read_done.wait()
+            await db_module.settle_balance(31, 5.0)
+            release.set()
+            self.assertEqual((await reader)["balance"], 1.0)
+            return await db_module.get_user_balance(31)
+
+        users = SlowReadCollection([{"user_id": 31, "balance": 1.0}])
+        read_done, release = asyncio.Event(), asyncio.Event()
+        try:
+            with mock.patch.object(db_module, "users_collection", users), \
+                    mock.patch.object(db_module.leaderboards, "observe"):
+                self.assertEqual(asyncio.run(run()).balance, 6.0)
+        finally:
+            db_module.user_cache.invalidate(31)
+
+class FakeUsersCollection:
+    """Records bulk writes instead of sending them to Mongo"""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.batches = []
+
+    async def bulk_write(self, operations, ordered=True):
+        if self.fail:
+            raise RuntimeError("primary unavailable")
+        self.batches.append(operations)
+
+class TestLastActiveTracker(unittest.TestCase):
+    """Test debounced last_active tracking"""
+
+    def test_touches_are_coalesced_per_user(self):
+        """Test many touches become one update per user in one bulk_write"""
+        tracker = LastActiveTracker()
+        now = datetime.now()
+        tracker.touch(1, now - timedelta(seconds=5))
+        tracker.touch(1, now)
+        tracker.touch(2, now)
+
+        collection = FakeUsersCollection()
+        self.assertEqual(asyncio.run(tracker.flush(collection)), 2)
+        self.assertEqual(len(collection.batches), 1)
+        self.assertCountEqual(collection.batches[0], [
+            UpdateOne({"user_id": 1}, {"$max": {"last_active": now}}),
+            UpdateOne({"user_id": 2}, {"$max": {"last_active": now}})
+        ])
+
+        self.assertEqual(asyncio.run(tracker.flush(collection)), 0)
+
+    def test_failed_flush_is_retried(self):
+        """Test timestamps survive a failed bulk_write"""
+        tracker = LastActiveTracker()
+        tracker.touch(1)
+        self.assertEqual(asyncio.run(tracker.flush(FakeUsersCollection(fail=True))), 0)
+        self.assertEqual(asyncio.run(tracker.flush(FakeUsersCollection())), 1)
+
+class FakeLedgerCollection:
+    """Records insert_many batches, optionally failing partway through"""
+
+    def __init__(self, fail_after=None, code=None):
+        self.fail_after = fail_after
+        self.code = code
+        self.batches = []
+
+    async def insert_many(self, rows, ordered=True):
+        if self.fail_after is not None:
+            self.batches.append(rows[:self.fail_after])
+            fail_after, self.fail_after = self.fail_after, None
+            if self.code is None:
+                raise RuntimeError("primary unavailable")
+            raise BulkWriteError({"nInserted": fail_after, "writeErrors": [{"index": fail_after, "code": self.code}]})
+        self.batches.append(list(rows))
+
+class TestLedgerWriter(unittest.TestCase):
+    """Test the write-behind games and transactions ledger"""
+
+    def test_rows_batch_until_threshold(self):
+        """Test rows are written in one ordered batch once the size threshold is hit"""
+        games = FakeLedgerCollection()
+        writer = LedgerWriter({"games": games}, batch_size=3)
+
+        async def run():
+            for i in range(3):
+                await writer.add("games", {"n": i})
+                if i < 2:
+                    self.assertEqual(games.batches, [])
+
+        asyncio.run(run())
+        self.assertEqual(games.batches, [[{"n": 0}, {"n": 1}, {"n": 2}]])
+        self.assertEqual(writer.pending(), 0)
+
+    def test_durable_write_flushes_and_raises(self):
+        """Test durable rows are written immediately and failures surface"""
+        transactions = FakeLedgerCollection()
+        writer = LedgerWriter({"transactions": transactions}, batch_size=100)
+        asyncio.run(writer.add("transactions", {"n": 1}, durable=True))
+        self.assertEqual(transactions.batches, [[{"n": 1}]])
+
+        transactions.fail_after = 0
+        with self.assertRaises(DatabaseError):
+            asyncio.run(writer.add("transactions", {"n": 2}, durable=True))
+        # A failed durable row is not retried behind the caller's back
+        self.assertEqual(writer.pending(), 0)
+
+    def test_failed_collection_does_not_lose_other_batches(self):
+        """Test a games failure neither drops nor blocks a durable deposit"""
+        games, transactions = FakeLedgerCollection(fail_after=0), FakeLedgerCollection()
+        writer = LedgerWriter({"games": games, "transactions": transactions}, batch_size=100)
+        writer._append("games", {"game": 1})
+        asyncio.run(writer.add("transactions", {"deposit": 1}, durable=True))
+        self.assertEqual(transactions.batches, [[{"deposit": 1}]])
+        self.assertEqual(writer.pending(), 1)
+
+        asyncio.run(writer.flush())
+        self.assertEqual(games.batches[-1], [{"game": 1}])
+        self.assertEqual(writer.pending(), 0)
+
+    def test_sync_flush_attempts_every_collection(self):
+        """Test the sync flush raises only after trying every batch"""
+        class SyncCollection(FakeLedgerCollection):
+            def insert_many(self, rows, ordered=True):
+                return asyncio.run(FakeLedgerCollection.insert_many(self, rows, ordered))
+
+        games, transactions = SyncCollection(fail_after=0), SyncCollection()
+        writer = LedgerWriter({"games": games, "transactions": transactions}, batch_size=100)
+        writer._append("games", {"game": 1})
+        writer._append("transactions", {"bet": 1})
+        with self.assertRaises(DatabaseError):
+            writer.flush_sync(raise_errors=True)
+        self.assertEqual(transactions.batches, [[{"bet": 1}]])
+        self.assertEqual(writer.pending(), 1)
+
+    def test_related_rows_share_one_batch(self):
+        """Test add_many buffers rows together and writes them in one insert"""
+        transactions = FakeLedgerCollection()
+        writer = LedgerWriter({"transactions": transactions}, batch_size=100)
+        asyncio.run(writer.add_many("transactions", [{"n": 1}, {"n": 2}], durable=True))
+        self.assertEqual(transactions.batches, [[{"n": 1}, {"n": 2}]])
+
+    def test_partial_failure_keeps_order_and_skips_duplicates(self):
+        """Test only rows after the stored prefix are retried"""
+        games = FakeLedgerCollection(fail_after=1, code=11000)
+        writer = LedgerWriter({"games": games}, batch_size=100)
+        for i in range(3):
+            writer._append("games", {"n": i})
+
+        self.assertEqual(asyncio.run(writer.flush()), 1)
+        self.assertEqual(asyncio.run(writer.flush()), 1)
+        self.assertEqual(games.batches[-1], [{"n": 2}])
+
+    def test_duplicate_row_is_not_rolled_up_again(self):
+        """Test a row an earlier flush already stored does not reach the rollups twice"""
+        games = FakeLedgerCollection(fail_after=1, code=11000)
+        rollups = mock.AsyncMock()
+        writer = LedgerWriter({"games": games}, batch_size=100, rollups={"games": rollups})
+        for i in range(3):
+            writer._append("games", {"n": i})
+
+        with mock.patch("src.database.ledger.build_rollup_operations", return_value=[]) as build:
+            asyncio.run(writer.flush())
+            asyncio.run(writer.flush())
+
+        rolled_up = [row for call in build.call_args_list for row in call.args[1]]
+        self.assertEqual(rolled_up, [{"n": 0}, {"n": 2}])
+        self.assertEqual(writer.rows_written, 2)
+
+    def test_retried_rows_are_looked_up_before_reinserting(self):
+        """Test rows a dropped insert stored are not duplicated in a collection without unique _ids"""
+        class TimeseriesCollection:
+            def __init__(self):
+                self.rows = []
+                self.drop_connection = True
+
+            def find(self, query, projection=None):
+                ids = set(query["_id"]["$in"])
+                return FakeCursor([{"_id": row["_id"]} for row in self.rows if row["_id"] in ids])
+
+            async def insert_many(self, rows, ordered=True):
+                if self.drop_connection:
+                    # The first rows land before the connection drops
+                    self.drop_connection = False
+                    self.rows.extend(rows[:2])
+                    raise AutoReconnect("connection reset")
+                self.rows.extend(rows)
+
+        games = TimeseriesCollection()
+        writer = LedgerWriter({"games": games}, batch_size=100, rollups={"games": mock.AsyncMock()})
+        for i in range(4):
+            writer._append("games", {"_id": i, "n": i})
+
+        with mock.patch("src.database.ledger.build_rollup_operations", return_value=[]) as build:
+            self.assertEqual(asyncio.run(writer.flush()), 0)
+            self.assertEqual(asyncio.run(writer.flush()), 4)
+
+        self.assertEqual(sorted(row["_id"] for row in games.rows), [0, 1, 2, 3])
+        rolled_up = [row["_id"] for call in build.call_args_list for row in call.args[1]]
+        self.assertEqual(sorted(rolled_up), [0, 1, 2, 3])
+        self.assertEqual((writer.rows_written, writer.pending()), (4, 0))
+
+    def test_backpressure_flushes_full_buffer(self):
+        """Test a full buffer is flushed before accepting more rows"""
+        games = FakeLedgerCollection()
+        writer = LedgerWriter({"games": games}, batch_size=100, max_buffer=2)
+
+        async def run():
+            for i in range(3):
+                await writer.add("games", {"n": i})
+
+        asyncio.run(run())
+        self.assertEqual(writer.backpressure_waits, 1)
+        self.assertEqual(games.batches, [[{"n": 0}, {"n": 1}]])
+        self.assertEqual(writer.pending(), 1)
+
+    def test_backpressure_refuses_rows_while_database_is_down(self):
+        """Test a full buffer raises instead of growing when its flush fails"""
+        class DownCollection(FakeLedgerCollection):
+            async def insert_many(self, rows, ordered=True):
+                raise AutoReconnect("primary unavailable")
+
+        writer = LedgerWriter({"games": DownCollection()}, batch_size=100, max_buffer=2)
+
+        async def run():
+            for i in range(2):
+                await writer.add("games", {"n": i})
+            for i in range(2, 4):
+                with self.assertRaises(DatabaseError):
+                    await writer.add("games", {"n": i})
+
+        asyncio.run(run())
+        self.assertEqual(writer.pending(), 2)
+        self.assertEqual(writer.backpressure_waits, 2)
+
+    def test_unencodable_row_is_dead_lettered(self):
+        """Test a row pymongo cannot encode no longer blocks the rows behind it"""
+        class EncodingCollection(FakeLedgerCollection):
+            async def insert_many(self, rows, ordered=True):
+                for row in rows:
+                    bson.encode(row)
+                self.batches.append(list(rows))
+
+        games = EncodingCollection()
+        writer = LedgerWriter({"games": games}, batch_size=100)
+        poison = {"n": object()}
+        for row in ({"n": 0}, poison, {"n": 2}):
+            writer._append("games", row)
+
+        self.assertEqual(asyncio.run(writer.flush()), 0)
+        self.assertEqual(asyncio.run(writer.flush()), 2)
+        self.assertEqual(games.batches, [[{"n": 0}, {"n": 2}]])
+        self.assertEqual([entry["row"] for entry in writer.dead_letters], [poison])
+        self.assertEqual(writer.pending(), 0)
+
+        # A durable caller learns its row was not recorded
+        with self.assertRaises(DatabaseError):
+            asyncio.run(writer.add("games", {"n": object()}, durable=True))
+        self.assertEqual(len(writer.dead_letters), 1)
+
+    def test_rejected_row_is_dead_lettered(self):
+        """Test a row the server rejects is set aside and the rest are retried"""
+        games = FakeLedgerCollection(fail_after=1, code=121)
+        writer = LedgerWriter({"games": games}, batch_size=100)
+        for i in range(3):
+            writer._append("games", {"n": i})
+
+        self.assertEqual(asyncio.run(writer.flush()), 1)
+        self.assertEqual(asyncio.run(writer.flush()), 1)
+        self.assertEqual(games.batches[-1], [{"n": 2}])
+        self.assertEqual([entry["row"] for entry in writer.dead_letters], [{"n": 1}])
+
+class TestKeysetPagination(unittest.TestCase):
+    """Test cursor pagination queries"""
+
+    def test_first_page_has_no_filter(self):
+        """Test the first page only sorts, with _id as tie-breaker"""
+        query, sort = build_keyset_query("created_at", -1)
+        self.assertEqual(query, {})
+        self.assertEqual(sort, [("created_at", -1), ("_id", -1)])
+
+    def test_cursor_round_trip_and_seek(self):
+        """Test a cursor resumes strictly after the last document"""
+        last = {"_id": ObjectId(), "created_at": datetime(2024, 1, 2, 3, 4, 5, 6000)}
+        cursor = encode_cursor(last, "created_at")
+        self.assertNotIn("=", cursor)
+        self.assertEqual(decode_cursor(cursor), (last["created_at"], last["_id"]))
+
+        query, _ = build_keyset_query("created_at", -1, cursor)
+        self.assertEqual(query["$or"][0], {"created_at": {"$lt": last["created_at"]}})
+        self.assertEqual(query["$or"][1], {"created_at": last["created_at"], "_id": {"$lt": last["_id"]}})
+
+    def test_invalid_cursor(self):
+        """Test a tampered cursor is rejected"""
+        with self.assertRaises(ValueError):
+            build_keyset_query("created_at", 1, "not-a-cursor")
+
+class TestUserSearch(unittest.TestCase):
+    """Test indexed user search keys and ranking"""
+
+    def test_keys_are_normalized(self):
+        """Test usernames and names are folded into prefix keys"""
+        keys = build_search_keys({"username": "Alice_W", "first_name": "Ana  Maria", "last_name": "STRASSE"})
+        self.assertIn("alice_w", keys)
+        self.assertIn("ana maria strasse", keys)
+        self.assertIn("maria", keys)
+        self.assertEqual(normalize_search_term("  @Alice "), "alice")
+        self.assertEqual(build_search_keys({"username": None}), [])
+
+    def test_upsert_maintains_keys(self):
+        """Test profile refreshes rewrite search keys"""
+        update = build_user_upsert({"username": "Bob"})
+        self.assertEqual(update["$set"]["search_keys"], ["bob"])
+        self.assertEqual(build_user_upsert()["$setOnInsert"]["search_keys"], [])
+
+    def test_prefix_query_is_anchored_and_escaped(self):
+        """Test user input cannot widen the indexed prefix scan"""
+        self.assertEqual(build_prefix_query("a.b"), {"search_keys": {"$regex": "^a\\.b"}})
+
+    def test_ranking(self):
+        """Test exact usernames outrank prefixes and name matches"""
+        users = [
+            {"user_id": 1, "username": "bobby", "search_keys": ["bobby"]},
+            {"user_id": 2, "username": "x", "search_keys": ["x", "bob"]},
+            {"user_id": 3, "username": "bob", "search_keys": ["bob"]},
+            {"user_id": 3, "username": "bob", "search_keys": ["bob"]}
+        ]
+        ranked = rank_search_results("bob", users, limit=10)
+        self.assertEqual([user["user_id"] for user in ranked], [3, 1, 2])
+
+class TestRollups(unittest.TestCase):
+    """Test analytics rollup maintenance"""
+
+    def test_batch_folds_into_one_upsert_per_bucket(self):
+        """Test rows in the same bucket share a single $inc upsert"""
+        rows = [
+            {"game_type": "dice", "bet_amount": 2.0, "winnings": 0.0, "timestamp": datetime(2024, 5, 1, 10, 15)},
+            {"game_type": "dice", "bet_amount": 5.0, "winnings": 9.0, "timestamp": datetime(2024, 5, 1, 10, 45)},
+            {"game_type": "dice", "bet_amount": 1.0, "winnings": 0.0, "timestamp": datetime(2024, 5, 1, 11, 5)}
+        ]
+        operations = build_rollup_operations("games", rows)
+        self.assertEqual(len(operations), 4)
+        self.assertIn(UpdateOne(
+            {"granularity": "hour", "bucket": datetime(2024, 5, 1, 10), "game_type": "dice"},
+            {"$inc": {"total_games": 2, "total_bet_amount": 7.0, "total_winnings": 9.0}, "$max": {"max_bet": 5.0}},
+            upsert=True
+        ), operations)
+        self.assertIn(UpdateOne(
+            {"granularity": "all", "bucket": ALL_TIME_BUCKET, "game_type": "dice"},
+            {"$inc": {"total_games": 3, "total_bet_amount": 8.0, "total_winnings": 9.0}, "$max": {"max_bet": 5.0}},
+            upsert=True
+        ), operations)
+
+    def test_transaction_rollups_and_backfill(self):
+        """Test transactions roll up per type and backfill merges on the bucket key"""
+        operations = build_rollup_operations("transactions", [
+            {"type": "deposit", "amount": 10.0, "timestamp": datetime(2024, 5, 1, 10)}
+        ])
+        self.assertEqual(operations[0], UpdateOne(
+            {"granularity": "hour", "bucket": datetime(2024, 5, 1, 10), "type": "deposit"},
+            {"$inc": {"count": 1, "total_amount": 10.0}, "$max": {"max_amount": 10.0}, "$min": {"min_amount": 10.0}},
+            upsert=True
+        ))
+
+        pipeline = build_backfill_pipeline("transactions", "day", "transaction_rollups")
+        self.assertEqual(pipeline[-1]["$merge"]["on"], ["granularity", "bucket", "type"])
+
+    def test_financial_stats_read_all_time_rollups(self):
+        """Test financial stats come from the rollups, sizing withdrawals like deposits"""
+        operations = build_rollup_operations("transactions", [
+            {"type": "withdrawal", "amount": -4.0, "timestamp": datetime(2024, 5, 1)},
+            {"type": "withdrawal", "amount": -10.0, "timestamp": datetime(2024, 5, 2)}
+        ])
+        self.assertIn(UpdateOne(
+            {"granularity": "all", "bucket": ALL_TIME_BUCKET, "type": "withdrawal"},
+            {"$inc": {"count": 2, "total_amount": -14.0}, "$max": {"max_amount": 10.0}, "$min": {"min_amount": 4.0}},
+            upsert=True
+        ), operations)
+
+        rollups = mock.Mock()
+        rollups.find.return_value = FakeCursor([
+            {"type": "deposit", "count": 2, "total_amount": 30.0, "max_amount": 20.0, "min_amount": 10.0},
+            {"type": "withdrawal", "count": 2, "total_amount": -14.0, "max_amount": 10.0, "min_amount": 4.0}
+        ])
+        with mock.patch.object(db_module, "analytics_transaction_rollups_collection", rollups), \
+                mock.patch.object(db_module, "flush_ledger", mock.AsyncMock()) as flush:
+            stats = asyncio.run(db_module.get_financial_stats())
+
+        # Secondary reads gain nothing from flushing to the primary first
+        flush.assert_not_awaited()
+
+        self.assertEqual(rollups.find.call_args.args[0]["granularity"], "all")
+        self.assertEqual(stats["deposits"]["avg_deposit"], 15.0)
+        self.assertEqual(stats["withdrawals"], {
+            "total_withdrawals": 14.0, "count_withdrawals": 2, "avg_withdrawal": 7.0,
+            "max_withdrawal": 10.0, "min_withdrawal": 4.0
+        })
+        self.assertEqual(stats["bonuses"], {})
+
+    def test_setup_builds_rollups_missing_for_existing_ledgers(self):
+        """Test only a ledger with rows and no rollup buckets is rebuilt"""
+        def collection(name, first_row):
+            return mock.Mock(name=name, find_one=mock.AsyncMock(return_value=first_row))
+
+        collections = {
+            "games_collection": collection("games", {"_id": 1}),
+            "game_rollups_collection": collection("game_rollups", None),
+            "transactions_collection": collection("transactions", {"_id": 2}),
+            "transaction_rollups_collection": collection("transaction_rollups", {"_id": 3}),
+        }
+        with mock.patch.multiple(db_module, **collections), \
+                mock.patch.object(db_module, "flush_ledger", mock.AsyncMock()), \
+                mock.patch.object(db_module.archive_catalog, "collection_names", mock.AsyncMock(return_value=[])), \
+                mock.patch.object(db_module, "_rebuild_ledger_rollups", mock.AsyncMock()) as rebuild:
+            self.assertEqual(asyncio.run(db_module.rebuild_missing_rollups()), ["games"])
+            rebuild.assert_awaited_once_with("games", collections["games_collection"], collections["game_rollups_collection"])
+
+            # A fresh database has nothing to rebuild
+            collections["games_collection"].find_one.return_value = None
+            rebuild.reset_mock()
+            self.assertEqual(asyncio.run(db_module.rebuild_missing_rollups()), [])
+            rebuild.assert_not_awaited()
+
+    def test_missing_dimension_shares_one_key(self):
+        """Test rows without a dimension value roll up under the same key in both paths"""
+        operations = build_rollup_operations("games", [
+            {"bet_amount": 1.0, "winnings": 0.0, "timestamp": datetime(2024, 5, 1, 10)}
+        ])
+        self.assertIn(UpdateOne(
+            {"granularity": "all", "bucket": ALL_TIME_BUCKET, "game_type": UNKNOWN_DIMENSION},
+            {"$inc": {"total_games": 1, "total_bet_amount": 1.0, "total_winnings": 0.0}, "$max": {"max_bet": 1.0}},
+            upsert=True
+        ), operations)
+        self.assertEqual(len(operations), 3)
+
+        pipeline = build_backfill_pipeline("games", "day", "game_rollups")
+        group = next(stage["$group"] for stage in pipeline if "$group" in stage)
+        self.assertEqual(group["_id"]["value"], {"$ifNull": ["$game_type", UNKNOWN_DIMENSION]})
+
+class TestLeaderboard(unittest.TestCase):
+    """Test the bounded in-memory leaderboards"""
+
+    def test_ranks_follow_updates(self):
+        """Test settlements reorder the board and ties break by user_id"""
+        board = Leaderboard("balance", size=3)
+        board.load([{"user_id": 1, "balance": 50.0}, {"user_id": 2, "balance": 20.0}])
+        board.update(3, 20.0)
+        self.assertEqual([board.rank(user_id) for user_id in (1, 2, 3)], [1, 2, 3])
+
+        board.update(3, 80.0)
+        self.assertEqual(board.rank(3), 1)
+        self.assertEqual(board.top(2), [{"user_id": 3, "balance": 80.0}, {"user_id": 1, "balance": 50.0}])
+
+    def test_board_stays_bounded(self):
+        """Test the lowest user is evicted and the floor keeps ranks exact"""
+        board = Leaderboard("balance", size=2)
+        board.load([{"user_id": 1, "balance": 30.0}, {"user_id": 2, "balance": 20.0}])
+        self.assertEqual(board.floor, 20.0)
+
+        board.update(3, 25.0)
+        self.assertIsNone(board.rank(2))
+        self.assertEqual(board.floor, 20.0)
+
+        # A tracked user falling below the floor may be behind someone untracked
+        board.update(1, 5.0)
+        self.assertIsNone(board.rank(1))
+        self.assertEqual(board.rank(3), 1)
+
+    def test_service_observes_user_documents(self):
+        """Test one settled user document updates every metric"""
+        service = LeaderboardService(size=10)
+        service.observe({"user_id": 7, "balance": 3.0, "total_bets": 4})
+        self.assertEqual(service.get_rank(7), {"balance": 1, "total_bets": 1})
+        self.assertEqual(service.get_rank(8), {"balance": None, "total_bets": None})
+
+class TestUserViews(unittest.TestCase):
+    """Test projected lightweight user views"""
+
+    def test_projection_matches_slots(self):
+        """Test a view only asks Mongo for its own fields"""
+        self.assertEqual(BalanceView.projection(), {"_id": 0, "user_id": 1, "balance": 1, "is_banned": 1})
+
+    def test_view_reads_like_a_document(self):
+        """Test views support item access, defaults and stay read-only"""
+        view = StatsView.from_document({"user_id": 1, "balance": 4.5, "total_bets": 3, "username": "ignored"})
+        self.assertEqual(view.balance, 4.5)
+        self.assertEqual(view["total_bets"], 3)
+        self.assertEqual(view.get("total_wins"), 0)
+        self.assertIsNone(view.get("username"))
+        self.assertFalse(hasattr(view, "__dict__"))
+        with self.assertRaises(KeyError):
+            view["username"]
+        with self.assertRaises(AttributeError):
+            view.balance = 0
+
+class TestIndexAdvisor(unittest.TestCase):
+    """Test index analysis against the declarative plan"""
+
+    def test_prefix_redundant_indexes(self):
+        """Test single-field indexes covered by a compound are flagged"""
+        indexes = [
+            {"name": "_id_", "key": {"_id": 1}},
+            {"name": "user_id_1", "key": {"user_id": 1}},
+            {"name": "user_id_1_timestamp_-1", "key": {"user_id": 1, "timestamp": -1}},
+            {"name": "uniq", "key": {"timestamp": 1}, "unique": True},
+            {"name": "timestamp_1_x_1", "key": {"timestamp": 1, "x": 1}}
+        ]
+        self.assertEqual(find_redundant_indexes(indexes), [{"name": "user_id_1", "covered_by": "user_id_1_timestamp_-1"}])
+
+    def test_unused_indexes(self):
+        """Test indexes without recorded accesses are reported"""
+        stats = [
+            {"name": "_id_", "accesses": {"ops": 0}},
+            {"name": "is_banned_1", "accesses": {"ops": 0}},
+            {"name": "user_id_1", "accesses": {"ops": 12}}
+        ]
+        self.assertEqual(find_unused_indexes(stats), ["is_banned_1"])
+
+    def test_plan_serves_recorded_shapes(self):
+        """Test every planned index backs a query and redundant ones are gone"""
+        plan = build_index_plan()
+        self.assertEqual(find_unserved_indexes(plan), [])
+        game_indexes = {index["options"]["name"] for index in plan["games"]}
+        self.assertNotIn("user_id_1", game_indexes)
+        self.assertNotIn("game_type_1", game_indexes)
+
+    def test_shape_matching(self):
+        """Test equality prefixes, ranges and reversed sorts"""
+        shape = {"collection": "games", "equality": ["user_id"], "sort": [("timestamp", -1)]}
+        self.assertTrue(index_serves_shape([("user_id", 1), ("timestamp", 1)], shape))
+        self.assertFalse(index_serves_shape([("timestamp", -1)], shape))
+        self.assertTrue(index_serves_shape([("last_active", 1)], {"range": "last_active"}))
+
+    def test_replacement_drops_same_key_index(self):
+        """Test a planned index replaces an unplanned one on the same keys"""
+        class FakeIndexCollection:
+            def __init__(self):
+                self.indexes = [{"name": "_id_", "key": {"_id": 1}}, {"name": "is_banned_1", "key": {"is_banned": 1}}, {"name": "old_1", "key": {"old": 1}}]
+                self.calls = []
+
+            def list_indexes(self):
+                indexes = list(self.indexes)
+                return SimpleNamespace(to_list=lambda length: asyncio.sleep(0, indexes))
+
+            async def drop_index(self, name):
+                self.calls.append(("drop", name))
+
+            async def create_index(self, keys, **options):
+                self.calls.append(("create", options["name"]))
+
+        collection = FakeIndexCollection()
+        plan = {"users": [{"keys": [("is_banned", 1)], "options": {"name": "banned_users", "partialFilterExpression": {"is_banned": True}}}]}
+        actions = asyncio.run(apply_index_plan({"users": collection}, plan))
+        self.assertEqual(collection.calls, [("drop", "is_banned_1"), ("create", "banned_users")])
+        self.assertEqual(actions[0], "drop users.is_banned_1 (replaced by banned_users)")
+
+class TestCommandMonitoring(unittest.TestCase):
+    """Test command latency histograms and the slow-query log"""
+
+    def _run(self, stats, request_id, command_name, command, duration_ms):
+        event = SimpleNamespace(
+            command_name=command_name, command=command, database_name="exowin_bot",
+            connection_id=("localhost", 27017), request_id=request_id,
+            duration_micros=int(duration_ms * 1000)
+        )
+        stats.started(event)
+        stats.succeeded(event)
+
+    def test_filter_shape_hides_values(self):
+        """Test slow-query shapes keep fields and operators but no user data"""
+        shape = filter_shape({"user_id": 42, "$or": [{"a": "x"}, {"a": "y"}], "ts": {"$gte": datetime.now()}})
+        self.assertEqual(shape, {"user_id": "int", "$or": [{"a": "str"}], "ts": {"$gte": "datetime"}})
+        self.assertEqual(extract_filter("update", {"updates": [{"q": {"user_id": 1}}]}), {"user_id": 1})
+
+    def test_latency_is_recorded_per_operation(self):
+        """Test calls are grouped by collection and command with slow ones logged"""
+        stats = CommandStats(slow_ms=50)
+        self._run(stats, 1, "find", {"find": "users", "filter": {"user_id": 1}}, 3)
+        self._run(stats, 2, "find", {"find": "users", "filter": {"user_id": 2}}, 80)
+        self._run(stats, 3, "ping", {"ping": 1}, 500)
+
+        summary = stats.get_stats()
+        self.assertEqual(len(summary), 1)
+        self.assertEqual((summary[0]["collection"], summary[0]["count"]), ("users", 2))
+        self.assertEqual(summary[0]["max_ms"], 80)
+        self.assertEqual(len(stats.slow_queries), 1)
+        self.assertEqual(stats.slow_queries[0]["shape"], {"user_id": "int"})
+
+class TestClientFactory(unittest.TestCase):
+    """Test the shared client options, reuse and pool metrics"""
+
+    def test_compressors_and_options(self):
+        """Test unknown compressors are dropped and zlib is always available"""
+        self.assertIn("zlib", available_compressors("bogus, zlib"))
+        self.assertNotIn("bogus", available_compressors("bogus, zlib"))
+        options = client_options()
+        self.assertFalse(options["connect"])
+        self.assertIn("maxPoolSize", options)
+
+    def test_client_is_reused_until_closed(self):
+        """Test the sync client is built lazily once per process"""
+        first = get_sync_client()
+        self.assertIs(get_sync_client(), first)
+        close_clients("pymongo")
+        self.assertIsNot(get_sync_client(), first)
+        close_clients("pymongo")
+
+    def test_lazy_handles_follow_the_factory(self):
+        """Test module-level handles pick up a client rebuilt after close"""
+        users = LazyHandle(get_sync_client)["exowin_test"]["users"]
+        first = users.database.client
+        self.assertIs(first, get_sync_client())
+        close_clients("pymongo")
+        self.assertIsNot(users.database.client, first)
+        self.assertIs(users.database.client, get_sync_client())
+        self.assertEqual(users.name, "users")
+        close_clients("pymongo")
+
+    def test_analytics_read_preference(self):
+        """Test dashboards prefer a secondary with bounded staleness"""
+        preference = analytics_read_preference().document
+        self.assertEqual(preference["mode"], "secondaryPreferred")
+        self.assertGreaterEqual(preference["maxStalenessSeconds"], 90)
+
+    def test_pool_stats_track_checkouts(self):
+        """Test checkouts, check-ins and the peak in-use count"""
+        stats = PoolStats()
+        event = SimpleNamespace(address=("localhost", 27017), reason="timeout")
+        stats.connection_created(event)
+        stats.connection_checked_out(event)
+        stats.connection_checked_out(event)
+        stats.connection_checked_in(event)
+        stats.connection_check_out_failed(event)
+        result = stats.get_stats()
+        self.assertEqual((result["checked_out"], result["peak_checked_out"]), (1, 2))
+        self.assertEqual((result["checkouts"], result["checkout_failures"]), (2, 1))
+
+class FakeGroupUsers:
+    """Users collection that evaluates the single $group stage of an aggregate"""
+
+    def __init__(self, users):
+        self.users = users
+        self.pipelines = []
+
+    def _value(self, expression, user):
+        if isinstance(expression, str) and expression.startswith("$"):
+            return user.get(expression[1:])
+        if isinstance(expression, dict):
+            operator, args = next(iter(expression.items()))
+            values = [self._value(arg, user) for arg in args]
+            if operator == "$cond":
+                return values[1] if values[0] else values[2]
+            if values[0] is None:
+                return False
+            return values[0] >= values[1] if operator == "$gte" else values[0] > values[1]
+        return expression
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        (stage,) = pipeline
+        result = {"_id": None}
+        for field, accumulator in stage["$group"].items():
+            if field == "_id":
+                continue
+            operator, expression = next(iter(accumulator.items()))
+            values = [self._value(expression, user) for user in self.users]
+            result[field] = sum(values) if operator == "$sum" else sum(values) / len(values)
+        return FakeCursor([result] if self.users else [])
+
+class TestAdminStats(unittest.TestCase):
+    """Test the admin panel's financial and activity views"""
+
+    def test_activity_stats_count_every_window_in_one_pass(self):
+        """Test activity windows and engagement come from a single aggregation"""
+        now = datetime.now()
+        users = FakeGroupUsers([
+            {"last_active": now - timedelta(minutes=5), "total_bets": 10, "balance": 4.0, "total_deposits": 20.0, "total_withdrawals": 0},
+            {"last_active": now - timedelta(hours=5), "total_bets": 2, "balance": 0.0, "total_deposits": 0, "total_withdrawals": 5.0},
+            {"last_active": now - timedelta(days=3), "total_bets": 0, "balance": 2.0, "total_deposits": 10.0, "total_withdrawals": 0},
+            {"last_active": now - timedelta(days=60), "total_bets": 0, "balance": 0.0},
+            {"total_bets": 0, "balance": 0.0}
+        ])
+        with mock.patch.object(db_module, "analytics_users_collection", users):
+            stats = asyncio.run(db_module.get_user_activity_stats())
+
+        self.assertEqual(len(users.pipelines), 1)
+        self.assertEqual(
+            [stats[window] for window in ("active_1h", "active_24h", "active_7d", "active_30d")],
+            [1, 2, 3, 3]
+        )
+        self.assertEqual(stats["engagement"]["avg_games_per_user"], 2.4)
+        self.assertEqual(stats["engagement"]["total_users_with_deposits"], 2)
+        self.assertEqual(stats["engagement"]["total_users_with_withdrawals"], 1)
+
+    def test_activity_stats_without_users(self):
+        """Test an empty users collection gives zero counts, not an error"""
+        with mock.patch.object(db_module, "analytics_users_collection", FakeGroupUsers([])):
+            stats = asyncio.run(db_module.get_user_activity_stats())
+        self.assertEqual(stats, {"active_1h": 0, "active_24h": 0, "active_7d": 0, "active_30d": 0, "engagement": {}})
+
+    def test_financial_stats_scan_once_and_skip_missing_types(self):
+        """Test one rollup read serves all three sections and absent types stay empty"""
+        rollups = mock.Mock()
+        rollups.find.return_value = FakeCursor([
+            {"type": "bonus", "count": 4, "total_amount": 6.0, "max_amount": 3.0, "min_amount": 0.5},
+            {"type": "deposit", "count": 0, "total_amount": 0.0}
+        ])
+        with mock.patch.object(db_module, "analytics_transaction_rollups_collection", rollups):
+            stats = asyncio.run(db_module.get_financial_stats())
+
+        self.assertEqual(rollups.find.call_count, 1)
+        self.assertEqual(stats["bonuses"], {"total_bonuses": 6.0, "count_bonuses": 4, "avg_bonus": 1.5})
+        self.assertEqual((stats["deposits"], stats["withdrawals"]), ({}, {}))
+
+class FakeCursor:
+    """Minimal async cursor over a list of documents"""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs = sorted(self.docs, key=lambda doc: doc[field], reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.docs = self.docs[:count]
+        return self
+
+    async def to_list(self, length=None):
+        return list(self.docs)
+
+class FakeMigrationCollection:
+    """Collection stub with just what the time-series migration uses"""
+
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+
+    async def rename(self, new_name):
+        self.database.collections[new_name] = self.database.collections.pop(self.name)
+
+    def find(self, query, projection=None):
+        docs = self.database.collections[self.name]["docs"]
+        if "_id" in query:
+            docs = [doc for doc in docs if doc["_id"] > query["_id"]["$gt"]]
+        return FakeCursor(docs)
+
+    async def insert_many(self, rows, ordered=True):
+        if self.database.fail_inserts_after is not None:
+            if self.database.fail_inserts_after == 0:
+                # Half the batch lands before the connection drops
+                self.database.collections[self.name]["docs"].extend(rows[:len(rows) // 2])
+                self.database.fail_inserts_after = None
+                raise ConnectionError("connection reset")
+            self.database.fail_inserts_after -= 1
+        self.database.collections[self.name]["docs"].extend(rows)
+
+    async def find_one(self, query):
+        return self.database.checkpoints.get(query["_id"])
+
+    async def update_one(self, query, update, upsert=False):
+        self.database.checkpoints.setdefault(query["_id"], {"_id": query["_id"]}).update(update["$set"])
+
+    async def count_documents(self, query):
+        docs = self.database.collections.get(self.name, {"docs": []})["docs"]
+        return len([doc for doc in docs if not query or doc.get("timestamp") is not None])
+
+class FakeMigrationDatabase:
+    """Database stub tracking collections and their types"""
+
+    def __init__(self):
+        self.collections = {}
+        self.checkpoints = {}
+        self.fail_inserts_after = None
+
+    def __getitem__(self, name):
+        return FakeMigrationCollection(self, name)
+
+    def list_collections(self, filter):
+        name = filter["name"]
+        if name not in self.collections:
+            return FakeCursor([])
+        return FakeCursor([{"name": name, "type": self.collections[name]["type"]}])
+
+    async def create_collection(self, name, timeseries=None):
+        self.collections[name] = {"type": "timeseries" if timeseries else "collection", "docs": []}
+
+class TestGamesTimeseries(unittest.TestCase):
+    """Test moving the games ledger into a time-series collection"""
+
+    def test_options_use_user_id_as_meta(self):
+        """Test user_id filters keep working against the time-series collection"""
+        options = timeseries_options("minutes")
+        self.assertEqual((options["timeField"], options["metaField"], options["granularity"]), ("timestamp", "user_id", "minutes"))
+
+    def test_migration_copies_every_round(self):
+        """Test rounds are copied in batches and a second run is a no-op"""
+        database = FakeMigrationDatabase()
+        rounds = [{"_id": i, "user_id": i % 3, "game_type": "dice", "timestamp": datetime(2024, 1, 1) + timedelta(seconds=i)} for i in range(25)]
+        database.collections["games"] = {"type": "collection", "docs": rounds}
+
+        copied = asyncio.run(migrate_games_to_timeseries(database, batch_size=10))
+        self.assertEqual(copied, 25)
+        self.assertEqual(database.collections["games"]["type"], "timeseries")
+        self.assertEqual(len(database.collections[GAMES_LEGACY_COLLECTION]["docs"]), 25)
+        self.assertEqual(asyncio.run(migrate_games_to_timeseries(database, batch_size=10)), 0)
+
+    def test_interrupted_migration_resumes_without_duplicates(self):
+        """Test a run that dies mid-batch resumes from its checkpoint"""
+        database = FakeMigrationDatabase()
+        rounds = [{"_id": i, "user_id": i % 3, "game_type": "dice", "timestamp": datetime(2024, 1, 1) + timedelta(seconds=i)} for i in range(25)]
+        database.collections["games"] = {"type": "collection", "docs": rounds}
+        database.fail_inserts_after = 1
+
+        with self.assertRaises(ConnectionError):
+            asyncio.run(migrate_games_to_timeseries(database, batch_size=10))
+        self.assertEqual(database.checkpoints["games_timeseries"]["last_id"], 9)
+
+        self.assertEqual(asyncio.run(migrate_games_to_timeseries(database, batch_size=10)), 10)
+        copied_ids = [doc["_id"] for doc in database.collections["games"]["docs"]]
+        self.assertEqual(sorted(copied_ids), list(range(25)))
+        self.assertEqual(database.checkpoints["games_timeseries"]["status"], "done")
+        self.assertEqual(asyncio.run(migrate_games_to_timeseries(database, batch_size=10)), 0)
+
+class FakeArchiveDatabase:
+    """Database stub holding archive collections as lists of rows"""
+
+    def __init__(self, collections):
+        self.collections = collections
+        self.queried = []
+
+    async def list_collection_names(self):
+        return list(self.collections)
+
+    def __getitem__(self, name):
+        database = self
+
+        class Collection:
+            def find(self, query):
+                database.queried.append(name)
+                rows = [row for row in database.collections[name] if row["user_id"] == query["user_id"]]
+                if "timestamp" in query:
+                    rows = [row for row in rows if row["timestamp"] < query["timestamp"]["$lt"]]
+                return FakeCursor(rows)
+
+        return Collection()
+
+class FakeTimeseriesLedger:
+    """Time-series games collection that, like MongoDB 6.x, rejects non-meta deletes"""
+
+    def __init__(self, database, rows):
+        self.database = database
+        self.rows = rows
+        self.deletes = []
+
+    def find(self, query):
+        bound = query["timestamp"]
+        if isinstance(bound, dict):
+            return FakeCursor([row for row in self.rows if row["timestamp"] < bound["$lt"]])
+        return FakeCursor([row for row in self.rows if row["timestamp"] == bound])
+
+    async def delete_many(self, query):
+        if self.database.version < (7, 0) and set(query) != {"user_id"}:
+            raise RuntimeError("Cannot perform an update or delete on a time-series collection when querying on a field that is not the metaField")
+        self.deletes.append(query)
+        self.rows = [row for row in self.rows if row["timestamp"] > query["timestamp"]["$lte"]]
+
+class FakeTimeseriesArchiveDatabase:
+    """Database stub with a time-series games ledger and list-backed archives"""
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.games = FakeTimeseriesLedger(self, rows)
+        self.archives = {}
+
+    async def command(self, name):
+        return {"versionArray": list(self.version) + [0, 0]}
+
+    def list_collections(self, filter):
+        return FakeCursor([{"name": "games", "type": "timeseries"}] if filter["name"] == "games" else [])
+
+    async def list_collection_names(self):
+        return ["games"] + list(self.archives)
+
+    async def create_collection(self, name, **options):
+        self.archives.setdefault(name, [])
+
+    def __getitem__(self, name):
+        if name == "games":
+            return self.games
+        database = self
+
+        class Archive:
+            async def create_index(self, keys):
+                pass
+
+            async def insert_many(self, rows, ordered=True):
+                database.archives[name].extend(rows)
+
+        return Archive()
+
+class TestLedgerArchive(unittest.TestCase):
+    """Test monthly archive naming, history fallback and rollup rebuilds"""
+
+    def setUp(self):
+        self.original_catalog = archive_module.archive_catalog
+        archive_module.archive_catalog = ArchiveCatalog()
+
+    def tearDown(self):
+        archive_module.archive_catalog = self.original_catalog
+
+    def test_archive_names_round_trip(self):
+        """Test rows map to a monthly collection that parses back"""
+        name = archive_collection_name("games", datetime(2024, 3, 17, 12))
+        self.assertEqual(name, "games_archive_2024_03")
+        self.assertEqual(parse_archive_name(name), ("games", datetime(2024, 3, 1)))
+        self.assertIsNone(parse_archive_name("games_legacy"))
+
+    def test_history_reads_newest_archive_months_first(self):
+        """Test archived pages skip months before the user existed"""
+        database = FakeArchiveDatabase({
+            "games_archive_2024_01": [{"user_id": 1, "timestamp": datetime(2024, 1, 5)}],
+            "games_archive_2024_02": [{"user_id": 1, "timestamp": datetime(2024, 2, day)} for day in (3, 9, 20)],
+            "transactions_archive_2024_02": []
+        })
+        rows = asyncio.run(find_archived(database, "games", 1, limit=2, before=datetime(2024, 2, 15)))
+        self.assertEqual([row["timestamp"].day for row in rows], [9, 3])
+
+        database.queried.clear()
+        rows = asyncio.run(find_archived(database, "games", 1, limit=5, since=datetime(2024, 2, 2)))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(database.queried, ["games_archive_2024_02"])
+
+    def test_timeseries_games_are_archived_by_timestamp_range(self):
+        """Test a 7.0 time-series ledger is deleted by time range, ties included"""
+        rows = [{"_id": i, "user_id": i % 2, "timestamp": datetime(2024, 1, 1 + i // 2)} for i in range(5)]
+        database = FakeTimeseriesArchiveDatabase((7, 0), rows)
+
+        moved = asyncio.run(archive_collection(database, "games", datetime(2024, 2, 1), batch_size=3))
+        self.assertEqual(moved, 5)
+        self.assertEqual(sorted(row["_id"] for row in database.archives["games_archive_2024_01"]), list(range(5)))
+        self.assertEqual(database.games.rows, [])
+        self.assertTrue(all(set(query) == {"timestamp"} for query in database.games.deletes))
+
+    def test_timeseries_games_are_skipped_before_7_0(self):
+        """Test a 6.x time-series ledger is left in place instead of failing the run"""
+        rows = [{"_id": 1, "user_id": 1, "timestamp": datetime(2024, 1, 1)}]
+        database = FakeTimeseriesArchiveDatabase((6, 0), rows)
+
+        with self.assertLogs("database", level="WARNING"):
+            self.assertEqual(asyncio.run(archive_collection(database, "games", datetime(2024, 2, 1))), 0)
+        self.assertEqual(database.games.rows, rows)
+        self.assertEqual(database.archives, {})
+
+    def test_rebuild_pipeline_reads_archives(self):
+        """Test the backfill unions archived months before grouping"""
+        pipeline = build_backfill_pipeline("games", "all", "game_rollups", union=["games_archive_2024_01"])
+        self.assertEqual(pipeline[0], {"$unionWith": "games_archive_2024_01"})
+        self.assertIn("$group", pipeline[1])
+
+class TestSingleFlight(unittest.TestCase):
+    """Test concurrent identical reads share one query"""
+
+    def test_concurrent_reads_are_coalesced(self):
+        """Test one query serves every caller that arrives while it runs"""
+        flight = SingleFlight()
+        queries = []
+
+        async def load():
+            queries.append(1)
+            await asyncio.sleep(0.01)
+            return {"user_id": 1, "balance": 10}
+
+        async def run():
+            return await asyncio.gather(*(flight.do((1, "user"), load) for _ in range(5)))
+
+        results = asyncio.run(run())
+        self.assertEqual(len(queries), 1)
+        self.assertTrue(all(result["balance"] == 10 for result in results))
+        stats = flight.get_stats()
+        self.assertEqual((stats["executions"], stats["coalesced"], stats["in_flight"]), (1, 4, 0))
+
+    def test_write_detaches_inflight_read(self):
+        """Test callers arriving after a write start a fresh query"""
+        flight = SingleFlight()
+        balances = iter([10, 25])
+
+        async def load():
+            balance = next(balances)
+            await asyncio.sleep(0.01)
+            return balance
+
+        async def run():
+            first = asyncio.ensure_future(flight.do((1, "user"), load))
+            await asyncio.sleep(0)
+            flight.forget_group(1)
+            second = await flight.do((1, "user"), load)
+            return await first, second
+
+        self.assertEqual(asyncio.run(run()), (10, 25))
+
+    def test_cancelled_caller_does_not_cancel_query(self):
+        """Test the shared query survives one waiter being cancelled"""
+        flight = SingleFlight()
+
+        async def load():
+            await asyncio.sleep(0.01)
+            return "done"
+
+        async def run():
+            leader = asyncio.ensure_future(flight.do((1, "user"), load))
+            follower = asyncio.ensure_future(flight.do((1, "user"), load))
+            await asyncio.sleep(0)
+            leader.cancel()
+            return await follower
+
+        self.assertEqual(asyncio.run(run()), "done")
+
+class FakeMigrationTarget:
+    """Collection stub supporting _id-ordered scans, bulk_write and checkpoints"""
+
+    def __init__(self, docs=None):
+        self.docs = {doc["_id"]: doc for doc in (docs or [])}
+        self.bulk_writes = 0
+        self.received = []
+
+    def _matches(self, doc, query):
+        if "$and" in query:
+            return all(self._matches(doc, part) for part in query["$and"])
+        if "_id" in query and isinstance(query["_id"], dict):
+            return doc["_id"] > query["_id"]["$gt"]
+        return all(doc.get(field) == value for field, value in query.items())
+
+    def find(self, query=None, projection=None):
+        return FakeCursor([dict(doc) for doc in self.docs.values() if self._matches(doc, query or {})])
+
+    async def find_one(self, query):
+        return self.docs.get(query["_id"])
+
+    async def update_one(self, query, update, upsert=False):
+        doc = self.docs.setdefault(query["_id"], {"_id": query["_id"]})
+        doc.update(update["$set"])
+
+    async def bulk_write(self, operations, ordered=True):
+        self.bulk_writes += 1
+        self.received.extend(operations)
+        return SimpleNamespace(modified_count=len(operations))
+
+class TestMigrationRunner(unittest.TestCase):
+    """Test versioned, checkpointed document migrations"""
+
+    def setUp(self):
+        self.users = FakeMigrationTarget([{"_id": i, "user_id": i, "balance": 1.0} for i in range(7)])
+        self.database = {"users": self.users, "migrations": FakeMigrationTarget()}
+        self.migration = Migration(1, "add theme", "users", {}, lambda user: None if "theme" in user else {"$set": {"theme": "dark"}})
+
+    def test_user_defaults_migration_fills_missing_fields(self):
+        """Test the registered migration only sets fields a document lacks"""
+        (stage,) = MIGRATIONS[0].transform({"_id": 1, "user_id": 1, "balance": 5.0, "username": "Bob"})
+        self.assertNotIn("balance", stage["$set"])
+        self.assertEqual(stage["$set"]["search_keys"]["$cond"][1], {"$literal": build_search_keys({"username": "Bob"})})
+
+    def test_user_defaults_keep_values_written_meanwhile(self):
+        """Test a default only lands on a field that is still missing when the write runs"""
+        (stage,) = MIGRATIONS[0].transform({"_id": 1, "user_id": 1})
+        self.assertEqual(stage["$set"]["referred_by"], {"$cond": [
+            {"$eq": [{"$type": "$referred_by"}, "missing"]}, {"$literal": USER_DEFAULTS["referred_by"]}, "$referred_by"
+        ]})
+
+    def test_dry_run_writes_nothing(self):
+        """Test a dry run counts changes without touching documents or checkpoints"""
+        runner = MigrationRunner(self.database, [self.migration], batch_size=3, max_docs_per_second=0)
+        results = asyncio.run(runner.run(dry_run=True))
+        self.assertEqual(results[1], {"scanned": 7, "modified": 7})
+        self.assertEqual(self.users.bulk_writes, 0)
+        self.assertEqual(self.database["migrations"].docs, {})
+
+    def test_resumes_from_checkpoint(self):
+        """Test a rerun continues after the saved _id and a finished one is skipped"""
+        self.database["migrations"].docs[1] = {"_id": 1, "status": "running", "last_id": 3, "scanned": 4, "modified": 4}
+        runner = MigrationRunner(self.database, [self.migration], batch_size=2, max_docs_per_second=0)
+        self.assertEqual(asyncio.run(runner.run())[1], {"scanned": 7, "modified": 7})
+        self.assertEqual(self.users.received, [UpdateOne({"_id": i}, {"$set": {"theme": "dark"}}) for i in (4, 5, 6)])
+        self.assertEqual(self.users.bulk_writes, 2)
+        self.assertEqual(asyncio.run(runner.run())[1], {"scanned": 0, "modified": 0})
+
+if __name__ == '__main__':
+    unittest.main()
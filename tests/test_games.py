@@ -4,8 +4,26 @@ import os
 
 # Add src to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+# Keep provably-fair seeds off the database
+os.environ.setdefault("FAIR_SEED_BACKEND", "memory")
 
+import time
+import threading
+import random
+from unittest import mock
 from src.games.blackjack import Card, Deck, BlackjackGame
+from src.games.sessions import MemorySessionStore, SocketSessionStore, GameSessions, SessionConflict, build_session_server, encode_game, decode_game, live_nonces
+from src.games.mines import MinesGame, create_mines_game, clear_mines_game
+from src.games.tower import TowerGame
+from src.games.crash import CrashGame
+from src.games.plinko import PlinkoGame
+from src.games.poker import PokerGame
+from src.games.crash_rounds import CrashRoundEngine, CrashRound, RoundBet, MemoryRoundJournal
+from src.games.fair import FairRandom, FairRNG, MemorySeedStore, SeedPairInUse, CrashHashChain, fair_rng, verify_outcome, verify_crash_round, hash_server_seed
+from src.games.simulation import RTPStats, RouletteModel, TowerModel, build_models, check_model, simulate, vectorized_available
+import hmac
+import hashlib
+from src.utils.error_handler import GameError
 
 class TestBlackjackGame(unittest.TestCase):
     """Test blackjack game logic"""
@@ -71,5 +89,410 @@ class TestBlackjackGame(unittest.TestCase):
         value = game.get_hand_value(game.player_hand)
         self.assertEqual(value, 21)  # A + A + 9 = 1 + 1 + 9 = 11, then one ace becomes 11
 
+class TestGameSessions(unittest.TestCase):
+    """Test the active game session backends"""
+
+    def test_memory_store_expires_and_evicts(self):
+        """Test idle sessions expire and the oldest is evicted past max_size"""
+        store = MemorySessionStore(max_size=2, ttl=0.05)
+        store.set("mines:1", "a")
+        store.set("mines:2", "b")
+        store.set("mines:3", "c")
+        self.assertIsNone(store.get("mines:1"))
+        self.assertEqual(store.get("mines:3"), "c")
+        time.sleep(0.06)
+        self.assertIsNone(store.get("mines:2"))
+        stats = store.get_stats()
+        self.assertEqual((stats["evictions"], stats["expired"]), (1, 1))
+
+    def test_games_round_trip_through_encoding(self):
+        """Test a game survives the out-of-process encoding with its state"""
+        game = BlackjackGame(1, 10)
+        game.hit()
+        restored = decode_game(encode_game(game))
+        self.assertEqual(restored.to_dict(), game.to_dict())
+        self.assertEqual(len(restored.deck.cards), len(game.deck.cards))
+
+    def test_socket_store_is_shared(self):
+        """Test two clients of one session server see the same game"""
+        server = build_session_server(("127.0.0.1", 0), "test", MemorySessionStore())
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        address = f"127.0.0.1:{server.address[1]}"
+
+        game = BlackjackGame(7, 5)
+        SocketSessionStore(address, "test").set("blackjack:7", game)
+        restored = SocketSessionStore(address, "test").get("blackjack:7")
+        self.assertEqual(restored.to_dict(), game.to_dict())
+
+    def test_socket_requires_authkey_and_loopback(self):
+        """Test the socket backend refuses a placeholder authkey or a public address"""
+        with self.assertRaises(ValueError):
+            SocketSessionStore("127.0.0.1:50055", "")
+        with self.assertRaises(ValueError):
+            build_session_server(("127.0.0.1", 0), "change-me", MemorySessionStore())
+        with self.assertRaises(ValueError):
+            SocketSessionStore("0.0.0.0:50055", "secret")
+        SocketSessionStore("10.0.0.5:50055", "secret", allow_remote=True)
+
+    def test_stale_version_is_refused(self):
+        """Test a write or removal based on an outdated read does nothing"""
+        store = MemorySessionStore()
+        store.set("tower:1", "a")
+        _, version = store.get_versioned("tower:1")
+        self.assertTrue(store.replace("tower:1", "b", version))
+        self.assertFalse(store.replace("tower:1", "c", version))
+        self.assertFalse(store.remove("tower:1", version))
+        self.assertEqual(store.get("tower:1"), "b")
+
+    def test_finished_game_is_settled_once(self):
+        """Test only one of two cash outs gets the game back to pay"""
+        store = MemorySessionStore()
+        sessions = GameSessions("mines")
+        game = MinesGame(1, rng=random.Random(3))
+        game.start_game(10)
+        with mock.patch("src.games.sessions._backend", store):
+            sessions.set(1, game)
+            cashed, paid = sessions.update(1, lambda game: game.cash_out())
+            self.assertTrue(cashed)
+            self.assertEqual(paid.winnings, 10)
+            self.assertEqual(sessions.update(1, lambda game: game.cash_out()), (None, None))
+
+    def test_session_changed_by_another_worker_conflicts(self):
+        """Test a request loses when another worker ends the session under it"""
+        store = MemorySessionStore()
+        sessions = GameSessions("tower")
+        game = TowerGame(1, rng=random.Random(3))
+        game.start_game(10)
+
+        def choose_after_another_worker(game):
+            store.remove("tower:1", store.get_versioned("tower:1")[1])
+            return game.choose_tile(0)
+
+        with mock.patch("src.games.sessions._backend", store):
+            sessions.set(1, game)
+            with self.assertRaises(SessionConflict):
+                sessions.update(1, choose_after_another_worker)
+
+class TestCompactGameState(unittest.TestCase):
+    """Test the binary session encoding of every game"""
+
+    def round_trip(self, game):
+        data = encode_game(game)
+        self.assertLess(len(data), 128)
+        return decode_game(data)
+
+    def test_mines_round_trip(self):
+        """Test mines keeps its layout and revealed tiles"""
+        game = MinesGame(3, mines_count=5)
+        game.start_game(10)
+        safe = next(position for position in range(25) if not game.grid[position])
+        game.reveal_tile(safe)
+        restored = self.round_trip(game)
+        self.assertEqual(restored.get_game_state(), game.get_game_state())
+        self.assertEqual(restored.grid, game.grid)
+        self.assertEqual(sorted(restored.mines_positions), sorted(game.mines_positions))
+
+    def test_tower_round_trip(self):
+        """Test tower keeps its layout and progress"""
+        game = TowerGame(3)
+        game.start_game(10)
+        game.choose_tile(game.tower_layout[0].index(True))
+        restored = self.round_trip(game)
+        self.assertEqual(restored.get_game_state(), game.get_game_state())
+        self.assertEqual(restored.tower_layout, game.tower_layout)
+
+    def test_crash_round_trip(self):
+        """Test crash keeps its crash point and start time"""
+        game = CrashGame(3)
+        game.start_game(10)
+        restored = self.round_trip(game)
+        for field in CrashGame.__slots__:
+            self.assertEqual(getattr(restored, field), getattr(game, field))
+
+    def test_plinko_round_trip(self):
+        """Test plinko keeps its ball path and result"""
+        game = PlinkoGame(3)
+        game.start_game(10, 'low')
+        game.drop_ball()
+        restored = self.round_trip(game)
+        self.assertEqual(restored.get_game_state(), game.get_game_state())
+
+    def test_poker_round_trip(self):
+        """Test poker keeps both hands and the remaining deck"""
+        game = PokerGame(3)
+        game.start_game(10)
+        restored = self.round_trip(game)
+        self.assertEqual(restored.get_game_state(), game.get_game_state())
+        restored.finish_game()
+        game.finish_game()
+        self.assertEqual(restored.get_game_state(), game.get_game_state())
+
+    def test_blackjack_round_trip(self):
+        """Test blackjack keeps both hands and deals the same next card"""
+        game = BlackjackGame(3, 10)
+        restored = decode_game(encode_game(game))
+        self.assertEqual(restored.to_dict(), game.to_dict())
+        self.assertEqual(restored.deck.draw().code, game.deck.draw().code)
+
+    def test_games_without_a_nonce_round_trip(self):
+        """Test games dealt from a plain random.Random keep a None nonce"""
+        mines, tower, crash = MinesGame(1, 3, rng=random.Random(1)), TowerGame(1, rng=random.Random(1)), CrashGame(1, rng=random.Random(1))
+        for game in (mines, tower, crash):
+            game.start_game(10)
+        for game in (mines, tower, crash, BlackjackGame(1, 1.0, rng=random.Random(1))):
+            self.assertIsNone(game.nonce)
+            restored = self.round_trip(game)
+            self.assertIsNone(restored.nonce)
+            self.assertEqual((restored.user_id, restored.bet_amount, restored.game_over), (game.user_id, game.bet_amount, game.game_over))
+
+class TestCrashRounds(unittest.TestCase):
+    """Test the shared crash round engine"""
+
+    def setUp(self):
+        self.debits = []
+        self.refunds = []
+        self.settled = []
+        self.engine = CrashRoundEngine(betting_seconds=0.2, tick_interval=0.02, pause_seconds=0, crash_point_factory=lambda: 1.01)
+        self.engine._debit = lambda user_id, amount: self.debits.append((user_id, amount)) or 100.0
+        self.engine._refund = lambda user_id, amount: self.refunds.append((user_id, amount))
+        self.engine._settle = lambda crash_round, bets: self.settled.append((crash_round, bets))
+
+    def play(self):
+        round_thread = threading.Thread(target=self.engine.play_round)
+        round_thread.start()
+        while self.engine.round is None:
+            time.sleep(0.01)
+        return round_thread
+
+    def test_bets_share_one_round_and_settle_together(self):
+        """Test every bet rides the same crash point and is settled in one call"""
+        round_thread = self.play()
+        self.engine.place_bet(1, 10, auto_cashout=1.005)
+        self.engine.place_bet(2, 5, auto_cashout=2.0)
+        self.engine.place_bet(3, 1)
+        with self.assertRaises(GameError):
+            self.engine.place_bet(3, 1)
+        round_thread.join()
+
+        self.assertEqual(len(self.settled), 1)
+        crash_round, bets = self.settled[0]
+        winnings = {bet.user_id: bet.winnings for bet in bets}
+        self.assertAlmostEqual(winnings[1], 10.05)
+        self.assertEqual((winnings[2], winnings[3]), (0.0, 0.0))
+        self.assertEqual(len(self.debits), 3)
+
+    def test_cash_out_and_closed_betting(self):
+        """Test manual cash-out locks the shared multiplier and late bets are refused"""
+        round_thread = self.play()
+        self.engine.place_bet(1, 10)
+        while self.engine.round.phase != "running":
+            time.sleep(0.005)
+        with self.assertRaises(GameError):
+            self.engine.place_bet(2, 10)
+        bet = self.engine.cash_out(1)
+        round_thread.join()
+
+        self.assertGreaterEqual(bet.cash_out_multiplier, 1.0)
+        self.assertLess(bet.cash_out_multiplier, 1.01)
+        self.assertEqual(self.settled[0][1][0].winnings, bet.winnings)
+
+    def test_stream_pushes_round_events(self):
+        """Test subscribers receive the round's phase changes and ticks"""
+        stream = self.engine.subscribe(keepalive=1)
+        round_thread = self.play()
+        events = []
+        while "event: settled" not in events:
+            events.append(next(stream).split("\n", 1)[0])
+        round_thread.join()
+        stream.close()
+
+        # A stream opened mid-phase starts with a snapshot of the round
+        self.assertIn(events[0], ("event: round", "event: betting"))
+        self.assertLess(events.index("event: start"), events.index("event: crash"))
+        self.assertEqual(self.engine.subscribers, 0)
+
+    def test_failed_settlement_is_retried_next_round(self):
+        """Test a round whose settlement failed is paid from the journal before the next one"""
+        self.engine.settle_attempts = 1
+        settle = self.engine._settle
+        self.engine._settle = mock.Mock(side_effect=RuntimeError("primary unavailable"))
+        round_thread = self.play()
+        self.engine.place_bet(1, 10, auto_cashout=1.005)
+        round_thread.join()
+        self.assertEqual(len(self.engine.journal.unsettled()), 1)
+
+        self.engine._settle = settle
+        self.engine.recover()
+        (crash_round, bets), = self.settled
+        self.assertEqual((crash_round.phase, bets[0].user_id, bets[0].winnings), ("crashed", 1, 10 * 1.005))
+        self.assertEqual(self.engine.journal.unsettled(), [])
+
+    def test_interrupted_round_is_refunded(self):
+        """Test a round cut short by a restart refunds its stakes under the same round key"""
+        journal = MemoryRoundJournal()
+        crash_round = CrashRound(7, 3.0, 0.0)
+        journal.open(crash_round, [RoundBet(1, 10), RoundBet(2, 4, auto_cashout=1.5)])
+        self.engine.journal = journal
+
+        self.engine.recover()
+        (recovered, bets), = self.settled
+        self.assertEqual((recovered.phase, recovered.round_key), ("interrupted", crash_round.round_key))
+        self.assertEqual([bet.winnings for bet in bets], [10, 4])
+
+    def test_rounds_owned_by_another_worker_are_refused(self):
+        """Test start() will not run a second round loop beside another worker's"""
+        journal = mock.Mock()
+        journal.claim.return_value = False
+        with self.assertRaises(GameError):
+            self.engine.start(self.engine._debit, self.engine._refund, self.engine._settle, journal)
+        self.assertIsNone(self.engine._thread)
+
+class TestProvablyFair(unittest.TestCase):
+    """Test the provably-fair RNG service"""
+
+    def test_stream_is_published_hmac(self):
+        """Test floats are the top 53 bits of HMAC-SHA256(server, client:nonce:cursor)"""
+        digest = hmac.new(b"server", b"client:7:0", hashlib.sha256).digest()
+        expected = (int.from_bytes(digest[:8], "big") >> 11) / 2 ** 53
+        self.assertEqual(FairRandom("server", "client", 7).random(), expected)
+        self.assertEqual(FairRandom("server", "client", 7).sample(range(25), 5), FairRandom("server", "client", 7).sample(range(25), 5))
+
+    def test_nonces_are_reserved_in_blocks(self):
+        """Test consecutive nonces cost one store write per block"""
+        rng = FairRNG(MemorySeedStore(), block_size=4)
+        self.assertEqual([rng.draw(1).nonce for _ in range(6)], list(range(6)))
+        # A batch that does not fit the block takes a fresh contiguous one
+        self.assertEqual([stream.nonce for stream in rng.batch(1, 5)], list(range(8, 13)))
+        self.assertEqual(rng.get_stats()["reservations"], 3)
+
+    def test_revealed_seed_replays_game(self):
+        """Test a played game can be verified once its server seed is revealed"""
+        game = MinesGame(424242, mines_count=5)
+        committed = fair_rng.get_seeds(424242)["current"]
+        revealed = fair_rng.rotate(424242, "my-seed")["revealed"]
+
+        self.assertEqual(hash_server_seed(revealed["server_seed"]), committed["server_seed_hash"])
+        verification = verify_outcome("mines", revealed["server_seed"], revealed["client_seed"], game.nonce, {"mines_count": 5})
+        self.assertEqual(verification["outcome"], game.mines_positions)
+        self.assertEqual(fair_rng.get_seeds(424242)["current"]["client_seed"], "my-seed")
+        self.assertGreater(fair_rng.draw(424242).nonce, game.nonce)
+
+    def test_rotated_seed_stays_hidden_while_leased_elsewhere(self):
+        """Test a seed another process still deals from is revealed only after its lease"""
+        store = MemorySeedStore()
+        worker, other = FairRNG(store, block_size=4), FairRNG(store, block_size=4)
+        other._holder_pid = worker._holder_pid = os.getpid()
+        worker._holder, other._holder = "worker", "other"
+        game = worker.draw(1)
+
+        revealed = other.rotate(1)["revealed"]
+        self.assertTrue(revealed["retiring"])
+        self.assertNotIn("server_seed", revealed)
+        self.assertNotIn("server_seed", other.get_seeds(1)["revealed"][0])
+        # The worker's block is still its own to finish
+        self.assertEqual(worker.draw(1).nonce, game.nonce + 1)
+
+    def test_expired_lease_reveals_and_moves_to_new_seed(self):
+        """Test an expired block is not dealt from and no longer hides the seed"""
+        store = MemorySeedStore()
+        worker, other = FairRNG(store, block_size=4, lease=0), FairRNG(store, block_size=4)
+        other._holder_pid = worker._holder_pid = os.getpid()
+        worker._holder, other._holder = "worker", "other"
+        committed = worker.get_seeds(1)["current"]["server_seed_hash"]
+        worker.draw(1)
+
+        seeds = other.rotate(1)
+        self.assertEqual(hash_server_seed(seeds["revealed"]["server_seed"]), committed)
+        self.assertEqual(worker.get_seeds(1)["current"]["server_seed_hash"], committed)
+        worker.draw(1)
+        self.assertEqual(worker.get_seeds(1)["current"], seeds["current"])
+
+    def test_rotation_never_reveals_a_live_game(self):
+        """Test rotating mid-game is refused and a seed dealing a live game stays hidden"""
+        user_id = 515151
+        game = create_mines_game(user_id, 1.0, mines_count=5)
+        try:
+            self.assertIn(game.nonce, live_nonces(user_id))
+            with self.assertRaises(SeedPairInUse):
+                fair_rng.rotate(user_id, live_nonces=live_nonces(user_id))
+
+            # Rotated by a request that raced the game's start: the history
+            # still hides the seed until the game is over
+            fair_rng.rotate(user_id)
+            seeds = fair_rng.get_seeds(user_id, live_nonces(user_id))["revealed"][0]
+            self.assertNotIn("server_seed", seeds)
+            self.assertTrue(seeds["retiring"])
+        finally:
+            clear_mines_game(user_id)
+        self.assertIn("server_seed", fair_rng.get_seeds(user_id, live_nonces(user_id))["revealed"][0])
+
+    def test_verify_limits_params(self):
+        """Test verification only replays with params a real game could have used"""
+        self.assertEqual(len(verify_outcome("tower", "s", "c", 0, {"levels": 8})["outcome"]), 8)
+        with self.assertRaises(ValueError):
+            verify_outcome("tower", "s", "c", 0, {"levels": 10 ** 7})
+        with self.assertRaises(ValueError):
+            verify_outcome("mines", "s", "c", 0, {"grid_size": 25, "mines_count": True})
+        with self.assertRaises(ValueError):
+            verify_outcome("plinko", "s", "c", 0, {"rows": 16, "extra": 1})
+        with self.assertRaises(ValueError):
+            verify_outcome("roulette", "s", "c", 0, {"rounds": 5})
+
+    def test_crash_hash_chain(self):
+        """Test each round hash proves the previous one back to the commitment"""
+        chain = CrashHashChain(length=3)
+        first, second = chain.next(), chain.next()
+        self.assertEqual(hashlib.sha256(first.encode()).hexdigest(), chain.commitment)
+        self.assertEqual(verify_crash_round(second)["previous_hash"], first)
+        self.assertEqual(verify_crash_round(first)["crash_point"], verify_crash_round(first)["crash_point"])
+
+class TestRtpSimulation(unittest.TestCase):
+    """Test the Monte Carlo RTP simulator"""
+
+    def test_models_match_game_classes(self):
+        """Test every fast path agrees with the game class it models"""
+        for model in build_models():
+            result = check_model(model, rounds=300)
+            self.assertTrue(result["passed"], result)
+
+    @unittest.skipUnless(vectorized_available(), "NumPy is not installed (pip install -r requirements-dev.txt)")
+    def test_vectorized_paths_match_game_classes(self):
+        """Test every NumPy path pays exactly what the plain-Python path pays"""
+        for model in build_models():
+            if not model.draws:
+                continue
+            result = check_model(model, rounds=500, seed=7)
+            self.assertEqual(result["vectorized_mismatches"], 0, result)
+            self.assertTrue(result["passed"], result)
+        result = simulate(TowerModel(), rounds=20000, seed=3, chunk_size=5000)
+        self.assertEqual(result["mode"], "vectorized")
+        self.assertLess(result["ci_low"], 1.0)
+
+    def test_roulette_rtp(self):
+        """Test a red bet converges on 36/37 and reports its exposure"""
+        result = simulate(RouletteModel("red"), rounds=20000, seed=3, processes=1, chunk_size=5000)
+        self.assertEqual(result["rounds"], 20000)
+        self.assertLess(result["ci_low"], 36 / 37)
+        self.assertGreater(result["ci_high"], 36 / 37)
+        self.assertEqual(result["max_exposure"], 2)
+
+    def test_stats_merge_matches_single_pass(self):
+        """Test merged batches give the same mean and variance as one batch"""
+        payouts = [0.0, 2.0, 0.0, 3.375, 0.0, 1.5, 0.0]
+        whole, merged = RTPStats(), RTPStats()
+        whole.add(payouts)
+        for start in range(0, len(payouts), 3):
+            part = RTPStats()
+            part.add(payouts[start:start + 3])
+            merged.merge(part)
+        self.assertAlmostEqual(merged.summary()["rtp"], whole.summary()["rtp"])
+        self.assertAlmostEqual(merged.summary()["variance"], whole.summary()["variance"])
+        self.assertEqual(merged.max_payout, 3.375)
+
+    def test_tower_rejects_impossible_strategy(self):
+        """Test cashing out above the tower is refused"""
+        with self.assertRaises(ValueError):
+            TowerModel(levels=9)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
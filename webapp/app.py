@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory, session
+from flask import Flask, Response, render_template, request, jsonify, send_from_directory, session, stream_with_context
 from flask_cors import CORS
 import os
 import sys
@@ -15,18 +15,20 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 # Load environment variables
 load_dotenv()
 
-from webapp.sync_db import get_user, update_user_balance, record_transaction, record_game
+from webapp.sync_db import get_user, settle_balance, record_transaction, record_game, settle_round, crash_rounds_collection, start_background_threads
 from src.utils.logger import webapp_logger
 from src.utils.validators import validator
 from src.utils.error_handler import GameError, InsufficientFundsError, InvalidBetError
-from src.games.blackjack import create_blackjack_game, hit_blackjack, stand_blackjack, get_game, set_game, clear_game
-from src.games.roulette import create_roulette_game, get_roulette_game, place_roulette_bet, spin_roulette, clear_roulette_game
-from src.games.crash import create_crash_game, get_crash_game, update_crash_game, cash_out_crash, clear_crash_game
-from src.games.mines import create_mines_game, get_mines_game, reveal_mines_tile, cash_out_mines, clear_mines_game
-from src.games.tower import create_tower_game, get_tower_game, choose_tower_tile, cash_out_tower, clear_tower_game
-from src.games.plinko import create_plinko_game, get_plinko_game, drop_plinko_ball, clear_plinko_game
-from src.games.poker import create_poker_game, get_poker_game, finish_poker_game, clear_poker_game
-from src.games.lottery import create_lottery_game, get_lottery_game, select_lottery_numbers, draw_lottery_numbers, clear_lottery_game
+from src.games.blackjack import create_blackjack_game, hit_blackjack, stand_blackjack, set_game, play_game
+from src.games.roulette import create_roulette_game, get_roulette_game, place_roulette_bet, spin_roulette
+from src.games.crash_rounds import crash_rounds, MongoRoundJournal
+from src.games.sessions import SessionConflict, live_nonces
+from src.games.fair import fair_rng, SeedPairInUse, register_fair_game, verify_outcome, verify_crash_round, choice_param, float_param
+from src.games.mines import create_mines_game, reveal_mines_tile, cash_out_mines
+from src.games.tower import create_tower_game, choose_tower_tile, cash_out_tower
+from src.games.plinko import create_plinko_game, get_plinko_game, drop_plinko_ball
+from src.games.poker import create_poker_game, finish_poker_game
+from src.games.lottery import create_lottery_game, select_lottery_numbers, draw_lottery_numbers
 
 app = Flask(__name__)
 CORS(app, origins="*", allow_headers="*", methods="*")
@@ -35,6 +37,11 @@ CORS(app, origins="*", allow_headers="*", methods="*")
 app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY', secrets.token_hex(32))
 app.permanent_session_lifetime = timedelta(hours=24)
 
+# Flusher threads start in each serving process, not when sync_db is imported
+@app.before_request
+def start_database_threads():
+    start_background_threads()
+
 # Security headers
 @app.after_request
 def add_security_headers(response):
@@ -106,11 +113,12 @@ def place_bet():
             }), 400
         
         # Deduct bet amount
-        update_user_balance(user_id, -bet_amount)
+        updated_user = settle_balance(user_id, -bet_amount)
         record_transaction(user_id, -bet_amount, "bet", f"{game_type} bet")
         
         # Process game logic based on game type
-        result = process_game_logic(game_type, bet_amount, game_data)
+        rng = fair_rng.draw(user_id)
+        result = process_game_logic(game_type, bet_amount, game_data, rng)
         
         # Record game result
         game_id = record_game(
@@ -120,29 +128,29 @@ def place_bet():
         
         # Update balance if won
         if result['winnings'] > 0:
-            update_user_balance(user_id, result['winnings'])
+            updated_user = settle_balance(user_id, result['winnings'])
             record_transaction(user_id, result['winnings'], "win", f"{game_type} win")
         
-        # Get updated user data
-        updated_user = get_user(user_id)
-        
         return jsonify({
             'success': True,
             'result': result,
             'new_balance': updated_user['balance'],
-            'game_id': game_id
+            'game_id': game_id,
+            'nonce': rng.nonce
         })
         
+    except InsufficientFundsError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-def process_game_logic(game_type, bet_amount, game_data):
-    """Process game logic and return result"""
+def process_game_logic(game_type, bet_amount, game_data, rng=random):
+    """Process game logic and return result, drawing from rng"""
     try:
         if game_type == 'coinflip':
             # Coinflip game logic
             user_choice = game_data.get('choice', 'heads')  # heads or tails
-            result = random.choice(['heads', 'tails'])
+            result = rng.choice(['heads', 'tails'])
             
             if user_choice == result:
                 winnings = bet_amount * 2  # 2x multiplier for correct guess
@@ -165,7 +173,7 @@ def process_game_logic(game_type, bet_amount, game_data):
         
         elif game_type == 'crash':
             # Crash game logic
-            crash_point = round(random.uniform(1.01, 10.0), 2)
+            crash_point = round(rng.uniform(1.01, 10.0), 2)
             cash_out_at = game_data.get('cash_out_at', 2.0)
             
             if cash_out_at <= crash_point:
@@ -192,7 +200,7 @@ def process_game_logic(game_type, bet_amount, game_data):
             target = game_data.get('target', 50)  # Target number (1-100)
             over_under = game_data.get('over_under', 'over')  # 'over' or 'under'
             
-            roll = random.randint(1, 100)
+            roll = rng.randint(1, 100)
             
             won = False
             if over_under == 'over' and roll > target:
@@ -242,7 +250,7 @@ def process_game_logic(game_type, bet_amount, game_data):
             
             # Simulate ball drop (weighted towards center)
             weights = [1, 2, 4, 6, 8, 6, 4, 2, 1]
-            bucket = random.choices(range(9), weights=weights)[0]
+            bucket = rng.choices(range(9), weights=weights)[0]
             multiplier = multipliers[risk_level][bucket]
             
             winnings = bet_amount * multiplier
@@ -262,11 +270,8 @@ def process_game_logic(game_type, bet_amount, game_data):
             revealed_positions = game_data.get('revealed', [])
             action = game_data.get('action', 'reveal')  # 'reveal' or 'cashout'
             
-            # Generate consistent mine positions for this game session
-            seed = game_data.get('seed', random.randint(1, 1000000))
-            random.seed(seed)
-            mine_positions = random.sample(range(25), mines_count)
-            random.seed()  # Reset seed
+            # Mine positions come from the server's seeds, never the client's
+            mine_positions = rng.sample(range(25), mines_count)
             
             if action == 'reveal':
                 position = game_data.get('position')
@@ -294,7 +299,6 @@ def process_game_logic(game_type, bet_amount, game_data):
                         'gems_found': gems_found,
                         'multiplier': multiplier,
                         'hit_mine': False,
-                        'seed': seed,
                         'message': f'Found a gem! Current multiplier: {multiplier:.2f}x'
                     }
             
@@ -324,7 +328,7 @@ def process_game_logic(game_type, bet_amount, game_data):
             bet_value = game_data.get('bet_value')
             
             # Generate winning number (0-36)
-            winning_number = random.randint(0, 36)
+            winning_number = rng.randint(0, 36)
             
             # Determine color
             if winning_number == 0:
@@ -370,9 +374,9 @@ def process_game_logic(game_type, bet_amount, game_data):
             weights = [30, 25, 20, 15, 7, 2, 1]  # Weighted probabilities
             
             # Spin reels
-            reel1 = random.choices(symbols, weights=weights)[0]
-            reel2 = random.choices(symbols, weights=weights)[0]
-            reel3 = random.choices(symbols, weights=weights)[0]
+            reel1 = rng.choices(symbols, weights=weights)[0]
+            reel2 = rng.choices(symbols, weights=weights)[0]
+            reel3 = rng.choices(symbols, weights=weights)[0]
             
             # Check for wins
             multiplier = 0
@@ -403,8 +407,8 @@ def process_game_logic(game_type, bet_amount, game_data):
             
             if action == 'deal':
                 # Deal initial cards
-                player_cards = [random.randint(1, 11), random.randint(1, 11)]
-                dealer_cards = [random.randint(1, 11)]
+                player_cards = [rng.randint(1, 11), rng.randint(1, 11)]
+                dealer_cards = [rng.randint(1, 11)]
                 
                 player_total = sum(player_cards)
                 
@@ -456,7 +460,7 @@ def process_game_logic(game_type, bet_amount, game_data):
                 current_level = game_data.get('current_level', 0)
                 
                 # Each level has 2 safe tiles and 1 dangerous tile
-                safe_tiles = random.sample(range(3), 2)
+                safe_tiles = rng.sample(range(3), 2)
                 
                 if tile in safe_tiles:
                     # Safe tile - advance level
@@ -502,7 +506,7 @@ def process_game_logic(game_type, bet_amount, game_data):
             
             # Spin the wheel (weighted towards lower multipliers)
             weights = [25, 20, 15, 25, 8, 20, 15, 2]  # Lower chance for higher multipliers
-            winning_segment = random.choices(list(segments.keys()), weights=weights)[0]
+            winning_segment = rng.choices(list(segments.keys()), weights=weights)[0]
             
             if winning_segment == selected_segment:
                 multiplier = segments[winning_segment]
@@ -542,7 +546,37 @@ def process_game_logic(game_type, bet_amount, game_data):
             'message': f'Game error: {str(e)}'
         }
 
+# game_data keys process_game_logic reads; every value is a scalar except revealed tiles
+BET_GAME_DATA_KEYS = {
+    'choice', 'cash_out_at', 'target', 'over_under', 'risk', 'mines', 'revealed', 'action', 'position',
+    'bet_type', 'bet_value', 'level', 'tile', 'current_level', 'selected_segment'
+}
+
+def check_bet_game_data(name, value):
+    """Param check keeping a replayed bet's game_data as small as a real one"""
+    if not isinstance(value, dict):
+        raise ValueError(f"{name} must be an object")
+    unknown = sorted(set(value) - BET_GAME_DATA_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown {name} keys: {', '.join(unknown)}")
+    for key, item in value.items():
+        if key == 'revealed':
+            if not isinstance(item, list) or len(item) > 25 or not all(isinstance(tile, int) for tile in item):
+                raise ValueError(f"{name}.revealed must be a list of at most 25 tiles")
+        elif isinstance(item, (list, dict)) or (isinstance(item, str) and len(item) > 32):
+            raise ValueError(f"{name}.{key} must be a short value")
+    return value
+
 # Blackjack specific endpoints
+@register_fair_game("bet", {
+    "game_type": choice_param('coinflip', 'crash', 'dice', 'plinko', 'mines', 'roulette', 'slots', 'blackjack', 'tower', 'wheel', 'roll'),
+    "bet_amount": float_param(0, 1_000_000_000),
+    "game_data": check_bet_game_data
+})
+def replay_bet(rng, game_type, bet_amount=1.0, game_data=None):
+    """Outcome of one /api/game/bet call, for verification"""
+    return process_game_logic(game_type, bet_amount, game_data or {}, rng)
+
 @app.route('/api/blackjack/deal', methods=['POST'])
 def blackjack_deal():
     """Deal new blackjack hand"""
@@ -565,22 +599,21 @@ def blackjack_deal():
             }), 400
         
         # Deduct bet amount
-        update_user_balance(user_id, -bet_amount)
+        updated_user = settle_balance(user_id, -bet_amount)
         record_transaction(user_id, -bet_amount, "bet", "blackjack bet")
         
         # Create new game
         game = create_blackjack_game(user_id, bet_amount)
         set_game(user_id, game)
         
-        # Get updated user data
-        updated_user = get_user(user_id)
-        
         return jsonify({
             'success': True,
             'game': game.to_dict(),
             'new_balance': updated_user['balance']
         })
         
+    except InsufficientFundsError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -594,14 +627,11 @@ def blackjack_hit():
         if not user_id:
             return jsonify({'success': False, 'error': 'Missing user_id'}), 400
         
-        # Get active game
-        game = get_game(user_id)
+        # Hit; a finished hand leaves the session in the same step, so only this request settles it
+        result, game = play_game(user_id, hit_blackjack)
         if not game:
             return jsonify({'success': False, 'error': 'No active game'}), 400
         
-        # Hit
-        result = hit_blackjack(game)
-        
         # If game is over, handle winnings
         if game.game_over:
             winnings = game.get_winnings()
@@ -615,14 +645,11 @@ def blackjack_hit():
             
             # Update balance with winnings
             if winnings > 0:
-                update_user_balance(user_id, winnings)
+                updated_user = settle_balance(user_id, winnings)
                 record_transaction(user_id, winnings, "win", "blackjack win")
+            else:
+                updated_user = get_user(user_id)
             
-            # Clear game
-            clear_game(user_id)
-            
-            # Get updated user data
-            updated_user = get_user(user_id)
             result['new_balance'] = updated_user['balance']
         
         return jsonify({
@@ -630,6 +657,8 @@ def blackjack_hit():
             'game': result
         })
         
+    except SessionConflict as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -643,14 +672,11 @@ def blackjack_stand():
         if not user_id:
             return jsonify({'success': False, 'error': 'Missing user_id'}), 400
         
-        # Get active game
-        game = get_game(user_id)
+        # Stand; this ends the game and its session, so only this request settles it
+        result, game = play_game(user_id, stand_blackjack)
         if not game:
             return jsonify({'success': False, 'error': 'No active game'}), 400
         
-        # Stand
-        result = stand_blackjack(game)
-        
         # Handle winnings
         winnings = game.get_winnings()
         
@@ -663,14 +689,11 @@ def blackjack_stand():
         
         # Update balance with winnings
         if winnings > 0:
-            update_user_balance(user_id, winnings)
+            updated_user = settle_balance(user_id, winnings)
             record_transaction(user_id, winnings, "win", "blackjack win")
+        else:
+            updated_user = get_user(user_id)
         
-        # Clear game
-        clear_game(user_id)
-        
-        # Get updated user data
-        updated_user = get_user(user_id)
         result['new_balance'] = updated_user['balance']
         
         return jsonify({
@@ -678,6 +701,8 @@ def blackjack_stand():
             'game': result
         })
         
+    except SessionConflict as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -728,16 +753,22 @@ def roulette_bet():
                 'balance': user['balance']
             }), 400
         
-        # Place bet
-        success = place_roulette_bet(user_id, bet_type, bet_amount)
-        if not success:
+        if get_roulette_game(user_id) is None:
             return jsonify({'success': False, 'error': 'Failed to place bet'}), 400
         
-        # Deduct bet from balance
-        new_balance = update_user_balance(user_id, -bet_amount)
+        # Deduct bet from balance before the bet exists, so a refused debit leaves no bet behind
+        new_balance = settle_balance(user_id, -bet_amount)['balance']
         record_transaction(user_id, -bet_amount, 'roulette_bet', f'Roulette bet: {bet_type}')
         
-        game = get_roulette_game(user_id)
+        # Place bet
+        try:
+            placed, game = place_roulette_bet(user_id, bet_type, bet_amount)
+        except SessionConflict:
+            placed = False
+        if not placed:
+            settle_balance(user_id, bet_amount)
+            record_transaction(user_id, bet_amount, 'roulette_refund', f'Roulette bet refund: {bet_type}')
+            return jsonify({'success': False, 'error': 'Failed to place bet'}), 400
         
         return jsonify({
             'success': True,
@@ -749,6 +780,8 @@ def roulette_bet():
             'new_balance': new_balance
         })
         
+    except InsufficientFundsError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -762,16 +795,14 @@ def roulette_spin():
         if not user_id:
             return jsonify({'success': False, 'error': 'Missing user_id'}), 400
         
-        # Spin wheel
-        winning_number = spin_roulette(user_id)
-        if winning_number is None:
+        # Spin wheel; the finished game leaves the session in the same step
+        winning_number, game = spin_roulette(user_id)
+        if game is None:
             return jsonify({'success': False, 'error': 'No active game'}), 400
         
-        game = get_roulette_game(user_id)
-        
         # Handle winnings
         if game.winnings > 0:
-            new_balance = update_user_balance(user_id, game.winnings)
+            new_balance = settle_balance(user_id, game.winnings)['balance']
             record_transaction(user_id, game.winnings, 'roulette_win', f'Roulette win: {game.winning_number}')
             record_game(user_id, 'roulette', game.total_bet, game.winnings, 'win')
         else:
@@ -789,93 +820,110 @@ def roulette_spin():
                 'winnings': game.winnings,
                 'payout_details': game.payout_details,
                 'game_over': game.game_over,
-                'result': game.result
+                'result': game.result,
+                'nonce': game.nonce
             },
             'new_balance': new_balance
         }
         
-        # Clear game
-        clear_roulette_game(user_id)
-        
         return jsonify(result)
         
+    except SessionConflict as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 # ==================== CRASH API ENDPOINTS ====================
-@app.route('/api/crash/start', methods=['POST'])
-def crash_start():
-    """Start a new crash game"""
+def debit_crash_bet(user_id, bet_amount):
+    """Take a crash stake; returns the new balance"""
+    user = get_user(user_id)
+    if user['balance'] < bet_amount:
+        raise InsufficientFundsError('Insufficient balance')
+    new_balance = settle_balance(user_id, -bet_amount)['balance']
+    record_transaction(user_id, -bet_amount, 'crash_bet', 'Crash game bet')
+    return new_balance
+
+def refund_crash_bet(user_id, bet_amount):
+    """Return a stake that missed the round"""
+    settle_balance(user_id, bet_amount)
+    record_transaction(user_id, bet_amount, 'crash_refund', 'Crash bet refund')
+
+def settle_crash_round(crash_round, bets):
+    """Pay every bet of a finished round in one bulk write, at most once per round"""
+    if crash_round.phase == 'interrupted':
+        results = [{
+            'user_id': bet.user_id,
+            'bet_amount': bet.amount,
+            'winnings': bet.amount,
+            'outcome': 'refund',
+            'type': 'crash_refund',
+            'description': 'Crash round interrupted, bet refunded'
+        } for bet in bets]
+    else:
+        results = [{
+            'user_id': bet.user_id,
+            'bet_amount': bet.amount,
+            'winnings': bet.winnings,
+            'outcome': 'win' if bet.winnings else 'lose',
+            'description': f'Crash win at {bet.cash_out_multiplier:.2f}x' if bet.winnings else None
+        } for bet in bets]
+    settle_round('crash', results, crash_round.round_key)
+
+def ensure_crash_rounds():
+    """Run the crash rounds in this worker; raises GameError if another worker owns them"""
+    crash_rounds.start(debit_crash_bet, refund_crash_bet, settle_crash_round, MongoRoundJournal(crash_rounds_collection))
+
+@app.route('/api/crash/stream')
+def crash_stream():
+    """Server-Sent Events with the shared round's phases and multiplier ticks"""
+    try:
+        ensure_crash_rounds()
+    except GameError as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    return Response(
+        stream_with_context(crash_rounds.subscribe()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/crash/round')
+def crash_round_state():
+    """Current round state, with the caller's bet if user_id is given"""
+    try:
+        ensure_crash_rounds()
+    except GameError as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    return jsonify({'success': True, 'round': crash_rounds.get_state(request.args.get('user_id', type=int))})
+
+@app.route('/api/crash/bet', methods=['POST'])
+def crash_bet():
+    """Join the round that is taking bets"""
     try:
         data = request.get_json()
         user_id = data.get('user_id')
         bet_amount = float(data.get('bet_amount'))
+        auto_cashout = data.get('auto_cashout')
         
         if not all([user_id, bet_amount]):
             return jsonify({'success': False, 'error': 'Missing required fields'}), 400
         
-        # Get user and check balance
-        user = get_user(user_id)
-        if user['balance'] < bet_amount:
-            return jsonify({
-                'success': False,
-                'error': 'Insufficient balance',
-                'balance': user['balance']
-            }), 400
-        
-        # Deduct bet from balance
-        new_balance = update_user_balance(user_id, -bet_amount)
-        record_transaction(user_id, -bet_amount, 'crash_bet', 'Crash game bet')
-        
-        # Create game
-        game = create_crash_game(user_id, bet_amount)
-        
-        return jsonify({
-            'success': True,
-            'game': {
-                'current_multiplier': game.current_multiplier,
-                'is_running': game.is_running,
-                'game_over': game.game_over,
-                'bet_amount': game.bet_amount
-            },
-            'new_balance': new_balance
-        })
-        
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-@app.route('/api/crash/update', methods=['POST'])
-def crash_update():
-    """Update crash game state"""
-    try:
-        data = request.get_json()
-        user_id = data.get('user_id')
-        
-        if not user_id:
-            return jsonify({'success': False, 'error': 'Missing user_id'}), 400
-        
-        game = update_crash_game(user_id)
-        if not game:
-            return jsonify({'success': False, 'error': 'No active game'}), 400
+        ensure_crash_rounds()
+        placed = crash_rounds.place_bet(user_id, bet_amount, float(auto_cashout) if auto_cashout else None)
         
         return jsonify({
             'success': True,
-            'game': {
-                'current_multiplier': game.current_multiplier,
-                'is_running': game.is_running,
-                'game_over': game.game_over,
-                'result': game.result,
-                'winnings': game.winnings,
-                'cashed_out': game.cashed_out
-            }
+            'round_id': placed['round_id'],
+            'new_balance': placed['balance']
         })
         
+    except GameError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/crash/cashout', methods=['POST'])
 def crash_cashout():
-    """Cash out from crash game"""
+    """Cash out of the running round; the payout lands when the round settles"""
     try:
         data = request.get_json()
         user_id = data.get('user_id')
@@ -883,40 +931,16 @@ def crash_cashout():
         if not user_id:
             return jsonify({'success': False, 'error': 'Missing user_id'}), 400
         
-        success = cash_out_crash(user_id)
-        if not success:
-            return jsonify({'success': False, 'error': 'Cannot cash out'}), 400
+        bet = crash_rounds.cash_out(user_id)
         
-        game = get_crash_game(user_id)
-        
-        # Handle winnings
-        if game.winnings > 0:
-            new_balance = update_user_balance(user_id, game.winnings)
-            record_transaction(user_id, game.winnings, 'crash_win', f'Crash win at {game.cash_out_multiplier:.2f}x')
-            record_game(user_id, 'crash', game.bet_amount, game.winnings, 'win')
-        else:
-            user = get_user(user_id)
-            new_balance = user['balance']
-            record_game(user_id, 'crash', game.bet_amount, 0, 'lose')
-        
-        result = {
+        return jsonify({
             'success': True,
-            'game': {
-                'current_multiplier': game.current_multiplier,
-                'cash_out_multiplier': game.cash_out_multiplier,
-                'winnings': game.winnings,
-                'game_over': game.game_over,
-                'result': game.result,
-                'cashed_out': game.cashed_out
-            },
-            'new_balance': new_balance
-        }
-        
-        # Clear game
-        clear_crash_game(user_id)
-        
-        return jsonify(result)
+            'cash_out_multiplier': bet.cash_out_multiplier,
+            'winnings': bet.winnings
+        })
         
+    except GameError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -943,7 +967,7 @@ def mines_start():
             }), 400
         
         # Deduct bet from balance
-        new_balance = update_user_balance(user_id, -bet_amount)
+        new_balance = settle_balance(user_id, -bet_amount)['balance']
         record_transaction(user_id, -bet_amount, 'mines_bet', 'Mines game bet')
         
         # Create game
@@ -955,6 +979,8 @@ def mines_start():
             'new_balance': new_balance
         })
         
+    except InsufficientFundsError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -969,16 +995,13 @@ def mines_reveal():
         if not all([user_id is not None, position is not None]):
             return jsonify({'success': False, 'error': 'Missing required fields'}), 400
         
-        result = reveal_mines_tile(user_id, position)
-        if result is None:
+        result, game = reveal_mines_tile(user_id, position)
+        if game is None:
             return jsonify({'success': False, 'error': 'No active game'}), 400
         
-        game = get_mines_game(user_id)
-        
-        # If hit mine, record loss
-        if result.get('hit_mine'):
+        # If hit mine, record loss; the game has already left the session
+        if result and result.get('hit_mine'):
             record_game(user_id, 'mines', game.bet_amount, 0, 'lose')
-            clear_mines_game(user_id)
         
         return jsonify({
             'success': True,
@@ -986,6 +1009,8 @@ def mines_reveal():
             'game': game.get_game_state()
         })
         
+    except SessionConflict as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -999,14 +1024,13 @@ def mines_cashout():
         if not user_id:
             return jsonify({'success': False, 'error': 'Missing user_id'}), 400
         
-        success = cash_out_mines(user_id)
+        # Cashing out ends the session in the same step, so only one request gets paid
+        success, game = cash_out_mines(user_id)
         if not success:
             return jsonify({'success': False, 'error': 'Cannot cash out'}), 400
         
-        game = get_mines_game(user_id)
-        
         # Handle winnings
-        new_balance = update_user_balance(user_id, game.winnings)
+        new_balance = settle_balance(user_id, game.winnings)['balance']
         record_transaction(user_id, game.winnings, 'mines_win', f'Mines cashout at {game.current_multiplier:.2f}x')
         record_game(user_id, 'mines', game.bet_amount, game.winnings, 'win')
         
@@ -1016,11 +1040,10 @@ def mines_cashout():
             'new_balance': new_balance
         }
         
-        # Clear game
-        clear_mines_game(user_id)
-        
         return jsonify(result)
         
+    except SessionConflict as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -1046,7 +1069,7 @@ def tower_start():
             }), 400
         
         # Deduct bet from balance
-        new_balance = update_user_balance(user_id, -bet_amount)
+        new_balance = settle_balance(user_id, -bet_amount)['balance']
         record_transaction(user_id, -bet_amount, 'tower_bet', 'Tower game bet')
         
         # Create game
@@ -1058,6 +1081,8 @@ def tower_start():
             'new_balance': new_balance
         })
         
+    except InsufficientFundsError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -1072,23 +1097,19 @@ def tower_choose():
         if not all([user_id is not None, tile_index is not None]):
             return jsonify({'success': False, 'error': 'Missing required fields'}), 400
         
-        result = choose_tower_tile(user_id, tile_index)
-        if result is None:
+        result, game = choose_tower_tile(user_id, tile_index)
+        if game is None:
             return jsonify({'success': False, 'error': 'No active game'}), 400
         
-        game = get_tower_game(user_id)
-        
-        # If hit trap or completed tower, handle winnings
+        # If hit trap or completed tower, handle winnings; the game has already left the session
         if game.game_over:
             if game.result == 'trap':
                 record_game(user_id, 'tower', game.bet_amount, 0, 'lose')
             elif game.result == 'completed':
-                new_balance = update_user_balance(user_id, game.winnings)
+                new_balance = settle_balance(user_id, game.winnings)['balance']
                 record_transaction(user_id, game.winnings, 'tower_win', f'Tower completed at level {game.current_level}')
                 record_game(user_id, 'tower', game.bet_amount, game.winnings, 'win')
                 result['new_balance'] = new_balance
-            
-            clear_tower_game(user_id)
         
         return jsonify({
             'success': True,
@@ -1096,6 +1117,8 @@ def tower_choose():
             'game': game.get_game_state()
         })
         
+    except SessionConflict as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -1109,14 +1132,13 @@ def tower_cashout():
         if not user_id:
             return jsonify({'success': False, 'error': 'Missing user_id'}), 400
         
-        success = cash_out_tower(user_id)
+        # Cashing out ends the session in the same step, so only one request gets paid
+        success, game = cash_out_tower(user_id)
         if not success:
             return jsonify({'success': False, 'error': 'Cannot cash out'}), 400
         
-        game = get_tower_game(user_id)
-        
         # Handle winnings
-        new_balance = update_user_balance(user_id, game.winnings)
+        new_balance = settle_balance(user_id, game.winnings)['balance']
         record_transaction(user_id, game.winnings, 'tower_win', f'Tower cashout at level {game.current_level}')
         record_game(user_id, 'tower', game.bet_amount, game.winnings, 'win')
         
@@ -1126,11 +1148,10 @@ def tower_cashout():
             'new_balance': new_balance
         }
         
-        # Clear game
-        clear_tower_game(user_id)
-        
         return jsonify(result)
         
+    except SessionConflict as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -1157,16 +1178,18 @@ def plinko_drop():
             }), 400
         
         # Deduct bet from balance
-        new_balance = update_user_balance(user_id, -bet_amount)
+        new_balance = settle_balance(user_id, -bet_amount)['balance']
         record_transaction(user_id, -bet_amount, 'plinko_bet', 'Plinko game bet')
         
-        # Create game and drop ball
-        game = create_plinko_game(user_id, bet_amount, risk_level)
-        result = drop_plinko_ball(user_id)
+        # Create game and drop ball; the dropped game leaves the session in the same step
+        create_plinko_game(user_id, bet_amount, risk_level)
+        result, game = drop_plinko_ball(user_id)
+        if game is None:
+            return jsonify({'success': False, 'error': 'No active game'}), 400
         
         # Handle winnings
         if game.winnings > 0:
-            new_balance = update_user_balance(user_id, game.winnings)
+            new_balance = settle_balance(user_id, game.winnings)['balance']
             record_transaction(user_id, game.winnings, 'plinko_win', f'Plinko win: {result["multiplier"]}x')
             record_game(user_id, 'plinko', game.bet_amount, game.winnings, 'win')
         else:
@@ -1179,11 +1202,12 @@ def plinko_drop():
             'new_balance': new_balance
         }
         
-        # Clear game
-        clear_plinko_game(user_id)
-        
         return jsonify(response)
         
+    except SessionConflict as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    except InsufficientFundsError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -1209,7 +1233,7 @@ def poker_start():
             }), 400
         
         # Deduct bet from balance
-        new_balance = update_user_balance(user_id, -bet_amount)
+        new_balance = settle_balance(user_id, -bet_amount)['balance']
         record_transaction(user_id, -bet_amount, 'poker_bet', 'Poker game bet')
         
         # Create game
@@ -1221,6 +1245,8 @@ def poker_start():
             'new_balance': new_balance
         })
         
+    except InsufficientFundsError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -1234,15 +1260,14 @@ def poker_finish():
         if not user_id:
             return jsonify({'success': False, 'error': 'Missing user_id'}), 400
         
-        success = finish_poker_game(user_id)
+        # Finishing ends the session in the same step, so only one request gets paid
+        success, game = finish_poker_game(user_id)
         if not success:
             return jsonify({'success': False, 'error': 'No active game'}), 400
         
-        game = get_poker_game(user_id)
-        
         # Handle winnings
         if game.winnings > 0:
-            new_balance = update_user_balance(user_id, game.winnings)
+            new_balance = settle_balance(user_id, game.winnings)['balance']
             record_transaction(user_id, game.winnings, 'poker_win', f'Poker win: {game.player_hand_rank[1]}')
             record_game(user_id, 'poker', game.bet_amount, game.winnings, game.result)
         else:
@@ -1256,11 +1281,10 @@ def poker_finish():
             'new_balance': new_balance
         }
         
-        # Clear game
-        clear_poker_game(user_id)
-        
         return jsonify(result)
         
+    except SessionConflict as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -1286,7 +1310,7 @@ def lottery_start():
             }), 400
         
         # Deduct bet from balance
-        new_balance = update_user_balance(user_id, -bet_amount)
+        new_balance = settle_balance(user_id, -bet_amount)['balance']
         record_transaction(user_id, -bet_amount, 'lottery_bet', 'Lottery ticket purchase')
         
         # Create game
@@ -1298,6 +1322,8 @@ def lottery_start():
             'new_balance': new_balance
         })
         
+    except InsufficientFundsError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -1312,17 +1338,17 @@ def lottery_select():
         if not all([user_id, numbers]):
             return jsonify({'success': False, 'error': 'Missing required fields'}), 400
         
-        success = select_lottery_numbers(user_id, numbers)
+        success, game = select_lottery_numbers(user_id, numbers)
         if not success:
             return jsonify({'success': False, 'error': 'Invalid number selection'}), 400
         
-        game = get_lottery_game(user_id)
-        
         return jsonify({
             'success': True,
             'game': game.get_game_state()
         })
         
+    except SessionConflict as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -1336,15 +1362,14 @@ def lottery_draw():
         if not user_id:
             return jsonify({'success': False, 'error': 'Missing user_id'}), 400
         
-        success = draw_lottery_numbers(user_id)
+        # Drawing ends the session in the same step, so only one request gets paid
+        success, game = draw_lottery_numbers(user_id)
         if not success:
             return jsonify({'success': False, 'error': 'No active game or numbers not selected'}), 400
         
-        game = get_lottery_game(user_id)
-        
         # Handle winnings
         if game.winnings > 0:
-            new_balance = update_user_balance(user_id, game.winnings)
+            new_balance = settle_balance(user_id, game.winnings)['balance']
             record_transaction(user_id, game.winnings, 'lottery_win', f'Lottery win: {game.matches} matches')
             record_game(user_id, 'lottery', game.bet_amount, game.winnings, 'win')
         else:
@@ -1358,14 +1383,72 @@ def lottery_draw():
             'new_balance': new_balance
         }
         
-        # Clear game
-        clear_lottery_game(user_id)
-        
         return jsonify(result)
         
+    except SessionConflict as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# ==================== PROVABLY FAIR API ENDPOINTS ====================
+@app.route('/api/fair/seeds/<int:user_id>')
+def fair_seeds(user_id):
+    """Current server seed hash and client seed, plus revealed seed pairs"""
+    try:
+        return jsonify({'success': True, 'seeds': fair_rng.get_seeds(user_id, live_nonces(user_id))})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/fair/rotate', methods=['POST'])
+def fair_rotate():
+    """Reveal the current server seed and start a new pair"""
+    try:
+        data = request.get_json()
+        user_id = data.get('user_id')
+        
+        if not user_id:
+            return jsonify({'success': False, 'error': 'Missing user_id'}), 400
+        
+        # A seed dealing an unfinished game must not be revealed
+        return jsonify({'success': True, 'seeds': fair_rng.rotate(user_id, data.get('client_seed'), live_nonces(user_id))})
+        
+    except SeedPairInUse as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/fair/verify', methods=['POST'])
+def fair_verify():
+    """Replay a game from revealed seeds, or a crash round from its hash"""
+    try:
+        data = request.get_json()
+        game = data.get('game')
+        
+        if game == 'crash_round':
+            if not data.get('hash'):
+                return jsonify({'success': False, 'error': 'Missing hash'}), 400
+            return jsonify({'success': True, 'verification': verify_crash_round(data['hash'], data.get('salt', crash_rounds.chain.salt))})
+        
+        server_seed = data.get('server_seed')
+        client_seed = data.get('client_seed')
+        nonce = data.get('nonce')
+        if not all([game, server_seed, client_seed]) or nonce is None:
+            return jsonify({'success': False, 'error': 'Missing required fields'}), 400
+        
+        return jsonify({'success': True, 'verification': verify_outcome(game, server_seed, client_seed, int(nonce), data.get('params'))})
+        
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/fair/crash')
+def fair_crash():
+    """Crash hash chain commitment and recently revealed round hashes"""
+    return jsonify({'success': True, 'crash': crash_rounds.get_fairness()})
+
 @app.route('/static/<path:filename>')
 def static_files(filename):
     """Serve static files"""
@@ -7,16 +7,81 @@ class CrashGame {
         this.crashPoint = 0;
         this.gameStartTime = 0;
         this.animationId = null;
+        this.countdownInterval = null;
         this.hasBet = false;
         this.betAmount = 0;
         this.autoCashout = 0;
         this.cashedOut = false;
+        this.roundId = null;
+        // Server clock minus local clock, in milliseconds
+        this.clockOffset = 0;
         
         this.canvas = document.getElementById('crashGraph');
         this.ctx = this.canvas.getContext('2d');
         
         this.initializeGraph();
-        this.startNewRound();
+        this.connect();
+    }
+    
+    connect() {
+        // Rounds run on the server; every player follows the same clock
+        this.events = new EventSource(`${window.location.origin}/api/crash/stream`);
+        this.events.addEventListener('round', (e) => this.onRound(JSON.parse(e.data)));
+        this.events.addEventListener('betting', (e) => this.onBetting(JSON.parse(e.data)));
+        this.events.addEventListener('start', (e) => this.onStart(JSON.parse(e.data)));
+        this.events.addEventListener('tick', (e) => this.onTick(JSON.parse(e.data)));
+        this.events.addEventListener('crash', (e) => this.onCrash(JSON.parse(e.data)));
+        this.events.addEventListener('settled', (e) => this.onSettled(JSON.parse(e.data)));
+    }
+    
+    syncClock(state) {
+        this.clockOffset = state.server_time * 1000 - Date.now();
+    }
+    
+    serverNow() {
+        return Date.now() + this.clockOffset;
+    }
+    
+    onRound(state) {
+        this.syncClock(state);
+        if (state.phase === 'betting') {
+            this.onBetting(state);
+        } else if (state.phase === 'running') {
+            this.onStart(state);
+        } else if (state.phase === 'crashed') {
+            document.getElementById('crash-status').textContent = 'Waiting for next round...';
+        }
+    }
+    
+    onBetting(state) {
+        this.syncClock(state);
+        this.roundId = state.round_id;
+        this.startNewRound(state.betting_ends_at * 1000);
+    }
+    
+    onStart(state) {
+        this.syncClock(state);
+        this.roundId = state.round_id;
+        this.gameStartTime = state.start_time * 1000;
+        this.startGame();
+    }
+    
+    onTick(state) {
+        this.syncClock(state);
+        this.currentMultiplier = state.multiplier;
+    }
+    
+    onCrash(state) {
+        this.crashPoint = state.crash_point;
+        this.currentMultiplier = state.crash_point;
+        this.crashGame();
+    }
+    
+    onSettled(state) {
+        // Payouts are written in bulk once the round ends
+        if (this.hasBet && state.round_id === this.roundId) {
+            window.gambleAPI.getUserData();
+        }
     }
     
     initializeGraph() {
@@ -73,7 +138,7 @@ class CrashGame {
         const width = this.canvas.width / window.devicePixelRatio;
         const height = this.canvas.height / window.devicePixelRatio;
         
-        const timeElapsed = (Date.now() - this.gameStartTime) / 1000;
+        const timeElapsed = (this.serverNow() - this.gameStartTime) / 1000;
         const maxTime = 30; // 30 seconds max display
         const maxMultiplier = 10; // 10x max display
         
@@ -84,7 +149,7 @@ class CrashGame {
         
         for (let t = 0; t <= timeElapsed; t += 0.1) {
             const x = (t / maxTime) * width;
-            const multiplier = Math.min(1 + (t * 0.1), this.currentMultiplier);
+            const multiplier = Math.min(this.multiplierAt(t), this.currentMultiplier);
             const y = height - ((multiplier - 1) / (maxMultiplier - 1)) * height;
             
             if (t === 0) {
@@ -98,7 +163,7 @@ class CrashGame {
         
         // Draw crash point if crashed
         if (!this.isGameActive && this.crashPoint > 0) {
-            const crashTime = Math.log(this.crashPoint) / Math.log(1.1);
+            const crashTime = Math.pow(this.crashPoint - 1, 1 / 1.5) / 0.1;
             const x = (crashTime / maxTime) * width;
             const y = height - ((this.crashPoint - 1) / (maxMultiplier - 1)) * height;
             
@@ -116,16 +181,19 @@ class CrashGame {
         }
     }
     
-    startNewRound() {
+    startNewRound(bettingEndsAt) {
         // Reset game state
+        cancelAnimationFrame(this.animationId);
         this.isGameActive = false;
         this.currentMultiplier = 1.00;
-        this.crashPoint = this.generateCrashPoint();
+        this.crashPoint = 0;
         this.cashedOut = false;
         this.hasBet = false;
         
         // Update UI
-        document.getElementById('multiplier').textContent = '1.00x';
+        const multiplierElement = document.getElementById('multiplier');
+        multiplierElement.textContent = '1.00x';
+        multiplierElement.classList.remove('crashed');
         document.getElementById('crash-status').textContent = 'Place your bets!';
         document.getElementById('crash-status').className = 'crash-status waiting';
         document.getElementById('placeBetBtn').classList.remove('hidden');
@@ -136,65 +204,60 @@ class CrashGame {
         this.drawGraph();
         
         // Start countdown
-        this.startCountdown();
+        this.startCountdown(bettingEndsAt);
     }
     
-    startCountdown() {
-        let countdown = 5;
-        const countdownInterval = setInterval(() => {
+    startCountdown(bettingEndsAt) {
+        clearInterval(this.countdownInterval);
+        const update = () => {
+            const countdown = Math.max(0, Math.ceil((bettingEndsAt - this.serverNow()) / 1000));
             document.getElementById('crash-status').textContent = `Starting in ${countdown}s...`;
-            countdown--;
-            
-            if (countdown < 0) {
-                clearInterval(countdownInterval);
-                this.startGame();
+            if (countdown <= 0) {
+                clearInterval(this.countdownInterval);
             }
-        }, 1000);
+        };
+        update();
+        this.countdownInterval = setInterval(update, 250);
     }
     
     startGame() {
+        clearInterval(this.countdownInterval);
         this.isGameActive = true;
-        this.gameStartTime = Date.now();
         
         // Update UI
         document.getElementById('crash-status').textContent = 'Game in progress...';
         document.getElementById('crash-status').className = 'crash-status rising';
         document.getElementById('placeBetBtn').classList.add('hidden');
         
-        if (this.hasBet) {
+        if (this.hasBet && !this.cashedOut) {
             document.getElementById('cashoutBtn').classList.remove('hidden');
             document.getElementById('cashoutBtn').classList.add('cashout-available');
         }
         
         // Start multiplier animation
+        cancelAnimationFrame(this.animationId);
         this.animateMultiplier();
     }
     
+    multiplierAt(seconds) {
+        // Same curve as the server; ticks keep it honest
+        return 1 + Math.pow(Math.max(seconds, 0) * 0.1, 1.5);
+    }
+    
     animateMultiplier() {
         if (!this.isGameActive) return;
         
-        const timeElapsed = (Date.now() - this.gameStartTime) / 1000;
-        this.currentMultiplier = 1 + (timeElapsed * 0.1);
+        // Interpolate between server ticks on the shared clock
+        const timeElapsed = (this.serverNow() - this.gameStartTime) / 1000;
+        this.currentMultiplier = Math.max(this.currentMultiplier, this.multiplierAt(timeElapsed));
         
         // Update multiplier display
         const multiplierElement = document.getElementById('multiplier');
         multiplierElement.textContent = `${this.currentMultiplier.toFixed(2)}x`;
-        multiplierElement.classList.add('rising');
         
-        setTimeout(() => {
-            multiplierElement.classList.remove('rising');
-        }, 100);
-        
-        // Check for crash
-        if (this.currentMultiplier >= this.crashPoint) {
-            this.crashGame();
-            return;
-        }
-        
-        // Check for auto cashout
+        // Auto cashout is applied by the server; mirror it in the UI
         if (this.hasBet && !this.cashedOut && this.autoCashout > 0 && this.currentMultiplier >= this.autoCashout) {
-            this.cashOut(true);
-            return;
+            this.showCashedOut(this.autoCashout, true);
         }
         
         // Update graph
@@ -204,8 +267,21 @@ class CrashGame {
         this.animationId = requestAnimationFrame(() => this.animateMultiplier());
     }
     
+    showCashedOut(multiplier, isAuto) {
+        this.cashedOut = true;
+        const winnings = this.betAmount * multiplier;
+        
+        // Hide cashout button
+        document.getElementById('cashoutBtn').classList.add('hidden');
+        document.getElementById('cashoutBtn').classList.remove('cashout-available');
+        
+        // Show result
+        this.showResult(true, winnings, `${isAuto ? 'Auto-' : ''}Cashed out at ${multiplier.toFixed(2)}x`);
+    }
+    
     crashGame() {
         this.isGameActive = false;
+        cancelAnimationFrame(this.animationId);
         
         // Play crash sound
         window.gambleAPI.playSound('crash', 0.6);
@@ -227,23 +303,6 @@ class CrashGame {
         
         // Draw final graph
         this.drawGraph();
-        
-        // Start new round after delay
-        setTimeout(() => {
-            this.startNewRound();
-        }, 5000);
-    }
-    
-    generateCrashPoint() {
-        // Generate crash point with house edge
-        const r = Math.random();
-        if (r < 0.01) {
-            return 1.0 + Math.random() * 0.1;
-        } else if (r < 0.05) {
-            return 1.1 + Math.random() * 0.4;
-        } else {
-            return 0.9 / Math.pow(Math.random(), 0.7);
-        }
     }
     
     showResult(won, amount, message) {
@@ -301,20 +360,34 @@ async function placeBet() {
     showLoading(placeBetBtn);
     
     try {
-        // Place bet through API
-        const result = await window.gambleAPI.placeBet('crash', betAmount, {
-            target_multiplier: autoCashout
+        // Join the round that is taking bets
+        const response = await fetch(`${window.location.origin}/api/crash/bet`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({
+                user_id: window.gambleAPI.userId,
+                bet_amount: betAmount,
+                auto_cashout: autoCashout
+            })
         });
+        const result = await response.json();
         
-        if (result) {
+        if (result.success) {
             crashGame.hasBet = true;
             crashGame.betAmount = betAmount;
             crashGame.autoCashout = autoCashout;
+            window.userData.balance = result.new_balance;
+            window.gambleAPI.updateBalanceDisplay(result.new_balance);
+            document.getElementById('placeBetBtn').classList.add('hidden');
             
             // Show auto cashout indicator
             showAutoCashoutIndicator(autoCashout);
             
             window.gambleAPI.showSuccess(`Bet placed: ${window.gambleAPI.formatMoney(betAmount)}`);
+        } else {
+            window.gambleAPI.showError(result.error);
         }
     } catch (error) {
         window.gambleAPI.showError('Failed to place bet');
@@ -323,27 +396,31 @@ async function placeBet() {
     }
 }
 
-async function cashOut(isAuto = false) {
+async function cashOut() {
     if (!crashGame.hasBet || crashGame.cashedOut || !crashGame.isGameActive) {
         return;
     }
     
-    crashGame.cashedOut = true;
-    const winnings = crashGame.betAmount * crashGame.currentMultiplier;
-    
-    // Update balance locally
-    window.userData.balance += winnings;
-    window.gambleAPI.updateBalanceDisplay(window.userData.balance);
-    
-    // Hide cashout button
-    document.getElementById('cashoutBtn').classList.add('hidden');
-    document.getElementById('cashoutBtn').classList.remove('cashout-available');
-    
-    // Show result
-    crashGame.showResult(true, winnings, 
-        `${isAuto ? 'Auto-' : ''}Cashed out at ${crashGame.currentMultiplier.toFixed(2)}x`);
-    
-    window.gambleAPI.showSuccess(`Cashed out: ${window.gambleAPI.formatMoney(winnings)}`);
+    try {
+        const response = await fetch(`${window.location.origin}/api/crash/cashout`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ user_id: window.gambleAPI.userId })
+        });
+        const result = await response.json();
+        
+        if (result.success) {
+            // The balance updates when the round settles
+            crashGame.showCashedOut(result.cash_out_multiplier, false);
+            window.gambleAPI.showSuccess(`Cashed out: ${window.gambleAPI.formatMoney(result.winnings)}`);
+        } else {
+            window.gambleAPI.showError(result.error);
+        }
+    } catch (error) {
+        window.gambleAPI.showError('Failed to cash out');
+    }
 }
 
 function setBetAmount(amount) {
@@ -1,128 +1,138 @@
 import os
+import atexit
+import threading
 import pymongo
+from pymongo import UpdateOne
+from bson import ObjectId
 from dotenv import load_dotenv
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from src.utils.logger import db_logger
+from src.utils.error_handler import InsufficientFundsError
+from src.database.schema import build_settlement_filter, build_settlement_update, build_round_settlement, build_user_upsert, resolve_user_upsert
+from src.database.cache import user_cache
+from src.database.leaderboard import leaderboards
+from src.database.client import LazyHandle, get_sync_client, MONGODB_URI, DATABASE_NAME
+from src.database.activity import LastActiveTracker, LAST_ACTIVE_FLUSH_INTERVAL
+from src.database.ledger import LedgerWriter, DURABLE_TRANSACTION_TYPES, LEDGER_BATCH_SIZE, LEDGER_FLUSH_INTERVAL, LEDGER_MAX_BUFFER
 
 load_dotenv()
 
-MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
-DATABASE_NAME = os.getenv("DATABASE_NAME", "exowin_bot")
-
-# Use synchronous pymongo client for webapp
-client = pymongo.MongoClient(MONGODB_URI)
+# Use the shared synchronous pymongo client for webapp, resolved on use so
+# forked workers get their own pool
+client = LazyHandle(get_sync_client)
 db = client[DATABASE_NAME]
 users_collection = db["users"]
 transactions_collection = db["transactions"]
 games_collection = db["games"]
+game_rollups_collection = db["game_rollups"]
+transaction_rollups_collection = db["transaction_rollups"]
+crash_rounds_collection = db["crash_rounds"]
+
+# Buffer last_active writes and flush them from a background thread
+last_active_tracker = LastActiveTracker(interval=LAST_ACTIVE_FLUSH_INTERVAL)
+
+# Buffer game and transaction rows and write them in ordered batches
+ledger_writer = LedgerWriter(
+    {"games": games_collection, "transactions": transactions_collection},
+    batch_size=LEDGER_BATCH_SIZE,
+    interval=LEDGER_FLUSH_INTERVAL,
+    max_buffer=LEDGER_MAX_BUFFER,
+    rollups={"games": game_rollups_collection, "transactions": transaction_rollups_collection}
+)
+
+# Pid of the process the flusher threads run in; a forked worker starts its own
+_background_pid = None
+_background_lock = threading.Lock()
+
+def start_background_threads():
+    """Start the last_active and ledger flusher threads once per process.
+
+    Called from the webapp's startup rather than at import, so scripts and
+    tests importing this module do not get threads or exit hooks.
+    """
+    global _background_pid
+    if _background_pid == os.getpid():
+        return
+    with _background_lock:
+        if _background_pid == os.getpid():
+            return
+        _background_pid = os.getpid()
+        last_active_tracker.start_thread(users_collection)
+        ledger_writer.start_thread()
+        atexit.register(last_active_tracker.flush_sync, users_collection)
+        atexit.register(ledger_writer.flush_sync)
 
 def get_user(user_id: int, user_data: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
     """Get user from database or create if not exists"""
     try:
         db_logger.debug(f"Getting user {user_id}")
-        user = users_collection.find_one({"user_id": user_id})
-        if not user:
-            user = {
-                "user_id": user_id,
-                "balance": 1.0,  # Starting balance of $1
-                "created_at": datetime.now(),
-                "last_active": datetime.now(),
-                "total_bets": 0,
-                "total_wins": 0,
-                "total_losses": 0,
-                "total_deposits": 0,
-                "total_withdrawals": 0,
-                "is_banned": False,
-                # New fields for bonuses and settings
-                "daily_bonus_streak": 0,
-                "last_daily_bonus": None,
-                "total_daily_bonuses": 0.0,
-                "total_referrals": 0,
-                "total_referral_bonuses": 0.0,
-                "total_event_bonuses": 0.0,
-                "referred_by": None,
-                # Settings
-                "notifications_enabled": True,
-                "sound_effects": True,
-                "theme": "dark",
-                "language": "en",
-                "auto_bet_enabled": False,
-                "quick_bet_enabled": False,
-                # User info fields
-                "username": None,
-                "first_name": None,
-                "last_name": None
-            }
-            
-            # Add user data if provided
-            if user_data:
-                user.update({
-                    "username": user_data.get('username'),
-                    "first_name": user_data.get('first_name'),
-                    "last_name": user_data.get('last_name')
-                })
-            
-            users_collection.insert_one(user)
-            db_logger.info(f"Created new user {user_id}")
-        else:
-            # Update last active and user info if provided
-            update_data = {"last_active": datetime.now()}
-            if user_data:
-                update_data.update({
-                    "username": user_data.get('username'),
-                    "first_name": user_data.get('first_name'),
-                    "last_name": user_data.get('last_name')
-                })
-            
-            users_collection.update_one(
-                {"user_id": user_id},
-                {"$set": update_data}
-            )
+        if not user_data:
+            # Plain reads of existing users stay reads; only a miss upserts
+            user = users_collection.find_one({"user_id": user_id}, {"_id": False})
+            if user is not None:
+                last_active_tracker.touch(user_id)
+                return user
         
-        # Remove MongoDB ObjectId for JSON serialization
-        if '_id' in user:
-            del user['_id']
+        update = build_user_upsert(user_data)
+        before = users_collection.find_one_and_update(
+            {"user_id": user_id},
+            update,
+            projection={"_id": False},
+            upsert=True,
+            return_document=pymongo.ReturnDocument.BEFORE
+        )
+        user = resolve_user_upsert(user_id, before, update)
+        user.pop("_id", None)
+        
+        if before is None:
+            db_logger.info(f"Created new user {user_id}")
+            leaderboards.observe(user)
+        elif not user_data:
+            # Plain reads only record activity; it is written in bulk later
+            last_active_tracker.touch(user_id)
         
         return user
     except Exception as e:
         db_logger.error(f"Database error in get_user: {e}")
         raise
 
-def update_user_balance(user_id: int, amount: float) -> bool:
-    """Update user balance"""
+def settle_balance(user_id: int, amount: float, inc: Optional[Dict[str, Any]] = None, set_fields: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Apply a balance delta and every counter change in one round trip.
+
+    A debit the balance cannot cover changes nothing and raises
+    InsufficientFundsError.
+    """
     try:
-        users_collection.update_one(
-            {"user_id": user_id},
-            {"$inc": {"balance": amount}, "$set": {"last_active": datetime.now()}}
+        user = users_collection.find_one_and_update(
+            build_settlement_filter(user_id, amount),
+            build_settlement_update(amount, inc, set_fields),
+            projection={"_id": False},
+            return_document=pymongo.ReturnDocument.AFTER
         )
-        
-        # Update stats based on transaction type
-        if amount > 0:
-            users_collection.update_one(
-                {"user_id": user_id},
-                {"$inc": {"total_wins": 1}}
-            )
-        elif amount < 0:
-            users_collection.update_one(
-                {"user_id": user_id},
-                {"$inc": {"total_losses": 1}}
-            )
-        
-        users_collection.update_one(
-            {"user_id": user_id},
-            {"$inc": {"total_bets": 1}}
-        )
-        
-        return True
     except Exception as e:
-        db_logger.error(f"Database error in update_user_balance: {e}")
+        db_logger.error(f"Database error in settle_balance: {e}")
         raise
+    # Keep the bot's cache coherent when both run in one process (start.py)
+    user_cache.invalidate(user_id)
+    if user is None:
+        if amount < 0:
+            raise InsufficientFundsError("Insufficient balance")
+        return None
+    leaderboards.observe(user)
+    return user
+
+def update_user_balance(user_id: int, amount: float) -> bool:
+    """Update user balance"""
+    return settle_balance(user_id, amount) is not None
 
-def record_transaction(user_id: int, amount: float, transaction_type: str, game_id: str = None, description: str = None) -> str:
-    """Record a transaction"""
+def record_transaction(user_id: int, amount: float, transaction_type: str, game_id: str = None, description: str = None, durable: Optional[bool] = None) -> str:
+    """Record a transaction; money-moving types are written before returning"""
+    if durable is None:
+        durable = transaction_type in DURABLE_TRANSACTION_TYPES
     try:
         transaction = {
+            "_id": ObjectId(),
             "user_id": user_id,
             "amount": amount,
             "type": transaction_type,  # deposit, withdrawal, bet, win
@@ -130,7 +140,7 @@ def record_transaction(user_id: int, amount: float, transaction_type: str, game_
             "description": description,
             "timestamp": datetime.now()
         }
-        result = transactions_collection.insert_one(transaction)
+        ledger_writer.add_sync("transactions", transaction, durable=durable)
         
         # Update user stats for deposits and withdrawals
         if transaction_type == "deposit":
@@ -144,15 +154,19 @@ def record_transaction(user_id: int, amount: float, transaction_type: str, game_
                 {"$inc": {"total_withdrawals": amount}}
             )
         
-        return str(result.inserted_id)
+        if transaction_type in ("deposit", "withdrawal"):
+            user_cache.invalidate(user_id)
+        
+        return str(transaction["_id"])
     except Exception as e:
         db_logger.error(f"Database error in record_transaction: {e}")
         raise
 
-def record_game(user_id: int, game_type: str, bet_amount: float, outcome: str, winnings: float) -> str:
+def record_game(user_id: int, game_type: str, bet_amount: float, outcome: str, winnings: float, durable: bool = False) -> str:
     """Record a game result"""
     try:
         game = {
+            "_id": ObjectId(),
             "user_id": user_id,
             "game_type": game_type,
             "bet_amount": bet_amount,
@@ -160,8 +174,55 @@ def record_game(user_id: int, game_type: str, bet_amount: float, outcome: str, w
             "winnings": winnings,
             "timestamp": datetime.now()
         }
-        result = games_collection.insert_one(game)
-        return str(result.inserted_id)
+        ledger_writer.add_sync("games", game, durable=durable)
+        return str(game["_id"])
     except Exception as e:
         db_logger.error(f"Database error in record_game: {e}")
-        raise
\ No newline at end of file
+        raise
+
+def settle_round(game_type: str, results: List[Dict[str, Any]], round_key: Optional[str] = None) -> int:
+    """Pay and record every bet of a shared round with one bulk write.
+
+    Each result has user_id, bet_amount, winnings, outcome and description,
+    and optionally the transaction type; stakes were already debited when the
+    bets were placed. With a round_key each user is credited at most once for
+    the round, so a failed settlement can be run again. Returns the number of
+    users paid.
+    """
+    try:
+        now = datetime.now()
+        winners = [result for result in results if result["winnings"] > 0]
+        if winners:
+            operations = []
+            for result in winners:
+                if round_key:
+                    operations.append(UpdateOne(*build_round_settlement(result["user_id"], round_key, result["winnings"])))
+                else:
+                    operations.append(UpdateOne({"user_id": result["user_id"]}, build_settlement_update(result["winnings"])))
+            users_collection.bulk_write(operations, ordered=False)
+            for user in users_collection.find({"user_id": {"$in": [result["user_id"] for result in winners]}}, {"_id": False}):
+                user_cache.invalidate(user["user_id"])
+                leaderboards.observe(user)
+
+        ledger_writer.add_many_sync("games", [{
+            "_id": ObjectId(),
+            "user_id": result["user_id"],
+            "game_type": game_type,
+            "bet_amount": result["bet_amount"],
+            "outcome": result["outcome"],
+            "winnings": result["winnings"],
+            "timestamp": now
+        } for result in results])
+        ledger_writer.add_many_sync("transactions", [{
+            "_id": ObjectId(),
+            "user_id": result["user_id"],
+            "amount": result["winnings"],
+            "type": result.get("type", f"{game_type}_win"),
+            "game_id": None,
+            "description": result["description"],
+            "timestamp": now
+        } for result in winners])
+        return len(winners)
+    except Exception as e:
+        db_logger.error(f"Database error in settle_round: {e}")
+        raise